@@ -23,29 +23,47 @@ from .version import router as version_router
 from .permissions import router as permissions_router
 from .audit import router as audit_router
 
-# 創建主 API 路由器
-api_router = APIRouter()
+# 所有子路由（依註冊順序）
+API_ROUTERS = (
+    auth_router,
+    users_router,
+    teams_router,
+    test_run_configs_router,
+    test_run_configs_search_router,  # 新增搜尋路由
+    test_cases_router,
+    test_runs_router,
+    attachments_router,
+    tcg_router,
+    test_run_items_router,
+    contacts_router,
+    team_sync_router,
+    organization_sync_router,
+    jira_router,
+    lark_groups_router,
+    lark_users_router,
+    admin_router,
+    version_router,
+    permissions_router,
+    audit_router,
+)
 
-# 包含所有子路由
-api_router.include_router(auth_router)
-api_router.include_router(users_router)
-api_router.include_router(teams_router)
-api_router.include_router(test_run_configs_router)
-api_router.include_router(test_run_configs_search_router)  # 新增搜尋路由
-api_router.include_router(test_cases_router)
-api_router.include_router(test_runs_router)
-api_router.include_router(attachments_router)
-api_router.include_router(tcg_router)
-api_router.include_router(test_run_items_router)
-api_router.include_router(contacts_router)
-api_router.include_router(team_sync_router)
-api_router.include_router(organization_sync_router)
-api_router.include_router(jira_router)
-api_router.include_router(lark_groups_router)
-api_router.include_router(lark_users_router)
-api_router.include_router(admin_router)
-api_router.include_router(version_router)
-api_router.include_router(permissions_router)
-api_router.include_router(audit_router)
 
-# 可以在此添加其他 API 路由
+def include_api_routers(app, prefix: str = "/api") -> None:
+    """將子路由直接掛到應用程式上
+
+    FastAPI 每次 include_router 都會重新建立所有路由（含依賴分析與回應模型），
+    經由中介的 api_router 再掛一次會讓啟動時的路由建立工作加倍。
+    """
+    for router in API_ROUTERS:
+        app.include_router(router, prefix=prefix)
+
+
+def __getattr__(name):
+    # 相容舊用法：需要時才組出包含所有子路由的 api_router
+    if name == "api_router":
+        router = APIRouter()
+        for sub_router in API_ROUTERS:
+            router.include_router(sub_router)
+        globals()["api_router"] = router
+        return router
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -75,6 +75,22 @@ def _get_cpu_percent():
         return None
 
 
+def _get_lark_media_cache_stats():
+    try:
+        from app.services.lark_media_cache import get_lark_media_cache
+        return get_lark_media_cache().get_stats()
+    except Exception:
+        return None
+
+
+def _get_thumbnail_stats():
+    try:
+        from app.services.thumbnail_service import thumbnail_service
+        return thumbnail_service.get_stats()
+    except Exception:
+        return None
+
+
 @router.get("/system_metrics", include_in_schema=False)
 async def system_metrics():
     now = datetime.now(timezone.utc)
@@ -86,6 +102,8 @@ async def system_metrics():
         "load": _get_loadavg(),
         "cpu": {"percent": _get_cpu_percent()},
         "memory": _get_memory_info(),
+        "lark_media_cache": _get_lark_media_cache_stats(),
+        "thumbnails": _get_thumbnail_stats(),
     }
     return JSONResponse(payload)
 
@@ -4,7 +4,7 @@
 提供檔案上傳到 Lark Drive 並附加到測試案例或測試執行記錄的功能
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import Optional
@@ -15,6 +15,21 @@ import urllib.parse
 from app.database import get_db, get_sync_db
 from app.models.database_models import Team as TeamDB, TestRunConfig as TestRunConfigDB
 from app.services.lark_client import LarkClient
+from app.services import attachment_index_service
+from app.services.thumbnail_service import (
+    DEFAULT_SIZE as DEFAULT_THUMBNAIL_SIZE,
+    THUMB_DIR_NAME,
+    is_image,
+    thumbnail_service,
+)
+from app.services.lark_media_cache import (
+    LARK_MEDIA_DOWNLOAD_URL,
+    LarkMediaFetchError,
+    extract_media_token,
+    get_lark_media_cache,
+    make_lark_media_fetcher,
+)
+from app.utils.file_response import build_file_response
 from app.config import settings
 
 router = APIRouter(prefix="/attachments", tags=["attachments"])
@@ -44,6 +59,16 @@ def get_lark_client_for_team(team_id: int, db: Session) -> tuple[LarkClient, Tea
     return lark_client, team
 
 
+def _build_content_disposition(filename: str) -> str:
+    """產生下載用 Content-Disposition（非 ASCII 檔名使用 RFC 5987 格式）"""
+    try:
+        filename.encode('ascii')
+        return f'attachment; filename="{filename}"'
+    except UnicodeEncodeError:
+        encoded_filename = urllib.parse.quote(filename, safe='')
+        return f'attachment; filename*=UTF-8\'\'{encoded_filename}'
+
+
 @router.post("/teams/{team_id}/testcases/{record_id}/upload")
 async def upload_testcase_attachment(
     team_id: int,
@@ -232,6 +257,8 @@ async def upload_testrun_attachment(
         # 寫入檔案
         with open(stored_path, "wb") as out:
             out.write(file_content)
+        attachment_index_service.index_content(db, base_dir, stored_path, file_content, file.content_type)
+        thumbnail_service.schedule(stored_path, orig_name, file.content_type)
 
         # 準備檔案元資料
         item_meta = {
@@ -544,6 +571,7 @@ async def remove_testcase_attachment(
 
 @router.get("/teams/{team_id}/attachments/download")
 async def download_attachment_proxy(
+    request: Request,
     team_id: int,
     file_url: str = None,
     file_token: str = None,
@@ -555,8 +583,11 @@ async def download_attachment_proxy(
     
     現在優先支援本地附件：
     - 若 file_url 以 /attachments 開頭，直接從本地檔案系統讀取並回傳
-    - 若只有 file_token，嘗試在本地 attachments 目錄中以檔名搜尋
-    - 其餘情況才代理 Lark 下載
+    - 若只有 file_token，以 attachment_index 索引表查詢本地檔案
+    - Lark 媒體（file_token 或 medias 下載 URL）經本地磁碟 LRU 快取回應
+    - 其餘情況才直接代理 Lark 下載
+
+    本地檔案回應支援 Range（斷點續傳/影片拖曳）、ETag 與 Last-Modified/304。
     """
     import os
     import mimetypes
@@ -578,47 +609,87 @@ async def download_attachment_proxy(
             # 僅允許服務 attachments_root 之下的檔案
             if attachments_root not in disk_path.parents:
                 raise HTTPException(status_code=403, detail="禁止存取")
-            media_type = mimetypes.guess_type(str(disk_path))[0] or 'application/octet-stream'
-            def iterfile():
-                with open(disk_path, 'rb') as f:
-                    yield from f
-            return StreamingResponse(iterfile(), media_type=media_type)
+            entry = attachment_index_service.find_by_relative_path(db, rel)
+            media_type = (entry.mime_type if entry else None) or mimetypes.guess_type(str(disk_path))[0] or 'application/octet-stream'
+            return build_file_response(
+                request, disk_path, media_type=media_type,
+                sha256=entry.sha256 if entry else None,
+            )
     except HTTPException:
         raise
     except Exception:
         # 本地嘗試失敗則進入下一步
         pass
 
-    # 2) 只有 token：嘗試在本地 attachments 目錄以檔名搜尋
+    # 2) 只有 token：以附件索引表查詢本地檔案（單次索引查詢，不掃描目錄）
     try:
         if file_token and (not file_url):
-            project_root = Path(__file__).resolve().parents[2]
-            cfg_root = getattr(settings, 'attachments', None)
-            attachments_root = Path(cfg_root.root_dir) if (cfg_root and cfg_root.root_dir) else (project_root / 'attachments')
-            # 在整個 attachments 目錄中搜尋相符檔名（stored_name）
+            attachments_root = attachment_index_service.get_attachments_root()
             target = None
-            if attachments_root.exists():
-                for p in attachments_root.rglob('*'):
-                    if p.is_file() and p.name == file_token:
-                        target = p
-                        break
+            entry = attachment_index_service.find_by_token(db, file_token)
+            if entry is not None:
+                candidate = attachments_root / entry.relative_path
+                if attachments_root in candidate.parents and candidate.is_file():
+                    target = candidate
             if target and target.exists():
-                media_type = mimetypes.guess_type(str(target))[0] or 'application/octet-stream'
-                def iterfile():
-                    with open(target, 'rb') as f:
-                        yield from f
-                return StreamingResponse(iterfile(), media_type=media_type)
+                media_type = entry.mime_type or mimetypes.guess_type(str(target))[0] or 'application/octet-stream'
+                return build_file_response(request, target, media_type=media_type, sha256=entry.sha256)
     except Exception:
         pass
 
-    # 3) 代理 Lark 下載
+    # 3) Lark 媒體：優先使用本地磁碟快取，未命中時下載一次並寫入快取
+    media_token = extract_media_token(file_url) if file_url else file_token
+    media_cache = get_lark_media_cache()
+    if media_token and media_cache.enabled:
+        cached = media_cache.get(media_token)
+        if cached is None:
+            lark_client, team = get_lark_client_for_team(team_id, db)
+            access_token = lark_client.auth_manager.get_tenant_access_token()
+            if not access_token:
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail="無法取得 Lark access token"
+                )
+            download_url = file_url or LARK_MEDIA_DOWNLOAD_URL.format(file_token=media_token)
+            try:
+                cached = await media_cache.get_or_fetch(
+                    media_token, make_lark_media_fetcher(download_url, access_token)
+                )
+            except LarkMediaFetchError as e:
+                raise HTTPException(status_code=e.status_code, detail=str(e))
+            except requests.exceptions.Timeout:
+                raise HTTPException(
+                    status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                    detail="Lark 文件下載超時"
+                )
+            except requests.exceptions.RequestException as e:
+                raise HTTPException(
+                    status_code=status.HTTP_502_BAD_GATEWAY,
+                    detail=f"Lark 文件下載失敗: {str(e)}"
+                )
+            except ValueError:
+                cached = None
+        if cached is not None:
+            extra_headers = {}
+            if filename:
+                extra_headers['Content-Disposition'] = _build_content_disposition(filename)
+            elif cached.content_disposition:
+                extra_headers['Content-Disposition'] = cached.content_disposition
+            return build_file_response(
+                request, cached.path,
+                media_type=cached.content_type or 'application/octet-stream',
+                sha256=cached.sha256,
+                extra_headers=extra_headers,
+            )
+
+    # 4) 代理 Lark 下載（快取停用或非 medias URL 時直接串流）
     lark_client, team = get_lark_client_for_team(team_id, db)
     
     try:
         # 決定下載 URL
         download_url = file_url
         if not download_url and file_token:
-            download_url = f"https://open.larksuite.com/open-apis/drive/v1/medias/{file_token}/download"
+            download_url = LARK_MEDIA_DOWNLOAD_URL.format(file_token=file_token)
         
         if not download_url:
             raise HTTPException(
@@ -672,15 +743,7 @@ async def download_attachment_proxy(
         
         # 設定檔案名稱（處理中文檔名）
         if filename:
-            # 使用 RFC 5987 標準處理非 ASCII 檔案名稱
-            try:
-                # 嘗試 ASCII 編碼
-                filename.encode('ascii')
-                response_headers['Content-Disposition'] = f'attachment; filename="{filename}"'
-            except UnicodeEncodeError:
-                # 包含非 ASCII 字符，使用 RFC 5987 格式
-                encoded_filename = urllib.parse.quote(filename, safe='')
-                response_headers['Content-Disposition'] = f'attachment; filename*=UTF-8\'\'{encoded_filename}'
+            response_headers['Content-Disposition'] = _build_content_disposition(filename)
         elif 'content-disposition' in response.headers:
             response_headers['Content-Disposition'] = response.headers['content-disposition']
         
@@ -720,3 +783,33 @@ async def download_attachment_proxy(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"附件下載代理錯誤: {str(e)}"
         )
+
+
+@router.get("/thumbnails/{relative_path:path}")
+async def get_attachment_thumbnail(
+    request: Request,
+    relative_path: str,
+    size: int = DEFAULT_THUMBNAIL_SIZE,
+):
+    """
+    附件縮圖 API
+
+    回傳本地圖片附件的縮圖（WebP，不支援時為 JPEG）。縮圖通常於上傳時已在背景產生；
+    舊附件則於第一次請求時在 worker pool 產生後快取於附件目錄的 .thumbs/ 之下。
+    """
+    attachments_root = attachment_index_service.get_attachments_root().resolve()
+    rel = urllib.parse.unquote(relative_path).lstrip('/')
+    source = (attachments_root / rel).resolve()
+    # 僅允許服務 attachments_root 之下的檔案，且不可直接請求縮圖目錄本身
+    if attachments_root not in source.parents or THUMB_DIR_NAME in source.parts:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="禁止存取")
+    if not source.is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="附件不存在")
+    if not is_image(source.name):
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="此附件不支援縮圖")
+
+    thumb = await thumbnail_service.get_or_create(source, size)
+    if thumb is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="無法產生縮圖")
+    media_type = 'image/webp' if thumb.suffix == '.webp' else 'image/jpeg'
+    return build_file_response(request, thumb, media_type=media_type)
@@ -18,6 +18,7 @@ from app.auth.dependencies import require_role
 from app.auth.models import UserRole
 from app.database import get_async_session
 from app.models.database_models import Team, User
+from app.utils import fast_json
 
 router = APIRouter(prefix="/audit", tags=["audit"])
 
@@ -77,7 +78,7 @@ async def list_audit_logs(
     response = await audit_service.query_logs(query, current_user)
     team_map = await _fetch_team_names(item.team_id for item in response.items)
 
-    return {
+    content = {
         "items": [
             {
                 "id": item.id,
@@ -100,6 +101,7 @@ async def list_audit_logs(
         "page_size": response.page_size,
         "total_pages": response.total_pages,
     }
+    return fast_json.fast_json_response(content) if fast_json.FAST_JSON_ENABLED else content
 
 
 @router.get("/logs/export")
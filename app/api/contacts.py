@@ -135,21 +135,16 @@ async def get_contact_by_id(
         # 獲取組織同步服務
         sync_service = get_lark_org_sync_service()
         
-        # 搜索特定用戶（使用用戶 ID 作為關鍵字）
-        search_result = sync_service.search_contacts_for_team(team_id, user_id, 1)
-        
-        if search_result.get('success', False) and search_result.get('data', {}).get('suggestions'):
-            user = search_result['data']['suggestions'][0]
-            
-            # 檢查是否確實匹配
-            if user.get('id') == user_id:
-                return {
-                    "success": True,
-                    "data": {
-                        "contact": user
-                    },
-                    "message": "聯絡人資訊獲取成功"
-                }
+        # 以用戶 ID 精確查詢（搜尋索引的 ID 對照表）
+        user = sync_service.get_contact(user_id)
+        if user:
+            return {
+                "success": True,
+                "data": {
+                    "contact": user
+                },
+                "message": "聯絡人資訊獲取成功"
+            }
         
         raise HTTPException(status_code=404, detail="聯絡人不存在")
         
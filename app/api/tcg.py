@@ -25,6 +25,7 @@ class TCGSearchResponse(BaseModel):
     """TCG 搜尋回應模型"""
     results: List[TCGOption]
     total: int
+    total_capped: bool = False  # True 表示 total 僅為下限（搜尋取得足夠結果後即停止比對）
 
 
 @router.get("/search", response_model=TCGSearchResponse)
@@ -33,14 +34,10 @@ async def search_tcg(
     limit: int = Query(20, ge=1, le=100000, description="回傳筆數"),
     offset: int = Query(0, ge=0, description="偏移量")
 ):
-    """搜尋 TCG 單號（從本地 SQLite 查詢，極快速度）"""
+    """搜尋 TCG 單號（記憶體索引，前綴符合者優先）"""
     try:
-        # 直接從本地 SQLite 查詢，速度極快
-        results = tcg_converter.search_tcg_numbers(keyword or "", limit + offset)
-        
-        # 計算總數（搜尋全部結果）
-        total_results = tcg_converter.search_tcg_numbers(keyword or "", 999999)
-        total_count = len(total_results)
+        # 單次搜尋同時取得結果與符合總數
+        results, total_count = tcg_converter.search_tcg_numbers_with_total(keyword or "", limit + offset)
         
         # 應用 offset
         if offset > 0:
@@ -54,7 +51,8 @@ async def search_tcg(
         
         return TCGSearchResponse(
             results=tcg_options,
-            total=total_count
+            total=total_count,
+            total_capped=bool(keyword and keyword.strip()) and total_count > limit + offset
         )
         
     except Exception as e:
@@ -109,8 +107,8 @@ async def get_tcg_status():
     """取得 TCG 資料庫狀態"""
     try:
         # 取得資料庫統計
-        all_tcg = tcg_converter.search_tcg_numbers("", 999999)
-        total_count = len(all_tcg)
+        total_count = tcg_converter.count_records()
+        sample_records = tcg_converter.search_tcg_numbers("", 5)
         
         # 取得調度器狀態
         from app.services.scheduler import task_scheduler
@@ -119,8 +117,10 @@ async def get_tcg_status():
         return {
             "database": {
                 "total_records": total_count,
-                "sample_records": all_tcg[:5] if all_tcg else []
+                "sample_records": sample_records
             },
+            # 最近一次增量同步的變更數與耗時（本行程尚未同步過時為 null）
+            "last_sync": tcg_converter.get_sync_stats(),
             "scheduler": scheduler_status
         }
     except Exception as e:
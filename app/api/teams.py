@@ -8,7 +8,7 @@ from sqlalchemy import select, delete
 from typing import List
 from pydantic import BaseModel
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.auth.dependencies import (
     get_current_user,
     require_admin,
@@ -117,7 +117,7 @@ def team_model_to_db(team: TeamCreate) -> TeamDB:
 
 @router.get("/")
 async def get_teams(
-    db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_read_db), current_user: User = Depends(get_current_user)
 ):
     """取得當前使用者可存取的團隊列表
 
@@ -228,7 +228,7 @@ async def validate_table(
 @router.get("/{team_id}")
 async def get_team(
     team_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user),
 ):
     """根據 ID 取得特定團隊（需要對該團隊的讀取權限）"""
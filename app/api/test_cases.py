@@ -16,6 +16,7 @@ from fastapi import (
     UploadFile,
     File,
     Response,
+    Request,
     Form,
 )
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -38,8 +39,10 @@ from app.models.test_case import (
     TestCaseResponse,
     TestCaseBatchOperation,
     TestCaseBatchResponse,
+    TestCaseChangesResponse,
 )
 from app.models.database_models import (
+    DATA_VERSION_SCOPE_TEST_CASES,
     Team as TeamDB,
     TestCaseLocal as TestCaseLocalDB,
     SyncStatus,
@@ -48,7 +51,10 @@ from app.services.test_case_repo_service import TestCaseRepoService
 from app.services.tcg_converter import tcg_converter
 from app.services.test_case_sync_service import TestCaseSyncService
 from app.services.lark_client import LarkClient
+from app.services import attachment_index_service, data_version_service, test_case_change_service
+from app.services.thumbnail_service import thumbnail_service, thumbnail_url, remove_thumbnails
 from app.config import settings
+from app.utils import fast_json
 from app.audit import audit_service, ActionType, ResourceType, AuditSeverity
 
 router = APIRouter(prefix="/teams/{team_id}/testcases", tags=["test-cases"])
@@ -132,6 +138,7 @@ def build_tcg_items(numbers: List[str]) -> List[dict]:
     seen: set[str] = set()
     table_id = getattr(tcg_converter, "table_id", TCG_TABLE_ID_DEFAULT)
 
+    normalized_numbers: List[str] = []
     for raw in numbers:
         normalized = normalize_tcg_number(raw)
         if not normalized:
@@ -139,13 +146,16 @@ def build_tcg_items(numbers: List[str]) -> List[dict]:
         if normalized in seen:
             continue
         seen.add(normalized)
+        normalized_numbers.append(normalized)
 
-        record_id: Optional[str] = None
-        try:
-            record_id = tcg_converter.get_record_id_by_tcg_number(normalized)
-        except Exception:
-            record_id = None
+    # 一次批量解析（記憶體索引，不查資料庫）
+    try:
+        resolved = tcg_converter.resolve_record_ids(normalized_numbers)
+    except Exception:
+        resolved = {}
 
+    for normalized in normalized_numbers:
+        record_id: Optional[str] = resolved.get(normalized)
         if not record_id:
             record_id = f"tcg_{normalized.replace('-', '')}"
 
@@ -165,6 +175,7 @@ def build_tcg_items(numbers: List[str]) -> List[dict]:
 @router.get("/", response_model=List[TestCaseResponse])
 async def get_test_cases(
     team_id: int,
+    request: Request,
     response: Response,
     db: Session = Depends(get_sync_db),
     current_user: User = Depends(get_current_user),
@@ -188,6 +199,8 @@ async def get_test_cases(
       - X-Total-Count: 總筆數
       - X-Has-Next: 是否尚有下一頁（true/false）
     - 若 with_meta=true，回傳 { items, page: { skip, limit, total, hasNext } }
+    - 回應帶 ETag（團隊資料版本 + 查詢參數）；If-None-Match 命中時回 304
+    - X-Data-Version: 查詢前的團隊資料版本，用戶端作為 /changes 差異同步的起始 watermark
     """
     # 權限檢查
     from app.auth.models import UserRole
@@ -203,6 +216,19 @@ async def get_test_cases(
                 detail="無權限存取此團隊的測試案例",
             )
 
+    # 資料未變動時直接回 304（僅讀取版本號，不執行列表查詢）
+    # 版本號只讀一次，ETag 與 X-Data-Version 必須對應同一個版本
+    version_key = (DATA_VERSION_SCOPE_TEST_CASES, team_id)
+    versions = data_version_service.get_versions(db, [version_key])
+    etag = data_version_service.build_list_etag(request, "tc", versions)
+    not_modified = data_version_service.not_modified_response(request, etag)
+    if not_modified is not None:
+        return not_modified
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = data_version_service.LIST_CACHE_CONTROL
+    # 於查詢前讀取：查詢期間的變更會在下次差異同步重播（upsert 可重複套用）
+    response.headers["X-Data-Version"] = str(versions[version_key])
+
     try:
         service = TestCaseRepoService(db)
         # 先取 total 以便計算 hasNext
@@ -221,7 +247,9 @@ async def get_test_cases(
             has_next = False
         else:
             has_next = total > (skip + limit)
-        items = service.list(
+        # 快速路徑直接組出 JSON 結構，略過 Pydantic 建模與 response_model 驗證
+        list_items = service.list_dicts if fast_json.FAST_JSON_ENABLED else service.list
+        items = list_items(
             team_id=team_id,
             search=search,
             tcg_filter=tcg_filter,
@@ -236,8 +264,9 @@ async def get_test_cases(
         # 設置標頭
         response.headers["X-Total-Count"] = str(total)
         response.headers["X-Has-Next"] = "true" if has_next else "false"
+        content: Any = items
         if with_meta:
-            return {
+            content = {
                 "items": items,
                 "page": {
                     "skip": skip,
@@ -246,7 +275,9 @@ async def get_test_cases(
                     "hasNext": has_next,
                 },
             }
-        return items
+        if fast_json.FAST_JSON_ENABLED:
+            return fast_json.fast_json_response(content, response)
+        return content
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -299,6 +330,40 @@ async def get_test_cases_count(
         )
 
 
+@router.get("/changes", response_model=TestCaseChangesResponse)
+async def get_test_case_changes(
+    team_id: int,
+    db: Session = Depends(get_sync_db),
+    current_user: User = Depends(get_current_user),
+    since: int = Query(0, ge=0, description="上次同步的資料版本（watermark）"),
+    limit: int = Query(test_case_change_service.DEFAULT_CHANGES_LIMIT, ge=1, le=5000, description="最多回傳的變更紀錄數"),
+):
+    """取得 since 之後新增/修改/刪除的測試案例（需要對該團隊的讀取權限）
+    - resync_required=true 時 watermark 已過期（或不合法），用戶端需清除快取並重新載入
+    - has_more=true 時以回傳的 version 作為下一次的 since 繼續取得
+    """
+    from app.auth.models import UserRole
+    from app.auth.permission_service import permission_service
+
+    if current_user.role != UserRole.SUPER_ADMIN:
+        permission_check = await permission_service.check_team_permission(
+            current_user.id, team_id, PermissionType.READ, current_user.role
+        )
+        if not permission_check.has_permission:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="無權限存取此團隊的測試案例",
+            )
+
+    try:
+        return test_case_change_service.get_test_case_changes(db, team_id, since, limit)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"取得測試案例變更失敗: {str(e)}",
+        )
+
+
 @router.get("/diff", response_model=dict)
 async def diff_test_cases(
     team_id: int,
@@ -485,6 +550,7 @@ async def get_test_case(
                             "type": mime,
                             "url": url,
                             "tmp_url": url,
+                            "thumbnail_url": thumbnail_url(rel, name, mime),
                         }
                     )
             except Exception:
@@ -642,6 +708,8 @@ async def create_test_case(
                         continue
                     dest = final_dir / p.name
                     move(str(p), str(dest))
+                    attachment_index_service.move_entry(db, root_dir, p, dest)
+                    thumbnail_service.schedule(dest)
                     metas.append(
                         {
                             "name": p.name,
@@ -847,8 +915,9 @@ async def update_test_case(
                         try:
                             from app.services.tcg_converter import tcg_converter
 
+                            resolved = tcg_converter.resolve_record_ids(nums)
                             for n in nums:
-                                rid = tcg_converter.get_record_id_by_tcg_number(n)
+                                rid = resolved.get(n)
                                 if rid:
                                     pairs.append((rid, n))
                                 else:
@@ -949,6 +1018,8 @@ async def update_test_case(
                         continue
                     dest = final_dir / p.name
                     move(str(p), str(dest))
+                    attachment_index_service.move_entry(db, root_dir, p, dest)
+                    thumbnail_service.schedule(dest)
                     existing.append(
                         {
                             "name": p.name,
@@ -1090,6 +1161,7 @@ async def upload_test_case_attachments_staging(
         content = await f.read()
         with open(path, "wb") as out:
             out.write(content)
+        attachment_index_service.index_content(db, root_dir, path, content, f.content_type)
         uploaded.append(
             {
                 "name": orig,
@@ -1101,6 +1173,7 @@ async def upload_test_case_attachments_staging(
                 "uploaded_at": datetime.utcnow().isoformat(),
             }
         )
+    db.commit()
 
     return {
         "success": True,
@@ -1248,6 +1321,8 @@ async def upload_test_case_attachments_by_id(
         content = await f.read()
         with open(stored_path, "wb") as out:
             out.write(content)
+        attachment_index_service.index_content(db, root_dir, stored_path, content, f.content_type)
+        thumbnail_service.schedule(stored_path, orig_name, f.content_type)
         meta = {
             "name": orig_name,
             "stored_name": stored_name,
@@ -1462,6 +1537,8 @@ async def _delete_attachment_common(
             p = Path(disk_path)
             if root_dir in p.parents and p.exists():
                 p.unlink()
+                remove_thumbnails(p)
+            attachment_index_service.remove_path(db, root_dir, p)
     except Exception:
         pass
 
@@ -1546,6 +1623,8 @@ async def upload_test_case_attachments(
         content = await f.read()
         with open(stored_path, "wb") as out:
             out.write(content)
+        attachment_index_service.index_content(db, root_dir, stored_path, content, f.content_type)
+        thumbnail_service.schedule(stored_path, orig_name, f.content_type)
         meta = {
             "name": orig_name,
             "stored_name": stored_name,
@@ -1663,6 +1742,7 @@ async def delete_test_case(
                 import shutil
 
                 shutil.rmtree(base_dir, ignore_errors=True)
+            attachment_index_service.remove_prefix(db, root_dir, base_dir)
         except Exception:
             pass
 
@@ -1735,6 +1815,7 @@ async def get_test_case_by_number(
                         "type": mime,
                         "url": url,
                         "tmp_url": url,
+                        "thumbnail_url": thumbnail_url(rel, name, mime),
                     }
                 )
         except Exception:
@@ -2107,22 +2188,15 @@ async def batch_operation_test_cases(
                 nonlocal tcg_value, tcg_ids
                 # 若直接提供 record_ids，嘗試回填單號；若不可得，單號留空
                 if tcg_ids and isinstance(tcg_ids, list):
-                    for x in tcg_ids:
-                        rid = str(x).strip()
-                        if not rid:
-                            continue
-                        tcg_no = ""
-                        try:
-                            from app.services.tcg_converter import tcg_converter
+                    rids = [str(x).strip() for x in tcg_ids if str(x).strip()]
+                    try:
+                        from app.services.tcg_converter import tcg_converter
 
-                            # 若有反向查詢方法可嘗試（不存在則忽略）
-                            if hasattr(tcg_converter, "get_tcg_number_by_record_id"):
-                                tcg_no = (
-                                    tcg_converter.get_tcg_number_by_record_id(rid) or ""
-                                )
-                        except Exception:
-                            pass
-                        pairs.append((rid, tcg_no))
+                        numbers_by_rid = tcg_converter.resolve_tcg_numbers(rids)
+                    except Exception:
+                        numbers_by_rid = {}
+                    for rid in rids:
+                        pairs.append((rid, numbers_by_rid.get(rid, "")))
                     return pairs
                 # 解析 tcg_value 中的單號
                 nums: list[str] = []
@@ -2144,8 +2218,9 @@ async def batch_operation_test_cases(
                 try:
                     from app.services.tcg_converter import tcg_converter
 
+                    resolved = tcg_converter.resolve_record_ids(nums)
                     for n in nums:
-                        rid = tcg_converter.get_record_id_by_tcg_number(n)
+                        rid = resolved.get(n)
                         if rid:
                             pairs.append((rid, n))
                         else:
@@ -27,6 +27,7 @@ from app.models.database_models import (
 from app.models.lark_types import TestResultStatus
 from app.models.test_run_config import TestRunStatus
 from app.services.lark_notify_service import get_lark_notify_service
+from app.services import run_counter_service
 from datetime import datetime
 from pydantic import BaseModel, Field
 
@@ -197,6 +198,9 @@ def convert_db_to_model(config_db: TestRunConfigDB) -> TestRunConfig:
         executed_cases=config_db.executed_cases,
         passed_cases=config_db.passed_cases,
         failed_cases=config_db.failed_cases,
+        retest_cases=config_db.retest_cases or 0,
+        not_available_cases=config_db.not_available_cases or 0,
+        unique_bug_tickets=config_db.unique_bug_tickets or 0,
         created_at=config_db.created_at,
         updated_at=config_db.updated_at,
         last_sync_at=config_db.last_sync_at
@@ -277,6 +281,11 @@ async def get_test_run_configs(
             pass_rate=config.get_pass_rate(),
             total_test_cases=config.total_test_cases,
             executed_cases=config.executed_cases,
+            passed_cases=config.passed_cases,
+            failed_cases=config.failed_cases,
+            retest_cases=config.retest_cases,
+            not_available_cases=config.not_available_cases,
+            unique_bug_tickets=config.unique_bug_tickets,
             start_date=config.start_date,
             end_date=config.end_date,
             created_at=config.created_at
@@ -488,7 +497,7 @@ async def sync_test_run_config(
     config_id: int,
     db: Session = Depends(get_sync_db)
 ):
-    """重構後：從本地 TestRunItem 統計並回寫到 TestRunConfig。"""
+    """檢查並修復配置統計（計數由 trigger 增量維護，此處僅於不一致時以實際項目重算）"""
     verify_team_exists(team_id, db)
     config_db = db.query(TestRunConfigDB).filter(
         TestRunConfigDB.id == config_id,
@@ -497,28 +506,28 @@ async def sync_test_run_config(
     if not config_db:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"找不到測試執行配置 ID {config_id}")
 
-    # 以本地 items 統計
-    items_q = db.query(TestRunItemDB).filter(TestRunItemDB.config_id == config_id)
-    total_cases = items_q.count()
-    executed_cases = items_q.filter(TestRunItemDB.test_result.isnot(None)).count()
-    passed_cases = items_q.filter(TestRunItemDB.test_result == 'Passed').count()
-    failed_cases = items_q.filter(TestRunItemDB.test_result == 'Failed').count()
-
-    config_db.total_test_cases = total_cases
-    config_db.executed_cases = executed_cases
-    config_db.passed_cases = passed_cases
-    config_db.failed_cases = failed_cases
+    result = run_counter_service.verify_counters(db, config_id=config_id, repair=True)
+    if result["mismatches"]:
+        logger.warning("Test Run %s 統計與項目不一致，已重算: %s", config_id, result["mismatches"][0]["fields"])
     config_db.last_sync_at = datetime.utcnow()
     db.commit()
+    db.refresh(config_db)
 
+    total_cases = config_db.total_test_cases or 0
+    executed_cases = config_db.executed_cases or 0
+    passed_cases = config_db.passed_cases or 0
     return {
         "success": True,
         "message": "同步完成（本地資料）",
+        "repaired": bool(result["mismatches"]),
         "statistics": {
             "total_test_cases": total_cases,
             "executed_cases": executed_cases,
             "passed_cases": passed_cases,
-            "failed_cases": failed_cases,
+            "failed_cases": config_db.failed_cases or 0,
+            "retest_cases": config_db.retest_cases,
+            "not_available_cases": config_db.not_available_cases,
+            "unique_bug_tickets": config_db.unique_bug_tickets,
             "execution_rate": (executed_cases / total_cases * 100) if total_cases > 0 else 0,
             "pass_rate": (passed_cases / executed_cases * 100) if executed_cases > 0 else 0
         }
@@ -666,10 +675,6 @@ async def restart_test_run(
         status=TestRunStatus.ACTIVE,
         start_date=datetime.utcnow(),
         end_date=None,
-        total_test_cases=0,
-        executed_cases=0,
-        passed_cases=0,
-        failed_cases=0,
         last_sync_at=None,
     )
     db.add(new_config)
@@ -707,11 +712,7 @@ async def restart_test_run(
         db.add(new_item)
         created += 1
 
-    # 更新新配置的統計
-    new_config.total_test_cases = created
-    new_config.executed_cases = 0
-    new_config.passed_cases = 0
-    new_config.failed_cases = 0
+    # 統計由 trigger 隨項目新增累計
     new_config.last_sync_at = now
 
     db.commit()
@@ -819,6 +820,11 @@ async def search_configs_by_tp_tickets(
                 pass_rate=config.get_pass_rate(),
                 total_test_cases=config.total_test_cases,
                 executed_cases=config.executed_cases,
+                passed_cases=config.passed_cases,
+                failed_cases=config.failed_cases,
+                retest_cases=config.retest_cases,
+                not_available_cases=config.not_available_cases,
+                unique_bug_tickets=config.unique_bug_tickets,
                 start_date=config.start_date,
                 end_date=config.end_date,
                 created_at=config.created_at
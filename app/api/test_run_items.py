@@ -5,7 +5,8 @@ Local CRUD for test run items stored in SQLite, detached from Lark.
 Items are created by selecting Test Cases and copying necessary fields.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session, aliased, contains_eager, joinedload
 from sqlalchemy import and_, or_
 from typing import List, Optional, Any, Dict
@@ -26,11 +27,19 @@ from app.models.database_models import (
     TestCaseLocal as TestCaseLocalDB,
 )
 from app.models.lark_types import Priority, TestResultStatus
+from app.services import attachment_index_service, data_version_service, run_counter_service
+from app.services.thumbnail_service import thumbnail_service, thumbnail_url, remove_thumbnails
+from app.services.write_queue import get_write_queue
+from app.services.live_events import get_event_broker, run_channel
+from app.utils import fast_json
 from pydantic import BaseModel, Field
 
 
 router = APIRouter(prefix="/teams/{team_id}/test-run-configs/{config_id}/items", tags=["test-run-items"])
 
+# SSE 連線無事件時的心跳間隔（秒），避免代理伺服器因閒置而斷線
+SSE_HEARTBEAT_SECONDS = 15.0
+
 @router.post("/{item_id}/upload-results")
 async def upload_test_run_results(
     team_id: int,
@@ -101,6 +110,8 @@ async def upload_test_run_results(
             content = await f.read()
             with open(stored_path, "wb") as out:
                 out.write(content)
+            attachment_index_service.index_content(db, base_dir, stored_path, content, f.content_type)
+            thumbnail_service.schedule(stored_path, orig_name, f.content_type)
 
             item_meta = {
                 "name": orig_name,
@@ -312,13 +323,15 @@ def _parse_execution_results(text: Optional[str]) -> List[Dict[str, Any]]:
             name = entry.get('name') or entry.get('stored_name') or 'file'
             rel = entry.get('relative_path') or ''
             stored = entry.get('stored_name') or name
+            content_type = entry.get('type') or 'application/octet-stream'
             results.append({
                 "file_token": stored,
                 "name": name,
                 "size": int(entry.get('size') or 0),
                 "url": f"{base_url}/{rel}" if rel else None,
+                "thumbnail_url": thumbnail_url(rel, name, content_type),
                 "uploaded_at": entry.get('uploaded_at'),
-                "content_type": entry.get('type') or 'application/octet-stream',
+                "content_type": content_type,
             })
         return results
     except Exception:
@@ -398,6 +411,59 @@ def _db_to_response(item: TestRunItemDB, case: Optional[TestCaseLocalDB] = None)
     )
 
 
+def _list_item_columns(case_alias) -> tuple:
+    return (
+        TestRunItemDB.id,
+        TestRunItemDB.team_id,
+        TestRunItemDB.config_id,
+        TestRunItemDB.test_case_number,
+        case_alias.title,
+        case_alias.priority,
+        case_alias.precondition,
+        case_alias.steps,
+        case_alias.expected_result,
+        TestRunItemDB.assignee_id,
+        TestRunItemDB.assignee_name,
+        TestRunItemDB.assignee_en_name,
+        TestRunItemDB.assignee_email,
+        TestRunItemDB.test_result,
+        TestRunItemDB.executed_at,
+        TestRunItemDB.execution_duration,
+        TestRunItemDB.attachments_json,
+        TestRunItemDB.execution_results_json,
+        TestRunItemDB.created_at,
+        TestRunItemDB.updated_at,
+    )
+
+
+def _row_to_item_dict(row) -> Dict[str, Any]:
+    """_list_item_columns 資料列 → 與 _db_to_response 相同的 JSON 結構（欄位順序與模型一致）"""
+    exec_results = _parse_execution_results(row.execution_results_json)
+    return {
+        "id": row.id,
+        "team_id": row.team_id,
+        "config_id": row.config_id,
+        "test_case_number": row.test_case_number,
+        "title": row.title,
+        "priority": row.priority.value if hasattr(row.priority, 'value') else row.priority,
+        "precondition": row.precondition,
+        "steps": row.steps,
+        "expected_result": row.expected_result,
+        "assignee_id": row.assignee_id,
+        "assignee_name": row.assignee_name,
+        "assignee_en_name": row.assignee_en_name,
+        "assignee_email": row.assignee_email,
+        "test_result": row.test_result.value if hasattr(row.test_result, 'value') else row.test_result,
+        "executed_at": row.executed_at,
+        "execution_duration": row.execution_duration,
+        "attachment_count": _len_json_list(row.attachments_json),
+        "execution_result_count": len(exec_results),
+        "execution_results": exec_results,
+        "created_at": row.created_at,
+        "updated_at": row.updated_at,
+    }
+
+
 def _add_result_history(db: Session, item: TestRunItemDB,
                         prev_result, prev_executed_at,
                         new_result, new_executed_at,
@@ -425,10 +491,68 @@ def _add_result_history(db: Session, item: TestRunItemDB,
     db.add(rec)
 
 
+def _bug_ticket_numbers(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    try:
+        tickets = json.loads(text)
+    except Exception:
+        return []
+    if not isinstance(tickets, list):
+        return []
+    return [t['ticket_number'].upper() for t in tickets if isinstance(t, dict) and 'ticket_number' in t]
+
+
+def _item_event(item: TestRunItemDB) -> Dict[str, Any]:
+    """即時推送用的項目欄位（結果、執行者、Bug tickets）"""
+    return {
+        "id": item.id,
+        "test_case_number": item.test_case_number,
+        "test_result": item.test_result.value if hasattr(item.test_result, 'value') else item.test_result,
+        "executed_at": item.executed_at.isoformat() if item.executed_at else None,
+        "execution_duration": item.execution_duration,
+        "assignee_id": item.assignee_id,
+        "assignee_name": item.assignee_name,
+        "assignee_en_name": item.assignee_en_name,
+        "assignee_email": item.assignee_email,
+        "bug_tickets": _bug_ticket_numbers(item.bug_tickets_json),
+        "updated_at": item.updated_at.isoformat() if item.updated_at else None,
+    }
+
+
+def _statistics_snapshot(bind, team_id: int, config_id: int) -> Dict[str, Any]:
+    with Session(bind=bind) as db:
+        return _compute_item_statistics(db, team_id, config_id)
+
+
+async def _publish_run_events(db: Session, team_id: int, config_id: int,
+                              items: Optional[List[Dict[str, Any]]] = None,
+                              deleted_ids: Optional[List[int]] = None,
+                              reload: bool = False) -> None:
+    """commit 後推送項目變更與統計（統計合併計算）給 SSE 訂閱者；推送失敗不影響請求"""
+    try:
+        broker = get_event_broker()
+        channel = run_channel(config_id)
+        if not broker.has_subscribers(channel):
+            return
+        if items:
+            await broker.publish(channel, "items", {"items": items})
+        if deleted_ids:
+            await broker.publish(channel, "items_deleted", {"ids": deleted_ids})
+        if reload:
+            await broker.publish(channel, "items_reload", {})
+        bind = db.get_bind()
+        broker.publish_coalesced(channel, "statistics", lambda: _statistics_snapshot(bind, team_id, config_id))
+    except Exception as e:
+        logger.warning(f"推送測試執行 {config_id} 即時事件失敗: {e}")
+
+
 @router.get("/", response_model=List[TestRunItemResponse])
 async def list_items(
     team_id: int,
     config_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_sync_db),
     # Filters
     search: Optional[str] = Query(None, description="標題/編號模糊搜尋"),
@@ -442,6 +566,14 @@ async def list_items(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=10000),
 ):
+    # 資料未變動時直接回 304（僅讀取版本號，不執行列表查詢）
+    etag = data_version_service.items_etag(db, request, team_id, config_id)
+    not_modified = data_version_service.not_modified_response(request, etag)
+    if not_modified is not None:
+        return not_modified
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = data_version_service.LIST_CACHE_CONTROL
+
     _verify_team_and_config(team_id, config_id, db)
 
     Tc = aliased(TestCaseLocalDB)
@@ -454,7 +586,7 @@ async def list_items(
     ).filter(
         TestRunItemDB.team_id == team_id,
         TestRunItemDB.config_id == config_id,
-    ).options(contains_eager(TestRunItemDB.test_case, alias=Tc))
+    )
 
     if search:
         s = f"%{search}%"
@@ -489,7 +621,13 @@ async def list_items(
     else:
         q = q.order_by(sort_col.desc())
 
-    items = q.offset(skip).limit(limit).all()
+    q = q.offset(skip).limit(limit)
+    if fast_json.FAST_JSON_ENABLED:
+        # 快速路徑：只取列表欄位，直接組出 TestRunItemResponse 的 JSON 結構
+        rows = q.with_entities(*_list_item_columns(Tc)).all()
+        return fast_json.fast_json_response([_row_to_item_dict(r) for r in rows], response)
+
+    items = q.options(contains_eager(TestRunItemDB.test_case, alias=Tc)).all()
     return [_db_to_response(i, getattr(i, 'test_case', None)) for i in items]
 
 
@@ -502,11 +640,28 @@ async def batch_create_items(
 ):
     _verify_team_and_config(team_id, config_id, db)
 
+    # 經由寫入佇列提交（大批次單獨成一個交易，不與結果更新合併）
+    created, skipped, errors = await get_write_queue().run(
+        lambda session: _apply_batch_create(session, team_id, config_id, payload.items), group=False
+    )
+    if created:
+        await _publish_run_events(db, team_id, config_id, reload=True)
+
+    return BatchCreateResponse(
+        success=len(errors) == 0,
+        created_count=created,
+        skipped_duplicates=skipped,
+        errors=errors,
+    )
+
+
+def _apply_batch_create(db: Session, team_id: int, config_id: int, items: List[Any]):
+    """建立 Test Run 項目（於寫入佇列的 Session 內執行，不自行 commit）；回傳 (建立數, 略過數, 錯誤訊息)"""
     created = 0
     skipped = 0
     errors: List[str] = []
 
-    for idx, item in enumerate(payload.items):
+    for idx, item in enumerate(items):
         try:
             # Handle duplicates via unique constraint (config_id, test_case_number)
             existing = db.query(TestRunItemDB).filter(
@@ -550,15 +705,7 @@ async def batch_create_items(
         except Exception as e:
             errors.append(f"index {idx}: {e}")
             continue
-
-    db.commit()
-
-    return BatchCreateResponse(
-        success=len(errors) == 0,
-        created_count=created,
-        skipped_duplicates=skipped,
-        errors=errors,
-    )
+    return created, skipped, errors
 
 
 @router.put("/{item_id}", response_model=TestRunItemResponse)
@@ -570,18 +717,34 @@ async def update_item(
     db: Session = Depends(get_sync_db)
 ):
     _verify_team_and_config(team_id, config_id, db)
+    data = payload.model_dump(exclude_unset=True)
+    # 移除快照類欄位（僅保留兼容性輸入）
+    for legacy_field in ['title', 'priority', 'precondition', 'steps', 'expected_result']:
+        data.pop(legacy_field, None)
+
+    def apply(session: Session):
+        response = _apply_item_update(session, team_id, config_id, item_id, data)
+        return response, (_item_event(session.get(TestRunItemDB, item_id)) if response is not None else None)
+
+    # 經由寫入佇列提交，與其他結果更新合併 commit
+    response, event = await get_write_queue().run(apply)
+    if response is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="找不到項目")
+    await _publish_run_events(db, team_id, config_id, items=[event])
+    return response
+
+
+def _apply_item_update(db: Session, team_id: int, config_id: int, item_id: int,
+                       data: Dict[str, Any]) -> Optional[TestRunItemResponse]:
+    """更新單一項目並記錄歷程（於寫入佇列的 Session 內執行，不自行 commit）；項目不存在時回傳 None"""
     item = db.query(TestRunItemDB).filter(
         TestRunItemDB.id == item_id,
         TestRunItemDB.team_id == team_id,
         TestRunItemDB.config_id == config_id,
     ).first()
     if not item:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="找不到項目")
+        return None
 
-    data = payload.model_dump(exclude_unset=True)
-    # 移除快照類欄位（僅保留兼容性輸入）
-    for legacy_field in ['title', 'priority', 'precondition', 'steps', 'expected_result']:
-        data.pop(legacy_field, None)
     prev_result = item.test_result
     prev_executed_at = item.executed_at
     # Simple field updates
@@ -642,8 +805,7 @@ async def update_item(
     )
 
     item.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(item)
+    db.flush()
     return _db_to_response(item, item.test_case)
 
 
@@ -676,20 +838,29 @@ async def delete_item(
         if cleaned_files_count > 0:
             logger.info(f"Test Run Item {item_id} 已清理 {cleaned_files_count} 個測試結果檔案")
         
-        # 2. 保險刪除對應歷程（避免 DB 未啟用 FK 級聯時殘留）
-        db.query(ResultHistoryDB).filter(
-            ResultHistoryDB.team_id == team_id,
-            ResultHistoryDB.config_id == config_id,
-            ResultHistoryDB.item_id == item_id,
-        ).delete(synchronize_session=False)
-        
-        # 3. 刪除 Test Run Item
-        db.delete(item)
-        db.commit()
+        # 2. 經由寫入佇列刪除歷程與項目
+        await get_write_queue().run(lambda session: _apply_item_delete(session, team_id, config_id, item_id))
         
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    await _publish_run_events(db, team_id, config_id, deleted_ids=[item_id])
+
+
+def _apply_item_delete(db: Session, team_id: int, config_id: int, item_id: int) -> None:
+    """刪除項目與其結果歷程（於寫入佇列的 Session 內執行，不自行 commit）"""
+    # 保險刪除對應歷程（避免 DB 未啟用 FK 級聯時殘留）
+    db.query(ResultHistoryDB).filter(
+        ResultHistoryDB.team_id == team_id,
+        ResultHistoryDB.config_id == config_id,
+        ResultHistoryDB.item_id == item_id,
+    ).delete(synchronize_session=False)
+    item = db.query(TestRunItemDB).filter(
+        TestRunItemDB.id == item_id,
+        TestRunItemDB.team_id == team_id,
+        TestRunItemDB.config_id == config_id,
+    ).first()
+    if item:
+        db.delete(item)
 
 
 @router.post("/batch-update-results", response_model=Dict[str, Any])
@@ -700,10 +871,35 @@ async def batch_update_results(
     db: Session = Depends(get_sync_db)
 ):
     _verify_team_and_config(team_id, config_id, db)
+    source = payload.change_source or 'batch'
+    def apply(session: Session):
+        touched: List[TestRunItemDB] = []
+        success, errors = _apply_result_updates(session, team_id, config_id, payload.updates, source, touched)
+        return success, errors, [_item_event(item) for item in touched]
+
+    # 經由寫入佇列提交：並發的結果更新與歷程寫入合併為一次 commit
+    success, errors, events = await get_write_queue().run(apply)
+    if events:
+        await _publish_run_events(db, team_id, config_id, items=events)
+    return {
+        "success": len(errors) == 0,
+        "processed_count": len(payload.updates),
+        "success_count": success,
+        "error_count": len(errors),
+        "error_messages": errors,
+    }
+
+
+def _apply_result_updates(db: Session, team_id: int, config_id: int,
+                          updates: List[Dict[str, Any]], source: str,
+                          touched: Optional[List[TestRunItemDB]] = None):
+    """套用批次結果更新並記錄歷程（於寫入佇列的 Session 內執行，不自行 commit）；回傳 (成功數, 錯誤訊息)
+
+    touched 不為 None 時收集成功更新的項目（供即時推送）
+    """
     success = 0
     errors: List[str] = []
-    source = payload.change_source or 'batch'
-    for upd in payload.updates:
+    for upd in updates:
         try:
             item_id = upd.get('id')
             # 檢查是否至少有一個要更新的欄位
@@ -771,17 +967,12 @@ async def batch_update_results(
 
             item.updated_at = datetime.utcnow()
             success += 1
+            if touched is not None:
+                touched.append(item)
         except Exception as e:
             errors.append(f"項目 {upd.get('id')} 更新失敗: {str(e)}")
             continue
-    db.commit()
-    return {
-        "success": len(errors) == 0,
-        "processed_count": len(payload.updates),
-        "success_count": success,
-        "error_count": len(errors),
-        "error_messages": errors,
-    }
+    return success, errors
 
 
 @router.get("/{item_id}/result-history", response_model=List[ResultHistoryItem])
@@ -832,41 +1023,75 @@ async def get_items_statistics(
     db: Session = Depends(get_sync_db)
 ):
     _verify_team_and_config(team_id, config_id, db)
-    q = db.query(TestRunItemDB).filter(
-        TestRunItemDB.team_id == team_id,
-        TestRunItemDB.config_id == config_id,
-    )
-    total = q.count()
-    executed = q.filter(TestRunItemDB.test_result.isnot(None)).count()
-    passed = q.filter(TestRunItemDB.test_result == TestResultStatus.PASSED).count()
-    failed = q.filter(TestRunItemDB.test_result == TestResultStatus.FAILED).count()
-    retest = q.filter(TestRunItemDB.test_result == TestResultStatus.RETEST).count()
-    na = q.filter(TestRunItemDB.test_result == TestResultStatus.NOT_AVAILABLE).count()
+    return _compute_item_statistics(db, team_id, config_id)
+
+
+@router.get("/events")
+async def stream_item_events(
+    team_id: int,
+    config_id: int,
+    request: Request,
+    db: Session = Depends(get_sync_db)
+):
+    """即時事件串流（Server-Sent Events）
+
+    連線後先送出目前的 statistics，之後推送：
+    - items：結果、執行者、Bug tickets 變更（部分欄位，依 id 合併）
+    - items_deleted / items_reload：項目刪除 / 新增（需重新載入列表）
+    - statistics：變更後的彙總統計（短時間內多次變更只送一次）
+    - resync：連線消費過慢而漏掉事件，需重新載入後重新連線
+    """
+    _verify_team_and_config(team_id, config_id, db)
+    subscription = await get_event_broker().subscribe(run_channel(config_id))
+    initial = _compute_item_statistics(db, team_id, config_id)
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            yield _sse_message("statistics", initial)
+            while not await request.is_disconnected():
+                message = await subscription.get(timeout=SSE_HEARTBEAT_SECONDS)
+                if subscription.overflowed:
+                    yield _sse_message("resync", {})
+                    break
+                if message is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield _sse_message(message["event"], message["data"])
+        finally:
+            subscription.close()
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+
+def _sse_message(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def _compute_item_statistics(db: Session, team_id: int, config_id: int) -> Dict[str, Any]:
+    """讀取配置上由 trigger 增量維護的計數（單筆主鍵查詢，不掃描項目）"""
+    fields = run_counter_service.COUNTER_FIELDS
+    # 只取欄位（不經 identity map），同一 session 先前載入的配置物件不會回傳過期計數
+    row = db.query(*(getattr(TestRunConfigDB, field) for field in fields)).filter(
+        TestRunConfigDB.id == config_id,
+        TestRunConfigDB.team_id == team_id,
+    ).first()
+    counts = {field: ((row[i] if row else 0) or 0) for i, field in enumerate(fields)}
+    total = counts["total_test_cases"]
+    executed = counts["executed_cases"]
+    passed = counts["passed_cases"]
+    failed = counts["failed_cases"]
+    retest = counts["retest_cases"]
+    na = counts["not_available_cases"]
+    bug_tickets_count = counts["unique_bug_tickets"]
 
     execution_rate = (executed / total * 100) if total > 0 else 0.0
     pass_rate = (passed / executed * 100) if executed > 0 else 0.0
     total_pass_rate = (passed / total * 100) if total > 0 else 0.0
 
-    # 計算 Bug Tickets 統計
-    bug_tickets_count = 0
-    unique_bug_tickets = set()
-    
-    # 查詢所有有 bug_tickets_json 的項目
-    items_with_bugs = q.filter(TestRunItemDB.bug_tickets_json.isnot(None)).all()
-    
-    for item in items_with_bugs:
-        if item.bug_tickets_json:
-            try:
-                tickets_data = json.loads(item.bug_tickets_json)
-                if isinstance(tickets_data, list):
-                    for ticket in tickets_data:
-                        if isinstance(ticket, dict) and 'ticket_number' in ticket:
-                            unique_bug_tickets.add(ticket['ticket_number'].upper())
-            except Exception:
-                pass  # 忽略解析錯誤的項目
-    
-    bug_tickets_count = len(unique_bug_tickets)
-
     return {
         "total_runs": total,
         "executed_runs": executed,
@@ -1057,6 +1282,7 @@ async def add_bug_ticket(
     item.updated_at = datetime.utcnow()
     db.commit()
     db.refresh(item)
+    await _publish_run_events(db, team_id, config_id, items=[_item_event(item)])
     
     return BugTicketResponse(
         ticket_number=new_ticket['ticket_number'],
@@ -1109,6 +1335,7 @@ async def delete_bug_ticket(
     item.bug_tickets_json = json.dumps(existing_tickets, ensure_ascii=False) if existing_tickets else None
     item.updated_at = datetime.utcnow()
     db.commit()
+    await _publish_run_events(db, team_id, config_id, items=[_item_event(item)])
 
 
 # -------------------- Test Results Management --------------------
@@ -1166,6 +1393,7 @@ async def get_test_run_results(
                 "name": name,
                 "size": size,
                 "url": f"{base_url}/{rel}" if rel else None,
+                "thumbnail_url": thumbnail_url(rel, name, content_type),
                 "uploaded_at": f.get('uploaded_at'),
                 "content_type": content_type,
             })
@@ -1277,6 +1505,8 @@ async def delete_test_result_file(
             # 只允許刪除附件根目錄下的檔案
             if (base_dir in p.parents or base_dir == p.parent) and p.exists():
                 p.unlink()
+                remove_thumbnails(p)
+            attachment_index_service.remove_path(db, base_dir, p)
     except Exception:
         pass
 
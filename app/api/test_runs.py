@@ -9,6 +9,7 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+import asyncio
 import io
 import logging
 
@@ -957,9 +958,17 @@ async def batch_update_test_results(
 
 @router.post("/{config_id}/generate-html")
 async def generate_html_report(
-    team_id: int, config_id: int, request: Request, db: Session = Depends(get_sync_db)
+    team_id: int,
+    config_id: int,
+    request: Request,
+    wait: bool = Query(False, description="等待背景生成完成後才回應"),
+    db: Session = Depends(get_sync_db),
 ):
-    """生成 Test Run HTML 報告（靜態檔），並回傳可存取的連結"""
+    """生成 Test Run HTML 報告（靜態檔），並回傳可存取的連結
+
+    報告以資料版本（項目數與最後更新時間）為鍵：資料未變動時直接回傳既有報告（status=ready），
+    否則排入背景 worker 重新生成（status=generating），可透過 GET /{config_id}/report 查詢進度。
+    """
     try:
         # 驗證團隊和配置存在（不需要 Lark API 驗證）
         team = db.query(TeamDB).filter(TeamDB.id == team_id).first()
@@ -979,11 +988,16 @@ async def generate_html_report(
                 detail=f"找不到測試執行配置 ID {config_id}",
             )
 
-        # 生成 HTML
-        from ..services.html_report_service import HTMLReportService
+        # 資料版本未變動則直接回傳既有報告；否則交由背景 worker 重新生成
+        from ..services.html_report_service import html_report_worker
 
-        service = HTMLReportService(db_session=db)
-        result = service.generate_test_run_report(team_id=team_id, config_id=config_id)
+        result = html_report_worker.request(team_id=team_id, config_id=config_id, db=db)
+        if wait and result["status"] == "generating":
+            future = html_report_worker.get_future(team_id, config_id)
+            if future is not None:
+                await asyncio.wrap_future(future)
+                result["status"] = "ready"
+                result["generated_at"] = future.result().get("generated_at")
 
         # 將相對路徑轉為完整網址
         base = str(request.base_url).rstrip("/")
@@ -992,6 +1006,8 @@ async def generate_html_report(
             "success": True,
             "report_id": result["report_id"],
             "report_url": absolute_url,
+            "status": result["status"],
+            "data_version": result["data_version"],
             "overwritten": result.get("overwritten", True),
             "generated_at": result.get("generated_at"),
         }
@@ -1009,7 +1025,7 @@ async def generate_html_report(
 async def get_html_report_status(
     team_id: int, config_id: int, request: Request, db: Session = Depends(get_sync_db)
 ):
-    """查詢 HTML 報告是否已存在，存在則回傳完整連結"""
+    """查詢 HTML 報告是否已存在、是否為最新資料版本，以及背景生成狀態"""
     # 驗證團隊與配置存在
     team = db.query(TeamDB).filter(TeamDB.id == team_id).first()
     if not team:
@@ -1027,15 +1043,114 @@ async def get_html_report_status(
             detail=f"找不到測試執行配置 ID {config_id}",
         )
 
-    # 檢查檔案存在
-    from pathlib import Path
+    # 檢查報告檔案與背景生成狀態
+    from ..services.html_report_service import html_report_worker
+
+    result = html_report_worker.get_status(team_id=team_id, config_id=config_id, db=db)
+    base = str(request.base_url).rstrip("/")
+    result["report_url"] = f"{base}{result['report_url']}"
+    return result
+
 
-    report_path = (
-        Path.cwd() / "generated_report" / f"team-{team_id}-config-{config_id}.html"
+def _verify_team_config(team_id: int, config_id: int, db: Session) -> TestRunConfigDB:
+    team = db.query(TeamDB).filter(TeamDB.id == team_id).first()
+    if not team:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"找不到團隊 ID {team_id}"
+        )
+    config = (
+        db.query(TestRunConfigDB)
+        .filter(TestRunConfigDB.id == config_id, TestRunConfigDB.team_id == team_id)
+        .first()
     )
-    if report_path.exists():
-        base = str(request.base_url).rstrip("/")
-        url = f"{base}/reports/team-{team_id}-config-{config_id}.html"
-        return {"exists": True, "report_url": url}
-    else:
-        return {"exists": False}
+    if not config:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"找不到測試執行配置 ID {config_id}",
+        )
+    return config
+
+
+def _pdf_job_response(team_id: int, config_id: int, job: Dict[str, Any]) -> Dict[str, Any]:
+    prefix = f"/api/teams/{team_id}/test-runs/{config_id}/pdf-jobs/{job['job_id']}"
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "full_results": job.get("full_results", False),
+        "error": job.get("error"),
+        "size": job.get("size"),
+        "render_seconds": job.get("render_seconds"),
+        "status_url": prefix,
+        "download_url": f"{prefix}/download" if job["status"] == "done" else None,
+    }
+
+
+def _pdf_file_response(job: Dict[str, Any], config_id: int):
+    from fastapi.responses import FileResponse
+
+    if job["status"] == "failed":
+        raise HTTPException(
+            status_code=job.get("error_status_code") or status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"PDF 報告生成失敗: {job.get('error')}",
+        )
+    if job["status"] != "done":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="PDF 報告尚在生成中")
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    return FileResponse(
+        job["path"],
+        media_type="application/pdf",
+        filename=f"test-run-report-{config_id}-{timestamp}.pdf",
+    )
+
+
+@router.post("/{config_id}/pdf-jobs")
+async def create_pdf_report_job(
+    team_id: int,
+    config_id: int,
+    full: bool = Query(False, description="輸出全部測試項目（預設僅前 50 筆）"),
+    db: Session = Depends(get_sync_db),
+):
+    """提交 PDF 報告生成工作（於 process pool 背景渲染），立即回傳 job handle"""
+    _verify_team_config(team_id, config_id, db)
+    from ..services.pdf_report_jobs import pdf_report_jobs
+
+    job = pdf_report_jobs.submit(team_id=team_id, config_id=config_id, full_results=full)
+    return {"success": True, **_pdf_job_response(team_id, config_id, job)}
+
+
+@router.get("/{config_id}/pdf-jobs/{job_id}")
+async def get_pdf_report_job(team_id: int, config_id: int, job_id: str):
+    """查詢 PDF 報告生成工作狀態"""
+    from ..services.pdf_report_jobs import pdf_report_jobs
+
+    job = pdf_report_jobs.get(job_id)
+    if not job or (job["team_id"], job["config_id"]) != (team_id, config_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="找不到 PDF 報告工作")
+    return _pdf_job_response(team_id, config_id, job)
+
+
+@router.get("/{config_id}/pdf-jobs/{job_id}/download")
+async def download_pdf_report_job(team_id: int, config_id: int, job_id: str):
+    """下載已完成的 PDF 報告"""
+    from ..services.pdf_report_jobs import pdf_report_jobs
+
+    job = pdf_report_jobs.get(job_id)
+    if not job or (job["team_id"], job["config_id"]) != (team_id, config_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="找不到 PDF 報告工作")
+    return _pdf_file_response(job, config_id)
+
+
+@router.get("/{config_id}/generate-pdf")
+async def generate_pdf_report(
+    team_id: int,
+    config_id: int,
+    full: bool = Query(False, description="輸出全部測試項目（預設僅前 50 筆）"),
+    db: Session = Depends(get_sync_db),
+):
+    """生成並直接下載 PDF 報告（渲染於 process pool，等待期間不佔用事件迴圈）"""
+    _verify_team_config(team_id, config_id, db)
+    from ..services.pdf_report_jobs import pdf_report_jobs
+
+    job = pdf_report_jobs.submit(team_id=team_id, config_id=config_id, full_results=full)
+    job = await pdf_report_jobs.wait(job["job_id"])
+    return _pdf_file_response(job, config_id)
@@ -15,6 +15,7 @@ from datetime import datetime
 from app.auth.dependencies import get_current_user
 from app.auth.models import UserRole, UserCreate
 from app.auth.password_service import PasswordService
+from app.auth.permission_service import clear_permission_cache
 from app.services.user_service import UserService
 from app.models.database_models import User
 from app.database import get_async_session
@@ -674,6 +675,10 @@ async def update_user(
             await session.commit()
             await session.refresh(user)
 
+            if "role" in changed_fields or "is_active" in changed_fields:
+                # 角色/啟用狀態變更後，所有 worker 的權限快取都需失效
+                await clear_permission_cache(user.id)
+
             logger.info(f"管理員 {current_user.username} 更新了使用者 {user.username}")
 
             if changed_fields:
@@ -769,6 +774,7 @@ async def delete_user(
             # 永久刪除使用者資料
             await session.delete(user)
             await session.commit()
+            await clear_permission_cache(user_id)
 
             logger.info(f"管理員 {current_user.username} 永久刪除了使用者 {deleted_username}")
 
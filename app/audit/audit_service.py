@@ -3,6 +3,9 @@
 
 提供審計記錄的創建、查詢、匯出和統計功能。
 實作批次寫入、非同步處理和敏感資料遮罩。
+
+批次緩衝區屬於各 worker 行程：記錄時即取得操作時間，由本行程的背景寫入任務
+（start_writer）定期寫出，不依賴後續請求觸發；多個 worker 的寫入由審計資料庫的 WAL/busy_timeout 排序。
 """
 
 import logging
@@ -34,6 +37,7 @@ class AuditService:
         self._batch_buffer: List[AuditLogCreate] = []
         self._batch_lock = asyncio.Lock()
         self._last_flush = datetime.utcnow()
+        self._writer_task: Optional[asyncio.Task] = None
         
     # ===================== 記錄創建 =====================
     
@@ -73,7 +77,8 @@ class AuditService:
                 action_brief=action_brief,
                 severity=severity,
                 ip_address=ip_address,
-                user_agent=user_agent
+                user_agent=user_agent,
+                timestamp=datetime.utcnow()
             )
             
             # 加入批次緩衝區
@@ -84,7 +89,7 @@ class AuditService:
                 should_flush = (
                     len(self._batch_buffer) >= self.config.batch_size or
                     severity == AuditSeverity.CRITICAL or
-                    (datetime.utcnow() - self._last_flush).seconds > 30
+                    (datetime.utcnow() - self._last_flush).total_seconds() > self.config.flush_interval_seconds
                 )
                 
                 if should_flush:
@@ -488,6 +493,31 @@ class AuditService:
                 await self._flush_batch()
             return count
             
+    def start_writer(self, interval_seconds: Optional[float] = None) -> None:
+        """啟動本 worker 的背景寫入任務（需於事件迴圈中呼叫，例如 FastAPI startup 事件）"""
+        if self._writer_task is not None or not self.config.enabled:
+            return
+        interval = interval_seconds if interval_seconds is not None else self.config.flush_interval_seconds
+        self._writer_task = asyncio.get_running_loop().create_task(self._writer_loop(max(0.1, interval)))
+
+    async def stop_writer(self) -> None:
+        """停止背景寫入任務並寫出剩餘記錄"""
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+            self._writer_task = None
+        await self.force_flush()
+
+    async def _writer_loop(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if self._batch_buffer:
+                    await self.force_flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"背景寫入審計記錄失敗: {e}", exc_info=True)
+
     # ===================== 私有方法 =====================
     
     def _mask_sensitive_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
@@ -537,7 +567,7 @@ class AuditService:
                             details_json = json.dumps({"error": "詳情序列化失敗"}, ensure_ascii=False)
                             
                     db_record = AuditLogTable(
-                        timestamp=datetime.utcnow(),
+                        timestamp=record.timestamp or datetime.utcnow(),
                         user_id=record.user_id,
                         username=record.username,
                         role=record.role,
@@ -560,9 +590,8 @@ class AuditService:
                 
         except Exception as e:
             logger.error(f"批次寫入審計記錄失敗: {e}", exc_info=True)
-            # 失敗的記錄放回緩衝區（避免遺失）
-            async with self._batch_lock:
-                self._batch_buffer = records_to_write + self._batch_buffer
+            # 失敗的記錄放回緩衝區（避免遺失）；呼叫端已持有 _batch_lock，不可重複取得
+            self._batch_buffer = records_to_write + self._batch_buffer
 
 
 # 全域審計服務實例
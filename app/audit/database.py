@@ -7,16 +7,20 @@
 
 import logging
 from typing import Optional, AsyncGenerator
-from sqlalchemy import create_engine, text, MetaData
+from sqlalchemy import create_engine, event, text, MetaData
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.pool import QueuePool, NullPool
 from sqlalchemy.exc import SQLAlchemyError
 from contextlib import asynccontextmanager
 
 from ..config import get_settings
+from ..services.metrics import instrument_engine
 
 logger = logging.getLogger(__name__)
 
+# 審計資料庫每條連線的頁面快取（MB）；NullPool 下連線不重複使用，維持小值即可
+AUDIT_CACHE_MB = 4
+
 
 class AuditDatabaseManager:
     """審計資料庫管理器"""
@@ -39,6 +43,7 @@ class AuditDatabaseManager:
                 await self._initialize_postgresql()
             else:
                 await self._initialize_sqlite()
+            instrument_engine(self._engine.sync_engine, "audit")
             await self._ensure_schema()
             
             self._is_initialized = True
@@ -87,6 +92,13 @@ class AuditDatabaseManager:
             future=True,
             connect_args={"check_same_thread": False}
         )
+
+        # 多個 worker 各自批次寫入同一審計資料庫：WAL + busy_timeout，避免 "database is locked"
+        from ..database import configure_sqlite_connection
+
+        @event.listens_for(self._engine.sync_engine, "connect")
+        def set_sqlite_pragma(dbapi_conn, connection_record):
+            configure_sqlite_connection(dbapi_conn, cache_mb=AUDIT_CACHE_MB)
         
         self._session_factory = async_sessionmaker(
             bind=self._engine,
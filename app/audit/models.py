@@ -60,7 +60,7 @@ class AuditLogBase(BaseModel):
 
 class AuditLogCreate(AuditLogBase):
     """建立審計記錄請求模型"""
-    pass
+    timestamp: Optional[datetime] = Field(None, description="操作時間 (UTC)；未指定時以寫入時間為準")
 
 
 class AuditLog(AuditLogBase):
@@ -11,7 +11,7 @@ from app.auth.models import UserRole, PermissionType, AuthErrorResponse
 from app.auth.auth_service import auth_service
 from app.auth.permission_service import permission_service
 from app.models.database_models import User
-from app.database import get_async_session
+from app.database import get_read_session
 from sqlalchemy import select
 
 
@@ -45,7 +45,7 @@ async def get_current_user(
         )
 
     # 從資料庫取得完整使用者資訊
-    async with get_async_session() as session:
+    async with get_read_session() as session:
         result = await session.execute(
             select(User).where(User.id == token_data.user_id)
         )
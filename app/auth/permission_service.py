@@ -3,6 +3,7 @@
 
 實作角色檢查、團隊權限檢查、權限快取機制。
 遵循「預設拒絕」原則和「資源所屬團隊權限優先」原則。
+權限快取為各 worker 行程內快取；clear_cache 會廣播失效訊息，其他 worker 收到後清除同一範圍。
 """
 
 import asyncio
@@ -10,18 +11,22 @@ import logging
 import hashlib
 import os
 import re
+import threading
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Set, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
 from functools import lru_cache
 
-import casbin
 import yaml
 from sqlalchemy import select
 
-from app.database import get_async_session
+from app.database import get_read_session
 from app.models.database_models import User, Team
 from app.auth.models import UserRole, PermissionType, PermissionCheck
 from app.config import get_settings
+from app.services.worker_coordination import TOPIC_PERMISSIONS, get_invalidation_bus
+
+if TYPE_CHECKING:
+    import casbin
 
 logger = logging.getLogger(__name__)
 
@@ -127,13 +132,25 @@ class PermissionService:
         self._ui_map_path = os.path.join(base_dir, "ui_capabilities.yaml")
 
         # 執行體
-        self._enforcer: Optional[casbin.Enforcer] = None
+        self._enforcer: Optional["casbin.Enforcer"] = None
         self._constraints: Dict = {}
         self._ui_map: Dict = {}
         self._policy_version: str = self.FALLBACK_VERSION
 
-        # 初始化載入
-        self._load_all(initial=True)
+        # 策略於首次使用（或啟動任務 preload）時才載入，避免匯入時載入 casbin 與讀檔
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._load_lock:
+            if not self._loaded:
+                self._load_all(initial=True)
+
+    def preload(self) -> None:
+        """預先載入策略（供啟動任務於背景呼叫）"""
+        self._ensure_loaded()
     
     def _normalize_role(self, role: str) -> str:
         # 與 Casbin policy.csv 與 constraints.yaml 對齊：使用小寫（例如 SUPER_ADMIN -> super_admin）
@@ -157,7 +174,9 @@ class PermissionService:
         raw = "|".join(parts).encode("utf-8")
         return hashlib.sha256(raw).hexdigest()[:12]
 
-    def _load_enforcer(self) -> casbin.Enforcer:
+    def _load_enforcer(self) -> "casbin.Enforcer":
+        import casbin
+
         if not os.path.exists(self._model_path) or not os.path.exists(self._policy_path):
             raise FileNotFoundError("Casbin model.conf 或 policy.csv 不存在")
         e = casbin.Enforcer(self._model_path, self._policy_path)
@@ -186,6 +205,7 @@ class PermissionService:
         except Exception as e:
             logging.error(f"載入 Casbin enforcer 失敗: {e}")
             try:
+                import casbin
                 self._enforcer = casbin.Enforcer()
             except Exception:
                 self._enforcer = None
@@ -208,6 +228,7 @@ class PermissionService:
             logging.debug(f"計算權限版本失敗，使用預設: {e}")
             self._policy_version = self.FALLBACK_VERSION
 
+        self._loaded = True
         if self._enforcer:
             logging.info(f"Permission policy loaded, version={self._policy_version}")
         else:
@@ -215,6 +236,9 @@ class PermissionService:
 
     def _maybe_reload(self) -> None:
         """若檔案版本有變更則熱重載策略/設定。"""
+        if not self._loaded:
+            self._ensure_loaded()
+            return
         try:
             current = self._compute_policy_version()
             if current != self._policy_version:
@@ -313,6 +337,7 @@ class PermissionService:
 
     # 以下方法為相容舊 API，用於 /matrix 顯示（非授權決策依據）
     def get_matrix(self) -> Dict:
+        self._ensure_loaded()
         try:
             # 從 policy.csv 反推 features 與 roles
             features = set()
@@ -340,6 +365,7 @@ class PermissionService:
             }
 
     def get_policy_version(self) -> str:
+        self._ensure_loaded()
         return self._policy_version
 
     def get_role_level(self, role: str) -> int:
@@ -349,6 +375,7 @@ class PermissionService:
 
     def has_basic_permission(self, role: str, feature: str, action: str, dom: str = "") -> bool:
         try:
+            self._ensure_loaded()
             if not self._enforcer:
                 return False
             return bool(self._enforcer.enforce(self._normalize_role(role), feature, action, dom, {}))
@@ -376,7 +403,7 @@ class PermissionService:
         
         # 從資料庫查詢
         try:
-            async with get_async_session() as session:
+            async with get_read_session() as session:
                 result = await session.execute(
                     select(User.role).where(User.id == user_id, User.is_active == True)
                 )
@@ -537,7 +564,7 @@ class PermissionService:
             if not user_role:
                 return []
 
-            async with get_async_session() as session:
+            async with get_read_session() as session:
                 result = await session.execute(select(Team.id))
                 return [team_id for team_id, in result.fetchall()]
 
@@ -586,7 +613,7 @@ class PermissionService:
     async def _get_user_role(self, user_id: int) -> Optional[UserRole]:
         """取得使用者角色"""
         try:
-            async with get_async_session() as session:
+            async with get_read_session() as session:
                 result = await session.execute(
                     select(User.role).where(User.id == user_id, User.is_active == True)
                 )
@@ -713,7 +740,7 @@ class PermissionService:
             if target_user_id:
                 # 取得目標使用者資訊
                 try:
-                    async with get_async_session() as session:
+                    async with get_read_session() as session:
                         result = await session.execute(
                             select(User).where(User.id == target_user_id)
                         )
@@ -738,7 +765,16 @@ class PermissionService:
             team_id: 團隊 ID（可選，為 None 時清除該使用者所有快取）
         """
         await self.cache.clear(user_id, team_id)
+        get_invalidation_bus().broadcast(TOPIC_PERMISSIONS, f"{user_id}:{'' if team_id is None else team_id}")
         logger.info(f"已清除權限快取: user_id={user_id}, team_id={team_id}")
+
+    async def _on_cache_invalidated(self, key: Optional[str]) -> None:
+        """其他 worker 清除權限快取時呼叫（key 為 "user_id:team_id"，無 key 時清除全部）"""
+        if not key:
+            await self.cache.clear_all()
+            return
+        user_id, _, team_id = key.partition(":")
+        await self.cache.clear(int(user_id), int(team_id) if team_id else None)
     
     async def get_permission_summary(self, user_id: int) -> Dict:
         """
@@ -783,6 +819,7 @@ class PermissionService:
         回傳 (是否通過, 理由) 列表（AND 邏輯）。"""
         results: List[Tuple[bool, str]] = []
         role = self._normalize_role(role)
+        self._ensure_loaded()
         rules = (
             self._constraints.get(role, {})
             .get(feature, {})
@@ -834,6 +871,7 @@ class PermissionService:
 
 # 全域權限服務實例
 permission_service = PermissionService()
+get_invalidation_bus().subscribe(TOPIC_PERMISSIONS, permission_service._on_cache_invalidated)
 
 
 # 便利函數
@@ -9,9 +9,10 @@ import logging
 from datetime import datetime, timedelta
 from typing import List, Optional, Set
 from sqlalchemy import select, delete, and_, func, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
-from app.database import get_async_session
-from app.models.database_models import ActiveSession
+from app.database import get_async_session, get_read_session
+from app.models.database_models import ActiveSession, LoginChallenge
 from app.config import get_settings
 
 logger = logging.getLogger(__name__)
@@ -23,7 +24,7 @@ class SessionService:
     def __init__(self):
         self.settings = get_settings()
         self._revoked_jtis: Set[str] = set()  # 記憶體中的撤銷 JTI 集合
-        self._challenges: dict = {}  # 暫存 challenges {identifier: (challenge, expires_at)}
+        self._challenge_table_ready = False
         
     async def create_session(
         self, 
@@ -84,7 +85,7 @@ class SessionService:
             
         # 檢查資料庫
         try:
-            async with get_async_session() as session:
+            async with get_read_session() as session:
                 result = await session.execute(
                     select(ActiveSession).where(
                         and_(
@@ -245,10 +246,18 @@ class SessionService:
                 )
                 
                 deleted_count = result.rowcount
+
+                # 清理過期的 challenges
+                await self._ensure_challenge_table(session)
+                challenge_result = await session.execute(
+                    delete(LoginChallenge).where(LoginChallenge.expires_at < current_time)
+                )
                 await session.commit()
                 
                 if deleted_count > 0:
                     logger.info(f"清理了 {deleted_count} 個過期會話")
+                if challenge_result.rowcount:
+                    logger.debug(f"清理了 {challenge_result.rowcount} 個過期 challenge")
                     
                 # 清理記憶體快取中的過期 JTI
                 self._cleanup_memory_cache()
@@ -259,10 +268,20 @@ class SessionService:
             logger.error(f"清理過期會話失敗: {e}")
             return 0
     
+    async def _ensure_challenge_table(self, session) -> None:
+        """既有資料庫補建 login_challenges 表（每個行程只檢查一次）"""
+        if self._challenge_table_ready:
+            return
+        conn = await session.connection()
+        await conn.run_sync(lambda sync_conn: LoginChallenge.__table__.create(sync_conn, checkfirst=True))
+        self._challenge_table_ready = True
+
     async def store_challenge(self, identifier: str, challenge: str, expires_at: datetime) -> bool:
         """
         暫存 challenge
 
+        存於共用資料庫（login_challenges），讓其他 worker 處理的登入請求也能驗證。
+
         Args:
             identifier: 使用者識別 (username 或 email)
             challenge: 隨機 challenge 字串
@@ -272,7 +291,16 @@ class SessionService:
             是否暫存成功
         """
         try:
-            self._challenges[identifier] = (challenge, expires_at)
+            async with get_async_session() as session:
+                await self._ensure_challenge_table(session)
+                stmt = sqlite_insert(LoginChallenge).values(
+                    identifier=identifier, challenge=challenge, expires_at=expires_at
+                )
+                await session.execute(stmt.on_conflict_do_update(
+                    index_elements=[LoginChallenge.identifier],
+                    set_={"challenge": stmt.excluded.challenge, "expires_at": stmt.excluded.expires_at},
+                ))
+                await session.commit()
             logger.debug(f"暫存 challenge for {identifier}")
             return True
         except Exception as e:
@@ -283,6 +311,8 @@ class SessionService:
         """
         驗證 challenge
 
+        以單一 DELETE 比對並取用，同一 challenge 即使同時送到多個 worker 也只會成功一次。
+
         Args:
             identifier: 使用者識別
             challenge: 要驗證的 challenge
@@ -291,27 +321,24 @@ class SessionService:
             是否驗證成功
         """
         try:
-            if identifier not in self._challenges:
-                logger.warning(f"找不到 challenge for {identifier}")
-                return False
-
-            stored_challenge, expires_at = self._challenges[identifier]
-
-            # 檢查是否過期
-            if datetime.utcnow() > expires_at:
-                logger.warning(f"Challenge 已過期 for {identifier}")
-                del self._challenges[identifier]
-                return False
-
-            # 驗證 challenge
-            if stored_challenge != challenge:
-                logger.warning(f"Challenge 不匹配 for {identifier}")
-                return False
+            async with get_async_session() as session:
+                await self._ensure_challenge_table(session)
+                result = await session.execute(
+                    delete(LoginChallenge).where(
+                        and_(
+                            LoginChallenge.identifier == identifier,
+                            LoginChallenge.challenge == challenge,
+                            LoginChallenge.expires_at >= datetime.utcnow()
+                        )
+                    )
+                )
+                await session.commit()
 
-            # 驗證成功，刪除 challenge (一次性使用)
-            del self._challenges[identifier]
-            logger.debug(f"Challenge 驗證成功 for {identifier}")
-            return True
+            if result.rowcount:
+                logger.debug(f"Challenge 驗證成功 for {identifier}")
+                return True
+            logger.warning(f"Challenge 不存在、不匹配或已過期 for {identifier}")
+            return False
 
         except Exception as e:
             logger.error(f"驗證 challenge 失敗: {e}")
@@ -327,17 +354,6 @@ class SessionService:
             self._revoked_jtis = set(jti_list[len(jti_list)//2:])
             logger.debug("清理了一半的 JTI 記憶體快取")
 
-        # 清理過期的 challenges
-        current_time = datetime.utcnow()
-        expired_identifiers = [
-            identifier for identifier, (_, expires_at) in self._challenges.items()
-            if expires_at < current_time
-        ]
-        for identifier in expired_identifiers:
-            del self._challenges[identifier]
-        if expired_identifiers:
-            logger.debug(f"清理了 {len(expired_identifiers)} 個過期 challenge")
-    
     async def get_session_statistics(self) -> dict:
         """
         取得會話統計資訊
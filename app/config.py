@@ -80,6 +80,8 @@ class AuditConfig(BaseModel):
     enabled: bool = True
     database_url: str = "sqlite:///./audit.db"
     batch_size: int = 100
+    # 每個 worker 的審計緩衝區最長停留秒數（背景寫入任務定期寫出）
+    flush_interval_seconds: float = 5.0
     cleanup_days: int = 365
     max_detail_size: int = 10240
     excluded_fields: list = ['password', 'token', 'secret', 'key']
@@ -92,6 +94,7 @@ class AuditConfig(BaseModel):
             enabled=os.getenv('ENABLE_AUDIT', str(fallback.enabled if fallback else True)).lower() == 'true',
             database_url=os.getenv('AUDIT_DATABASE_URL', fallback.database_url if fallback else 'sqlite:///./audit.db'),
             batch_size=int(os.getenv('AUDIT_BATCH_SIZE', str(fallback.batch_size if fallback else 100))),
+            flush_interval_seconds=float(os.getenv('AUDIT_FLUSH_SECONDS', str(fallback.flush_interval_seconds if fallback else 5.0))),
             cleanup_days=int(os.getenv('AUDIT_CLEANUP_DAYS', str(fallback.cleanup_days if fallback else 365))),
             max_detail_size=int(os.getenv('AUDIT_MAX_DETAIL_SIZE', str(fallback.max_detail_size if fallback else 10240))),
             excluded_fields=fallback.excluded_fields if fallback else ['password', 'token', 'secret', 'key'],
@@ -101,12 +104,42 @@ class AuditConfig(BaseModel):
 class AttachmentsConfig(BaseModel):
     # 若留空，則預設使用專案根目錄下的 attachments 子目錄
     root_dir: str = ""
+    # Lark 媒體下載快取目錄；留空則使用專案根目錄下的 cache/lark_media
+    lark_cache_dir: str = ""
+    # Lark 媒體快取容量上限（MB），0 表示停用快取
+    lark_cache_max_mb: int = 1024
 
     @classmethod
     def from_env(cls, fallback: 'AttachmentsConfig' = None) -> 'AttachmentsConfig':
         env_root = os.getenv('ATTACHMENTS_ROOT_DIR')
+        env_cache_dir = os.getenv('LARK_MEDIA_CACHE_DIR')
         return cls(
-            root_dir=env_root if env_root else (fallback.root_dir if fallback else '')
+            root_dir=env_root if env_root else (fallback.root_dir if fallback else ''),
+            lark_cache_dir=env_cache_dir if env_cache_dir else (fallback.lark_cache_dir if fallback else ''),
+            lark_cache_max_mb=int(os.getenv('LARK_MEDIA_CACHE_MAX_MB', str(fallback.lark_cache_max_mb if fallback else 1024)))
+        )
+
+class ProfilingConfig(BaseModel):
+    """SQL 效能剖析設定（預設關閉）"""
+    enabled: bool = False
+    # 同一 SQL 指紋於單一請求內執行次數達此值即視為 N+1
+    n_plus_one_threshold: int = 10
+    # 單一查詢超過此毫秒數寫入慢查詢日誌
+    slow_query_ms: int = 100
+    # 是否於回應加上 Server-Timing 標頭
+    server_timing: bool = True
+    # 慢查詢/N+1 日誌檔；留空則僅寫入應用程式日誌
+    log_file: str = ""
+
+    @classmethod
+    def from_env(cls, fallback: 'ProfilingConfig' = None) -> 'ProfilingConfig':
+        fallback = fallback or cls()
+        return cls(
+            enabled=os.getenv('SQL_PROFILER_ENABLED', str(fallback.enabled)).lower() == 'true',
+            n_plus_one_threshold=int(os.getenv('SQL_PROFILER_N_PLUS_ONE_THRESHOLD', str(fallback.n_plus_one_threshold))),
+            slow_query_ms=int(os.getenv('SQL_PROFILER_SLOW_QUERY_MS', str(fallback.slow_query_ms))),
+            server_timing=os.getenv('SQL_PROFILER_SERVER_TIMING', str(fallback.server_timing)).lower() == 'true',
+            log_file=os.getenv('SQL_PROFILER_LOG_FILE', fallback.log_file)
         )
     
 class Settings(BaseModel):
@@ -116,6 +149,7 @@ class Settings(BaseModel):
     attachments: AttachmentsConfig = AttachmentsConfig()
     auth: AuthConfig = AuthConfig()
     audit: AuditConfig = AuditConfig()
+    profiling: ProfilingConfig = ProfilingConfig()
     
     @classmethod
     def from_env_and_file(cls, config_path: str = "config.yaml") -> 'Settings':
@@ -135,7 +169,8 @@ class Settings(BaseModel):
             jira=base_settings.jira,  # JIRA 保持檔案設定
             attachments=AttachmentsConfig.from_env(base_settings.attachments),
             auth=AuthConfig.from_env(base_settings.auth),
-            audit=AuditConfig.from_env(base_settings.audit)
+            audit=AuditConfig.from_env(base_settings.audit),
+            profiling=ProfilingConfig.from_env(base_settings.profiling)
         )
 
 def load_config(config_path: str = "config.yaml") -> Settings:
@@ -161,7 +196,9 @@ def create_default_config(config_path: str = "config.yaml") -> None:
             "api_token": ""
         },
         "attachments": {
-            "root_dir": ""  # 留空代表使用專案內 attachments 目錄
+            "root_dir": "",  # 留空代表使用專案內 attachments 目錄
+            "lark_cache_dir": "",  # 留空代表使用專案內 cache/lark_media 目錄
+            "lark_cache_max_mb": 1024
         },
         "auth": {
             "enable_auth": True,
@@ -175,10 +212,18 @@ def create_default_config(config_path: str = "config.yaml") -> None:
             "enabled": True,
             "database_url": "sqlite:///./audit.db",
             "batch_size": 100,
+            "flush_interval_seconds": 5.0,
             "cleanup_days": 365,
             "max_detail_size": 10240,
             "excluded_fields": ["password", "token", "secret", "key"],
             "debug_sql": False
+        },
+        "profiling": {
+            "enabled": False,
+            "n_plus_one_threshold": 10,
+            "slow_query_ms": 100,
+            "server_timing": True,
+            "log_file": ""
         }
     }
     
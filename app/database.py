@@ -3,16 +3,25 @@
 
 將主資料庫升級為異步 aiosqlite，改善 SQLite 並發與鎖定問題。
 統一使用異步模式，避免同步/異步混用導致的連接衝突。
+
+連線池：
+- 寫入：單一持久連線（pool_size=1），寫入自然序列化，不再每個會話重新建立連線
+- 讀取：多條唯讀連線（query_only、mmap、共用的快取預算），供查詢路徑使用
+PRAGMA 由 configure_sqlite_connection 統一設定，只在實體連線建立時執行一次；同步引擎亦同。
 """
 
 import logging
+import os
 from pathlib import Path
 from typing import AsyncGenerator
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker, AsyncSession
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy import event, text
 from contextlib import asynccontextmanager
 
+from app.services import sql_profiler
+from app.services.metrics import instrument_engine
+
 # 向後相容：保留同步接口供緊急使用
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
@@ -20,44 +29,25 @@ from sqlalchemy.orm import sessionmaker
 
 logger = logging.getLogger(__name__)
 
-# 使用與現有資料庫相同的路徑
+# 使用與現有資料庫相同的路徑（可由 DATABASE_FILE 環境變數指向其他檔案，例如效能測試的暫存資料庫）
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
-DB_FILE = PROJECT_ROOT / "test_case_repo.db"
+DB_FILE = Path(os.getenv("DATABASE_FILE") or PROJECT_ROOT / "test_case_repo.db")
 DATABASE_URL = f"sqlite+aiosqlite:///{DB_FILE}"
 SYNC_DATABASE_URL = f"sqlite:///{DB_FILE}"  # 向後相容
 
-# ===================== 異步資料庫引擎（主要使用） =====================
-
-# 創建異步引擎
-engine = create_async_engine(
-    DATABASE_URL,
-    poolclass=NullPool,  # SQLite 使用 NullPool
-    echo=False,  # 可設為 True 用於調試
-    future=True,
-    connect_args={
-        "check_same_thread": False,
-    }
-)
-
-# 異步會話工廠
-SessionLocal = async_sessionmaker(
-    bind=engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
-    autoflush=False,
-    autocommit=False
-)
+# 連線池參數（可由環境變數調整）
+READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "8"))
+READ_CACHE_BUDGET_MB = int(os.getenv("DB_READ_CACHE_MB", "256"))  # 所有讀取連線共用的快取預算
+WRITE_CACHE_MB = int(os.getenv("DB_WRITE_CACHE_MB", "64"))
+MMAP_SIZE_MB = int(os.getenv("DB_MMAP_MB", "256"))
+POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT", "30"))
 
-# SQLAlchemy Base
-Base = declarative_base()
 
-# SQLite 優化參數設定（異步版本）
-@event.listens_for(engine.sync_engine, "connect")
-def set_sqlite_pragma(dbapi_conn, connection_record):
-    """為異步連接設定 SQLite 優化參數"""
+def configure_sqlite_connection(dbapi_conn, read_only: bool = False, cache_mb: int = WRITE_CACHE_MB) -> None:
+    """設定 SQLite 連線參數（於實體連線建立時呼叫一次，異步與同步引擎共用）"""
     cursor = dbapi_conn.cursor()
     try:
-        # 啟用 WAL 模式以改善並發
+        # 啟用 WAL 模式以改善並發（寫入資料庫檔後持久有效，已是 WAL 時為 no-op）
         cursor.execute("PRAGMA journal_mode=WAL")
         # 設定 busy timeout 為 30 秒
         cursor.execute("PRAGMA busy_timeout=30000")
@@ -65,15 +55,79 @@ def set_sqlite_pragma(dbapi_conn, connection_record):
         cursor.execute("PRAGMA synchronous=NORMAL")
         # 啟用外鍵約束
         cursor.execute("PRAGMA foreign_keys=ON")
-        # 優化記憶體使用
-        cursor.execute("PRAGMA cache_size=-64000")  # 64MB cache
+        # 頁面快取（負值單位為 KiB）
+        cursor.execute(f"PRAGMA cache_size=-{max(1, cache_mb) * 1024}")
         # 設定 temp store 在記憶體中
         cursor.execute("PRAGMA temp_store=MEMORY")
-        logger.debug("SQLite 異步連接優化參數設定完成")
+        # 以記憶體映射讀取資料檔，減少 read() 系統呼叫
+        cursor.execute(f"PRAGMA mmap_size={MMAP_SIZE_MB * 1024 * 1024}")
+        if read_only:
+            # 讀取連線拒絕任何寫入，避免誤用造成第二個寫入者
+            cursor.execute("PRAGMA query_only=ON")
     finally:
         cursor.close()
 
 
+def create_sqlite_engine(db_file, name: str, read_only: bool = False, pool_size: int = 1,
+                         cache_mb: int = WRITE_CACHE_MB) -> AsyncEngine:
+    """建立具連線池的 aiosqlite 引擎（連線重複使用，PRAGMA 只設定一次）"""
+    async_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{db_file}",
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=pool_size,
+        max_overflow=0,
+        pool_timeout=POOL_TIMEOUT_SECONDS,
+        echo=False,  # 可設為 True 用於調試
+        future=True,
+        connect_args={
+            "check_same_thread": False,
+        }
+    )
+
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def set_sqlite_pragma(dbapi_conn, connection_record):
+        configure_sqlite_connection(dbapi_conn, read_only=read_only, cache_mb=cache_mb)
+        logger.debug(f"SQLite 連線參數設定完成（{name}）")
+
+    # 查詢計數與耗時指標、每請求 SQL 剖析
+    instrument_engine(async_engine.sync_engine, name)
+    sql_profiler.install(async_engine.sync_engine)
+    return async_engine
+
+
+# ===================== 異步資料庫引擎（主要使用） =====================
+
+# 寫入引擎：單一連線，所有經由 SessionLocal 的交易依序取得
+engine = create_sqlite_engine(DB_FILE, "async")
+
+# 讀取引擎：唯讀連線池，快取預算平均分配給各連線
+read_engine = create_sqlite_engine(
+    DB_FILE, "async_read", read_only=True, pool_size=READ_POOL_SIZE,
+    cache_mb=max(1, READ_CACHE_BUDGET_MB // max(1, READ_POOL_SIZE)),
+)
+
+# 異步會話工廠
+SessionLocal = async_sessionmaker(
+    bind=engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autoflush=False,
+    autocommit=False
+)
+
+# 唯讀會話工廠
+ReadSessionLocal = async_sessionmaker(
+    bind=read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autoflush=False,
+    autocommit=False
+)
+
+# SQLAlchemy Base
+Base = declarative_base()
+
+
 # ===================== 異步會話管理 =====================
 
 @asynccontextmanager
@@ -90,6 +144,20 @@ async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+@asynccontextmanager
+async def get_read_session() -> AsyncGenerator[AsyncSession, None]:
+    """取得唯讀會話（使用讀取連線池，不佔用寫入連線）"""
+    async with ReadSessionLocal() as session:
+        try:
+            yield session
+        except Exception as e:
+            logger.error(f"資料庫唯讀會話錯誤: {e}")
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+
 # FastAPI 異步依賴注入
 async def get_db():
     """FastAPI 依賴注入用的異步會話生成器"""
@@ -97,11 +165,18 @@ async def get_db():
         yield session
 
 
+async def get_read_db():
+    """FastAPI 依賴注入用的唯讀會話生成器（僅查詢的路由使用）"""
+    async with get_read_session() as session:
+        yield session
+
+
 # ===================== 資料庫管理函數 =====================
 
 async def cleanup_database() -> None:
     """清理異步資料庫連接"""
     await engine.dispose()
+    await read_engine.dispose()
     logger.info("異步資料庫連接已清理")
 
 
@@ -165,16 +240,13 @@ def get_sync_engine():
             pool_recycle=3600
         )
         _SyncSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=_sync_engine)
+        instrument_engine(_sync_engine, "sync")
+        sql_profiler.install(_sync_engine)
         
-        # 同步版本的 PRAGMA 設定
+        # 與異步引擎相同的 PRAGMA 設定
         @event.listens_for(_sync_engine, "connect")
         def set_sync_sqlite_pragma(dbapi_conn, connection_record):
-            cursor = dbapi_conn.cursor()
-            cursor.execute("PRAGMA journal_mode=WAL")
-            cursor.execute("PRAGMA busy_timeout=30000")
-            cursor.execute("PRAGMA synchronous=NORMAL")
-            cursor.execute("PRAGMA foreign_keys=ON")
-            cursor.close()
+            configure_sqlite_connection(dbapi_conn)
             
     return _sync_engine
 
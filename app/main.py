@@ -1,10 +1,12 @@
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 from pathlib import Path
+import asyncio
 import logging
 import os
+import time
 
 app = FastAPI(
     title="Test Case Repository Web Tool",
@@ -20,9 +22,22 @@ try:
 except Exception as _e:
     logging.warning(f"GZipMiddleware 啟用失敗（不影響服務）：{_e}")
 
-from app.middlewares import AuditMiddleware
+from app.middlewares import AuditMiddleware, MetricsMiddleware, SQLProfilerMiddleware
+from app.config import settings
+from app.services.sql_profiler import configure_log_file
 
 app.add_middleware(AuditMiddleware)
+# 每請求 SQL 剖析（查詢數、DB 時間、N+1 偵測、Server-Timing），預設關閉
+if settings.profiling.enabled:
+    configure_log_file(settings.profiling.log_file)
+    app.add_middleware(
+        SQLProfilerMiddleware,
+        n_plus_one_threshold=settings.profiling.n_plus_one_threshold,
+        slow_query_ms=settings.profiling.slow_query_ms,
+        server_timing=settings.profiling.server_timing,
+    )
+# 最外層：量測包含其他 middleware 在內的完整處理時間
+app.add_middleware(MetricsMiddleware)
 
 # 配置日誌
 logging.basicConfig(level=logging.INFO)
@@ -58,9 +73,9 @@ app.mount("/attachments", StaticFiles(directory=str(ATTACHMENTS_DIR), html=False
 templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
 
 # 包含 API 路由
-from app.api import api_router
+from app.api import include_api_routers
 from app.api.system import router as system_router
-app.include_router(api_router, prefix="/api")
+include_api_routers(app, prefix="/api")
 app.include_router(system_router)
 
 # 前端頁面路由
@@ -117,6 +132,27 @@ async def profile(request: Request):
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus 指標（多 worker 時合併 METRICS_MULTIPROC_DIR 中各行程的快照）"""
+    from app.services.metrics import CONTENT_TYPE, registry
+    body = await asyncio.get_running_loop().run_in_executor(None, registry.render)
+    return Response(content=body, media_type=CONTENT_TYPE)
+
+def _warm_up():
+    from app.auth.permission_service import permission_service
+    from app.services.tcg_converter import tcg_converter
+
+    started = time.perf_counter()
+    try:
+        permission_service.preload()
+        tcg_converter.init_database()
+        tcg_converter.refresh_index()
+    except Exception as e:
+        logging.error(f"背景預載失敗: {e}")
+    logging.info("背景預載完成，耗時 %.0f ms", (time.perf_counter() - started) * 1000)
+
+
 @app.on_event("startup")
 async def startup_event():
     """應用程式啟動事件"""
@@ -127,8 +163,22 @@ async def startup_event():
         logging.info("報告目錄已就緒: %s", REPORT_DIR)
 
         await init_audit_database()
+        # 本 worker 的審計緩衝區由背景任務定期寫出
+        audit_service.start_writer()
         logging.info("審計資料庫初始化完成")
 
+        # 多 worker 快取失效訊息（權限快取、TCG 索引、聯絡人索引）
+        from app.services.worker_coordination import get_invalidation_bus
+        await get_invalidation_bus().start()
+
+        # 多 worker 模式下定期寫出本行程的指標快照
+        from app.services.metrics import registry as metrics_registry
+        metrics_registry.start_flusher()
+
+        # 一次性初始化移到背景執行（不阻塞啟動；首次使用前未完成時會自動載入）：
+        # 權限策略（casbin）、tcg_records 建表與 TCG 記憶體索引
+        asyncio.get_running_loop().run_in_executor(None, _warm_up)
+
         # 啟動定時任務調度器
         from app.services.scheduler import task_scheduler
         task_scheduler.start()
@@ -148,11 +198,42 @@ async def shutdown_event():
         logging.error(f"停止定時任務調度器失敗: {e}")
 
     try:
-        await audit_service.force_flush()
+        from app.services.pdf_report_jobs import pdf_report_jobs
+        pdf_report_jobs.shutdown()
+    except Exception as e:
+        logging.error(f"關閉 PDF 報告 worker 失敗: {e}")
+
+    try:
+        from app.services import worker_coordination
+        if worker_coordination._bus is not None:
+            await worker_coordination._bus.stop()
+    except Exception as e:
+        logging.error(f"停止快取失效輪詢失敗: {e}")
+
+    try:
+        from app.services import live_events
+        if live_events._broker is not None:
+            await live_events._broker.stop()
+    except Exception as e:
+        logging.error(f"關閉即時事件 broker 失敗: {e}")
+
+    try:
+        # 處理完佇列中剩餘的寫入
+        from app.services import write_queue
+        if write_queue._write_queue is not None:
+            await asyncio.get_running_loop().run_in_executor(None, write_queue._write_queue.stop)
+    except Exception as e:
+        logging.error(f"關閉寫入佇列失敗: {e}")
+
+    try:
+        await audit_service.stop_writer()
         await cleanup_audit_database()
     except Exception as e:
         logging.error(f"關閉審計資料庫失敗: {e}")
 
+    from app.services.metrics import registry as metrics_registry
+    metrics_registry.stop_flusher()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=9999)
@@ -1,5 +1,7 @@
 """FastAPI 中介層模組"""
 
 from .audit_middleware import AuditMiddleware
+from .metrics_middleware import MetricsMiddleware
+from .sql_profiler_middleware import SQLProfilerMiddleware
 
-__all__ = ["AuditMiddleware"]
+__all__ = ["AuditMiddleware", "MetricsMiddleware", "SQLProfilerMiddleware"]
@@ -0,0 +1,49 @@
+"""HTTP 請求指標 Middleware（純 ASGI，不經 BaseHTTPMiddleware 以免額外開銷）"""
+
+import time
+
+from app.services.metrics import HTTP_IN_PROGRESS, HTTP_LATENCY, HTTP_REQUESTS
+
+
+def _route_template(scope, status_code: int) -> str:
+    """取得路由樣板（如 /api/teams/{team_id}/testcases），避免以實際路徑造成高基數"""
+    route = scope.get("route")
+    path_format = getattr(route, "path_format", None) or getattr(route, "path", None)
+    if path_format:
+        return path_format
+    if status_code == 404:
+        return "__unmatched__"
+    # 靜態檔案等 Mount 不會寫入 scope["route"]，以第一層路徑歸類
+    segments = scope.get("path", "/").strip("/").split("/", 1)
+    return f"/{segments[0]}/*" if segments[0] else "/"
+
+
+class MetricsMiddleware:
+    """記錄每個 HTTP 請求的處理時間、狀態碼與處理中請求數"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_PROGRESS.dec()
+            method = scope.get("method", "GET")
+            route = _route_template(scope, status_code)
+            HTTP_REQUESTS.inc(method=method, route=route, status=status_code)
+            HTTP_LATENCY.observe(time.perf_counter() - start, method=method, route=route)
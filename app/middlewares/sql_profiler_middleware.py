@@ -0,0 +1,35 @@
+"""每請求 SQL 剖析 Middleware（設定 profiling.enabled 啟用）"""
+
+from app.services import sql_profiler
+
+
+class SQLProfilerMiddleware:
+    """為每個 HTTP 請求建立 RequestProfile，回應時加上 Server-Timing，結束時輸出 N+1 警告"""
+
+    def __init__(self, app, n_plus_one_threshold: int = 10, slow_query_ms: float = 100,
+                 server_timing: bool = True):
+        self.app = app
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.slow_query_ms = slow_query_ms
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        label = f"{scope.get('method', 'GET')} {scope.get('path', '')}"
+        profile, token = sql_profiler.start_profile(label, self.n_plus_one_threshold, self.slow_query_ms)
+
+        async def send_wrapper(message):
+            if self.server_timing and message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", profile.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sql_profiler.stop_profile(token)
+            profile.report()
@@ -20,6 +20,7 @@ from sqlalchemy import (
     UniqueConstraint,
     Index,
     and_,
+    event,
     select,
     text,
 )
@@ -126,11 +127,14 @@ class TestRunConfig(Base):
     start_date = Column(DateTime, nullable=True)
     end_date = Column(DateTime, nullable=True)
     
-    # 統計資訊
+    # 統計資訊（由 test_run_items 的 trigger 於同一交易中增量維護，見 RUN_COUNTER_TRIGGERS）
     total_test_cases = Column(Integer, default=0)
     executed_cases = Column(Integer, default=0)
     passed_cases = Column(Integer, default=0)
     failed_cases = Column(Integer, default=0)
+    retest_cases = Column(Integer, nullable=False, default=0, server_default="0")
+    not_available_cases = Column(Integer, nullable=False, default=0, server_default="0")
+    unique_bug_tickets = Column(Integer, nullable=False, default=0, server_default="0")
     
     # 系統欄位
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -396,6 +400,149 @@ TestRunItem.expected_result = column_property(
 )
 
 
+class AttachmentIndex(Base):
+    """本地附件路徑索引表
+
+    以 stored_name（即前端使用的 file_token）對應到 attachments 根目錄下的相對路徑，
+    讓下載代理以單次索引查詢定位檔案，而非每次掃描整個附件目錄。
+    """
+    __tablename__ = "attachment_index"
+
+    id = Column(Integer, primary_key=True)
+    stored_name = Column(String(255), nullable=False, index=True)
+    relative_path = Column(String(1024), nullable=False, unique=True)
+
+    # 檔案屬性
+    size = Column(Integer, default=0, nullable=False)
+    mime_type = Column(String(255), nullable=True)
+    sha256 = Column(String(64), nullable=True, index=True)
+    file_mtime = Column(Float, nullable=True)  # 檔案修改時間（epoch 秒）
+
+    # 系統欄位
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ScheduledTaskState(Base):
+    """定時任務執行狀態表
+
+    保存各定時任務的上次/下次執行時間與最近結果，讓服務重啟後依原排程續跑，
+    不會在啟動時重新執行所有任務。
+    """
+    __tablename__ = "scheduled_task_state"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False, unique=True)
+    schedule = Column(String(100), nullable=True)  # cron 表達式或 interval:<秒數>
+
+    last_run_at = Column(DateTime, nullable=True)
+    next_run_at = Column(DateTime, nullable=True)
+    last_status = Column(String(20), nullable=True)  # success, failed, timeout
+    last_duration_seconds = Column(Float, nullable=True)
+    last_error = Column(Text, nullable=True)
+    run_count = Column(Integer, default=0, nullable=False)
+    error_count = Column(Integer, default=0, nullable=False)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class TestRunBugTicketRef(Base):
+    """Test Run 的 Bug ticket 參照計數
+
+    每個配置內每個 ticket（大寫）一筆，item_count 為引用該 ticket 的項目數，由 trigger 維護；
+    新增/刪除列時同步增減 test_run_configs.unique_bug_tickets。
+    """
+    __tablename__ = "test_run_bug_tickets"
+
+    config_id = Column(Integer, primary_key=True)
+    ticket_number = Column(String(100), primary_key=True)
+    item_count = Column(Integer, nullable=False, default=0)
+
+
+class DataVersion(Base):
+    """資料版本計數器
+
+    每個範圍（scope, scope_id）一筆單調遞增的版本號，由 SQLite trigger 於資料異動時遞增，
+    涵蓋 ORM、批次 SQL 與同步匯入等所有寫入路徑：
+    - team_test_cases / team_id：test_cases 新增、修改、刪除
+    - config_items / config_id：test_run_items 新增、修改、刪除
+    列表 API 以版本號產生 ETag，資料未變動時直接回 304。
+    """
+    __tablename__ = "data_versions"
+
+    scope = Column(String(50), primary_key=True)
+    scope_id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class TestCaseChange(Base):
+    """測試案例變更紀錄（差異同步用）
+
+    由 test_cases 的 SQLite trigger 寫入，每筆異動記錄當下的團隊資料版本：
+    - upsert：新增或修改（含移入本團隊）
+    - delete：刪除、改編號（舊編號）或移出本團隊
+    不設外鍵，刪除後仍保留紀錄；compact_test_case_changes 定期清理被取代的紀錄與過期的刪除紀錄。
+    """
+    __tablename__ = "test_case_changes"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    team_id = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False)
+    test_case_id = Column(Integer, nullable=False)
+    test_case_number = Column(String(100), nullable=False)
+    op = Column(String(10), nullable=False)
+    changed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('ix_test_case_changes_team_version', 'team_id', 'version'),
+        Index('ix_test_case_changes_team_number', 'team_id', 'test_case_number'),
+    )
+
+
+class LiveEventRecord(Base):
+    """跨 worker 傳遞的即時事件（SQLite 後端，見 app.services.live_events）
+
+    僅作為短期傳輸管道，超過保留時間的紀錄會定期刪除。
+    """
+    __tablename__ = "live_events"
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = Column(Integer, primary_key=True)
+    channel = Column(String(100), nullable=False)
+    event = Column(String(50), nullable=False)
+    payload = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+class WorkerLease(Base):
+    """多 worker 之間的租約（例如定時任務調度器的 leader，見 app.services.worker_coordination）
+
+    持有者需在 expires_at 前續約；過期後其他 worker 可接手。時間為 UNIX 秒數，避免時區差異。
+    """
+    __tablename__ = "worker_leases"
+
+    name = Column(String(100), primary_key=True)
+    owner = Column(String(255), nullable=False)
+    acquired_at = Column(Float, nullable=False)
+    expires_at = Column(Float, nullable=False)
+
+
+class CacheInvalidation(Base):
+    """跨 worker 的快取失效訊息（各 worker 輪詢後清除本行程內的對應快取）
+
+    僅作為短期傳輸管道，超過保留時間的紀錄會定期刪除。
+    """
+    __tablename__ = "cache_invalidations"
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = Column(Integer, primary_key=True)
+    topic = Column(String(100), nullable=False)
+    key = Column(String(255), nullable=True)
+    origin = Column(String(255), nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
 class LarkUser(Base):
     """Lark 用戶信息表"""
     __tablename__ = "lark_users"
@@ -655,5 +802,224 @@ class PasswordResetToken(Base):
     )
 
 
+class LoginChallenge(Base):
+    """登入 challenge 暫存表（challenge-response 登入）
+
+    /auth/challenge 與 /auth/login 可能由不同 worker 處理，challenge 需存於共用資料庫；
+    每個識別一筆，重新索取時覆寫，驗證成功即刪除（一次性使用）。
+    """
+    __tablename__ = "login_challenges"
+
+    identifier = Column(String(255), primary_key=True)  # username 或 email
+    challenge = Column(String(128), nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
 # 建立資料庫表格的函數
 logger = logging.getLogger(__name__)
+
+
+# ===================== 資料版本 trigger =====================
+
+DATA_VERSION_SCOPE_TEST_CASES = "team_test_cases"
+DATA_VERSION_SCOPE_ITEMS = "config_items"
+
+
+def _bump_version_sql(scope: str, ref: str, when: str = "") -> str:
+    """遞增版本號；指定 when 時僅於條件成立時遞增（trigger 內以 INSERT ... SELECT ... WHERE 表達條件）"""
+    if when:
+        source = f"SELECT '{scope}', {ref}, 1, CURRENT_TIMESTAMP WHERE {when} "
+    else:
+        source = f"VALUES ('{scope}', {ref}, 1, CURRENT_TIMESTAMP) "
+    return (
+        "INSERT INTO data_versions (scope, scope_id, version, updated_at) "
+        f"{source}"
+        "ON CONFLICT (scope, scope_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;"
+    )
+
+
+def _version_triggers(table: str, key: str, scope: str) -> list:
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_version_insert AFTER INSERT ON {table} "
+        f"BEGIN {_bump_version_sql(scope, f'NEW.{key}')} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_version_update AFTER UPDATE ON {table} "
+        f"BEGIN {_bump_version_sql(scope, f'OLD.{key}')} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_version_move AFTER UPDATE OF {key} ON {table} "
+        f"WHEN NEW.{key} IS NOT OLD.{key} BEGIN {_bump_version_sql(scope, f'NEW.{key}')} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_version_delete AFTER DELETE ON {table} "
+        f"BEGIN {_bump_version_sql(scope, f'OLD.{key}')} END",
+    ]
+
+
+def _log_test_case_change_sql(row: str, op: str, when: str = "") -> str:
+    """寫入 test_case_changes；版本取自同一 trigger 中剛遞增的團隊版本"""
+    version = (
+        f"(SELECT version FROM data_versions WHERE scope = '{DATA_VERSION_SCOPE_TEST_CASES}' "
+        f"AND scope_id = {row}.team_id)"
+    )
+    return (
+        "INSERT INTO test_case_changes (team_id, version, test_case_id, test_case_number, op, changed_at) "
+        f"SELECT {row}.team_id, {version}, {row}.id, {row}.test_case_number, '{op}', CURRENT_TIMESTAMP"
+        f"{f' WHERE {when}' if when else ''};"
+    )
+
+
+def _test_case_change_triggers() -> list:
+    """test_cases 的版本遞增 + 變更紀錄 trigger（取代早期只遞增版本的 trg_test_cases_version_*）"""
+    scope = DATA_VERSION_SCOPE_TEST_CASES
+    moved = "NEW.team_id IS NOT OLD.team_id"
+    renamed_or_moved = f"{moved} OR NEW.test_case_number IS NOT OLD.test_case_number"
+    return [
+        *(f"DROP TRIGGER IF EXISTS trg_test_cases_version_{name}" for name in ("insert", "update", "move", "delete")),
+        "CREATE TRIGGER IF NOT EXISTS trg_test_cases_change_insert AFTER INSERT ON test_cases "
+        f"BEGIN {_bump_version_sql(scope, 'NEW.team_id')} {_log_test_case_change_sql('NEW', 'upsert')} END",
+        # 改編號或換團隊時，舊編號於原團隊視為刪除
+        "CREATE TRIGGER IF NOT EXISTS trg_test_cases_change_update AFTER UPDATE ON test_cases "
+        f"BEGIN {_bump_version_sql(scope, 'OLD.team_id')} "
+        f"{_log_test_case_change_sql('OLD', 'delete', renamed_or_moved)} "
+        f"{_bump_version_sql(scope, 'NEW.team_id', moved)} "
+        f"{_log_test_case_change_sql('NEW', 'upsert')} END",
+        "CREATE TRIGGER IF NOT EXISTS trg_test_cases_change_delete AFTER DELETE ON test_cases "
+        f"BEGIN {_bump_version_sql(scope, 'OLD.team_id')} {_log_test_case_change_sql('OLD', 'delete')} END",
+    ]
+
+
+# 以資料表分組的 trigger DDL（ensure_data_version_triggers 亦用於既有資料庫補建）
+DATA_VERSION_TRIGGERS = {
+    "test_cases": _test_case_change_triggers(),
+    "test_run_items": _version_triggers("test_run_items", "config_id", DATA_VERSION_SCOPE_ITEMS),
+}
+
+# 各團隊變更紀錄的最低可用版本；since 低於此值的用戶端需重新載入
+DATA_VERSION_SCOPE_TEST_CASE_CHANGES_FLOOR = "team_test_case_changes_floor"
+
+
+# ===================== Test Run 統計計數 trigger =====================
+
+# test_result 以 Enum 名稱儲存；批次 SQL 可能寫入值，兩者皆視為同一狀態
+_RESULT_COUNTER_COLUMNS = {
+    "passed_cases": TestResultStatus.PASSED,
+    "failed_cases": TestResultStatus.FAILED,
+    "retest_cases": TestResultStatus.RETEST,
+    "not_available_cases": TestResultStatus.NOT_AVAILABLE,
+}
+
+
+def _result_in_sql(expr: str, status: TestResultStatus) -> str:
+    return f"{expr} IN ('{status.name}', '{status.value}')"
+
+
+def _apply_item_counts_sql(row: str, sign: str) -> str:
+    """把單一項目（NEW / OLD）的貢獻以 sign（+ / -）套用到所屬配置的計數"""
+    assignments = [f"total_test_cases = COALESCE(total_test_cases, 0) {sign} 1",
+                   f"executed_cases = COALESCE(executed_cases, 0) {sign} ({row}.test_result IS NOT NULL)"]
+    for column, status in _RESULT_COUNTER_COLUMNS.items():
+        flag = f"(CASE WHEN {_result_in_sql(f'{row}.test_result', status)} THEN 1 ELSE 0 END)"
+        assignments.append(f"{column} = COALESCE({column}, 0) {sign} {flag}")
+    return f"UPDATE test_run_configs SET {', '.join(assignments)} WHERE id = {row}.config_id;"
+
+
+def _item_ticket_numbers_sql(row: str) -> str:
+    """項目 bug_tickets_json 中的 ticket 編號（大寫去重；非 JSON 陣列或缺 ticket_number 的元素忽略）"""
+    tickets = f"{row}.bug_tickets_json"
+    return (
+        "SELECT DISTINCT upper(json_extract(j.value, '$.ticket_number')) AS ticket_number "
+        f"FROM json_each(CASE WHEN json_valid({tickets}) THEN "
+        f"CASE WHEN json_type({tickets}) = 'array' THEN {tickets} END END) AS j "
+        "WHERE j.type = 'object' AND json_type(j.value, '$.ticket_number') = 'text'"
+    )
+
+
+def _add_ticket_refs_sql(row: str) -> str:
+    return (
+        "INSERT INTO test_run_bug_tickets (config_id, ticket_number, item_count) "
+        f"SELECT {row}.config_id, t.ticket_number, 1 FROM ({_item_ticket_numbers_sql(row)}) AS t WHERE true "
+        "ON CONFLICT (config_id, ticket_number) DO UPDATE SET item_count = item_count + 1;"
+    )
+
+
+def _remove_ticket_refs_sql(row: str) -> str:
+    return (
+        "UPDATE test_run_bug_tickets SET item_count = item_count - 1 "
+        f"WHERE config_id = {row}.config_id AND ticket_number IN ({_item_ticket_numbers_sql(row)}); "
+        f"DELETE FROM test_run_bug_tickets WHERE config_id = {row}.config_id AND item_count <= 0;"
+    )
+
+
+def _run_counter_triggers() -> list:
+    moved = "NEW.config_id IS NOT OLD.config_id"
+    return [
+        "CREATE TRIGGER IF NOT EXISTS trg_test_run_items_counts_insert AFTER INSERT ON test_run_items "
+        f"BEGIN {_apply_item_counts_sql('NEW', '+')} {_add_ticket_refs_sql('NEW')} END",
+        "CREATE TRIGGER IF NOT EXISTS trg_test_run_items_counts_delete AFTER DELETE ON test_run_items "
+        f"BEGIN {_apply_item_counts_sql('OLD', '-')} {_remove_ticket_refs_sql('OLD')} END",
+        "CREATE TRIGGER IF NOT EXISTS trg_test_run_items_counts_update AFTER UPDATE OF test_result, config_id "
+        f"ON test_run_items WHEN NEW.test_result IS NOT OLD.test_result OR {moved} "
+        f"BEGIN {_apply_item_counts_sql('OLD', '-')} {_apply_item_counts_sql('NEW', '+')} END",
+        # 先加後減：新舊皆有的 ticket 計數不變，不會先刪再建
+        "CREATE TRIGGER IF NOT EXISTS trg_test_run_items_bug_tickets_update AFTER UPDATE OF bug_tickets_json, config_id "
+        f"ON test_run_items WHEN NEW.bug_tickets_json IS NOT OLD.bug_tickets_json OR {moved} "
+        f"BEGIN {_add_ticket_refs_sql('NEW')} {_remove_ticket_refs_sql('OLD')} END",
+        "CREATE TRIGGER IF NOT EXISTS trg_test_run_bug_tickets_insert AFTER INSERT ON test_run_bug_tickets "
+        "BEGIN UPDATE test_run_configs SET unique_bug_tickets = COALESCE(unique_bug_tickets, 0) + 1 "
+        "WHERE id = NEW.config_id; END",
+        "CREATE TRIGGER IF NOT EXISTS trg_test_run_bug_tickets_delete AFTER DELETE ON test_run_bug_tickets "
+        "BEGIN UPDATE test_run_configs SET unique_bug_tickets = COALESCE(unique_bug_tickets, 0) - 1 "
+        "WHERE id = OLD.config_id; END",
+        "CREATE TRIGGER IF NOT EXISTS trg_test_run_configs_bug_tickets_delete AFTER DELETE ON test_run_configs "
+        "BEGIN DELETE FROM test_run_bug_tickets WHERE config_id = OLD.id; END",
+    ]
+
+
+# test_run_configs 的統計欄位由以下 trigger 維護，涵蓋 ORM、批次 update()/delete() 與原生 SQL；
+# 既有資料庫由 run_counter_service.ensure_run_counters 補欄位、建 trigger 並重算
+RUN_COUNTER_TRIGGERS = _run_counter_triggers()
+
+
+def _create_run_counter_triggers(target, connection, **kw):
+    """test_run_items 建表後建立統計 trigger（只建部分表、缺少 test_run_configs 時略過）"""
+    if connection.dialect.name != "sqlite" or not connection.dialect.has_table(connection, "test_run_configs"):
+        return
+    TestRunBugTicketRef.__table__.create(bind=connection, checkfirst=True)
+    for statement in RUN_COUNTER_TRIGGERS:
+        connection.exec_driver_sql(statement)
+
+
+def _create_data_version_triggers(target, connection, **kw):
+    """建表後一併建立 trigger；data_versions 表不存在時先建立（只建部分表時 trigger 仍可運作）"""
+    if connection.dialect.name != "sqlite":
+        return
+    DataVersion.__table__.create(bind=connection, checkfirst=True)
+    if target.name == "test_cases":
+        TestCaseChange.__table__.create(bind=connection, checkfirst=True)
+    for statement in DATA_VERSION_TRIGGERS[target.name]:
+        connection.exec_driver_sql(statement)
+
+
+def _init_test_case_change_floor(target, connection, **kw):
+    """既有資料庫新建變更紀錄表時，既有案例沒有紀錄：
+    遞增有案例之團隊的版本並把下限設為目前版本，舊版本的用戶端會收到 resync_required
+    """
+    if connection.dialect.name != "sqlite":
+        return
+    DataVersion.__table__.create(bind=connection, checkfirst=True)
+    if not connection.dialect.has_table(connection, "test_cases"):
+        return
+    scope = DATA_VERSION_SCOPE_TEST_CASES
+    connection.exec_driver_sql(
+        "INSERT INTO data_versions (scope, scope_id, version, updated_at) "
+        f"SELECT DISTINCT '{scope}', team_id, 1, CURRENT_TIMESTAMP FROM test_cases WHERE true "
+        "ON CONFLICT (scope, scope_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP"
+    )
+    connection.exec_driver_sql(
+        "INSERT OR REPLACE INTO data_versions (scope, scope_id, version, updated_at) "
+        f"SELECT '{DATA_VERSION_SCOPE_TEST_CASE_CHANGES_FLOOR}', scope_id, version, CURRENT_TIMESTAMP "
+        f"FROM data_versions WHERE scope = '{scope}' "
+        "AND scope_id IN (SELECT DISTINCT team_id FROM test_cases)"
+    )
+
+
+event.listen(TestCaseLocal.__table__, "after_create", _create_data_version_triggers)
+event.listen(TestRunItem.__table__, "after_create", _create_data_version_triggers)
+event.listen(TestRunItem.__table__, "after_create", _create_run_counter_triggers)
+event.listen(TestCaseChange.__table__, "after_create", _init_test_case_change_floor)
@@ -45,6 +45,7 @@ class LarkAttachment(BaseModel):
     type: str = Field(..., description="MIME 類型")
     url: str = Field(..., description="下載 URL")
     tmp_url: Optional[str] = Field(None, description="臨時下載 URL")
+    thumbnail_url: Optional[str] = Field(None, description="縮圖 URL（僅本地圖片附件）")
     
     model_config = ConfigDict(
         json_schema_extra={
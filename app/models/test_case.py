@@ -405,6 +405,23 @@ class TestCaseBatchResponse(BaseModel):
     error_messages: List[str] = Field([], description="錯誤訊息列表")
 
 
+class TestCaseDeletedRef(BaseModel):
+    """差異同步中已刪除（或改號、移出團隊）的測試案例"""
+    test_case_number: str = Field(..., description="測試案例編號")
+    test_case_id: int = Field(..., description="本地測試案例 ID")
+
+
+class TestCaseChangesResponse(BaseModel):
+    """測試案例差異同步回應模型"""
+    team_id: int = Field(..., description="團隊 ID")
+    since: int = Field(..., description="請求的起始版本")
+    version: int = Field(..., description="本次同步後的版本（下一次的 since）")
+    has_more: bool = Field(False, description="是否尚有後續變更")
+    resync_required: bool = Field(False, description="watermark 已過期，需重新載入全部資料")
+    upserted: List[TestCaseResponse] = Field([], description="新增或修改的測試案例")
+    deleted: List[TestCaseDeletedRef] = Field([], description="已刪除的測試案例")
+
+
 # 欄位映射類別
 class TestCaseFieldMapping:
     """測試案例欄位映射定義"""
@@ -45,6 +45,9 @@ class TestRunConfig(BaseModel):
     executed_cases: int = Field(0, description="已執行案例數")
     passed_cases: int = Field(0, description="通過案例數")
     failed_cases: int = Field(0, description="失敗案例數")
+    retest_cases: int = Field(0, description="重測案例數")
+    not_available_cases: int = Field(0, description="不適用案例數")
+    unique_bug_tickets: int = Field(0, description="不重複 Bug ticket 數")
     
     # 通知設定
     notifications_enabled: bool = Field(False, description="是否啟用通知")
@@ -376,6 +379,11 @@ class TestRunConfigSummary(BaseModel):
     pass_rate: float = Field(..., description="通過率")
     total_test_cases: int = Field(..., description="總案例數")
     executed_cases: int = Field(..., description="已執行案例數")
+    passed_cases: int = Field(0, description="通過案例數")
+    failed_cases: int = Field(0, description="失敗案例數")
+    retest_cases: int = Field(0, description="重測案例數")
+    not_available_cases: int = Field(0, description="不適用案例數")
+    unique_bug_tickets: int = Field(0, description="不重複 Bug ticket 數")
     start_date: Optional[datetime] = Field(None, description="開始日期")
     end_date: Optional[datetime] = Field(None, description="結束日期")
     created_at: datetime = Field(..., description="建立時間")
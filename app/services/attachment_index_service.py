@@ -0,0 +1,223 @@
+"""
+本地附件索引服務
+
+維護 attachment_index 表格：將 stored_name（file_token）對應到 attachments 根目錄下
+的相對路徑、大小、MIME 與雜湊值。
+
+- 所有本地上傳路徑在寫檔後呼叫 index_file / index_content 登錄
+- 刪除與搬移（staging → test-cases）時同步更新索引
+- 下載代理以 find_by_token 單次索引查詢定位檔案，取代 rglob 全目錄掃描
+- scripts/build_attachment_index.py 可一次性掃描既有檔案重建索引
+"""
+
+import hashlib
+import logging
+import mimetypes
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.database_models import AttachmentIndex
+from app.services.thumbnail_service import THUMB_DIR_NAME
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def get_attachments_root() -> Path:
+    """取得附件根目錄（未設定則回退至專案內 attachments 目錄）"""
+    cfg = getattr(settings, 'attachments', None)
+    root_dir = getattr(cfg, 'root_dir', '') if cfg else ''
+    return Path(root_dir) if root_dir else (PROJECT_ROOT / "attachments")
+
+
+def _relative_key(root_dir: Path, path: Path) -> Optional[str]:
+    """將絕對路徑轉為索引使用的相對路徑（POSIX 格式），不在根目錄下則回傳 None"""
+    try:
+        return Path(path).relative_to(root_dir).as_posix()
+    except ValueError:
+        return None
+
+
+def sha256_bytes(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _upsert(db: Session, rel: str, stored_name: str, size: int,
+            mime_type: Optional[str], sha256: Optional[str],
+            file_mtime: Optional[float]) -> AttachmentIndex:
+    row = db.query(AttachmentIndex).filter(AttachmentIndex.relative_path == rel).first()
+    if row is None:
+        row = AttachmentIndex(relative_path=rel)
+        db.add(row)
+    row.stored_name = stored_name
+    row.size = size
+    row.mime_type = mime_type
+    row.sha256 = sha256
+    row.file_mtime = file_mtime
+    return row
+
+
+def index_content(db: Session, root_dir: Path, stored_path: Path, content: bytes,
+                  mime_type: Optional[str] = None) -> Optional[AttachmentIndex]:
+    """登錄剛寫入的檔案（已持有內容時使用，避免再次讀檔計算雜湊）
+
+    只加入 session，不 commit；由呼叫端與其他變更一起提交。
+    """
+    rel = _relative_key(root_dir, stored_path)
+    if rel is None:
+        return None
+    try:
+        mtime = stored_path.stat().st_mtime
+    except OSError:
+        mtime = None
+    return _upsert(
+        db, rel, stored_path.name, len(content),
+        mime_type or mimetypes.guess_type(stored_path.name)[0],
+        sha256_bytes(content), mtime,
+    )
+
+
+def index_file(db: Session, root_dir: Path, stored_path: Path,
+               mime_type: Optional[str] = None) -> Optional[AttachmentIndex]:
+    """讀取磁碟上的檔案並登錄索引（用於搬移後或批次重建）"""
+    rel = _relative_key(root_dir, stored_path)
+    if rel is None or not stored_path.is_file():
+        return None
+    st = stored_path.stat()
+    return _upsert(
+        db, rel, stored_path.name, st.st_size,
+        mime_type or mimetypes.guess_type(stored_path.name)[0],
+        sha256_file(stored_path), st.st_mtime,
+    )
+
+
+def move_entry(db: Session, root_dir: Path, src: Path, dest: Path) -> Optional[AttachmentIndex]:
+    """檔案搬移後更新索引的相對路徑（例如 staging → test-cases）"""
+    src_rel = _relative_key(root_dir, src)
+    dest_rel = _relative_key(root_dir, dest)
+    if dest_rel is None:
+        return None
+    row = None
+    if src_rel is not None:
+        row = db.query(AttachmentIndex).filter(AttachmentIndex.relative_path == src_rel).first()
+    if row is None:
+        return index_file(db, root_dir, dest)
+    # 若目的地已有舊條目，先移除以維持唯一性
+    db.query(AttachmentIndex).filter(
+        AttachmentIndex.relative_path == dest_rel,
+        AttachmentIndex.id != row.id,
+    ).delete(synchronize_session=False)
+    row.relative_path = dest_rel
+    row.stored_name = dest.name
+    try:
+        row.file_mtime = dest.stat().st_mtime
+    except OSError:
+        pass
+    return row
+
+
+def remove_path(db: Session, root_dir: Path, path: Path) -> int:
+    """移除單一檔案的索引條目"""
+    rel = _relative_key(root_dir, path)
+    if rel is None:
+        return 0
+    return db.query(AttachmentIndex).filter(
+        AttachmentIndex.relative_path == rel
+    ).delete(synchronize_session=False)
+
+
+def remove_prefix(db: Session, root_dir: Path, directory: Path) -> int:
+    """移除某目錄下所有檔案的索引條目（例如刪除整個測試案例附件目錄）"""
+    rel = _relative_key(root_dir, directory)
+    if not rel or rel == ".":
+        return 0
+    return db.query(AttachmentIndex).filter(
+        AttachmentIndex.relative_path.startswith(rel.rstrip("/") + "/", autoescape=True)
+    ).delete(synchronize_session=False)
+
+
+def find_by_token(db: Session, file_token: str) -> Optional[AttachmentIndex]:
+    """以 stored_name 查找索引條目（單次索引查詢）"""
+    if not file_token:
+        return None
+    return (
+        db.query(AttachmentIndex)
+        .filter(AttachmentIndex.stored_name == file_token)
+        .order_by(AttachmentIndex.id.desc())
+        .first()
+    )
+
+
+def find_by_relative_path(db: Session, relative_path: str) -> Optional[AttachmentIndex]:
+    """以相對路徑查找索引條目（用於 /attachments/... 形式的 file_url）"""
+    if not relative_path:
+        return None
+    return db.query(AttachmentIndex).filter(
+        AttachmentIndex.relative_path == relative_path.lstrip("/")
+    ).first()
+
+
+def rebuild_index(db: Session, root_dir: Optional[Path] = None,
+                  prune: bool = True, batch_size: int = 500) -> Dict[str, Any]:
+    """掃描附件目錄重建索引
+
+    - 新檔案或大小/修改時間變動的檔案重新計算雜湊
+    - prune=True 時移除磁碟上已不存在的條目
+    """
+    root_dir = root_dir or get_attachments_root()
+    stats = {"scanned": 0, "indexed": 0, "unchanged": 0, "pruned": 0}
+    if not root_dir.exists():
+        return stats
+
+    known = {
+        row.relative_path: (row.size, row.file_mtime)
+        for row in db.query(
+            AttachmentIndex.relative_path, AttachmentIndex.size, AttachmentIndex.file_mtime
+        )
+    }
+    seen = set()
+    pending = 0
+    for p in root_dir.rglob('*'):
+        if not p.is_file() or THUMB_DIR_NAME in p.parts:
+            continue
+        rel = _relative_key(root_dir, p)
+        if rel is None:
+            continue
+        stats["scanned"] += 1
+        seen.add(rel)
+        st = p.stat()
+        if known.get(rel) == (st.st_size, st.st_mtime):
+            stats["unchanged"] += 1
+            continue
+        index_file(db, root_dir, p)
+        stats["indexed"] += 1
+        pending += 1
+        if pending >= batch_size:
+            db.commit()
+            pending = 0
+
+    if prune:
+        stale = [rel for rel in known if rel not in seen]
+        for i in range(0, len(stale), batch_size):
+            chunk = stale[i:i + batch_size]
+            stats["pruned"] += db.query(AttachmentIndex).filter(
+                AttachmentIndex.relative_path.in_(chunk)
+            ).delete(synchronize_session=False)
+
+    db.commit()
+    logger.info(f"附件索引重建完成: {stats}")
+    return stats
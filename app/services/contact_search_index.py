@@ -0,0 +1,333 @@
+"""
+聯絡人搜尋索引
+
+取代逐鍵掃描與資料庫 LIKE 查詢，提供聯絡人/指派人自動完成使用的記憶體索引：
+
+- 以 name、en_name、email 建立索引（NFKC + casefold 正規化，CJK 與拉丁字母皆適用）
+- 排名分層：完全相符 > 欄位前綴 > 詞首前綴 > 中段包含
+  - 欄位前綴與詞首前綴以排序陣列 + bisect 查詢，依字母序取前 N 筆即可停止
+  - 中段包含以 n-gram 倒排表取候選後再驗證：
+    長度 >= 3 的查詢使用 trigram；含非 ASCII（CJK）的 1~2 字查詢使用 unigram/bigram
+    （拉丁字母 1~2 字的查詢只做前綴比對，避免候選過多）
+- 增量更新：異動的聯絡人改用新的內部 ID 重新寫入，舊 ID 標記失效（查詢時略過），
+  失效比例過高時自動整體重建
+- 多 worker：組織同步只在執行同步的行程內更新索引，並廣播 contacts 失效訊息，
+  其他已載入索引的 worker 收到後自行由資料庫增量更新
+"""
+
+import bisect
+import logging
+import re
+import threading
+import unicodedata
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.services.worker_coordination import TOPIC_CONTACTS, get_invalidation_bus
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FIELDS = ("name", "en_name", "email")
+# 失效文件超過此比例時整體重建
+COMPACT_DEAD_RATIO = 0.25
+
+_TOKEN_SPLIT = re.compile(r"[^\w]+")
+
+
+def normalize(text: Optional[str]) -> str:
+    """搜尋用正規化：NFKC（全形轉半形等）+ casefold"""
+    if not text:
+        return ""
+    return unicodedata.normalize("NFKC", str(text)).casefold().strip()
+
+
+def _grams(text: str) -> Iterable[str]:
+    """欄位的 n-gram：所有 trigram，以及含非 ASCII 字元的 unigram/bigram"""
+    for i in range(len(text)):
+        unigram = text[i]
+        if not unigram.isascii():
+            yield unigram
+        bigram = text[i:i + 2]
+        if len(bigram) == 2 and not bigram.isascii():
+            yield bigram
+        trigram = text[i:i + 3]
+        if len(trigram) == 3:
+            yield trigram
+
+
+class _Doc:
+    __slots__ = ("doc_id", "values", "haystack", "payload", "alive")
+
+    def __init__(self, doc_id: str, values: Tuple[str, ...], payload: Any):
+        self.doc_id = doc_id
+        self.values = values
+        # 以 \x00 分隔各欄位，避免跨欄位誤配
+        self.haystack = "\x00".join(values)
+        self.payload = payload
+        self.alive = True
+
+
+class ContactSearchIndex:
+    """聯絡人 n-gram 搜尋索引（執行緒安全）"""
+
+    def __init__(self, fields: Sequence[str] = DEFAULT_FIELDS):
+        self.fields = tuple(fields)
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._docs: List[_Doc] = []
+        self._by_id: Dict[str, int] = {}
+        self._exact: Dict[str, List[int]] = {}
+        self._field_prefix: List[Tuple[str, int]] = []
+        self._token_prefix: List[Tuple[str, int]] = []
+        self._postings: Dict[str, List[int]] = {}
+        self._dead = 0
+        self.loaded = False
+
+    # ---------------- 建立與更新 ----------------
+
+    def _keys_for(self, values: Tuple[str, ...]) -> Tuple[set, set, set]:
+        exact, field_keys, tokens = set(), set(), set()
+        for value in values:
+            if not value:
+                continue
+            exact.add(value)
+            field_keys.add(value)
+            if "@" in value:
+                local = value.split("@", 1)[0]
+                exact.add(local)
+                field_keys.add(local)
+            tokens.update(t for t in _TOKEN_SPLIT.split(value) if t)
+        return exact, field_keys, tokens
+
+    def _values_for(self, record: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(normalize(record.get(field)) for field in self.fields)
+
+    def _add(self, doc_id: str, record: Dict[str, Any], payload: Any, sort_in_place: bool) -> None:
+        values = self._values_for(record)
+        internal_id = len(self._docs)
+        self._docs.append(_Doc(doc_id, values, payload))
+        self._by_id[doc_id] = internal_id
+
+        exact, field_keys, tokens = self._keys_for(values)
+        for key in exact:
+            self._exact.setdefault(key, []).append(internal_id)
+        if sort_in_place:
+            for key in field_keys:
+                bisect.insort(self._field_prefix, (key, internal_id))
+            for token in tokens:
+                bisect.insort(self._token_prefix, (token, internal_id))
+        else:
+            self._field_prefix.extend((key, internal_id) for key in field_keys)
+            self._token_prefix.extend((token, internal_id) for token in tokens)
+
+        grams = set()
+        for value in values:
+            grams.update(_grams(value))
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(internal_id)
+
+    def _remove(self, doc_id: str) -> None:
+        internal_id = self._by_id.pop(doc_id, None)
+        if internal_id is not None:
+            self._docs[internal_id].alive = False
+            self._dead += 1
+
+    def rebuild(self, records: Iterable[Dict[str, Any]],
+                id_key: str = "id", payload: Optional[Callable[[Dict[str, Any]], Any]] = None) -> int:
+        """以完整資料重建索引；payload 決定查詢回傳的內容（預設為 record 本身）"""
+        # 依顯示名稱排序後依序編號，讓倒排表的順序即為字母序
+        items = []
+        for record in records:
+            doc_id = record.get(id_key)
+            if doc_id:
+                items.append((normalize(record.get(self.fields[0])) or normalize(record.get(self.fields[-1])),
+                              doc_id, record))
+        items.sort(key=lambda item: (item[0], item[1]))
+
+        with self._lock:
+            self._reset()
+            for _key, doc_id, record in items:
+                self._add(doc_id, record, payload(record) if payload else record, sort_in_place=False)
+            self._field_prefix.sort()
+            self._token_prefix.sort()
+            self.loaded = True
+            return len(self._by_id)
+
+    def update(self, records: Iterable[Dict[str, Any]],
+               id_key: str = "id", payload: Optional[Callable[[Dict[str, Any]], Any]] = None) -> Dict[str, int]:
+        """以完整的最新資料增量更新：只重寫內容有變的聯絡人，移除已不存在者"""
+        records = list(records)
+        with self._lock:
+            if not self.loaded:
+                total = self.rebuild(records, id_key, payload)
+                return {"added": total, "updated": 0, "removed": 0, "rebuilt": 1}
+
+            seen = set()
+            added = updated = 0
+            for record in records:
+                doc_id = record.get(id_key)
+                if not doc_id:
+                    continue
+                seen.add(doc_id)
+                new_payload = payload(record) if payload else record
+                internal_id = self._by_id.get(doc_id)
+                if internal_id is not None:
+                    # payload 不一定包含所有索引欄位（例如 en_name），需同時比對索引值
+                    doc = self._docs[internal_id]
+                    if doc.payload == new_payload and doc.values == self._values_for(record):
+                        continue
+                    self._remove(doc_id)
+                    updated += 1
+                else:
+                    added += 1
+                self._add(doc_id, record, new_payload, sort_in_place=True)
+
+            removed_ids = [doc_id for doc_id in self._by_id if doc_id not in seen]
+            for doc_id in removed_ids:
+                self._remove(doc_id)
+
+            rebuilt = 0
+            if self._docs and self._dead / len(self._docs) > COMPACT_DEAD_RATIO:
+                self.rebuild(records, id_key, payload)
+                rebuilt = 1
+            return {"added": added, "updated": updated, "removed": len(removed_ids), "rebuilt": rebuilt}
+
+    # ---------------- 查詢 ----------------
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def get(self, doc_id: str) -> Optional[Any]:
+        internal_id = self._by_id.get(doc_id)
+        return self._docs[internal_id].payload if internal_id is not None else None
+
+    def _prefix_scan(self, entries: List[Tuple[str, int]], prefix: str):
+        start = bisect.bisect_left(entries, (prefix, -1))
+        for i in range(start, len(entries)):
+            key, internal_id = entries[i]
+            if not key.startswith(prefix):
+                break
+            yield internal_id
+
+    def _infix_candidates(self, query: str) -> List[int]:
+        if len(query) >= 3:
+            grams = {query[i:i + 3] for i in range(len(query) - 2)}
+        elif not query.isascii():
+            grams = {query}
+        else:
+            return []
+        postings = []
+        for gram in grams:
+            posting = self._postings.get(gram)
+            if not posting:
+                return []
+            postings.append(posting)
+        return min(postings, key=len)
+
+    def search(self, query: str, limit: int = 10) -> List[Any]:
+        """依排名分層回傳最多 limit 筆 payload"""
+        q = normalize(query)
+        if not q or limit <= 0:
+            return []
+
+        results: List[Any] = []
+        seen = set()
+        docs = self._docs
+
+        def take(internal_ids: Iterable[int], verify: bool = False) -> bool:
+            for internal_id in internal_ids:
+                if internal_id in seen:
+                    continue
+                doc = docs[internal_id]
+                if not doc.alive or (verify and q not in doc.haystack):
+                    continue
+                seen.add(internal_id)
+                results.append(doc.payload)
+                if len(results) >= limit:
+                    return True
+            return False
+
+        with self._lock:
+            if take(self._exact.get(q, ())):
+                return results
+            if take(self._prefix_scan(self._field_prefix, q)):
+                return results
+            if take(self._prefix_scan(self._token_prefix, q)):
+                return results
+            take(self._infix_candidates(q), verify=True)
+        return results
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "documents": len(self._by_id),
+                "dead_documents": self._dead,
+                "grams": len(self._postings),
+                "prefix_entries": len(self._field_prefix) + len(self._token_prefix),
+            }
+
+
+# ---------------- Lark 用戶（lark_users）索引 ----------------
+
+def _lark_user_payload(record: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'id': record['id'],
+        'name': record['name'],
+        'display_name': record['name'] or record['en_name'],
+        'email': record['email'],
+        'avatar': record['avatar'],
+        'department_id': record['department_id'],
+        'job_title': record['job_title'],
+        'employee_type': record['employee_type'],
+    }
+
+
+def _load_active_lark_users(db) -> List[Dict[str, Any]]:
+    from app.models.database_models import LarkUser
+
+    rows = db.query(
+        LarkUser.user_id, LarkUser.name, LarkUser.en_name, LarkUser.enterprise_email,
+        LarkUser.avatar_240, LarkUser.primary_department_id, LarkUser.job_title, LarkUser.employee_type,
+    ).filter(
+        LarkUser.is_activated == True,
+        LarkUser.is_exited == False
+    ).all()
+    return [
+        {
+            'id': user_id, 'name': name, 'en_name': en_name, 'email': email, 'avatar': avatar,
+            'department_id': department_id, 'job_title': job_title, 'employee_type': employee_type,
+        }
+        for user_id, name, en_name, email, avatar, department_id, job_title, employee_type in rows
+    ]
+
+
+class LarkContactIndex(ContactSearchIndex):
+    """lark_users 的聯絡人索引：首次查詢時載入，組織同步後增量更新"""
+
+    def ensure_loaded(self, db) -> None:
+        if self.loaded:
+            return
+        with self._lock:
+            if not self.loaded:
+                count = self.rebuild(_load_active_lark_users(db), payload=_lark_user_payload)
+                logger.info(f"聯絡人搜尋索引已載入 {count} 位用戶")
+
+    def refresh_from_db(self, db) -> Dict[str, int]:
+        result = self.update(_load_active_lark_users(db), payload=_lark_user_payload)
+        logger.info(f"聯絡人搜尋索引已更新: {result}")
+        return result
+
+    def reload_if_loaded(self, _key: Optional[str] = None) -> None:
+        """其他 worker 完成組織同步後呼叫（尚未載入者首次查詢時自然取得最新資料）"""
+        if not self.loaded:
+            return
+        from sqlalchemy.orm import Session
+        from app.database import get_sync_engine
+
+        with Session(bind=get_sync_engine()) as db:
+            self.refresh_from_db(db)
+
+
+contact_search_index = LarkContactIndex()
+get_invalidation_bus().subscribe(TOPIC_CONTACTS, contact_search_index.reload_if_loaded)
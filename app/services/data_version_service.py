@@ -0,0 +1,102 @@
+"""
+資料版本與列表 ETag
+
+data_versions 表由 SQLite trigger 維護（見 app.models.database_models.DATA_VERSION_TRIGGERS），
+每次 test_cases / test_run_items 寫入都會遞增所屬團隊 / 配置的版本號。
+
+列表 API 於執行查詢前先讀取版本號（單筆主鍵查詢）產生強 ETag：
+版本號 + 查詢參數雜湊。If-None-Match 命中時直接回 304，不必重建與壓縮整份資料。
+"""
+
+import hashlib
+import logging
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from starlette.responses import Response
+
+from app.models.database_models import (
+    DATA_VERSION_SCOPE_ITEMS,
+    DATA_VERSION_SCOPE_TEST_CASES,
+    DATA_VERSION_TRIGGERS,
+    DataVersion,
+    TestCaseChange,
+)
+from app.utils.file_response import etag_matches
+
+logger = logging.getLogger(__name__)
+
+# 列表回應需每次向伺服器驗證（搭配 ETag 取得 304）
+LIST_CACHE_CONTROL = "private, no-cache"
+
+_ensured_engines = set()
+_ensure_lock = threading.Lock()
+
+
+def ensure_data_version_triggers(bind) -> None:
+    """建立 data_versions / test_case_changes 表與 trigger（既有資料庫補建；重複呼叫無副作用）"""
+    engine = getattr(bind, "engine", bind)
+    key = id(engine)
+    if key in _ensured_engines:
+        return
+    with _ensure_lock:
+        if key in _ensured_engines:
+            return
+        if engine.dialect.name == "sqlite":
+            with engine.begin() as conn:
+                DataVersion.__table__.create(bind=conn, checkfirst=True)
+                TestCaseChange.__table__.create(bind=conn, checkfirst=True)
+                for statements in DATA_VERSION_TRIGGERS.values():
+                    for statement in statements:
+                        conn.exec_driver_sql(statement)
+        _ensured_engines.add(key)
+
+
+def get_versions(db: Session, keys: Iterable[Tuple[str, int]]) -> Dict[Tuple[str, int], int]:
+    """讀取多個範圍的版本號（尚無紀錄者為 0）"""
+    keys = list(keys)
+    ensure_data_version_triggers(db.get_bind())
+    versions = {key: 0 for key in keys}
+    for scope, scope_id in keys:
+        row = db.execute(
+            text("SELECT version FROM data_versions WHERE scope = :scope AND scope_id = :scope_id"),
+            {"scope": scope, "scope_id": scope_id},
+        ).first()
+        if row is not None:
+            versions[(scope, scope_id)] = int(row[0])
+    return versions
+
+
+def get_version(db: Session, scope: str, scope_id: int) -> int:
+    return get_versions(db, [(scope, scope_id)])[(scope, scope_id)]
+
+
+def _query_digest(request: Request) -> str:
+    """查詢參數（排序後）的雜湊，區分同一版本下的不同分頁/篩選結果"""
+    items = sorted(request.query_params.multi_items())
+    return hashlib.sha1(repr(items).encode("utf-8")).hexdigest()[:16]
+
+
+def build_list_etag(request: Request, prefix: str, versions: Dict[Tuple[str, int], int]) -> str:
+    parts = "-".join(f"{scope_id}.{version}" for (_, scope_id), version in sorted(versions.items()))
+    return f'"{prefix}-{parts}-{_query_digest(request)}"'
+
+
+def not_modified_response(request: Request, etag: str) -> Optional[Response]:
+    """If-None-Match 命中時回傳 304 回應，否則回傳 None"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": LIST_CACHE_CONTROL})
+    return None
+
+
+def items_etag(db: Session, request: Request, team_id: int, config_id: int) -> str:
+    """項目列表會帶出測試案例標題等欄位，因此同時納入團隊測試案例版本"""
+    versions = get_versions(db, [
+        (DATA_VERSION_SCOPE_ITEMS, config_id),
+        (DATA_VERSION_SCOPE_TEST_CASES, team_id),
+    ])
+    return build_list_etag(request, "items", versions)
@@ -3,22 +3,37 @@ HTML Report Generation Service
 - Generates a static HTML report for a specific Test Run
 - Stores the file under generated_report/{report_id}.html
 - Provides a stable report_id per test run: team-{team_id}-config-{config_id}
+- Reports are keyed by a per-config data version; unchanged runs reuse the existing artifact
+- HTMLReportWorker regenerates changed runs in a background thread
 
 Notes:
 - Pure static HTML (no app navigation or tool UI), minimal inline CSS
 - Escapes user-provided content to avoid XSS
 - Atomic write via temp file then rename
+- Artifact metadata (data_version, generated_at) is stored in generated_report/.meta/{report_id}.json
 """
 from __future__ import annotations
 
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
+import hashlib
+import logging
 import os
 import json
+import threading
 from pathlib import Path
 
+from sqlalchemy import func
 from sqlalchemy.orm import Session, joinedload
 
+logger = logging.getLogger(__name__)
+
+
+def report_id_for(team_id: int, config_id: int) -> str:
+    return f"team-{team_id}-config-{config_id}"
+
 
 class HTMLReportService:
     def __init__(self, db_session: Session, base_dir: Optional[str] = None):
@@ -27,12 +42,30 @@ class HTMLReportService:
         self.base_dir = Path(base_dir) if base_dir else Path.cwd()
         self.report_root = self.base_dir / "generated_report"
         self.tmp_root = self.report_root / ".tmp"
+        self.meta_root = self.report_root / ".meta"
         os.makedirs(self.tmp_root, exist_ok=True)
+        os.makedirs(self.meta_root, exist_ok=True)
 
     # ---------------- Public API ----------------
-    def generate_test_run_report(self, team_id: int, config_id: int) -> Dict[str, Any]:
+    def generate_test_run_report(self, team_id: int, config_id: int,
+                                 data_version: Optional[str] = None,
+                                 force: bool = False) -> Dict[str, Any]:
+        """Generate the report; returns the existing artifact when the data version is unchanged."""
+        report_id = report_id_for(team_id, config_id)
+        if data_version is None:
+            data_version = self.compute_data_version(team_id, config_id)
+
+        artifact = self.get_artifact_info(report_id)
+        if not force and artifact and artifact.get("data_version") == data_version:
+            return {
+                "report_id": report_id,
+                "report_url": f"/reports/{report_id}.html",
+                "generated_at": artifact.get("generated_at"),
+                "data_version": data_version,
+                "overwritten": False,
+            }
+
         data = self._collect_report_data(team_id, config_id)
-        report_id = f"team-{team_id}-config-{config_id}"
         html = self._render_html(data)
 
         # Atomic write
@@ -42,13 +75,67 @@ class HTMLReportService:
             f.write(html)
         os.replace(tmp_path, final_path)
 
+        generated_at = datetime.utcnow().isoformat()
+        self._write_meta(report_id, {"data_version": data_version, "generated_at": generated_at})
+
         return {
             "report_id": report_id,
             "report_url": f"/reports/{report_id}.html",
-            "generated_at": datetime.utcnow().isoformat(),
+            "generated_at": generated_at,
+            "data_version": data_version,
             "overwritten": True,
         }
 
+    def compute_data_version(self, team_id: int, config_id: int) -> str:
+        """Per-config data version: item count + latest item/test case/config update time.
+
+        One aggregate query; no item rows are loaded.
+        """
+        from ..models.database_models import (
+            TestRunConfig as TestRunConfigDB,
+            TestRunItem as TestRunItemDB,
+            TestCaseLocal as TestCaseLocalDB,
+        )
+
+        config_updated = self.db_session.query(TestRunConfigDB.updated_at).filter(
+            TestRunConfigDB.id == config_id,
+            TestRunConfigDB.team_id == team_id,
+        ).scalar()
+        count, max_id, items_updated, cases_updated = self.db_session.query(
+            func.count(TestRunItemDB.id),
+            func.max(TestRunItemDB.id),
+            func.max(TestRunItemDB.updated_at),
+            func.max(TestCaseLocalDB.updated_at),
+        ).outerjoin(
+            TestCaseLocalDB,
+            (TestCaseLocalDB.team_id == TestRunItemDB.team_id)
+            & (TestCaseLocalDB.test_case_number == TestRunItemDB.test_case_number),
+        ).filter(
+            TestRunItemDB.team_id == team_id,
+            TestRunItemDB.config_id == config_id,
+        ).one()
+
+        raw = f"{count}|{max_id}|{items_updated}|{cases_updated}|{config_updated}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+    def get_artifact_info(self, report_id: str) -> Optional[Dict[str, Any]]:
+        """Return metadata of the existing artifact, or None when the HTML file is missing."""
+        if not (self.report_root / f"{report_id}.html").exists():
+            return None
+        try:
+            with open(self.meta_root / f"{report_id}.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            return meta if isinstance(meta, dict) else {}
+        except (OSError, ValueError):
+            # 舊版產生的報告沒有 meta，視為版本未知
+            return {}
+
+    def _write_meta(self, report_id: str, meta: Dict[str, Any]) -> None:
+        tmp_path = self.tmp_root / f"{report_id}-{datetime.utcnow().timestamp()}.json"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_root / f"{report_id}.json")
+
     # ---------------- Data Collection ----------------
     def _collect_report_data(self, team_id: int, config_id: int) -> Dict[str, Any]:
         from ..models.database_models import TestRunConfig as TestRunConfigDB, TestRunItem as TestRunItemDB
@@ -68,30 +155,31 @@ class HTMLReportService:
             TestRunItemDB.config_id == config_id,
         ).all()
 
-        # Stats
+        # Stats（單次走訪計數）
+        status_counts: Counter = Counter()
+        priority_counts: Counter = Counter()
+        for i in items:
+            status_counts[i.test_result] += 1
+            case = getattr(i, 'test_case', None)
+            pri = getattr(case, 'priority', None)
+            if pri is not None:
+                priority_counts[pri.value if hasattr(pri, 'value') else pri] += 1
+
         total_count = len(items)
-        executed_count = len([i for i in items if i.test_result is not None])
-        passed_count = len([i for i in items if i.test_result == TestResultStatus.PASSED])
-        failed_count = len([i for i in items if i.test_result == TestResultStatus.FAILED])
-        retest_count = len([i for i in items if i.test_result == TestResultStatus.RETEST])
-        na_count = len([i for i in items if i.test_result == TestResultStatus.NOT_AVAILABLE])
+        executed_count = total_count - status_counts[None]
+        passed_count = status_counts[TestResultStatus.PASSED]
+        failed_count = status_counts[TestResultStatus.FAILED]
+        retest_count = status_counts[TestResultStatus.RETEST]
+        na_count = status_counts[TestResultStatus.NOT_AVAILABLE]
         not_executed_count = total_count - executed_count
 
         execution_rate = (executed_count / total_count * 100) if total_count > 0 else 0.0
         pass_rate = (passed_count / executed_count * 100) if executed_count > 0 else 0.0
 
         # Priority
-        def _item_priority(itm):
-            case = getattr(itm, 'test_case', None)
-            pri = getattr(case, 'priority', None)
-            if pri is None:
-                return None
-            return pri.value if hasattr(pri, 'value') else pri
-
-        priority_map = [_item_priority(i) for i in items]
-        high_priority = len([pri for pri in priority_map if pri == Priority.HIGH.value])
-        medium_priority = len([pri for pri in priority_map if pri == Priority.MEDIUM.value])
-        low_priority = len([pri for pri in priority_map if pri == Priority.LOW.value])
+        high_priority = priority_counts[Priority.HIGH.value]
+        medium_priority = priority_counts[Priority.MEDIUM.value]
+        low_priority = priority_counts[Priority.LOW.value]
 
         # Results list (all, 不限 100 筆)
         test_results: List[Dict[str, Any]] = []
@@ -396,3 +484,129 @@ class HTMLReportService:
 </html>
 """
         return html
+
+
+class HTMLReportWorker:
+    """Background regeneration of HTML reports.
+
+    - request(): returns immediately; unchanged runs are reported as ready, changed runs are queued
+    - identical requests for the same report and data version share one job
+    - get_status(): job state + artifact freshness for get_html_report_status
+    """
+
+    def __init__(self, session_factory: Optional[Callable[[], Session]] = None,
+                 base_dir: Optional[str] = None, max_workers: int = 2):
+        self._session_factory = session_factory
+        self._base_dir = base_dir
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._futures: Dict[str, Future] = {}
+
+    def _new_session(self) -> Session:
+        if self._session_factory is None:
+            from ..database import get_sync_engine
+            from sqlalchemy.orm import sessionmaker
+            self._session_factory = sessionmaker(autocommit=False, autoflush=False, bind=get_sync_engine())
+        return self._session_factory()
+
+    def _service(self, db: Session) -> HTMLReportService:
+        return HTMLReportService(db_session=db, base_dir=self._base_dir)
+
+    def _run(self, team_id: int, config_id: int, data_version: str) -> Dict[str, Any]:
+        report_id = report_id_for(team_id, config_id)
+        with self._lock:
+            self._jobs[report_id].update({"state": "running", "started_at": datetime.utcnow().isoformat()})
+        db = self._new_session()
+        try:
+            result = self._service(db).generate_test_run_report(team_id, config_id, data_version=data_version)
+            with self._lock:
+                self._jobs[report_id].update({
+                    "state": "done",
+                    "finished_at": datetime.utcnow().isoformat(),
+                    "error": None,
+                })
+            return result
+        except Exception as e:
+            logger.error(f"HTML 報告背景生成失敗 {report_id}: {e}")
+            with self._lock:
+                self._jobs[report_id].update({
+                    "state": "failed",
+                    "finished_at": datetime.utcnow().isoformat(),
+                    "error": str(e),
+                })
+            raise
+        finally:
+            db.close()
+
+    def request(self, team_id: int, config_id: int, db: Session) -> Dict[str, Any]:
+        """Return the current artifact if up to date, otherwise queue regeneration."""
+        service = self._service(db)
+        report_id = report_id_for(team_id, config_id)
+        data_version = service.compute_data_version(team_id, config_id)
+        artifact = service.get_artifact_info(report_id)
+        base = {
+            "report_id": report_id,
+            "report_url": f"/reports/{report_id}.html",
+            "data_version": data_version,
+        }
+        if artifact and artifact.get("data_version") == data_version:
+            return {**base, "status": "ready", "generated_at": artifact.get("generated_at"), "overwritten": False}
+
+        with self._lock:
+            job = self._jobs.get(report_id)
+            future = self._futures.get(report_id)
+            if not (job and future and not future.done() and job.get("data_version") == data_version):
+                self._jobs[report_id] = {
+                    "state": "pending",
+                    "data_version": data_version,
+                    "queued_at": datetime.utcnow().isoformat(),
+                    "started_at": None,
+                    "finished_at": None,
+                    "error": None,
+                }
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self._max_workers, thread_name_prefix="html-report"
+                    )
+                self._futures[report_id] = self._executor.submit(self._run, team_id, config_id, data_version)
+        return {**base, "status": "generating", "generated_at": (artifact or {}).get("generated_at"), "overwritten": True}
+
+    def get_future(self, team_id: int, config_id: int) -> Optional[Future]:
+        with self._lock:
+            return self._futures.get(report_id_for(team_id, config_id))
+
+    def get_status(self, team_id: int, config_id: int, db: Session) -> Dict[str, Any]:
+        """Artifact existence/freshness plus the latest background job state."""
+        service = self._service(db)
+        report_id = report_id_for(team_id, config_id)
+        artifact = service.get_artifact_info(report_id)
+        data_version = service.compute_data_version(team_id, config_id)
+        with self._lock:
+            job = dict(self._jobs.get(report_id) or {})
+
+        if job.get("state") in ("pending", "running"):
+            status = "generating"
+        elif job.get("state") == "failed" and job.get("data_version") == data_version:
+            status = "failed"
+        elif artifact is None:
+            status = "missing"
+        elif artifact.get("data_version") == data_version:
+            status = "ready"
+        else:
+            status = "stale"
+
+        return {
+            "report_id": report_id,
+            "exists": artifact is not None,
+            "report_url": f"/reports/{report_id}.html",
+            "status": status,
+            "up_to_date": bool(artifact) and artifact.get("data_version") == data_version,
+            "data_version": data_version,
+            "generated_at": (artifact or {}).get("generated_at"),
+            "job": job or None,
+        }
+
+
+html_report_worker = HTMLReportWorker()
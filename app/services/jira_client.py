@@ -4,6 +4,7 @@ import json
 from typing import Dict, List, Any, Optional
 from requests.auth import HTTPBasicAuth
 from ..config import settings
+from .metrics import track_outbound
 
 
 class JiraAuthManager:
@@ -67,15 +68,17 @@ class JiraIssueManager:
         url = f"{self.auth_manager.server_url}{endpoint}"
         
         try:
-            response = requests.request(
-                method=method,
-                url=url,
-                auth=self.auth_manager.auth,
-                headers=self.auth_manager.headers,
-                json=data,
-                params=params,
-                timeout=self.timeout
-            )
+            with track_outbound('jira', url) as call:
+                response = requests.request(
+                    method=method,
+                    url=url,
+                    auth=self.auth_manager.auth,
+                    headers=self.auth_manager.headers,
+                    json=data,
+                    params=params,
+                    timeout=self.timeout
+                )
+                call['status'] = response.status_code
             
             self.logger.debug(f"API 請求: {method} {endpoint} -> {response.status_code}")
             
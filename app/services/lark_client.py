@@ -12,11 +12,123 @@ import logging
 import requests
 import threading
 import asyncio
-import aiohttp
 import time
 from typing import Dict, List, Optional, Tuple, Any, Callable
 from datetime import datetime, timedelta
+import os
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+from app.services.contact_search_index import ContactSearchIndex
+from app.services.metrics import track_outbound
+
+
+# Lark Open API 共用限流：同一組 App 憑證下所有服務共用一個限流器
+DEFAULT_API_QPS = float(os.getenv('LARK_API_QPS', '20'))
+DEFAULT_API_CONCURRENCY = int(os.getenv('LARK_API_CONCURRENCY', '8'))
+
+
+class LarkRateLimiter:
+    """Lark API 限流器（執行緒安全）
+
+    - 以 token bucket 限制每秒請求數（qps）
+    - 以 semaphore 限制同時進行中的請求數（max_concurrency）
+    """
+
+    def __init__(self, qps: float = DEFAULT_API_QPS, max_concurrency: int = DEFAULT_API_CONCURRENCY):
+        self.qps = qps
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self._tokens = float(max(1.0, qps))
+        self._last_refill = time.monotonic()
+
+    def _take_token(self) -> None:
+        if self.qps <= 0:
+            return
+        capacity = max(1.0, self.qps)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(capacity, self._tokens + (now - self._last_refill) * self.qps)
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_seconds = (1 - self._tokens) / self.qps
+            time.sleep(wait_seconds)
+
+    @contextmanager
+    def acquire(self):
+        """取得一次請求配額，區塊結束時釋放並行名額"""
+        self._semaphore.acquire()
+        try:
+            self._take_token()
+            yield
+        finally:
+            self._semaphore.release()
+
+
+class LarkApiSession:
+    """通訊錄等 Open API 的共用 GET 請求封裝（執行緒安全）
+
+    - 共用 requests.Session 連線池（pool_size 建議與並行數一致）
+    - 經 auth_manager.rate_limiter 限流，429/5xx 以退避重試
+    - 每次實際發出請求時呼叫 on_request（供呼叫端累計 api_calls）
+    """
+
+    def __init__(self, auth_manager: 'LarkAuthManager', pool_size: int = 10, timeout: int = 30,
+                 max_retries: int = 3, on_request: Optional[Callable[[], None]] = None):
+        from requests.adapters import HTTPAdapter
+
+        self.auth_manager = auth_manager
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.on_request = on_request
+        self.logger = logging.getLogger(f"{__name__}.LarkApiSession")
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+        self.http.mount('https://', adapter)
+        self.http.mount('http://', adapter)
+
+    def get(self, url: str, params: Dict[str, Any]) -> Optional[Dict]:
+        """發送 GET 請求並回傳 data 欄位；失敗回傳 None"""
+        rate_limiter = getattr(self.auth_manager, 'rate_limiter', None)
+        for attempt in range(1, self.max_retries + 1):
+            token = self.auth_manager.get_tenant_access_token()
+            if not token:
+                self.logger.error("無法獲取 access token")
+                return None
+
+            headers = {
+                'Authorization': f'Bearer {token}',
+                'Content-Type': 'application/json'
+            }
+            if self.on_request is not None:
+                self.on_request()
+            with track_outbound('lark', url) as call:
+                if rate_limiter is not None:
+                    with rate_limiter.acquire():
+                        response = self.http.get(url, headers=headers, params=params, timeout=self.timeout)
+                else:
+                    response = self.http.get(url, headers=headers, params=params, timeout=self.timeout)
+                call['status'] = response.status_code
+
+            if response.status_code in {429, 500, 502, 503, 504} and attempt < self.max_retries:
+                sleep_seconds = min(2 ** attempt, 5)
+                self.logger.info(f"HTTP {response.status_code}，{sleep_seconds}s 後重試 ({attempt}/{self.max_retries})")
+                time.sleep(sleep_seconds)
+                continue
+            if response.status_code != 200:
+                self.logger.error(f"HTTP 請求失敗: {response.status_code} - {response.text}")
+                return None
+
+            data = response.json()
+            if data.get('code') != 0:
+                self.logger.warning(f"API 返回錯誤: {data}")
+                return None
+            return data.get('data', {})
+        return None
 
 
 class LarkAuthManager:
@@ -30,6 +142,9 @@ class LarkAuthManager:
         self._tenant_access_token = None
         self._token_expire_time = None
         self._token_lock = threading.Lock()
+
+        # 共用 API 限流器（部門/用戶同步等服務皆透過此限流器發送請求）
+        self.rate_limiter = LarkRateLimiter()
         
         # 設定日誌
         self.logger = logging.getLogger(f"{__name__}.LarkAuthManager")
@@ -50,14 +165,16 @@ class LarkAuthManager:
             
             # 取得新 Token
             try:
-                response = requests.post(
-                    self.auth_url,
-                    json={
-                        "app_id": self.app_id,
-                        "app_secret": self.app_secret
-                    },
-                    timeout=self.timeout
-                )
+                with track_outbound('lark', self.auth_url) as call:
+                    response = requests.post(
+                        self.auth_url,
+                        json={
+                            "app_id": self.app_id,
+                            "app_secret": self.app_secret
+                        },
+                        timeout=self.timeout
+                    )
+                    call['status'] = response.status_code
                 
                 if response.status_code != 200:
                     self.logger.error(f"Token 取得失敗，HTTP {response.status_code}")
@@ -232,13 +349,15 @@ class LarkRecordManager:
                     'Content-Type': 'application/json'
                 })
 
-                response = requests.request(
-                    method,
-                    url,
-                    headers=headers,
-                    timeout=self.timeout,
-                    **kwargs
-                )
+                with track_outbound('lark', url) as call:
+                    response = requests.request(
+                        method,
+                        url,
+                        headers=headers,
+                        timeout=self.timeout,
+                        **kwargs
+                    )
+                    call['status'] = response.status_code
 
                 if response.status_code != 200:
                     self.logger.error(f"API 請求失敗，HTTP {response.status_code}: {response.text}")
@@ -634,7 +753,9 @@ class LarkUserManager:
                 if page_token:
                     params['page_token'] = page_token
                 
-                response = requests.get(url, headers=headers, params=params, timeout=self.timeout)
+                with track_outbound('lark', url) as call:
+                    response = requests.get(url, headers=headers, params=params, timeout=self.timeout)
+                    call['status'] = response.status_code
                 
                 if response.status_code != 200:
                     self.logger.error(f"拉取用戶列表失敗，HTTP {response.status_code}: {response.text}")
@@ -687,7 +808,6 @@ class LarkUserManager:
             'by_id': {},
             'by_email': {},
             'by_name': {},
-            'search_terms': {}
         }
         
         for user in users:
@@ -703,19 +823,10 @@ class LarkUserManager:
             
             if name:
                 index['by_name'][name.lower()] = user
-            
-            # 建立搜尋詞索引
-            search_terms = []
-            if name:
-                search_terms.extend(name.lower().split())
-            if email:
-                search_terms.append(email.lower())
-                search_terms.append(email.lower().split('@')[0])
-            
-            for term in search_terms:
-                if term not in index['search_terms']:
-                    index['search_terms'][term] = []
-                index['search_terms'][term].append(user)
+        
+        # n-gram 索引：前綴/中段/CJK 單字查詢皆不需掃描全部用戶
+        index['search'] = ContactSearchIndex()
+        index['search'].rebuild(users, id_key='user_id')
         
         return index
     
@@ -739,50 +850,12 @@ class LarkUserManager:
             if not users:
                 return []
         
-        query = query.lower().strip()
-        results = []
-        seen_ids = set()  # 避免重複結果
-        
         with self._cache_lock:
-            # 方法1: 精確匹配（優先級最高）
-            if query in self._users_index.get('by_email', {}):
-                user = self._users_index['by_email'][query]
-                if user.get('user_id') not in seen_ids:
-                    results.append(user)
-                    seen_ids.add(user.get('user_id'))
-            
-            if query in self._users_index.get('by_name', {}):
-                user = self._users_index['by_name'][query]
-                if user.get('user_id') not in seen_ids:
-                    results.append(user)
-                    seen_ids.add(user.get('user_id'))
-            
-            # 方法2: 搜尋詞匹配
-            for term, term_users in self._users_index.get('search_terms', {}).items():
-                if query in term:
-                    for user in term_users:
-                        if user.get('user_id') not in seen_ids and len(results) < limit:
-                            results.append(user)
-                            seen_ids.add(user.get('user_id'))
-            
-            # 方法3: 模糊匹配（如果結果不夠）
-            if len(results) < limit:
-                for user in self._all_users_cache:
-                    if len(results) >= limit:
-                        break
-                    
-                    if user.get('user_id') in seen_ids:
-                        continue
-                    
-                    name = user.get('name', '').lower()
-                    email = user.get('email', '').lower()
-                    
-                    if query in name or query in email:
-                        results.append(user)
-                        seen_ids.add(user.get('user_id'))
+            search_index = self._users_index.get('search')
+        results = search_index.search(query, limit) if search_index else []
         
         self.logger.debug(f"搜尋 '{query}' 找到 {len(results)} 個結果")
-        return results[:limit]
+        return results
     
     def get_user_by_id(self, user_id: str) -> Optional[Dict]:
         """根據用戶ID獲取用戶資訊"""
@@ -2,39 +2,57 @@
 """
 Lark 部門遍歷服務
 
-負責遞歸遍歷 Lark 組織架構，收集所有部門信息並存儲到本地數據庫。
+負責逐層（BFS）並行遍歷 Lark 組織架構，收集所有部門信息並存儲到本地數據庫。
 基於實際 API 測試數據設計，支援斷點續傳和增量同步。
 """
 
 import json
 import logging
-import requests
 import threading
-from typing import Dict, List, Optional, Tuple, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, Any
 from datetime import datetime, timedelta
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, sessionmaker
 
 from app.database import get_sync_engine
 from app.models.database_models import LarkDepartment
-from app.services.lark_client import LarkAuthManager
+from app.services.lark_client import LarkApiSession, LarkAuthManager
 
 
 class LarkDepartmentService:
-    """Lark 部門遍歷服務"""
+    """Lark 部門遍歷服務
+
+    以逐層廣度優先（BFS）方式遍歷組織樹：同一層的部門並行查詢子部門
+    （並行度與請求速率受 auth_manager 共用的 LarkRateLimiter 限制），
+    每層結束後以批次 upsert 寫入 lark_departments，並透過 progress_callback 回報進度。
+    """
     
-    def __init__(self, auth_manager: LarkAuthManager):
+    def __init__(self, auth_manager: LarkAuthManager,
+                 session_factory: Optional[Callable[[], Session]] = None,
+                 max_workers: Optional[int] = None):
         self.auth_manager = auth_manager
         self.logger = logging.getLogger(__name__)
         
         # API 配置
         self.base_url = "https://open.larksuite.com/open-apis"
         self.timeout = 30
+        self.page_size = 50  # 子部門查詢每頁最大數量
+
+        # 並行查詢數（預設與共用限流器的並行上限一致）
+        rate_limiter = getattr(auth_manager, 'rate_limiter', None)
+        self.max_workers = max_workers or (rate_limiter.max_concurrency if rate_limiter else 4)
+
+        # 共用 HTTP 連線池與限流，避免每次請求重新建立 TLS 連線
+        self.api = LarkApiSession(auth_manager, pool_size=self.max_workers, timeout=self.timeout,
+                                  on_request=lambda: self._incr_stat('api_calls'))
         
         # 數據庫會話（使用同步引擎，避免與 AsyncEngine 混用）
-        sync_engine = get_sync_engine()
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
-        self.db_session = SessionLocal()
+        if session_factory is None:
+            sync_engine = get_sync_engine()
+            session_factory = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
+        self.db_session = session_factory()
         
         # 遍歷統計
         self.stats = {
@@ -43,196 +61,192 @@ class LarkDepartmentService:
             'departments_updated': 0,
             'api_calls': 0,
             'errors': 0,
+            'levels_completed': 0,
             'start_time': None,
             'end_time': None
         }
+        self._stats_lock = threading.Lock()
         
         # 遍歷狀態
         self.visited_departments = set()  # 避免重複遍歷
         self.max_level = 10  # 最大遍歷層級
-        
+
+    def _incr_stat(self, key: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[key] += amount
+
     def get_department_children(self, department_id: str) -> Optional[List[Dict]]:
-        """獲取部門的子部門列表"""
+        """獲取部門的直屬子部門列表（自動翻頁）"""
         try:
-            token = self.auth_manager.get_tenant_access_token()
-            if not token:
-                self.logger.error("無法獲取 access token")
-                return None
-            
-            url = f"{self.base_url}/contact/v3/departments/{department_id}/children"
-            headers = {
-                'Authorization': f'Bearer {token}',
-                'Content-Type': 'application/json'
-            }
-            params = {
-                'department_id_type': 'open_department_id',
-                'page_size': 50,  # 每頁最大數量
-                'user_id_type': 'open_id'
-            }
-            
-            self.stats['api_calls'] += 1
-            response = requests.get(url, headers=headers, params=params, timeout=self.timeout)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('code') == 0:
-                    children = data.get('data', {}).get('items', [])
-                    self.logger.debug(f"部門 {department_id} 有 {len(children)} 個子部門")
-                    return children
-                else:
-                    self.logger.warning(f"API 返回錯誤: {data}")
+            children: List[Dict] = []
+            page_token = None
+            while True:
+                params = {
+                    'department_id_type': 'open_department_id',
+                    'page_size': self.page_size,
+                    'user_id_type': 'open_id'
+                }
+                if page_token:
+                    params['page_token'] = page_token
+
+                data = self.api.get(f"{self.base_url}/contact/v3/departments/{department_id}/children", params)
+                if data is None:
                     return None
-            else:
-                self.logger.error(f"HTTP 請求失敗: {response.status_code} - {response.text}")
-                return None
+                children.extend(data.get('items') or [])
+
+                page_token = data.get('page_token')
+                if not page_token or not data.get('has_more', False):
+                    break
+
+            self.logger.debug(f"部門 {department_id} 有 {len(children)} 個子部門")
+            return children
                 
         except Exception as e:
             self.logger.error(f"獲取部門子部門異常: {e}")
-            self.stats['errors'] += 1
+            self._incr_stat('errors')
             return None
-    
-    def save_department(self, department_id: str, parent_id: Optional[str], level: int, 
-                       children_data: List[Dict], path: str) -> bool:
-        """保存部門信息到數據庫"""
+
+    def upsert_departments(self, rows: List[Dict[str, Any]], batch_size: int = 500) -> bool:
+        """批次寫入部門（INSERT ... ON CONFLICT DO UPDATE），並累計新增/更新數"""
+        if not rows:
+            return True
+        table = LarkDepartment.__table__
         try:
-            # 檢查部門是否已存在
-            existing_dept = self.db_session.query(LarkDepartment).filter(
-                LarkDepartment.department_id == department_id
-            ).first()
-            
-            now = datetime.utcnow()
-            
-            if existing_dept:
-                # 更新現有部門
-                existing_dept.parent_department_id = parent_id
-                existing_dept.level = level
-                existing_dept.path = path
-                existing_dept.updated_at = now
-                existing_dept.last_sync_at = now
-                
-                # 不在部門遍歷時更新 direct_user_count，改由用戶同步後重算
-                
-                self.stats['departments_updated'] += 1
-                self.logger.debug(f"更新部門: {department_id}")
-            else:
-                # 創建新部門
-                new_dept = LarkDepartment(
-                    department_id=department_id,
-                    parent_department_id=parent_id,
-                    level=level,
-                    path=path,
-                    direct_user_count=0,
-                    status='active',
-                    created_at=now,
-                    updated_at=now,
-                    last_sync_at=now
+            for offset in range(0, len(rows), batch_size):
+                batch = rows[offset:offset + batch_size]
+                ids = [row['department_id'] for row in batch]
+                existing = set(self.db_session.execute(
+                    select(table.c.department_id).where(table.c.department_id.in_(ids))
+                ).scalars())
+
+                stmt = sqlite_insert(table)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[table.c.department_id],
+                    set_={
+                        'parent_department_id': stmt.excluded.parent_department_id,
+                        'level': stmt.excluded.level,
+                        'path': stmt.excluded.path,
+                        # 根部門無上層列表資料，保留既有值
+                        'leaders_json': func.coalesce(stmt.excluded.leaders_json, table.c.leaders_json),
+                        'group_chat_employee_types_json': func.coalesce(
+                            stmt.excluded.group_chat_employee_types_json, table.c.group_chat_employee_types_json
+                        ),
+                        # 不在部門遍歷時更新 direct_user_count，改由用戶同步後重算
+                        'updated_at': stmt.excluded.updated_at,
+                        'last_sync_at': stmt.excluded.last_sync_at,
+                    }
                 )
-                
-                # 如果有子部門數據，存儲為 JSON
-                if children_data:
-                    # 提取並存儲領導信息和群聊員工類型
-                    leaders_data = []
-                    group_chat_types = []
-                    
-                    for child in children_data:
-                        if child.get('leaders'):
-                            leaders_data.extend(child['leaders'])
-                        if child.get('group_chat_employee_types'):
-                            group_chat_types.extend(child['group_chat_employee_types'])
-                    
-                    if leaders_data:
-                        new_dept.leaders_json = json.dumps(leaders_data, ensure_ascii=False)
-                    if group_chat_types:
-                        new_dept.group_chat_employee_types_json = json.dumps(group_chat_types, ensure_ascii=False)
-                
-                self.db_session.add(new_dept)
-                self.stats['departments_created'] += 1
-                self.logger.debug(f"創建新部門: {department_id}")
-            
+                self.db_session.execute(stmt, batch)
+
+                self.stats['departments_updated'] += len(existing)
+                self.stats['departments_created'] += len(batch) - len(existing)
             self.db_session.commit()
             return True
-            
-        except IntegrityError as e:
-            self.db_session.rollback()
-            self.logger.error(f"保存部門時數據庫完整性錯誤: {e}")
-            self.stats['errors'] += 1
-            return False
         except Exception as e:
             self.db_session.rollback()
-            self.logger.error(f"保存部門異常: {e}")
-            self.stats['errors'] += 1
-            return False
-    
-    def traverse_department_recursive(self, department_id: str, parent_id: Optional[str] = None, 
-                                    level: int = 0, path: str = "") -> bool:
-        """遞歸遍歷部門層次結構"""
-        
-        # 檢查是否已訪問過此部門（避免循環）
-        if department_id in self.visited_departments:
-            self.logger.warning(f"部門 {department_id} 已遍歷過，跳過")
-            return True
-        
-        # 檢查層級限制
-        if level > self.max_level:
-            self.logger.warning(f"達到最大遍歷層級 {self.max_level}，停止遞歸")
-            return False
-        
-        self.logger.info(f"遍歷部門: {department_id} (層級: {level}, 路徑: {path})")
-        self.visited_departments.add(department_id)
-        self.stats['departments_discovered'] += 1
-        
-        # 獲取子部門
-        children_data = self.get_department_children(department_id)
-        if children_data is None:
-            self.logger.warning(f"無法獲取部門 {department_id} 的子部門")
-            return False
-        
-        # 構建當前部門路徑
-        current_path = f"{path}/{department_id}" if path else f"/{department_id}"
-        
-        # 保存當前部門信息
-        if not self.save_department(department_id, parent_id, level, children_data, current_path):
-            self.logger.error(f"保存部門 {department_id} 失敗")
+            self.logger.error(f"批次保存部門異常: {e}")
+            self._incr_stat('errors')
             return False
-        
-        # 遞歸處理子部門
-        success_count = 0
-        for child_dept in children_data:
-            child_id = child_dept.get('open_department_id')
-            if child_id:
-                try:
-                    if self.traverse_department_recursive(child_id, department_id, level + 1, current_path):
-                        success_count += 1
-                    else:
-                        self.logger.warning(f"遍歷子部門 {child_id} 失敗")
-                except Exception as e:
-                    self.logger.error(f"遍歷子部門 {child_id} 時發生異常: {e}")
-                    self.stats['errors'] += 1
-        
-        self.logger.info(f"部門 {department_id} 遍歷完成，成功處理 {success_count}/{len(children_data)} 個子部門")
-        return True
+
+    @staticmethod
+    def _department_row(department_id: str, parent_id: Optional[str], level: int, path: str,
+                        item: Optional[Dict], now: datetime) -> Dict[str, Any]:
+        item = item or {}
+        leaders = item.get('leaders')
+        group_chat_types = item.get('group_chat_employee_types')
+        return {
+            'department_id': department_id,
+            'parent_department_id': parent_id,
+            'level': level,
+            'path': path,
+            'leaders_json': json.dumps(leaders, ensure_ascii=False) if leaders else None,
+            'group_chat_employee_types_json': (
+                json.dumps(group_chat_types, ensure_ascii=False) if group_chat_types else None
+            ),
+            'direct_user_count': 0,
+            'status': 'active',
+            'created_at': now,
+            'updated_at': now,
+            'last_sync_at': now,
+        }
+
+    def traverse_departments_bfs(self, root_departments: List[str],
+                                 progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[str]:
+        """逐層遍歷部門樹，回傳無法取得子部門的根部門 ID 列表"""
+        roots = set(root_departments)
+        failed_roots: List[str] = []
+        # 目前層級的部門：(department_id, parent_id, path, 上層列表中的部門資料)
+        frontier: List[Tuple[str, Optional[str], str, Optional[Dict]]] = []
+        for root_id in root_departments:
+            if root_id not in self.visited_departments:
+                self.visited_departments.add(root_id)
+                frontier.append((root_id, None, f"/{root_id}", None))
+
+        level = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="lark-dept") as executor:
+            while frontier:
+                if level > self.max_level:
+                    self.logger.warning(f"達到最大遍歷層級 {self.max_level}，略過 {len(frontier)} 個部門")
+                    break
+
+                self.logger.info(f"遍歷第 {level} 層，共 {len(frontier)} 個部門")
+                self.stats['departments_discovered'] += len(frontier)
+                children_lists = executor.map(self.get_department_children, [dept[0] for dept in frontier])
+
+                now = datetime.utcnow()
+                rows = []
+                next_frontier = []
+                for (dept_id, parent_id, path, item), children in zip(frontier, children_lists):
+                    if children is None:
+                        self.logger.warning(f"無法獲取部門 {dept_id} 的子部門")
+                        if dept_id in roots:
+                            # 根部門無法確認存在，不寫入
+                            failed_roots.append(dept_id)
+                        else:
+                            # 已由上層列表確認存在，仍保存部門本身，僅略過其子樹
+                            rows.append(self._department_row(dept_id, parent_id, level, path, item, now))
+                        continue
+                    rows.append(self._department_row(dept_id, parent_id, level, path, item, now))
+                    for child in children:
+                        child_id = child.get('open_department_id')
+                        if not child_id:
+                            continue
+                        if child_id in self.visited_departments:
+                            self.logger.warning(f"部門 {child_id} 已遍歷過，跳過")
+                            continue
+                        self.visited_departments.add(child_id)
+                        next_frontier.append((child_id, dept_id, f"{path}/{child_id}", child))
+
+                self.upsert_departments(rows)
+                self.stats['levels_completed'] = level + 1
+                if progress_callback is not None:
+                    try:
+                        progress_callback(self.stats.copy())
+                    except Exception as e:
+                        self.logger.warning(f"回報部門同步進度失敗: {e}")
+
+                frontier = next_frontier
+                level += 1
+
+        return failed_roots
     
-    def sync_all_departments(self, root_departments: List[str]) -> Dict[str, Any]:
+    def sync_all_departments(self, root_departments: List[str],
+                             progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
         """同步所有部門數據"""
         self.logger.info("開始 Lark 部門同步...")
         self.stats['start_time'] = datetime.utcnow()
         
         # 重置統計和狀態
         self.visited_departments.clear()
-        for key in ['departments_discovered', 'departments_created', 'departments_updated', 'api_calls', 'errors']:
+        for key in ['departments_discovered', 'departments_created', 'departments_updated',
+                    'api_calls', 'errors', 'levels_completed']:
             self.stats[key] = 0
         
-        success_roots = 0
-        
         try:
-            for root_dept_id in root_departments:
-                self.logger.info(f"開始遍歷根部門: {root_dept_id}")
-                
-                if self.traverse_department_recursive(root_dept_id):
-                    success_roots += 1
-                    self.logger.info(f"根部門 {root_dept_id} 遍歷成功")
-                else:
-                    self.logger.error(f"根部門 {root_dept_id} 遍歷失敗")
+            failed_roots = self.traverse_departments_bfs(root_departments, progress_callback)
+            for root_dept_id in failed_roots:
+                self.logger.error(f"根部門 {root_dept_id} 遍歷失敗")
+            success_roots = len(root_departments) - len(failed_roots)
             
             self.stats['end_time'] = datetime.utcnow()
             duration = (self.stats['end_time'] - self.stats['start_time']).total_seconds()
@@ -0,0 +1,348 @@
+"""
+Lark 媒體下載快取
+
+下載代理對 Lark 託管的附件（drive/v1/medias/{file_token}/download）每次檢視都會重新下載。
+此模組提供以 file_token 為鍵、容量受限的本地磁碟 LRU 快取：
+
+- 快取命中時直接由本地檔案回應（支援 Range / ETag，見 app.utils.file_response）
+- 同一 file_token 的並發請求合併為單次下載（single-flight）
+- 超過容量上限時依最近使用時間淘汰
+- 提供命中/未命中與位元組計數統計（get_stats）
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional, Any, BinaryIO
+
+import requests
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+LARK_MEDIA_DOWNLOAD_URL = "https://open.larksuite.com/open-apis/drive/v1/medias/{file_token}/download"
+_MEDIA_URL_RE = re.compile(r"/drive/v1/medias/([^/?#]+)/download")
+_SAFE_TOKEN_RE = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+# 下載函式簽名：寫入 BinaryIO，回傳回應標頭（content_type / content_disposition）
+MediaFetcher = Callable[[BinaryIO], Dict[str, Optional[str]]]
+
+
+class LarkMediaFetchError(Exception):
+    """Lark 媒體下載失敗（保留 HTTP 狀態碼供 API 層轉換）"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class CachedMedia:
+    path: Path
+    size: int
+    sha256: str
+    content_type: Optional[str] = None
+    content_disposition: Optional[str] = None
+
+
+class _HashingWriter:
+    """包裝檔案物件，寫入時同步計算 sha256 與大小"""
+
+    def __init__(self, fileobj: BinaryIO):
+        self._f = fileobj
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self._hash.update(data)
+        self.size += len(data)
+        return self._f.write(data)
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+def extract_media_token(file_url: Optional[str]) -> Optional[str]:
+    """從 Lark medias 下載 URL 取出 file_token；非該格式則回傳 None"""
+    if not file_url:
+        return None
+    m = _MEDIA_URL_RE.search(file_url)
+    return m.group(1) if m else None
+
+
+def make_lark_media_fetcher(download_url: str, access_token: str, timeout: int = 30) -> MediaFetcher:
+    """建立以 requests 串流下載 Lark 媒體的 fetcher"""
+
+    def fetch(out: BinaryIO) -> Dict[str, Optional[str]]:
+        headers = {'Authorization': f'Bearer {access_token}'}
+        with requests.get(download_url, headers=headers, stream=True, timeout=timeout) as response:
+            if response.status_code == 401:
+                raise LarkMediaFetchError(401, "Lark API 認證失敗")
+            if response.status_code == 404:
+                raise LarkMediaFetchError(404, "附件不存在")
+            if response.status_code != 200:
+                raise LarkMediaFetchError(502, f"Lark API 錯誤: HTTP {response.status_code}")
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                if chunk:
+                    out.write(chunk)
+            return {
+                'content_type': response.headers.get('content-type'),
+                'content_disposition': response.headers.get('content-disposition'),
+            }
+
+    return fetch
+
+
+class LarkMediaCache:
+    """以 file_token 為鍵的磁碟 LRU 快取"""
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'evictions': 0,
+            'errors': 0,
+            'bytes_served_from_cache': 0,
+            'bytes_downloaded': 0,
+        }
+        if self.enabled:
+            self._load_index()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    # ---------- 路徑與索引 ----------
+
+    def _data_path(self, token: str) -> Path:
+        return self.cache_dir / token[:2] / f"{token}.bin"
+
+    def _meta_path(self, token: str) -> Path:
+        return self.cache_dir / token[:2] / f"{token}.json"
+
+    def _load_index(self) -> None:
+        """啟動時掃描快取目錄，依修改時間重建 LRU 順序"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        found = []
+        for p in self.cache_dir.glob("*/*.bin"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            found.append((st.st_mtime, p.stem, st.st_size))
+        found.sort()
+        with self._lock:
+            for _, token, size in found:
+                self._entries[token] = size
+                self._total_bytes += size
+        logger.info(f"Lark 媒體快取載入 {len(found)} 筆，共 {self._total_bytes} bytes")
+
+    def _touch(self, token: str) -> None:
+        with self._lock:
+            if token in self._entries:
+                self._entries.move_to_end(token)
+        try:
+            os.utime(self._data_path(token), None)
+        except OSError:
+            pass
+
+    def _evict_if_needed(self) -> None:
+        victims = []
+        with self._lock:
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                token, size = self._entries.popitem(last=False)
+                self._total_bytes -= size
+                self._stats['evictions'] += 1
+                victims.append(token)
+        for token in victims:
+            for p in (self._data_path(token), self._meta_path(token)):
+                try:
+                    p.unlink()
+                except OSError:
+                    pass
+
+    # ---------- 讀取 ----------
+
+    def get(self, token: str) -> Optional[CachedMedia]:
+        """查詢快取（命中會更新 LRU 順序與統計）"""
+        if not self.enabled or not token or not _SAFE_TOKEN_RE.match(token):
+            return None
+        with self._lock:
+            if token not in self._entries:
+                return None
+        data_path = self._data_path(token)
+        try:
+            meta = json.loads(self._meta_path(token).read_text(encoding='utf-8'))
+            size = data_path.stat().st_size
+        except (OSError, ValueError):
+            self._drop(token)
+            return None
+        self._touch(token)
+        with self._lock:
+            self._stats['hits'] += 1
+            self._stats['bytes_served_from_cache'] += size
+        return CachedMedia(
+            path=data_path,
+            size=size,
+            sha256=meta.get('sha256') or '',
+            content_type=meta.get('content_type'),
+            content_disposition=meta.get('content_disposition'),
+        )
+
+    def _drop(self, token: str) -> None:
+        with self._lock:
+            size = self._entries.pop(token, None)
+            if size is not None:
+                self._total_bytes -= size
+
+    # ---------- 下載 ----------
+
+    def _download(self, token: str, fetcher: MediaFetcher) -> CachedMedia:
+        tmp_dir = self.cache_dir / ".tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = tmp_dir / f"{token}.{uuid.uuid4().hex}.part"
+        try:
+            with open(tmp_path, "wb") as f:
+                writer = _HashingWriter(f)
+                headers = fetcher(writer) or {}
+            data_path = self._data_path(token)
+            data_path.parent.mkdir(parents=True, exist_ok=True)
+            meta = {
+                'sha256': writer.hexdigest(),
+                'size': writer.size,
+                'content_type': headers.get('content_type'),
+                'content_disposition': headers.get('content_disposition'),
+                'cached_at': time.time(),
+            }
+            self._meta_path(token).write_text(json.dumps(meta), encoding='utf-8')
+            os.replace(tmp_path, data_path)
+        finally:
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+
+        with self._lock:
+            previous = self._entries.pop(token, 0)
+            self._entries[token] = writer.size
+            self._total_bytes += writer.size - previous
+            self._stats['bytes_downloaded'] += writer.size
+        self._evict_if_needed()
+        return CachedMedia(
+            path=data_path,
+            size=writer.size,
+            sha256=meta['sha256'],
+            content_type=meta['content_type'],
+            content_disposition=meta['content_disposition'],
+        )
+
+    async def get_or_fetch(self, token: str, fetcher: MediaFetcher) -> CachedMedia:
+        """取得快取檔案；未命中時下載（同一 token 的並發請求共用一次下載）"""
+        if not self.enabled:
+            raise RuntimeError("Lark 媒體快取未啟用")
+        if not _SAFE_TOKEN_RE.match(token or ''):
+            raise ValueError(f"無效的 file_token: {token!r}")
+
+        cached = self.get(token)
+        if cached is not None:
+            return cached
+
+        pending = self._inflight.get(token)
+        if pending is not None:
+            with self._lock:
+                self._stats['coalesced'] += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[token] = future
+        with self._lock:
+            self._stats['misses'] += 1
+        try:
+            result = await run_in_threadpool(self._download, token, fetcher)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            with self._lock:
+                self._stats['errors'] += 1
+            future.set_exception(e)
+            # 避免沒有其他等待者時出現 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(token, None)
+
+    # ---------- 管理 ----------
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats['hits'] + stats['misses']
+            stats.update({
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'total_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'hit_ratio': (stats['hits'] / lookups) if lookups else 0.0,
+                'inflight': len(self._inflight),
+            })
+        return stats
+
+    def clear(self) -> None:
+        with self._lock:
+            tokens = list(self._entries.keys())
+            self._entries.clear()
+            self._total_bytes = 0
+        for token in tokens:
+            for p in (self._data_path(token), self._meta_path(token)):
+                try:
+                    p.unlink()
+                except OSError:
+                    pass
+
+
+def _build_default_cache() -> LarkMediaCache:
+    cfg = getattr(settings, 'attachments', None)
+    cache_dir = getattr(cfg, 'lark_cache_dir', '') if cfg else ''
+    max_mb = getattr(cfg, 'lark_cache_max_mb', 0) if cfg else 0
+    return LarkMediaCache(
+        Path(cache_dir) if cache_dir else (PROJECT_ROOT / "cache" / "lark_media"),
+        max_bytes=int(max_mb) * 1024 * 1024,
+    )
+
+
+_media_cache: Optional[LarkMediaCache] = None
+_media_cache_lock = threading.Lock()
+
+
+def get_lark_media_cache() -> LarkMediaCache:
+    """取得全域 Lark 媒體快取（首次使用時建立）"""
+    global _media_cache
+    if _media_cache is None:
+        with _media_cache_lock:
+            if _media_cache is None:
+                _media_cache = _build_default_cache()
+    return _media_cache
@@ -13,7 +13,7 @@ from sqlalchemy.orm import Session
 
 from app.config import get_settings
 from app.database import SessionLocal
-from app.models.database_models import TestRunConfig as TestRunConfigDB, TestRunItem as TestRunItemDB
+from app.models.database_models import TestRunConfig as TestRunConfigDB
 from app.services.lark_group_service import get_lark_group_service
 
 logger = logging.getLogger(__name__)
@@ -391,23 +391,8 @@ class LarkNotifyService:
                 pass_rate = 0.0
                 fail_rate = 0.0
             
-            # 計算 bug 數量（從所有 TestRunItem 的 bug_tickets_json 彙整去重）
-            items = db.query(TestRunItemDB).filter(
-                TestRunItemDB.config_id == config_id,
-                TestRunItemDB.team_id == team_id
-            ).all()
-            
-            all_bugs = set()
-            for item in items:
-                if item.bug_tickets_json:
-                    try:
-                        bug_tickets = json.loads(item.bug_tickets_json)
-                        if isinstance(bug_tickets, list):
-                            all_bugs.update(bug_tickets)
-                    except (json.JSONDecodeError, TypeError):
-                        continue
-            
-            bug_count = len(all_bugs)
+            # 不重複 bug 數量由 trigger 維護於配置上
+            bug_count = config.unique_bug_tickets or 0
             
             return {
                 "pass_rate": pass_rate,
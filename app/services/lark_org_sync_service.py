@@ -4,11 +4,14 @@ Lark 組織架構同步服務
 
 整合部門遍歷和用戶收集功能，提供完整的組織架構同步解決方案。
 支援完整同步、增量同步和狀態監控。
+
+多 worker 時以檔案鎖確保同一時間只有一個行程在同步；用戶同步完成後廣播 contacts 失效訊息，
+讓其他 worker 更新聯絡人搜尋索引。
 """
 
 import logging
 import json
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any
 from datetime import datetime
 from sqlalchemy.orm import Session, sessionmaker
 
@@ -17,6 +20,7 @@ from app.services.lark_department_service import LarkDepartmentService
 from app.services.lark_user_service import LarkUserService
 from app.models.database_models import SyncHistory
 from app.database import get_sync_engine
+from app.services.worker_coordination import TOPIC_CONTACTS, file_lock, get_invalidation_bus
 
 
 # 本服務內部使用同步 Session，避免與 AsyncSession 混用
@@ -41,6 +45,9 @@ class LarkOrgSyncService:
             "od-52e860a5435261d6843c5191111c4ccd"
         ]
         
+        # 跨行程鎖（sync_status 只反映本行程）
+        self._sync_lock = file_lock("lark_org_sync")
+
         # 同步狀態
         self.sync_status = {
             'is_syncing': False,
@@ -58,6 +65,9 @@ class LarkOrgSyncService:
                 'message': '同步正在進行中，請稍後再試'
             }
         
+        if not self._sync_lock.acquire(blocking=False):
+            return self._lock_busy_result()
+
         self.logger.info("開始完整組織架構同步...")
         self.sync_status['is_syncing'] = True
         self.sync_status['last_sync_start'] = datetime.utcnow()
@@ -78,7 +88,7 @@ class LarkOrgSyncService:
             
             # Phase 2: 同步用戶數據
             self.logger.info("Phase 2: 同步用戶數據...")
-            user_result = self.user_service.sync_all_users()
+            user_result = self._sync_users()
             
             # 整合結果
             overall_success = dept_result.get('success', False) and user_result.get('success', False)
@@ -106,22 +116,49 @@ class LarkOrgSyncService:
         finally:
             self.sync_status['is_syncing'] = False
             self.sync_status['last_sync_end'] = datetime.utcnow()
+            self._sync_lock.release()
     
-    def sync_departments_only(self) -> Dict[str, Any]:
-        """僅同步部門架構"""
+    def _lock_busy_result(self) -> Dict[str, Any]:
+        return {
+            'success': False,
+            'message': '其他 worker 正在同步，請稍後再試'
+        }
+
+    def sync_departments_only(self, progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """僅同步部門架構（progress_callback 於每層遍歷完成後收到目前統計）"""
+        if not self._sync_lock.acquire(blocking=False):
+            return self._lock_busy_result()
+        try:
+            return self._sync_departments(progress_callback)
+        finally:
+            self._sync_lock.release()
+
+    def sync_users_only(self) -> Dict[str, Any]:
+        """僅同步用戶數據"""
+        if not self._sync_lock.acquire(blocking=False):
+            return self._lock_busy_result()
+        try:
+            return self._sync_users()
+        finally:
+            self._sync_lock.release()
+
+    # 以下兩個內部方法不取鎖，供已持有 _sync_lock 的完整/團隊同步呼叫（鎖不可重入）
+    def _sync_departments(self, progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
         self.logger.info("開始部門架構同步...")
-        result = self.department_service.sync_all_departments(self.root_departments)
+        result = self.department_service.sync_all_departments(self.root_departments, progress_callback)
         try:
             # 部門同步後，基於本地用戶資料重算直屬用戶數
             self.user_service.update_department_user_counts()
         except Exception as e:
             self.logger.error(f"部門同步後重算用戶數失敗: {e}")
         return result
-    
-    def sync_users_only(self) -> Dict[str, Any]:
-        """僅同步用戶數據"""
+
+    def _sync_users(self) -> Dict[str, Any]:
         self.logger.info("開始用戶數據同步...")
-        return self.user_service.sync_all_users()
+        result = self.user_service.sync_all_users()
+        # 本行程的聯絡人索引已於同步中更新，通知其他 worker
+        get_invalidation_bus().broadcast(TOPIC_CONTACTS)
+        return result
     
     def get_sync_status(self) -> Dict[str, Any]:
         """獲取同步狀態"""
@@ -231,21 +268,28 @@ class LarkOrgSyncService:
                 'message': f'獲取聯絡人失敗: {str(e)}'
             }
     
+    @staticmethod
+    def _to_suggestion(user: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'id': user['id'],
+            'name': user['name'],
+            'display_name': user['display_name'],
+            'email': user['email'],
+            'avatar': user['avatar']
+        }
+    
+    def get_contact(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """以用戶 ID 取得聯絡人（建議格式），不存在或已停用時返回 None"""
+        user = self.user_service.get_indexed_user(user_id)
+        return self._to_suggestion(user) if user else None
+    
     def search_contacts_for_team(self, team_id: int, query: str, limit: int = 10) -> Dict[str, Any]:
         """為特定團隊搜索聯絡人建議（兼容現有 API）"""
         try:
             users = self.search_users(query, limit)
             
             # 轉換為建議格式
-            suggestions = []
-            for user in users:
-                suggestions.append({
-                    'id': user['id'],
-                    'name': user['name'],
-                    'display_name': user['display_name'],
-                    'email': user['email'],
-                    'avatar': user['avatar']
-                })
+            suggestions = [self._to_suggestion(user) for user in users]
             
             return {
                 'success': True,
@@ -348,6 +392,23 @@ class LarkOrgSyncService:
         finally:
             db.close()
     
+    def _update_sync_progress(self, sync_id: int, dept_stats: Dict[str, Any]) -> None:
+        """部門遍歷期間更新同步記錄的即時進度"""
+        db = SyncSessionLocal()
+        try:
+            db.query(SyncHistory).filter(SyncHistory.id == sync_id).update({
+                'departments_discovered': dept_stats.get('departments_discovered', 0),
+                'departments_created': dept_stats.get('departments_created', 0),
+                'departments_updated': dept_stats.get('departments_updated', 0),
+                'api_calls': dept_stats.get('api_calls', 0),
+            })
+            db.commit()
+        except Exception as e:
+            self.logger.warning(f"更新同步進度失敗: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
     def get_sync_history(self, team_id: int, limit: int = 10) -> List[Dict[str, Any]]:
         """獲取團隊同步歷史記錄"""
         db = SyncSessionLocal()
@@ -396,9 +457,13 @@ class LarkOrgSyncService:
                 'message': '同步正在進行中，請稍後再試'
             }
         
+        if not self._sync_lock.acquire(blocking=False):
+            return self._lock_busy_result()
+
         # 創建同步記錄
         sync_id = self._create_sync_history(team_id, sync_type, 'manual', trigger_user)
         if not sync_id:
+            self._sync_lock.release()
             return {
                 'success': False,
                 'message': '無法創建同步記錄'
@@ -411,21 +476,24 @@ class LarkOrgSyncService:
         try:
             # 更新狀態為運行中
             self._update_sync_history(sync_id, 'running')
+
+            def report_progress(dept_stats: Dict[str, Any]) -> None:
+                self._update_sync_progress(sync_id, dept_stats)
             
             if sync_type == 'departments':
-                result = self.sync_departments_only()
+                result = self._sync_departments(report_progress)
                 self._update_sync_history(sync_id, 'completed' if result.get('success') else 'failed',
                                         dept_result=result, error_message=result.get('message') if not result.get('success') else None)
                 
             elif sync_type == 'users':
-                result = self.sync_users_only()
+                result = self._sync_users()
                 self._update_sync_history(sync_id, 'completed' if result.get('success') else 'failed',
                                         user_result=result, error_message=result.get('message') if not result.get('success') else None)
                 
             elif sync_type == 'full':
-                dept_result = self.sync_departments_only()
+                dept_result = self._sync_departments(report_progress)
                 if dept_result.get('success', False):
-                    user_result = self.sync_users_only()
+                    user_result = self._sync_users()
                     overall_success = user_result.get('success', False)
                     
                     result = {
@@ -470,6 +538,7 @@ class LarkOrgSyncService:
             self.sync_status['is_syncing'] = False
             self.sync_status['last_sync_end'] = datetime.utcnow()
             self.sync_status['current_sync_id'] = None
+            self._sync_lock.release()
 
 
 # 創建全局服務實例（使用配置中的 Lark 認證信息）
@@ -2,40 +2,60 @@
 """
 Lark 用戶收集服務
 
-負責從 Lark 各部門收集用戶數據並存儲到本地數據庫。
+負責從 Lark 各部門並行收集用戶數據，去重後批次寫入本地數據庫。
 基於實際 API 測試數據設計，支援增量同步和重複處理。
 """
 
 import json
 import logging
-import requests
 import threading
-from typing import Dict, List, Optional, Tuple, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, Any
 from datetime import datetime, timedelta
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import func
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from app.database import get_sync_engine
 from app.models.database_models import LarkUser, LarkDepartment
-from app.services.lark_client import LarkAuthManager
+from app.services.contact_search_index import contact_search_index
+from app.services.lark_client import LarkApiSession, LarkAuthManager
 
 
 class LarkUserService:
-    """Lark 用戶收集服務"""
+    """Lark 用戶收集服務
+
+    用戶同步為串流管線：並行抓取各部門成員頁面（受共用 LarkRateLimiter 限制），
+    依部門順序逐一處理並以 user_id 於記憶體去重，最後以批次 upsert 寫入 lark_users，
+    部門直屬人數則以單一聚合 UPDATE 重算。
+    """
+
+    # 單批 upsert 筆數（每批一次 existence 查詢與一次 commit）
+    UPSERT_BATCH_SIZE = 500
     
-    def __init__(self, auth_manager: LarkAuthManager):
+    def __init__(self, auth_manager: LarkAuthManager,
+                 session_factory: Optional[Callable[[], Session]] = None,
+                 max_workers: Optional[int] = None):
         self.auth_manager = auth_manager
         self.logger = logging.getLogger(__name__)
         
         # API 配置
         self.base_url = "https://open.larksuite.com/open-apis"
         self.timeout = 30
+
+        # 並行查詢數（預設與共用限流器的並行上限一致）
+        rate_limiter = getattr(auth_manager, 'rate_limiter', None)
+        self.max_workers = max_workers or (rate_limiter.max_concurrency if rate_limiter else 4)
+        self._stats_lock = threading.Lock()
+        self.api = LarkApiSession(auth_manager, pool_size=self.max_workers, timeout=self.timeout,
+                                  on_request=lambda: self._incr_stat('api_calls'))
         
         # 數據庫會話（使用同步引擎，避免與 AsyncEngine 混用）
-        sync_engine = get_sync_engine()
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
-        self.db_session = SessionLocal()
+        if session_factory is None:
+            sync_engine = get_sync_engine()
+            session_factory = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
+        self.db_session = session_factory()
         
         # 收集統計
         self.stats = {
@@ -53,24 +73,18 @@ class LarkUserService:
         # 用戶去重集合
         self.processed_users = set()  # user_id 集合
         self.user_dept_mapping = {}   # user_id -> [dept_ids] 映射
+
+    def _incr_stat(self, key: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[key] += amount
         
     def get_users_by_department(self, department_id: str, page_size: int = 50) -> Optional[List[Dict]]:
-        """獲取指定部門的直屬用戶列表"""
+        """獲取指定部門的直屬用戶列表（自動翻頁）"""
         try:
-            token = self.auth_manager.get_tenant_access_token()
-            if not token:
-                self.logger.error("無法獲取 access token")
-                return None
-            
             all_users = []
             page_token = None
             
             while True:
-                url = f"{self.base_url}/contact/v3/users/find_by_department"
-                headers = {
-                    'Authorization': f'Bearer {token}',
-                    'Content-Type': 'application/json'
-                }
                 params = {
                     'department_id': department_id,
                     'department_id_type': 'open_department_id',
@@ -80,33 +94,23 @@ class LarkUserService:
                 
                 if page_token:
                     params['page_token'] = page_token
-                
-                self.stats['api_calls'] += 1
-                response = requests.get(url, headers=headers, params=params, timeout=self.timeout)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get('code') == 0:
-                        users = data.get('data', {}).get('items', [])
-                        all_users.extend(users)
-                        
-                        # 檢查是否有更多頁面
-                        page_token = data.get('data', {}).get('page_token')
-                        if not page_token or not data.get('data', {}).get('has_more', False):
-                            break
-                    else:
-                        self.logger.warning(f"API 返回錯誤: {data}")
-                        return None
-                else:
-                    self.logger.error(f"HTTP 請求失敗: {response.status_code} - {response.text}")
+
+                data = self.api.get(f"{self.base_url}/contact/v3/users/find_by_department", params)
+                if data is None:
                     return None
+                all_users.extend(data.get('items') or [])
+
+                # 檢查是否有更多頁面
+                page_token = data.get('page_token')
+                if not page_token or not data.get('has_more', False):
+                    break
             
             self.logger.debug(f"部門 {department_id} 有 {len(all_users)} 個直屬用戶")
             return all_users
             
         except Exception as e:
             self.logger.error(f"獲取部門用戶異常: {e}")
-            self.stats['errors'] += 1
+            self._incr_stat('errors')
             return None
     
     def process_user_data(self, user_data: Dict, department_id: str) -> Dict[str, Any]:
@@ -182,89 +186,68 @@ class LarkUserService:
             self.logger.error(f"處理用戶數據異常: {e}")
             return None
     
-    def save_user(self, user_data: Dict[str, Any]) -> bool:
-        """保存用戶數據到數據庫"""
-        try:
-            user_id = user_data['user_id']
-            
-            # 檢查用戶是否已存在
-            existing_user = self.db_session.query(LarkUser).filter(
-                LarkUser.user_id == user_id
-            ).first()
-            
+    def upsert_users(self, rows: List[Dict[str, Any]]) -> int:
+        """批次寫入用戶（INSERT ... ON CONFLICT DO UPDATE），回傳成功筆數
+
+        既有用戶的部門列表會與本次結果合併；單批寫入失敗（例如 email 唯一鍵衝突）時
+        改為逐筆寫入，只略過有問題的用戶。
+        """
+        table = LarkUser.__table__
+        saved = 0
+        for offset in range(0, len(rows), self.UPSERT_BATCH_SIZE):
+            batch = rows[offset:offset + self.UPSERT_BATCH_SIZE]
+            existing = dict(self.db_session.execute(
+                select(table.c.user_id, table.c.department_ids_json)
+                .where(table.c.user_id.in_([row['user_id'] for row in batch]))
+            ).all())
+
             now = datetime.utcnow()
-            
-            if existing_user:
-                # 更新現有用戶
-                for key, value in user_data.items():
-                    if key != 'user_id':  # 不更新主鍵
-                        setattr(existing_user, key, value)
-                
-                existing_user.updated_at = now
-                existing_user.last_sync_at = now
-                
-                # 更新部門歸屬（合併部門列表）
-                existing_depts = json.loads(existing_user.department_ids_json or '[]')
-                new_depts = json.loads(user_data.get('department_ids_json', '[]'))
-                merged_depts = list(set(existing_depts + new_depts))
-                existing_user.department_ids_json = json.dumps(merged_depts, ensure_ascii=False)
-                
-                self.stats['users_updated'] += 1
-                self.logger.debug(f"更新用戶: {user_id} ({user_data.get('name', 'Unknown')})")
-            else:
-                # 創建新用戶
-                new_user = LarkUser(**user_data)
-                new_user.created_at = now
-                new_user.updated_at = now
-                
-                self.db_session.add(new_user)
-                self.stats['users_created'] += 1
-                self.logger.debug(f"創建新用戶: {user_id} ({user_data.get('name', 'Unknown')})")
-            
-            self.db_session.commit()
-            return True
-            
-        except IntegrityError as e:
-            self.db_session.rollback()
-            self.logger.error(f"保存用戶時數據庫完整性錯誤: {e}")
-            self.stats['errors'] += 1
-            return False
-        except Exception as e:
-            self.db_session.rollback()
-            self.logger.error(f"保存用戶異常: {e}")
-            self.stats['errors'] += 1
-            return False
-    
-    def collect_users_from_department(self, department_id: str) -> bool:
-        """從指定部門收集用戶數據"""
-        self.logger.info(f"開始收集部門 {department_id} 的用戶")
-        
-        try:
-            users_data = self.get_users_by_department(department_id)
-            if users_data is None:
-                self.logger.warning(f"無法獲取部門 {department_id} 的用戶數據")
-                return False
-            
-            success_count = 0
-            for user_data in users_data:
-                self.stats['users_discovered'] += 1
-                
-                processed_data = self.process_user_data(user_data, department_id)
-                if processed_data:
-                    if self.save_user(processed_data):
-                        success_count += 1
-                    else:
-                        self.logger.warning(f"保存用戶失敗: {user_data.get('user_id')}")
-                else:
-                    self.logger.warning(f"處理用戶數據失敗: {user_data}")
-            
-            self.logger.info(f"部門 {department_id} 用戶收集完成，成功 {success_count}/{len(users_data)} 個用戶")
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"從部門 {department_id} 收集用戶時發生異常: {e}")
-            self.stats['errors'] += 1
-            return False
+            for row in batch:
+                row['created_at'] = now
+                row['updated_at'] = now
+                if row['user_id'] in existing:
+                    # 合併部門歸屬（保留本次順序，附加既有但本次未出現的部門）
+                    new_depts = json.loads(row['department_ids_json'] or '[]')
+                    old_depts = json.loads(existing[row['user_id']] or '[]')
+                    merged = new_depts + [d for d in old_depts if d not in new_depts]
+                    row['department_ids_json'] = json.dumps(merged, ensure_ascii=False)
+
+            try:
+                self.db_session.execute(self._upsert_statement(batch[0].keys()), batch)
+                self.db_session.commit()
+                saved += len(batch)
+                self.stats['users_updated'] += len(existing)
+                self.stats['users_created'] += len(batch) - len(existing)
+                continue
+            except IntegrityError as e:
+                self.db_session.rollback()
+                self.logger.warning(f"批次保存用戶失敗，改為逐筆寫入: {e}")
+
+            for row in batch:
+                try:
+                    self.db_session.execute(self._upsert_statement(row.keys()), [row])
+                    self.db_session.commit()
+                    saved += 1
+                    self.stats['users_updated' if row['user_id'] in existing else 'users_created'] += 1
+                except IntegrityError as e:
+                    self.db_session.rollback()
+                    self.logger.error(f"保存用戶時數據庫完整性錯誤 {row['user_id']}: {e}")
+                    self.stats['errors'] += 1
+        return saved
+
+    @staticmethod
+    def _upsert_statement(columns):
+        """單列 upsert 語句；以 executemany 參數列表執行，SQLAlchemy 會自動合併為多列 VALUES"""
+        table = LarkUser.__table__
+        stmt = sqlite_insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id],
+            set_={
+                key: stmt.excluded[key]
+                for key in columns
+                if key not in ('user_id', 'created_at')
+            }
+        )
     
     def sync_all_users(self) -> Dict[str, Any]:
         """同步所有用戶數據（從已同步的部門中收集）"""
@@ -280,38 +263,65 @@ class LarkUserService:
         
         try:
             # 獲取所有活躍部門
-            departments = self.db_session.query(LarkDepartment).filter(
-                LarkDepartment.status == 'active'
-            ).all()
+            department_ids = list(self.db_session.execute(
+                select(LarkDepartment.department_id)
+                .where(LarkDepartment.status == 'active')
+                .order_by(LarkDepartment.level, LarkDepartment.department_id)
+            ).scalars())
             
-            if not departments:
+            if not department_ids:
                 return {
                     'success': False,
                     'message': '沒有找到活躍的部門，請先同步部門數據',
                     'stats': self.stats.copy()
                 }
             
-            self.logger.info(f"找到 {len(departments)} 個活躍部門，開始收集用戶...")
-            
+            self.logger.info(f"找到 {len(department_ids)} 個活躍部門，開始收集用戶...")
+
+            # 並行抓取；executor.map 依部門順序產出結果，
+            # 確保同一用戶以「第一個出現的部門」為主部門，結果可重現
+            rows: Dict[str, Dict[str, Any]] = {}
             success_count = 0
-            for department in departments:
-                if self.collect_users_from_department(department.department_id):
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="lark-user") as executor:
+                for department_id, users_data in zip(
+                    department_ids, executor.map(self.get_users_by_department, department_ids)
+                ):
+                    if users_data is None:
+                        self.logger.error(f"部門 {department_id} 用戶收集失敗")
+                        continue
                     success_count += 1
                     self.stats['departments_processed'] += 1
-                else:
-                    self.logger.error(f"部門 {department.department_id} 用戶收集失敗")
-            
-            self.stats['end_time'] = datetime.utcnow()
-            duration = (self.stats['end_time'] - self.stats['start_time']).total_seconds()
+
+                    for user_data in users_data:
+                        self.stats['users_discovered'] += 1
+                        processed_data = self.process_user_data(user_data, department_id)
+                        if not processed_data:
+                            self.logger.warning(f"處理用戶數據失敗: {user_data}")
+                            continue
+                        user_id = processed_data['user_id']
+                        if user_id in rows:
+                            rows[user_id]['department_ids_json'] = processed_data['department_ids_json']
+                        else:
+                            rows[user_id] = processed_data
+                            self.processed_users.add(user_id)
+
+            self.upsert_users(list(rows.values()))
             
             # 更新部門用戶統計
             self.update_department_user_counts()
+
+            # 增量更新聯絡人搜尋索引（僅重寫有變動的用戶）
+            if contact_search_index.loaded:
+                contact_search_index.refresh_from_db(self.db_session)
+
+            self.stats['end_time'] = datetime.utcnow()
+            duration = (self.stats['end_time'] - self.stats['start_time']).total_seconds()
             
             result = {
                 'success': success_count > 0,
                 'duration_seconds': duration,
                 'stats': self.stats.copy(),
-                'message': f"用戶同步完成，處理了 {success_count}/{len(departments)} 個部門"
+                'message': f"用戶同步完成，處理了 {success_count}/{len(department_ids)} 個部門"
             }
             
             self.logger.info(f"用戶同步完成: {result['message']}")
@@ -325,6 +335,7 @@ class LarkUserService:
             return result
             
         except Exception as e:
+            self.db_session.rollback()
             self.logger.error(f"用戶同步過程中發生嚴重錯誤: {e}")
             return {
                 'success': False,
@@ -334,22 +345,23 @@ class LarkUserService:
             }
     
     def update_department_user_counts(self):
-        """更新各部門的用戶統計數量"""
+        """更新各部門的直屬用戶數量（單一聚合 UPDATE）"""
         try:
-            # 更新各部門的直屬用戶數量
-            departments = self.db_session.query(LarkDepartment).all()
-            
-            for department in departments:
-                # 計算直屬用戶數
-                direct_count = self.db_session.query(func.count(LarkUser.user_id)).filter(
-                    LarkUser.primary_department_id == department.department_id,
+            direct_count = (
+                select(func.count(LarkUser.user_id))
+                .where(
+                    LarkUser.primary_department_id == LarkDepartment.department_id,
                     LarkUser.is_activated == True,
                     LarkUser.is_exited == False
-                ).scalar()
-                
-                department.direct_user_count = direct_count
-                department.updated_at = datetime.utcnow()
-            
+                )
+                .scalar_subquery()
+            )
+            self.db_session.execute(
+                update(LarkDepartment).values(
+                    direct_user_count=direct_count,
+                    updated_at=datetime.utcnow()
+                )
+            )
             self.db_session.commit()
             self.logger.info("部門用戶統計更新完成")
             
@@ -404,40 +416,26 @@ class LarkUserService:
             return {'error': str(e)}
     
     def search_users(self, query: str, limit: int = 50) -> List[Dict[str, Any]]:
-        """搜索用戶（本地數據庫搜索）"""
+        """搜索用戶（記憶體 n-gram 索引，首次查詢時從本地數據庫載入）"""
         try:
-            query = query.lower().strip()
-            if not query:
+            if not query or not query.strip():
                 return []
-            
-            # 構建搜索條件
-            users = self.db_session.query(LarkUser).filter(
-                (LarkUser.name.ilike(f'%{query}%')) |
-                (LarkUser.en_name.ilike(f'%{query}%')) |
-                (LarkUser.enterprise_email.ilike(f'%{query}%')),
-                LarkUser.is_activated == True,
-                LarkUser.is_exited == False
-            ).limit(limit).all()
-            
-            result = []
-            for user in users:
-                result.append({
-                    'id': user.user_id,
-                    'name': user.name,
-                    'display_name': user.name or user.en_name,
-                    'email': user.enterprise_email,
-                    'avatar': user.avatar_240,
-                    'department_id': user.primary_department_id,
-                    'job_title': user.job_title,
-                    'employee_type': user.employee_type
-                })
-            
-            return result
+            contact_search_index.ensure_loaded(self.db_session)
+            return contact_search_index.search(query, limit)
             
         except Exception as e:
             self.logger.error(f"搜索用戶失敗: {e}")
             return []
 
+    def get_indexed_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """以 user_id 精確查詢活躍用戶（走搜尋索引）"""
+        try:
+            contact_search_index.ensure_loaded(self.db_session)
+            return contact_search_index.get(user_id)
+        except Exception as e:
+            self.logger.error(f"查詢用戶失敗: {e}")
+            return None
+
     def get_top_users(self, limit: int = 50) -> List[Dict[str, Any]]:
         """返回前端可用的前 N 名活躍用戶（無搜尋詞時的預設清單）。
 
@@ -0,0 +1,321 @@
+"""
+即時事件發布/訂閱（SSE 推送用）
+
+路由於寫入 commit 後呼叫 publish()，事件經後端（backend）傳遞給各 worker 的本地訂閱者：
+- memory：行程內直接分派（單一 worker，預設）
+- sqlite：寫入 live_events 表（經寫入佇列合併 commit），各 worker 輪詢新事件後分派，
+  多 worker 共用同一 SQLite 檔即可互通，不需外部服務
+- 亦可用 LIVE_EVENTS_BACKEND=<module>:<Class> 指定自訂後端（例如 Redis pub/sub）
+
+每個訂閱者有一個有上限的佇列；消費過慢而溢位時標記 overflowed，SSE 端點會通知用戶端重新載入，
+不會因單一慢速連線拖累發布端。
+"""
+
+import asyncio
+import importlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Set
+
+from sqlalchemy import text
+
+from app.services.metrics import LIVE_EVENT_OVERFLOWS, LIVE_EVENTS_PUBLISHED
+
+logger = logging.getLogger(__name__)
+
+BACKEND_NAME = os.getenv("LIVE_EVENTS_BACKEND", "memory")
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("LIVE_EVENTS_QUEUE_SIZE", "256"))
+SQLITE_POLL_SECONDS = float(os.getenv("LIVE_EVENTS_POLL_MS", "250")) / 1000.0
+SQLITE_RETENTION_SECONDS = float(os.getenv("LIVE_EVENTS_RETENTION_SECONDS", "300"))
+# 彙總類事件（例如統計）的合併延遲：延遲內的多次觸發只計算、發布一次
+COALESCE_SECONDS = float(os.getenv("LIVE_EVENTS_COALESCE_MS", "300")) / 1000.0
+
+
+def run_channel(config_id: int) -> str:
+    """測試執行配置的事件頻道名稱"""
+    return f"test_run:{config_id}"
+
+
+class Subscription:
+    """單一訂閱者；以 get() 取得事件，溢位後 overflowed 為 True 且不再收到事件"""
+
+    def __init__(self, broker: "LiveEventBroker", channel: str, queue_size: int):
+        self.broker = broker
+        self.channel = channel
+        self.overflowed = False
+        self._queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=queue_size)
+        self._loop = asyncio.get_running_loop()
+
+    def _offer(self, message: Dict[str, Any]) -> None:
+        if self.overflowed:
+            return
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            LIVE_EVENT_OVERFLOWS.inc()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """取得下一個事件；逾時回傳 None"""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self) -> None:
+        self.broker._unsubscribe(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class MemoryEventBackend:
+    """行程內後端：發布即分派給本地訂閱者"""
+
+    shared = False
+
+    def __init__(self):
+        self.broker: Optional["LiveEventBroker"] = None
+
+    async def start(self, broker: "LiveEventBroker") -> None:
+        self.broker = broker
+
+    async def stop(self) -> None:
+        return None
+
+    async def publish(self, message: Dict[str, Any]) -> None:
+        self.broker._dispatch(message)
+
+
+class SQLiteEventBackend:
+    """以 live_events 表在多個 worker 之間傳遞事件（發布端與訂閱端都只依賴共用的 SQLite 檔）"""
+
+    shared = True
+
+    def __init__(self, engine=None, poll_seconds: float = SQLITE_POLL_SECONDS,
+                 retention_seconds: float = SQLITE_RETENTION_SECONDS, write_queue=None):
+        self._engine = engine
+        self._write_queue = write_queue
+        self.poll_seconds = poll_seconds
+        self.retention_seconds = retention_seconds
+        self.broker: Optional["LiveEventBroker"] = None
+        self._last_id = 0
+        self._task: Optional[asyncio.Task] = None
+        self._last_prune = 0.0
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from app.database import get_sync_engine
+            self._engine = get_sync_engine()
+        return self._engine
+
+    @property
+    def write_queue(self):
+        if self._write_queue is None:
+            from app.services.write_queue import get_write_queue
+            self._write_queue = get_write_queue()
+        return self._write_queue
+
+    def _prepare(self) -> int:
+        from app.models.database_models import LiveEventRecord
+        LiveEventRecord.__table__.create(bind=self.engine, checkfirst=True)
+        return self._max_id()
+
+    def _max_id(self) -> int:
+        with self.engine.connect() as conn:
+            return int(conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM live_events")).scalar() or 0)
+
+    async def start(self, broker: "LiveEventBroker") -> None:
+        self.broker = broker
+        # 只分派啟動後的新事件
+        self._last_id = await asyncio.to_thread(self._prepare)
+        self._task = asyncio.get_running_loop().create_task(self._poll_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def publish(self, message: Dict[str, Any]) -> None:
+        payload = json.dumps(message["data"], ensure_ascii=False, default=str)
+
+        def insert(session):
+            session.execute(
+                text("INSERT INTO live_events (channel, event, payload, created_at) "
+                     "VALUES (:channel, :event, :payload, CURRENT_TIMESTAMP)"),
+                {"channel": message["channel"], "event": message["event"], "payload": payload},
+            )
+
+        await self.write_queue.run(insert)
+
+    def _fetch(self):
+        with self.engine.connect() as conn:
+            return conn.execute(
+                text("SELECT id, channel, event, payload FROM live_events WHERE id > :last ORDER BY id LIMIT 1000"),
+                {"last": self._last_id},
+            ).all()
+
+    def _prune(self, session) -> None:
+        session.execute(
+            text("DELETE FROM live_events WHERE created_at < datetime('now', :age)"),
+            {"age": f"-{int(self.retention_seconds)} seconds"},
+        )
+
+    async def _poll_loop(self) -> None:
+        while True:
+            try:
+                if self.broker.subscriber_count():
+                    for row_id, channel, event, payload in await asyncio.to_thread(self._fetch):
+                        self._last_id = row_id
+                        self.broker._dispatch({"channel": channel, "event": event, "data": json.loads(payload)})
+                else:
+                    # 無訂閱者時不讀取事件內容，只推進位置，避免之後補送舊事件
+                    self._last_id = await asyncio.to_thread(self._max_id)
+                now = time.monotonic()
+                if now - self._last_prune > self.retention_seconds:
+                    self._last_prune = now
+                    self.write_queue.submit(self._prune)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"讀取即時事件失敗: {e}")
+            await asyncio.sleep(self.poll_seconds)
+
+
+BACKENDS: Dict[str, Callable[[], Any]] = {
+    "memory": MemoryEventBackend,
+    "sqlite": SQLiteEventBackend,
+}
+
+
+def create_backend(name: str):
+    """依名稱或 <module>:<Class> 建立後端"""
+    if name in BACKENDS:
+        return BACKENDS[name]()
+    module_name, _, attr = name.partition(":")
+    if not attr:
+        raise ValueError(f"未知的即時事件後端: {name}")
+    return getattr(importlib.import_module(module_name), attr)()
+
+
+class LiveEventBroker:
+    """本地訂閱管理與發布入口"""
+
+    def __init__(self, backend=None, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.backend = backend or MemoryEventBackend()
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self._started = False
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._pending: Dict[tuple, asyncio.Task] = {}
+
+    async def start(self) -> None:
+        if self._started:
+            return
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if not self._started:
+                await self.backend.start(self)
+                self._started = True
+
+    async def stop(self) -> None:
+        for task in list(self._pending.values()):
+            task.cancel()
+        self._pending.clear()
+        if self._started:
+            await self.backend.stop()
+            self._started = False
+
+    # ---- 訂閱 ----
+
+    async def subscribe(self, channel: str) -> Subscription:
+        await self.start()
+        subscription = Subscription(self, channel, self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def subscriber_count(self, channel: Optional[str] = None) -> int:
+        with self._lock:
+            if channel is not None:
+                return len(self._subscribers.get(channel, ()))
+            return sum(len(subs) for subs in self._subscribers.values())
+
+    def has_subscribers(self, channel: str) -> bool:
+        """是否可能有人訂閱（共用後端的訂閱者可能在其他 worker，一律視為有）"""
+        return self.backend.shared or self.subscriber_count(channel) > 0
+
+    def _dispatch(self, message: Dict[str, Any]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(message["channel"], ()))
+        for subscription in subscribers:
+            # 後端可能在其他執行緒分派，統一回到訂閱者所在的事件迴圈放入佇列
+            try:
+                if subscription._loop is asyncio.get_running_loop():
+                    subscription._offer(message)
+                    continue
+            except RuntimeError:
+                pass
+            subscription._loop.call_soon_threadsafe(subscription._offer, message)
+
+    # ---- 發布 ----
+
+    async def publish(self, channel: str, event: str, data: Any) -> None:
+        await self.start()
+        LIVE_EVENTS_PUBLISHED.inc(event=event)
+        await self.backend.publish({"channel": channel, "event": event, "data": data})
+
+    def publish_coalesced(self, channel: str, event: str, build: Callable[[], Any],
+                          delay: Optional[float] = None) -> None:
+        """延遲 delay 秒（預設 COALESCE_SECONDS）後於執行緒中呼叫 build() 並發布；期間重複觸發只會執行一次"""
+        delay = COALESCE_SECONDS if delay is None else delay
+        key = (channel, event)
+        if key in self._pending:
+            return
+
+        async def run():
+            try:
+                await asyncio.sleep(delay)
+                self._pending.pop(key, None)
+                await self.publish(channel, event, await asyncio.to_thread(build))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"發布即時事件 {event} 失敗: {e}")
+            finally:
+                # sleep 後已移除；此時鍵可能已屬於新排定的工作，只移除自己
+                if self._pending.get(key) is asyncio.current_task():
+                    del self._pending[key]
+
+        self._pending[key] = asyncio.get_running_loop().create_task(run())
+
+
+_broker: Optional[LiveEventBroker] = None
+_broker_lock = threading.Lock()
+
+
+def get_event_broker() -> LiveEventBroker:
+    """取得全域事件 broker（後端由 LIVE_EVENTS_BACKEND 決定）"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = LiveEventBroker(create_backend(BACKEND_NAME))
+    return _broker
@@ -0,0 +1,471 @@
+"""
+應用程式指標（Prometheus text exposition format）
+
+- Counter / Gauge / Histogram，支援標籤；執行緒安全
+- 多 worker（uvicorn --workers）：設定 METRICS_MULTIPROC_DIR 後，
+  每個行程定期將自身快照寫入 {dir}/metrics_{pid}.json，/metrics 抓取時合併所有行程：
+  counter / histogram 加總全部檔案（含已結束的 worker，數值不倒退）；
+  gauge 只加總仍存活的行程。部署前應清空該目錄（與 prometheus_client 的 multiprocess 模式相同）。
+- collector：抓取/寫檔前呼叫，用於把既有統計（審計佇列、快取命中等）同步到指標
+"""
+
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str,
+                 labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = registry._lock
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 需要標籤 {self.labelnames}，收到 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> List[List[Any]]:
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_total(self, value: float, **labels) -> None:
+        """以既有的累計統計直接設定總數（供 collector 使用）"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str,
+                 labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # [各 bucket 計數（非累計，最後一格為 +Inf）, sum, count]
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def _samples(self) -> List[List[Any]]:
+        with self._lock:
+            return [[list(key), [list(counts), total, count]]
+                    for key, (counts, total, count) in self._values.items()]
+
+
+class MetricsRegistry:
+    """指標註冊表；render() 產生 /metrics 的內容"""
+
+    def __init__(self, multiproc_dir: Optional[str] = None, flush_interval: float = 5.0):
+        self._lock = threading.RLock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self.multiproc_dir = multiproc_dir
+        self.flush_interval = flush_interval
+        self._flusher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # ---------------- 註冊 ----------------
+
+    def _register(self, cls, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(self, name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"指標 {name} 已以不同型別或標籤註冊")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        self._collectors.append(collector)
+
+    # ---------------- 快照與多行程儲存 ----------------
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.debug(f"指標 collector 執行失敗: {e}")
+        with self._lock:
+            metrics = list(self._metrics.values())
+        families = {}
+        for metric in metrics:
+            families[metric.name] = {
+                "type": metric.kind,
+                "help": metric.documentation,
+                "labelnames": list(metric.labelnames),
+                "buckets": list(getattr(metric, "buckets", ())),
+                "samples": metric._samples(),
+            }
+        return families
+
+    def _snapshot_path(self, pid: int) -> str:
+        return os.path.join(self.multiproc_dir, f"metrics_{pid}.json")
+
+    def flush(self) -> None:
+        """將本行程快照寫入共用目錄（原子替換）"""
+        if not self.multiproc_dir:
+            return
+        os.makedirs(self.multiproc_dir, exist_ok=True)
+        path = self._snapshot_path(os.getpid())
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def start_flusher(self) -> None:
+        """啟動背景定期寫檔（僅多行程模式）"""
+        if not self.multiproc_dir or (self._flusher and self._flusher.is_alive()):
+            return
+        self._stop.clear()
+
+        def _run():
+            while not self._stop.wait(self.flush_interval):
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.warning(f"寫入指標快照失敗: {e}")
+
+        self._flusher = threading.Thread(target=_run, name="metrics-flusher", daemon=True)
+        self._flusher.start()
+
+    def stop_flusher(self) -> None:
+        self._stop.set()
+        try:
+            self.flush()
+        except Exception as e:
+            logger.warning(f"寫入指標快照失敗: {e}")
+
+    def _collect_all(self) -> Dict[str, Dict[str, Any]]:
+        if not self.multiproc_dir:
+            return self.snapshot()
+
+        self.flush()
+        merged: Dict[str, Dict[str, Any]] = {}
+        for filename in sorted(os.listdir(self.multiproc_dir)):
+            match = re.fullmatch(r"metrics_(\d+)\.json", filename)
+            if not match:
+                continue
+            try:
+                with open(os.path.join(self.multiproc_dir, filename), encoding="utf-8") as f:
+                    families = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"讀取指標快照 {filename} 失敗: {e}")
+                continue
+            alive = _pid_alive(int(match.group(1)))
+            for name, family in families.items():
+                if family["type"] == "gauge" and not alive:
+                    continue
+                target = merged.setdefault(name, {**family, "samples": {}})
+                samples = target["samples"]
+                for labels, value in family["samples"]:
+                    key = tuple(labels)
+                    if key not in samples:
+                        samples[key] = value
+                    elif family["type"] == "histogram":
+                        counts, total, count = samples[key]
+                        samples[key] = [[a + b for a, b in zip(counts, value[0])], total + value[1], count + value[2]]
+                    else:
+                        samples[key] += value
+        for family in merged.values():
+            family["samples"] = [[list(key), value] for key, value in family["samples"].items()]
+        return merged
+
+    # ---------------- 輸出 ----------------
+
+    def render(self) -> str:
+        families = self._collect_all()
+        _derive_cache_hit_ratio(families)
+        lines: List[str] = []
+        for name in sorted(families):
+            family = families[name]
+            lines.append(f"# HELP {name} {_escape_help(family['help'])}")
+            lines.append(f"# TYPE {name} {family['type']}")
+            labelnames = family["labelnames"]
+            for labels, value in sorted(family["samples"], key=lambda s: s[0]):
+                pairs = list(zip(labelnames, labels))
+                if family["type"] != "histogram":
+                    lines.append(f"{name}{_format_labels(pairs)} {_format_value(value)}")
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(list(family["buckets"]) + ["+Inf"], counts):
+                    cumulative += bucket_count
+                    le = bound if bound == "+Inf" else _format_value(bound)
+                    lines.append(f"{name}_bucket{_format_labels(pairs + [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(pairs)} {_format_value(total)}")
+                lines.append(f"{name}_count{_format_labels(pairs)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label_value(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(pairs: Iterable[Tuple[str, Any]]) -> str:
+    pairs = list(pairs)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label_value(value)}"' for key, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _derive_cache_hit_ratio(families: Dict[str, Dict[str, Any]]) -> None:
+    """由合併後的 cache_requests_total 計算各快取命中率（避免跨行程加總比例）"""
+    family = families.get("cache_requests_total")
+    if not family:
+        return
+    totals: Dict[str, Dict[str, float]] = {}
+    for (cache, result), value in family["samples"]:
+        totals.setdefault(cache, {})[result] = value
+    samples = []
+    for cache, counts in totals.items():
+        lookups = counts.get("hit", 0) + counts.get("miss", 0)
+        samples.append([[cache], counts.get("hit", 0) / lookups if lookups else 0.0])
+    families["cache_hit_ratio"] = {
+        "type": "gauge", "help": "快取命中率（hit / (hit + miss)）",
+        "labelnames": ["cache"], "buckets": [], "samples": samples,
+    }
+
+
+# ---------------- 應用程式指標 ----------------
+
+registry = MetricsRegistry(multiproc_dir=os.getenv("METRICS_MULTIPROC_DIR") or None)
+
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total", "HTTP 請求數", ("method", "route", "status"))
+HTTP_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "HTTP 請求處理時間（依路由樣板）", ("method", "route"))
+HTTP_IN_PROGRESS = registry.gauge(
+    "http_requests_in_progress", "處理中的 HTTP 請求數")
+
+DB_QUERIES = registry.counter(
+    "db_queries_total", "資料庫查詢數", ("engine", "operation"))
+DB_LATENCY = registry.histogram(
+    "db_query_duration_seconds", "資料庫查詢時間", ("engine", "operation"),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+
+OUTBOUND_REQUESTS = registry.counter(
+    "outbound_requests_total", "對外 API 呼叫數", ("service", "endpoint", "status"))
+OUTBOUND_LATENCY = registry.histogram(
+    "outbound_request_duration_seconds", "對外 API 呼叫時間", ("service", "endpoint"))
+
+SCHEDULER_RUNS = registry.counter(
+    "scheduler_task_runs_total", "定時任務執行次數", ("task", "status"))
+SCHEDULER_DURATION = registry.histogram(
+    "scheduler_task_duration_seconds", "定時任務執行時間", ("task",),
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600))
+
+AUDIT_QUEUE_DEPTH = registry.gauge(
+    "audit_queue_depth", "審計記錄批次緩衝區中尚未寫入的筆數")
+CACHE_REQUESTS = registry.counter(
+    "cache_requests_total", "快取查詢數", ("cache", "result"))
+WRITE_QUEUE_DEPTH = registry.gauge(
+    "write_queue_depth", "寫入佇列中等待的工作數", ("queue",))
+WRITE_COMMIT_LATENCY = registry.histogram(
+    "write_queue_commit_seconds", "寫入佇列每次 commit（含批次內所有工作）耗時（秒）", ("queue",))
+WRITE_BATCH_SIZE = registry.histogram(
+    "write_queue_batch_size", "每次 commit 合併的工作數", ("queue",), buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+WRITE_JOBS = registry.counter(
+    "write_queue_jobs_total", "寫入佇列處理的工作數", ("queue", "status"))
+LIVE_EVENT_SUBSCRIBERS = registry.gauge(
+    "live_event_subscribers", "本行程的即時事件（SSE）訂閱連線數")
+LIVE_EVENTS_PUBLISHED = registry.counter(
+    "live_events_published_total", "發布的即時事件數", ("event",))
+LIVE_EVENT_OVERFLOWS = registry.counter(
+    "live_event_overflows_total", "因消費過慢而溢位的訂閱數")
+SCHEDULER_LEADER = registry.gauge(
+    "scheduler_leader", "本行程是否為定時任務調度 leader（多 worker 合併後應恰為 1）")
+CACHE_INVALIDATIONS = registry.counter(
+    "cache_invalidations_total", "跨 worker 快取失效訊息數", ("topic", "direction"))
+
+
+_ID_SEGMENT = re.compile(r"^(?:[a-z_\-]+|v\d+|\d)$")
+
+
+def normalize_endpoint(url: str) -> str:
+    """將 URL 轉為低基數的端點樣板：去除主機與查詢字串，ID 類路徑段以 {id} 取代"""
+    path = urlsplit(url).path or "/"
+    segments = [seg if _ID_SEGMENT.match(seg) else "{id}" for seg in path.split("/") if seg]
+    return "/" + "/".join(segments)
+
+
+def observe_outbound(service: str, url: str, status: Any, seconds: float) -> None:
+    endpoint = normalize_endpoint(url)
+    OUTBOUND_REQUESTS.inc(service=service, endpoint=endpoint, status=status)
+    OUTBOUND_LATENCY.observe(seconds, service=service, endpoint=endpoint)
+
+
+@contextmanager
+def track_outbound(service: str, url: str):
+    """記錄一次對外呼叫；呼叫端於取得回應後設定 call['status'] = response.status_code"""
+    call = {"status": "error"}
+    start = time.perf_counter()
+    try:
+        yield call
+    finally:
+        observe_outbound(service, url, call["status"], time.perf_counter() - start)
+
+
+def instrument_engine(engine, name: str) -> None:
+    """為 SQLAlchemy（同步）Engine 掛上查詢計數與耗時統計"""
+    from sqlalchemy import event
+
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get("metrics_query_start")
+        if not stack:
+            return
+        elapsed = time.perf_counter() - stack.pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        if operation not in ("SELECT", "INSERT", "UPDATE", "DELETE"):
+            operation = "OTHER"
+        DB_QUERIES.inc(engine=name, operation=operation)
+        DB_LATENCY.observe(elapsed, engine=name, operation=operation)
+
+    def _error(exception_context):
+        conn = exception_context.connection
+        stack = conn.info.get("metrics_query_start") if conn is not None else None
+        if stack:
+            stack.pop()
+        DB_QUERIES.inc(engine=name, operation="ERROR")
+
+    event.listen(engine, "before_cursor_execute", _before)
+    event.listen(engine, "after_cursor_execute", _after)
+    event.listen(engine, "handle_error", _error)
+
+
+def _collect_audit_queue() -> None:
+    from app.audit import audit_service
+    AUDIT_QUEUE_DEPTH.set(len(audit_service._batch_buffer))
+
+
+def _collect_cache_stats() -> None:
+    from app.services import lark_media_cache
+    cache = lark_media_cache._media_cache
+    if cache is None:
+        return
+    stats = cache.get_stats()
+    CACHE_REQUESTS.set_total(stats.get("hits", 0), cache="lark_media", result="hit")
+    CACHE_REQUESTS.set_total(stats.get("misses", 0), cache="lark_media", result="miss")
+
+
+def _collect_write_queue() -> None:
+    from app.services import write_queue
+    queue = write_queue._write_queue
+    if queue is None:
+        return
+    WRITE_QUEUE_DEPTH.set(queue.depth(), queue=queue.name)
+
+
+def _collect_live_events() -> None:
+    from app.services import live_events
+    broker = live_events._broker
+    LIVE_EVENT_SUBSCRIBERS.set(broker.subscriber_count() if broker is not None else 0)
+
+
+def _collect_scheduler_leader() -> None:
+    # 未匯入調度器（尚未啟動）時不強制載入
+    scheduler = sys.modules.get("app.services.scheduler")
+    if scheduler is None:
+        return
+    task_scheduler = scheduler.task_scheduler
+    SCHEDULER_LEADER.set(1 if task_scheduler.running and task_scheduler.is_leader else 0)
+
+
+registry.add_collector(_collect_audit_queue)
+registry.add_collector(_collect_cache_stats)
+registry.add_collector(_collect_write_queue)
+registry.add_collector(_collect_live_events)
+registry.add_collector(_collect_scheduler_leader)
@@ -0,0 +1,240 @@
+"""
+PDF 報告背景工作
+
+PDF 渲染（ReportLab 排版與圖表）為 CPU 密集工作，原本同步執行於請求之中。
+此模組將渲染移至 process pool：
+
+- 每個 worker 行程於啟動時註冊一次字型，並各自建立資料庫連線
+- API 提交工作後立即取得 job handle（job_id），再以狀態查詢/下載端點取回結果
+- 同一 Test Run 已有進行中的工作時直接沿用，不重複渲染
+- full_results=True 時輸出全部測試項目（結果表格由資料庫分批串流排版）
+- 完成的 PDF 暫存於 generated_report/pdf/，超過保留時間後清除
+- 工作狀態另寫入同目錄的 JSON sidecar（job-<job_id>.json），多個 uvicorn worker 時，
+  狀態查詢/下載請求即使送到其他 worker 也能取得工作資訊
+"""
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = int(os.getenv('PDF_REPORT_WORKERS', '2'))
+DEFAULT_JOB_TTL_SECONDS = 3600
+
+_JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+# ---------------- Worker 行程 ----------------
+
+_worker_engines: Dict[str, Any] = {}
+
+
+def _init_worker() -> None:
+    """worker 行程初始化：註冊字型（每個行程僅一次）"""
+    from app.services.pdf_report_service import register_chinese_font
+    register_chinese_font()
+
+
+def _get_worker_engine(database_url: str):
+    engine = _worker_engines.get(database_url)
+    if engine is None:
+        from sqlalchemy import create_engine
+        engine = create_engine(database_url, connect_args={"check_same_thread": False, "timeout": 30})
+        _worker_engines[database_url] = engine
+    return engine
+
+
+def _render_job(team_id: int, config_id: int, output_path: str, database_url: str,
+                full_results: bool = False) -> Dict[str, Any]:
+    """於 worker 行程中產生 PDF 並直接寫入 output_path"""
+    from sqlalchemy.orm import Session
+    from app.services.pdf_report_service import PDFReportService
+
+    started = time.perf_counter()
+    tmp_path = f"{output_path}.part"
+    try:
+        with Session(_get_worker_engine(database_url)) as db:
+            PDFReportService(db).write_test_run_report(team_id, config_id, tmp_path, full_results=full_results)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    return {"size": os.path.getsize(output_path), "render_seconds": round(time.perf_counter() - started, 3)}
+
+
+# ---------------- 主行程：工作管理 ----------------
+
+class PDFReportJobManager:
+    """管理 PDF 渲染工作與 process pool"""
+
+    def __init__(self, output_dir: Optional[Path] = None, database_url: Optional[str] = None,
+                 max_workers: int = DEFAULT_MAX_WORKERS, job_ttl_seconds: int = DEFAULT_JOB_TTL_SECONDS):
+        self.output_dir = Path(output_dir) if output_dir else (Path.cwd() / "generated_report" / "pdf")
+        self._database_url = database_url
+        self._max_workers = max(1, max_workers)
+        self._job_ttl = job_ttl_seconds
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._futures: Dict[str, Future] = {}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # 呼叫端需持有 self._lock
+        if self._executor is None:
+            # 使用 spawn，避免在多執行緒的伺服器行程中 fork
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return self._executor
+
+    def _get_database_url(self) -> str:
+        if self._database_url is None:
+            from app.database import get_sync_engine
+            self._database_url = get_sync_engine().url.render_as_string(hide_password=False)
+        return self._database_url
+
+    def _on_done(self, job_id: str, future: Future) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job["finished_at"] = time.time()
+            try:
+                job.update(future.result())
+                job["status"] = "done"
+            except Exception as e:
+                job["status"] = "failed"
+                job["error"] = str(e)
+                # ValueError 代表找不到 Test Run 配置
+                job["error_status_code"] = 404 if isinstance(e, ValueError) else 500
+                logger.error(f"PDF 報告產生失敗 job={job_id}: {e}")
+            self._write_sidecar(job)
+
+    def _sidecar_path(self, job_id: str) -> Path:
+        return self.output_dir / f"job-{job_id}.json"
+
+    def _write_sidecar(self, job: Dict[str, Any]) -> None:
+        """將工作狀態寫入 sidecar（先寫暫存檔再 rename，讀取端不會讀到半份內容）"""
+        path = self._sidecar_path(job["job_id"])
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            tmp_path.write_text(json.dumps(job), encoding="utf-8")
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"寫入 PDF 工作狀態失敗 job={job['job_id']}: {e}")
+
+    def _read_sidecar(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """讀取其他 worker 提交的工作狀態"""
+        if not _JOB_ID_RE.match(job_id):
+            return None
+        try:
+            job = json.loads(self._sidecar_path(job_id).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        now = time.time()
+        if job.get("finished_at") and now - job["finished_at"] > self._job_ttl:
+            return None
+        if job["status"] == "running" and now - job["created_at"] > self._job_ttl:
+            # 提交工作的 worker 已結束，狀態不會再更新
+            job.update(status="failed", error="PDF 報告工作已中斷", error_status_code=500)
+        elif job["status"] == "done" and not os.path.exists(job["path"]):
+            return None
+        return job
+
+    def _cleanup_expired(self) -> None:
+        # 呼叫端需持有 self._lock
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.get("finished_at") and now - job["finished_at"] > self._job_ttl
+        ]
+        for job_id in expired:
+            job = self._jobs.pop(job_id)
+            self._futures.pop(job_id, None)
+            for path in (job["path"], self._sidecar_path(job_id)):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    def submit(self, team_id: int, config_id: int, full_results: bool = False) -> Dict[str, Any]:
+        """提交 PDF 產生工作並回傳 job 資訊；同一 Test Run（同模式）已有進行中的工作則沿用"""
+        database_url = self._get_database_url()
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._cleanup_expired()
+            for job in self._jobs.values():
+                if (job["team_id"], job["config_id"], job["full_results"]) == (team_id, config_id, full_results) \
+                        and job["status"] == "running":
+                    return dict(job)
+
+            job_id = uuid.uuid4().hex
+            path = self.output_dir / f"team-{team_id}-config-{config_id}-{job_id}.pdf"
+            job = {
+                "job_id": job_id,
+                "team_id": team_id,
+                "config_id": config_id,
+                "full_results": full_results,
+                "status": "running",
+                "path": str(path),
+                "created_at": time.time(),
+                "finished_at": None,
+                "error": None,
+            }
+            self._jobs[job_id] = job
+            self._write_sidecar(job)
+            future = self._get_executor().submit(
+                _render_job, team_id, config_id, str(path), database_url, full_results
+            )
+            self._futures[job_id] = future
+        future.add_done_callback(lambda f, job_id=job_id: self._on_done(job_id, f))
+        return dict(job)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """取得工作資訊；非本行程提交的工作改讀 sidecar"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                return dict(job)
+        return self._read_sidecar(job_id)
+
+    async def wait(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """等待工作完成（不阻塞事件迴圈）"""
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None:
+            try:
+                await asyncio.wrap_future(future)
+            except Exception:
+                pass
+            # done callback 可能尚未執行，直接以 future 結果補上狀態
+            self._on_done(job_id, future)
+        return self.get(job_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            states: Dict[str, int] = {}
+            for job in self._jobs.values():
+                states[job["status"]] = states.get(job["status"], 0) + 1
+        return {"max_workers": self._max_workers, "jobs": states}
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+pdf_report_jobs = PDFReportJobManager()
@@ -3,7 +3,7 @@ PDF Report Generation Service using ReportLab
 """
 import io
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Optional
 
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import inch
@@ -12,33 +12,176 @@ from reportlab.platypus import (
     KeepTogether, PageBreak, Image
 )
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.colors import Color, black, white, red, green, orange, blue, grey
+from reportlab.lib.colors import Color, HexColor, black, white, red, green, orange, blue, grey
 from reportlab.lib import colors
-from reportlab.graphics.shapes import Drawing
+from reportlab.graphics.shapes import Drawing, String
 from reportlab.graphics.charts.piecharts import Pie
 from reportlab.graphics.charts.barcharts import VerticalBarChart
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 
+import functools
+import itertools
 import os
 
-# Ensure matplotlib can write its cache in restricted environments
-try:
-    os.environ.setdefault('MPLCONFIGDIR', '/tmp/mplconfig')
-    os.makedirs(os.environ['MPLCONFIGDIR'], exist_ok=True)
-except Exception:
-    # If /tmp isn't writable for some reason, ignore; matplotlib will attempt defaults
-    pass
-
-import matplotlib
-# Use non-GUI backend to avoid server-side rendering issues
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import matplotlib.font_manager as fm
+from sqlalchemy import and_, func
 from sqlalchemy.orm import Session
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfbase.cidfonts import UnicodeCIDFont
-import os
+
+
+# 預設（預覽）模式輸出的詳細結果列數；full_results=True 時輸出全部
+PREVIEW_RESULT_ROWS = 50
+# 自資料庫分批讀取的列數與每個結果小表格的列數
+RESULT_FETCH_SIZE = 500
+RESULT_TABLE_CHUNK_ROWS = 40
+
+
+class _LazyFlowableList(list):
+    """提供 doc.build 所需的 list 介面，由產生器逐步補充 flowable
+
+    ReportLab 只從 story 前端取用/放回 flowable，因此只需保留少量緩衝，
+    已排版的 flowable 即可釋放。
+    """
+
+    def __init__(self, source, buffer_size: int = 8):
+        super().__init__()
+        self._source = iter(source)
+        self._buffer_size = buffer_size
+        self._exhausted = False
+        self._fill(buffer_size)
+
+    def _fill(self, size: int) -> None:
+        while not self._exhausted and list.__len__(self) < size:
+            try:
+                list.append(self, next(self._source))
+            except StopIteration:
+                self._exhausted = True
+
+    def __len__(self) -> int:
+        self._fill(self._buffer_size)
+        return list.__len__(self)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.stop is not None and index.stop >= 0:
+                self._fill(index.stop)
+        elif index >= 0:
+            self._fill(index + 1)
+        return list.__getitem__(self, index)
+
+
+# 每個行程只註冊一次字型（PDF 於 process pool 中渲染，見 pdf_report_jobs）
+_registered_font: Optional[str] = None
+
+
+def register_chinese_font() -> str:
+    """註冊中文字型並回傳字型名稱（同一行程內僅執行一次）"""
+    global _registered_font
+    if _registered_font is not None:
+        return _registered_font
+
+    # 嘗試的字型路徑（按優先順序）
+    font_paths = [
+        '/Library/Fonts/Arial Unicode.ttf',  # macOS
+        '/System/Library/Fonts/Arial.ttc',   # macOS fallback
+        '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',  # Linux
+        '/Windows/Fonts/simhei.ttf',  # Windows
+        '/Windows/Fonts/msyh.ttc'     # Windows
+    ]
+
+    font_name = 'ChineseFont'
+
+    for font_path in font_paths:
+        if os.path.exists(font_path):
+            try:
+                if font_path.endswith('.ttc'):
+                    # TrueType Collection 需要指定子字型
+                    pdfmetrics.registerFont(TTFont(font_name, font_path, subfontIndex=0))
+                else:
+                    pdfmetrics.registerFont(TTFont(font_name, font_path))
+                _registered_font = font_name
+                return font_name
+            except Exception as e:
+                print(f"Failed to register font {font_path}: {e}")
+                continue
+
+    # 如果找不到合適字型，嘗試使用 ReportLab 內建 CID 字型（支援 CJK）
+    try:
+        # STSong-Light 主要為簡體中文；MSung-Light 支援繁體
+        # 優先嘗試 MSung-Light，若不可用則退回 STSong-Light
+        try:
+            cid_font_name = 'MSung-Light'
+            pdfmetrics.registerFont(UnicodeCIDFont(cid_font_name))
+        except Exception:
+            cid_font_name = 'STSong-Light'
+            pdfmetrics.registerFont(UnicodeCIDFont(cid_font_name))
+        print(f"Info: Using CID font as fallback: {cid_font_name}")
+        _registered_font = cid_font_name
+    except Exception as e:
+        # 最後退回 Helvetica（可能無法顯示 CJK，僅保證不崩潰）
+        print(f"Warning: No suitable Chinese font found, falling back to Helvetica. Reason: {e}")
+        _registered_font = 'Helvetica'
+    return _registered_font
+
+
+@functools.lru_cache(maxsize=64)
+def _pie_chart_drawing(items: tuple, title: str, chart_colors: tuple, font_name: str) -> Optional[Drawing]:
+    """以 ReportLab 原生圖形繪製圓餅圖；依輸入計數快取（向量圖，無需點陣化）"""
+    filtered = [(label, size, color) for (label, size), color in zip(items, chart_colors) if size > 0]
+    if not filtered:
+        return None
+    total = sum(size for _, size, _ in filtered)
+
+    drawing = Drawing(4 * inch, 4 * inch)
+    drawing.add(String(2 * inch, 3.75 * inch, title, fontName=font_name, fontSize=14, textAnchor='middle'))
+    pie = Pie()
+    pie.x = 0.9 * inch
+    pie.y = 0.7 * inch
+    pie.width = 2.2 * inch
+    pie.height = 2.2 * inch
+    pie.startAngle = 90
+    pie.direction = 'clockwise'
+    pie.data = [size for _, size, _ in filtered]
+    pie.labels = [f"{label} {size / total * 100:.1f}%" for label, size, _ in filtered]
+    pie.slices.fontName = font_name
+    pie.slices.fontSize = 9
+    pie.slices.strokeColor = white
+    pie.sideLabels = True
+    for idx, (_, _, color) in enumerate(filtered):
+        pie.slices[idx].fillColor = HexColor(color)
+    drawing.add(pie)
+    return drawing
+
+
+@functools.lru_cache(maxsize=64)
+def _bar_chart_drawing(items: tuple, title: str, chart_colors: tuple, font_name: str) -> Optional[Drawing]:
+    """以 ReportLab 原生圖形繪製長條圖；依輸入計數快取"""
+    labels = [label for label, _ in items]
+    values = [value for _, value in items]
+    if not values or all(v == 0 for v in values):
+        return None
+
+    drawing = Drawing(5 * inch, 3 * inch)
+    drawing.add(String(2.5 * inch, 2.75 * inch, title, fontName=font_name, fontSize=14, textAnchor='middle'))
+    chart = VerticalBarChart()
+    chart.x = 0.6 * inch
+    chart.y = 0.4 * inch
+    chart.width = 4 * inch
+    chart.height = 2 * inch
+    chart.data = [values]
+    chart.valueAxis.valueMin = 0
+    chart.valueAxis.labels.fontName = font_name
+    chart.categoryAxis.categoryNames = labels
+    chart.categoryAxis.labels.fontName = font_name
+    chart.barLabelFormat = '%d'
+    chart.barLabels.nudge = 7
+    chart.barLabels.fontName = font_name
+    chart.bars.strokeColor = None
+    for idx, color in enumerate(chart_colors[:len(labels)]):
+        chart.bars[(0, idx)].fillColor = HexColor(color)
+    drawing.add(chart)
+    return drawing
 
 
 class PDFReportService:
@@ -89,66 +232,37 @@ class PDFReportService:
     
     def _register_chinese_font(self) -> str:
         """註冊中文字型並回傳字型名稱"""
-        # 嘗試的字型路徑（按優先順序）
-        font_paths = [
-            '/Library/Fonts/Arial Unicode.ttf',  # macOS
-            '/System/Library/Fonts/Arial.ttc',   # macOS fallback
-            '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',  # Linux
-            '/Windows/Fonts/simhei.ttf',  # Windows
-            '/Windows/Fonts/msyh.ttc'     # Windows
-        ]
-        
-        font_name = 'ChineseFont'
-        
-        for font_path in font_paths:
-            if os.path.exists(font_path):
-                try:
-                    if font_path.endswith('.ttc'):
-                        # TrueType Collection 需要指定子字型
-                        pdfmetrics.registerFont(TTFont(font_name, font_path, subfontIndex=0))
-                    else:
-                        pdfmetrics.registerFont(TTFont(font_name, font_path))
-                    
-                    # 儲存字型名稱供其他方法使用
-                    self.chinese_font = font_name
-                    return font_name
-                except Exception as e:
-                    print(f"Failed to register font {font_path}: {e}")
-                    continue
-        
-        # 如果找不到合適字型，嘗試使用 ReportLab 內建 CID 字型（支援 CJK）
-        try:
-            # STSong-Light 主要為簡體中文；MSung-Light 支援繁體
-            # 優先嘗試 MSung-Light，若不可用則退回 STSong-Light
-            try:
-                cid_font_name = 'MSung-Light'
-                pdfmetrics.registerFont(UnicodeCIDFont(cid_font_name))
-            except Exception:
-                cid_font_name = 'STSong-Light'
-                pdfmetrics.registerFont(UnicodeCIDFont(cid_font_name))
-            self.chinese_font = cid_font_name
-            print(f"Info: Using CID font as fallback: {cid_font_name}")
-            return cid_font_name
-        except Exception as e:
-            # 最後退回 Helvetica（可能無法顯示 CJK，僅保證不崩潰）
-            print(f"Warning: No suitable Chinese font found, falling back to Helvetica. Reason: {e}")
-            self.chinese_font = 'Helvetica'
-            return 'Helvetica'
+        self.chinese_font = register_chinese_font()
+        return self.chinese_font
     
-    def generate_test_run_report(self, team_id: int, config_id: int) -> bytes:
+    def generate_test_run_report(self, team_id: int, config_id: int,
+                                 full_results: bool = False) -> bytes:
         """
         Generate PDF report for a specific test run
         
         Args:
             team_id: Team ID
             config_id: Test run configuration ID
+            full_results: 輸出全部測試項目（預設僅前 PREVIEW_RESULT_ROWS 筆）
             
         Returns:
             bytes: Generated PDF content
         """
         buffer = io.BytesIO()
+        self.write_test_run_report(team_id, config_id, buffer, full_results=full_results)
+        buffer.seek(0)
+        return buffer.read()
+
+    def write_test_run_report(self, team_id: int, config_id: int, output,
+                              full_results: bool = False) -> None:
+        """
+        Generate PDF report and write it to output (file path or binary file object)
+
+        統計以彙總查詢計算；詳細結果表格於排版時才由資料庫分批讀取並切成小表格，
+        因此記憶體用量不隨 Test Run 項目數增加。
+        """
         doc = SimpleDocTemplate(
-            buffer,
+            output,
             pagesize=A4,
             rightMargin=72,
             leftMargin=72,
@@ -157,7 +271,7 @@ class PDFReportService:
         )
         
         # 收集報告數據
-        report_data = self._collect_report_data(team_id, config_id)
+        report_data = self._collect_report_data(team_id, config_id, full_results=full_results)
         
         # 建立報告內容
         story = []
@@ -171,22 +285,21 @@ class PDFReportService:
         story.extend(self._build_status_chart(report_data))
         story.extend(self._build_priority_chart(report_data))
         
-        # 強制分頁 - 第三頁開始：詳細測試結果表格
+        # 強制分頁 - 第三頁開始：詳細測試結果表格（逐批產生）
         story.append(PageBreak())
-        story.extend(self._build_results_table(report_data))
-        
-        # 頁腳資訊
-        story.extend(self._build_footer())
+        results = self._build_results_table(report_data)
         
         # 生成 PDF
-        doc.build(story)
-        
-        buffer.seek(0)
-        return buffer.read()
+        doc.build(_LazyFlowableList(itertools.chain(story, results, self._build_footer())))
     
-    def _collect_report_data(self, team_id: int, config_id: int) -> Dict[str, Any]:
-        """Collect all necessary data for the report"""
-        from ..models.database_models import TestRunConfig as TestRunConfigDB, TestRunItem as TestRunItemDB
+    def _collect_report_data(self, team_id: int, config_id: int,
+                             full_results: bool = False) -> Dict[str, Any]:
+        """Collect report data with aggregate queries (item rows are streamed later)"""
+        from ..models.database_models import (
+            TestRunConfig as TestRunConfigDB,
+            TestRunItem as TestRunItemDB,
+            TestCaseLocal as TestCaseLocalDB,
+        )
         from ..models.lark_types import Priority, TestResultStatus
         import json
         
@@ -199,68 +312,59 @@ class PDFReportService:
         if not config:
             raise ValueError(f"找不到 Test Run 配置 (team_id={team_id}, config_id={config_id})")
         
-        # 獲取所有測試項目
-        items_query = self.db_session.query(TestRunItemDB).options(joinedload(TestRunItemDB.test_case)).filter(
+        item_filter = (
             TestRunItemDB.team_id == team_id,
-            TestRunItemDB.config_id == config_id
+            TestRunItemDB.config_id == config_id,
         )
-        items = items_query.all()
-        
-        # 計算基本統計
-        total_count = len(items)
-        executed_count = len([item for item in items if item.test_result is not None])
-        passed_count = len([item for item in items if item.test_result == TestResultStatus.PASSED])
-        failed_count = len([item for item in items if item.test_result == TestResultStatus.FAILED])
-        retest_count = len([item for item in items if item.test_result == TestResultStatus.RETEST])
-        na_count = len([item for item in items if item.test_result == TestResultStatus.NOT_AVAILABLE])
+        
+        # 計算基本統計（GROUP BY，不載入項目）
+        status_counts = {
+            result: count for result, count in self.db_session.query(
+                TestRunItemDB.test_result, func.count(TestRunItemDB.id)
+            ).filter(*item_filter).group_by(TestRunItemDB.test_result)
+        }
+        total_count = sum(status_counts.values())
+        executed_count = total_count - status_counts.get(None, 0)
+        passed_count = status_counts.get(TestResultStatus.PASSED, 0)
+        failed_count = status_counts.get(TestResultStatus.FAILED, 0)
+        retest_count = status_counts.get(TestResultStatus.RETEST, 0)
+        na_count = status_counts.get(TestResultStatus.NOT_AVAILABLE, 0)
         not_executed_count = total_count - executed_count
         
         execution_rate = (executed_count / total_count * 100) if total_count > 0 else 0.0
         pass_rate = (passed_count / executed_count * 100) if executed_count > 0 else 0.0
         
         # 計算優先級分佈
-        def _item_priority(itm):
-            case = getattr(itm, 'test_case', None)
-            pri = getattr(case, 'priority', None)
-            if pri is None:
-                return None
-            return pri.value if hasattr(pri, 'value') else pri
-
-        priority_values = [_item_priority(item) for item in items]
-        high_priority = len([pri for pri in priority_values if pri == Priority.HIGH.value])
-        medium_priority = len([pri for pri in priority_values if pri == Priority.MEDIUM.value])
-        low_priority = len([pri for pri in priority_values if pri == Priority.LOW.value])
-        
-        # 計算 Bug Tickets 統計
+        priority_counts = {}
+        for pri, count in self.db_session.query(
+            TestCaseLocalDB.priority, func.count(TestRunItemDB.id)
+        ).select_from(TestRunItemDB).join(
+            TestCaseLocalDB,
+            and_(
+                TestCaseLocalDB.team_id == TestRunItemDB.team_id,
+                TestCaseLocalDB.test_case_number == TestRunItemDB.test_case_number,
+            ),
+        ).filter(*item_filter).group_by(TestCaseLocalDB.priority):
+            if pri is not None:
+                key = pri.value if hasattr(pri, 'value') else pri
+                priority_counts[key] = priority_counts.get(key, 0) + count
+        high_priority = priority_counts.get(Priority.HIGH.value, 0)
+        medium_priority = priority_counts.get(Priority.MEDIUM.value, 0)
+        low_priority = priority_counts.get(Priority.LOW.value, 0)
+        
+        # 計算 Bug Tickets 統計（僅讀取 bug_tickets_json 欄位）
         unique_bug_tickets = set()
-        for item in items:
-            if item.bug_tickets_json:
-                try:
-                    tickets_data = json.loads(item.bug_tickets_json)
-                    if isinstance(tickets_data, list):
-                        for ticket in tickets_data:
-                            if isinstance(ticket, dict) and 'ticket_number' in ticket:
-                                unique_bug_tickets.add(ticket['ticket_number'].upper())
-                except Exception:
-                    pass
-        
-        # 準備詳細測試結果數據（限制前 100 筆）
-        test_results = []
-        for item in items[:100]:
-            case = getattr(item, 'test_case', None)
-            case_title = getattr(case, 'title', None)
-            case_priority = getattr(case, 'priority', None)
-            priority_str = None
-            if case_priority is not None:
-                priority_str = case_priority.value if hasattr(case_priority, 'value') else case_priority
-            test_results.append({
-                'test_case_number': item.test_case_number or '',
-                'title': case_title or '',
-                'priority': priority_str or '',
-                'status': item.test_result.value if item.test_result else '未執行',
-                'executor': item.assignee_name or '',
-                'execution_time': item.executed_at.strftime('%Y-%m-%d %H:%M') if item.executed_at else ''
-            })
+        for (bug_tickets_json,) in self.db_session.query(TestRunItemDB.bug_tickets_json).filter(
+            *item_filter, TestRunItemDB.bug_tickets_json.isnot(None)
+        ).yield_per(RESULT_FETCH_SIZE):
+            try:
+                tickets_data = json.loads(bug_tickets_json)
+                if isinstance(tickets_data, list):
+                    for ticket in tickets_data:
+                        if isinstance(ticket, dict) and 'ticket_number' in ticket:
+                            unique_bug_tickets.add(ticket['ticket_number'].upper())
+            except Exception:
+                pass
         
         return {
             'team_id': team_id,
@@ -298,9 +402,47 @@ class PDFReportService:
                 '中': medium_priority,
                 '低': low_priority
             },
-            'test_results': test_results,
+            # 詳細結果列數上限（None 表示全部）；實際資料由 _iter_result_rows 串流讀取
+            'results_limit': None if full_results else PREVIEW_RESULT_ROWS,
             'bug_tickets': list(unique_bug_tickets)
         }
+
+    def _iter_result_rows(self, team_id: int, config_id: int,
+                          limit: Optional[int] = None) -> Iterator[List[str]]:
+        """依項目順序分批讀取詳細結果列（只查詢表格所需欄位）"""
+        from ..models.database_models import TestRunItem as TestRunItemDB, TestCaseLocal as TestCaseLocalDB
+
+        query = self.db_session.query(
+            TestRunItemDB.test_case_number,
+            TestCaseLocalDB.title,
+            TestCaseLocalDB.priority,
+            TestRunItemDB.test_result,
+            TestRunItemDB.assignee_name,
+            TestRunItemDB.executed_at,
+        ).outerjoin(
+            TestCaseLocalDB,
+            and_(
+                TestCaseLocalDB.team_id == TestRunItemDB.team_id,
+                TestCaseLocalDB.test_case_number == TestRunItemDB.test_case_number,
+            ),
+        ).filter(
+            TestRunItemDB.team_id == team_id,
+            TestRunItemDB.config_id == config_id,
+        ).order_by(TestRunItemDB.id)
+        if limit is not None:
+            query = query.limit(limit)
+
+        for number, title, priority, result, assignee, executed_at in query.yield_per(RESULT_FETCH_SIZE):
+            title = title or ''
+            priority_str = (priority.value if hasattr(priority, 'value') else priority) if priority is not None else ''
+            yield [
+                number or '',
+                title[:40] + '...' if len(title) > 40 else title,
+                priority_str or '',
+                result.value if result else '未執行',
+                assignee or '',
+                executed_at.strftime('%Y-%m-%d %H:%M') if executed_at else '',
+            ]
     
     def _build_header(self, data: Dict[str, Any]) -> List:
         """Build report header section"""
@@ -425,7 +567,7 @@ class PDFReportService:
         
         story.append(Paragraph("測試狀態分佈", self.styles['ChineseSubtitle']))
         
-        # 使用 matplotlib 生成圓餅圖
+        # 使用 ReportLab 原生圖形生成圓餅圖
         chart_image = self._create_pie_chart(
             data['status_distribution'],
             "測試狀態分佈",
@@ -444,7 +586,7 @@ class PDFReportService:
         
         story.append(Paragraph("優先級分佈", self.styles['ChineseSubtitle']))
         
-        # 使用 matplotlib 生成長條圖
+        # 使用 ReportLab 原生圖形生成長條圖
         chart_image = self._create_bar_chart(
             data['priority_distribution'],
             "優先級分佈",
@@ -457,45 +599,36 @@ class PDFReportService:
         story.append(Spacer(1, 20))
         return story
     
-    def _build_results_table(self, data: Dict[str, Any]) -> List:
-        """Build detailed test results table"""
-        story = []
+    def _build_results_table(self, data: Dict[str, Any]) -> Iterator:
+        """Build detailed test results as a stream of fixed-size table chunks"""
+        if not data['statistics']['total_count']:
+            return
         
-        if data['test_results']:
-            story.append(Paragraph("詳細測試結果", self.styles['ChineseSubtitle']))
-            
-            # 建立表格標題
-            table_data = [
-                ['測試案例編號', '標題', '優先級', '狀態', '執行者', '執行時間']
-            ]
-            
-            # 添加測試結果數據
-            for result in data['test_results'][:50]:  # 限制最多50筆避免過長
-                table_data.append([
-                    result.get('test_case_number', ''),
-                    result.get('title', '')[:40] + '...' if len(result.get('title', '')) > 40 else result.get('title', ''),
-                    result.get('priority', ''),
-                    result.get('status', ''),
-                    result.get('executor', ''),
-                    result.get('execution_time', '')
-                ])
-            
-            table = Table(table_data, colWidths=[1.2*inch, 2.5*inch, 0.8*inch, 1*inch, 1*inch, 1.5*inch])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, -1), self.chinese_font),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('FONTSIZE', (0, 1), (-1, -1), 9),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ]))
-            
-            story.append(table)
+        yield Paragraph("詳細測試結果", self.styles['ChineseSubtitle'])
         
-        return story
+        header = ['測試案例編號', '標題', '優先級', '狀態', '執行者', '執行時間']
+        col_widths = [1.2*inch, 2.5*inch, 0.8*inch, 1*inch, 1*inch, 1.5*inch]
+        table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, -1), self.chinese_font),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ])
+        
+        # 每個小表格各自帶表頭，跨頁時重複表頭；排版完即可釋放
+        rows = self._iter_result_rows(data['team_id'], data['config_id'], data.get('results_limit'))
+        while True:
+            chunk = list(itertools.islice(rows, RESULT_TABLE_CHUNK_ROWS))
+            if not chunk:
+                break
+            table = Table([header] + chunk, colWidths=col_widths, repeatRows=1)
+            table.setStyle(table_style)
+            yield table
     
     def _build_footer(self) -> List:
         """Build report footer"""
@@ -507,85 +640,18 @@ class PDFReportService:
         
         return story
     
-    def _create_pie_chart(self, data: Dict[str, int], title: str, colors: List[str]) -> Optional[Image]:
-        """Create pie chart using matplotlib and convert to ReportLab Image"""
+    def _create_pie_chart(self, data: Dict[str, int], title: str, colors: List[str]) -> Optional[Drawing]:
+        """Create pie chart using ReportLab graphics (cached by input counts)"""
         try:
-            # 設定中文字型（如果可用）
-            plt.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'SimHei', 'DejaVu Sans']
-            plt.rcParams['axes.unicode_minus'] = False
-            
-            # 準備數據
-            labels = list(data.keys())
-            sizes = list(data.values())
-            
-            # 過濾掉為 0 的數據
-            filtered_data = [(label, size, color) for label, size, color in zip(labels, sizes, colors) if size > 0]
-            if not filtered_data:
-                return None
-                
-            labels, sizes, chart_colors = zip(*filtered_data)
-            
-            # 創建圖表
-            fig, ax = plt.subplots(figsize=(6, 6))
-            wedges, texts, autotexts = ax.pie(
-                sizes, 
-                labels=labels, 
-                autopct='%1.1f%%',
-                colors=chart_colors,
-                startangle=90
-            )
-            
-            ax.set_title(title, fontsize=14, fontweight='bold')
-            plt.tight_layout()
-            
-            # 轉換為 ReportLab Image
-            img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-            plt.close()
-            
-            img_buffer.seek(0)
-            return Image(img_buffer, width=4*inch, height=4*inch)
-            
+            return _pie_chart_drawing(tuple(data.items()), title, tuple(colors), self.chinese_font)
         except Exception as e:
             print(f"Error creating pie chart: {e}")
             return None
     
-    def _create_bar_chart(self, data: Dict[str, int], title: str, colors: List[str]) -> Optional[Image]:
-        """Create bar chart using matplotlib and convert to ReportLab Image"""
+    def _create_bar_chart(self, data: Dict[str, int], title: str, colors: List[str]) -> Optional[Drawing]:
+        """Create bar chart using ReportLab graphics (cached by input counts)"""
         try:
-            plt.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'SimHei', 'DejaVu Sans']
-            plt.rcParams['axes.unicode_minus'] = False
-            
-            labels = list(data.keys())
-            values = list(data.values())
-            
-            if not values or all(v == 0 for v in values):
-                return None
-            
-            fig, ax = plt.subplots(figsize=(6, 4))
-            bars = ax.bar(labels, values, color=colors[:len(labels)])
-            
-            # 添加數值標籤
-            for bar, value in zip(bars, values):
-                height = bar.get_height()
-                ax.annotate(f'{value}',
-                           xy=(bar.get_x() + bar.get_width() / 2, height),
-                           xytext=(0, 3),  # 3 points vertical offset
-                           textcoords="offset points",
-                           ha='center', va='bottom')
-            
-            ax.set_title(title, fontsize=14, fontweight='bold')
-            ax.set_ylabel('數量')
-            plt.tight_layout()
-            
-            # 轉換為 ReportLab Image
-            img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-            plt.close()
-            
-            img_buffer.seek(0)
-            return Image(img_buffer, width=5*inch, height=3*inch)
-            
+            return _bar_chart_drawing(tuple(data.items()), title, tuple(colors), self.chinese_font)
         except Exception as e:
             print(f"Error creating bar chart: {e}")
             return None
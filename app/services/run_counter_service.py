@@ -0,0 +1,197 @@
+"""
+Test Run 統計計數服務
+
+test_run_configs 的統計欄位（total/executed/passed/failed/retest/not_available 與不重複 Bug ticket 數）
+由 SQLite trigger 於 test_run_items 寫入的同一交易中增量維護（見
+app.models.database_models.RUN_COUNTER_TRIGGERS），列表與統計 API 直接讀取配置列，不再掃描項目。
+
+本模組負責：
+- ensure_run_counters：既有資料庫補建 test_run_bug_tickets 表與 trigger，首次安裝時全量重算
+- recompute_counters：以 GROUP BY 重算計數（全部或單一配置）
+- verify_counters：比對計數與實際項目，repair=True 時重算不一致的配置
+  （scripts/verify_run_counters.py 為命令列入口）
+"""
+
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select, text
+
+from app.models.database_models import (
+    RUN_COUNTER_TRIGGERS,
+    TestRunBugTicketRef,
+    TestRunConfig as TestRunConfigDB,
+)
+from app.models.lark_types import TestResultStatus
+
+logger = logging.getLogger(__name__)
+
+COUNTER_FIELDS = (
+    "total_test_cases",
+    "executed_cases",
+    "passed_cases",
+    "failed_cases",
+    "retest_cases",
+    "not_available_cases",
+    "unique_bug_tickets",
+)
+
+_STATUS_FIELDS = {
+    "passed_cases": TestResultStatus.PASSED,
+    "failed_cases": TestResultStatus.FAILED,
+    "retest_cases": TestResultStatus.RETEST,
+    "not_available_cases": TestResultStatus.NOT_AVAILABLE,
+}
+
+# 每個項目的不重複 ticket（與 trigger 相同的解析規則）
+_ITEM_TICKETS_FROM = (
+    "FROM test_run_items AS i, json_each(CASE WHEN json_valid(i.bug_tickets_json) THEN "
+    "CASE WHEN json_type(i.bug_tickets_json) = 'array' THEN i.bug_tickets_json END END) AS j "
+    "WHERE j.type = 'object' AND json_type(j.value, '$.ticket_number') = 'text'"
+)
+_TICKET_EXPR = "upper(json_extract(j.value, '$.ticket_number'))"
+
+_ensured_engines = set()
+_ensure_lock = threading.Lock()
+
+
+def _status_in(status: TestResultStatus) -> str:
+    return f"test_result IN ('{status.name}', '{status.value}')"
+
+
+def _config_filter(column: str, config_id: Optional[int]) -> str:
+    return f" AND {column} = :config_id" if config_id is not None else ""
+
+
+def _expected_counts_sql(config_id: Optional[int]) -> str:
+    status_sums = ", ".join(
+        f"SUM(CASE WHEN {_status_in(status)} THEN 1 ELSE 0 END) AS {field}"
+        for field, status in _STATUS_FIELDS.items()
+    )
+    return (
+        f"SELECT config_id, COUNT(*) AS total_test_cases, COUNT(test_result) AS executed_cases, {status_sums} "
+        f"FROM test_run_items WHERE true{_config_filter('config_id', config_id)} GROUP BY config_id"
+    )
+
+
+def _expected_ticket_refs_sql(config_id: Optional[int]) -> str:
+    return (
+        f"SELECT i.config_id, {_TICKET_EXPR} AS ticket_number, COUNT(DISTINCT i.id) AS item_count "
+        f"{_ITEM_TICKETS_FROM}{_config_filter('i.config_id', config_id)} GROUP BY i.config_id, ticket_number"
+    )
+
+
+def ensure_run_counters(bind) -> bool:
+    """補建 test_run_bug_tickets 表與計數 trigger（重複呼叫無副作用）
+
+    trigger 尚未安裝時，先前的寫入沒有增量紀錄，安裝後於同一交易中全量重算。
+    test_run_configs 缺少計數欄位時（尚未執行 database_init --auto-fix）不安裝，回傳 False。
+    """
+    engine = getattr(bind, "engine", bind)
+    key = id(engine)
+    if key in _ensured_engines:
+        return True
+    with _ensure_lock:
+        if key in _ensured_engines:
+            return True
+        if engine.dialect.name != "sqlite":
+            _ensured_engines.add(key)
+            return True
+        with engine.begin() as conn:
+            tables = {row[0] for row in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if not {"test_run_configs", "test_run_items"} <= tables:
+                return False
+            columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(test_run_configs)")}
+            missing = [field for field in COUNTER_FIELDS if field not in columns]
+            if missing:
+                logger.warning("test_run_configs 缺少計數欄位 %s，請先執行 database_init.py --auto-fix", missing)
+                return False
+            installed = {row[0] for row in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+            TestRunBugTicketRef.__table__.create(bind=conn, checkfirst=True)
+            # "CREATE TRIGGER IF NOT EXISTS <name> ..."
+            fresh = any(statement.split()[5] not in installed for statement in RUN_COUNTER_TRIGGERS)
+            for statement in RUN_COUNTER_TRIGGERS:
+                conn.exec_driver_sql(statement)
+            if fresh:
+                recompute_counters(conn)
+                logger.info("已安裝 Test Run 計數 trigger 並重算所有配置的統計")
+        _ensured_engines.add(key)
+        return True
+
+
+def recompute_counters(db, config_id: Optional[int] = None) -> None:
+    """以 GROUP BY 重算計數與 ticket 參照（db 可為 Session 或 Connection；由呼叫端提交）"""
+    params = {"config_id": config_id} if config_id is not None else {}
+    # 參照表的 insert/delete trigger 會增減 unique_bug_tickets，最後統一以實際數量覆寫
+    db.execute(text(f"DELETE FROM test_run_bug_tickets WHERE true{_config_filter('config_id', config_id)}"), params)
+    db.execute(text(
+        "INSERT INTO test_run_bug_tickets (config_id, ticket_number, item_count) "
+        f"{_expected_ticket_refs_sql(config_id)}"
+    ), params)
+
+    item_scope = "FROM test_run_items WHERE config_id = test_run_configs.id"
+    assignments = [
+        f"total_test_cases = (SELECT COUNT(*) {item_scope})",
+        f"executed_cases = (SELECT COUNT(test_result) {item_scope})",
+        *(f"{field} = (SELECT COUNT(*) {item_scope} AND {_status_in(status)})"
+          for field, status in _STATUS_FIELDS.items()),
+        "unique_bug_tickets = (SELECT COUNT(*) FROM test_run_bug_tickets WHERE config_id = test_run_configs.id)",
+    ]
+    db.execute(text(
+        f"UPDATE test_run_configs SET {', '.join(assignments)} WHERE true{_config_filter('id', config_id)}"
+    ), params)
+
+
+def verify_counters(db, config_id: Optional[int] = None, repair: bool = False) -> Dict[str, Any]:
+    """比對配置計數與實際項目；repair=True 時重算不一致的配置（由呼叫端提交）
+
+    Returns:
+        {"checked": 配置數, "mismatches": [{"config_id", "team_id", "fields": {欄位: {"stored", "expected"}}}],
+         "repaired": 重算的配置數}
+    """
+    params = {"config_id": config_id} if config_id is not None else {}
+    expected: Dict[int, Dict[str, int]] = {}
+    for row in db.execute(text(_expected_counts_sql(config_id)), params).mappings():
+        expected[row["config_id"]] = {field: int(row[field] or 0) for field in COUNTER_FIELDS[:-1]}
+
+    expected_refs: Dict[int, Dict[str, int]] = {}
+    for cid, ticket, count in db.execute(text(_expected_ticket_refs_sql(config_id)), params):
+        expected_refs.setdefault(cid, {})[ticket] = int(count)
+    stored_refs: Dict[int, Dict[str, int]] = {}
+    ref_rows = db.execute(text(
+        "SELECT config_id, ticket_number, item_count FROM test_run_bug_tickets "
+        f"WHERE true{_config_filter('config_id', config_id)}"
+    ), params)
+    for cid, ticket, count in ref_rows:
+        stored_refs.setdefault(cid, {})[ticket] = int(count)
+
+    stmt = select(TestRunConfigDB.id, TestRunConfigDB.team_id,
+                  *(getattr(TestRunConfigDB, field) for field in COUNTER_FIELDS))
+    if config_id is not None:
+        stmt = stmt.where(TestRunConfigDB.id == config_id)
+    query = db.execute(stmt)
+
+    checked = 0
+    mismatches: List[Dict[str, Any]] = []
+    for row in query.mappings():
+        checked += 1
+        cid = row["id"]
+        refs = expected_refs.get(cid, {})
+        want = dict(expected.get(cid) or {field: 0 for field in COUNTER_FIELDS[:-1]},
+                    unique_bug_tickets=len(refs))
+        fields = {
+            field: {"stored": row[field], "expected": want[field]}
+            for field in COUNTER_FIELDS if row[field] != want[field]
+        }
+        if stored_refs.get(cid, {}) != refs:
+            fields["bug_ticket_refs"] = {"stored": len(stored_refs.get(cid, {})), "expected": len(refs)}
+        if fields:
+            mismatches.append({"config_id": cid, "team_id": row["team_id"], "fields": fields})
+
+    repaired = 0
+    if repair:
+        for mismatch in mismatches:
+            recompute_counters(db, mismatch["config_id"])
+            repaired += 1
+    return {"checked": checked, "mismatches": mismatches, "repaired": repaired}
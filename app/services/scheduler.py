@@ -2,136 +2,397 @@
 定時任務管理器
 
 負責管理各種定時任務，包括 TCG 資料同步
+
+- 調度迴圈為 asyncio 任務，於應用程式事件迴圈中執行，依最早到期時間休眠
+- 排程支援 cron 表達式（見 app.utils.cron）或固定間隔，並可加入隨機抖動（jitter）
+- 任務於有上限的執行緒池中執行；同一任務執行中不會重疊觸發，並可設定逾時
+- 上次/下次執行時間與結果寫入 scheduled_task_state 表，重啟後沿用原排程
+- get_task_status 回報各任務的執行次數、錯誤、逾時與耗時統計
+- 多 worker 時以 worker_leases 租約選出 leader，只有 leader 依排程觸發任務；
+  其他 worker 定期嘗試接手，取得租約時先重新載入持久化狀態，避免重複補跑
 """
 
-import time
-import threading
+import asyncio
 import logging
-from typing import Dict, Any
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from app.services.tcg_converter import tcg_converter
-from app.services.lark_org_sync_service import get_lark_org_sync_service
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app.models.database_models import ScheduledTaskState
+from app.services.metrics import SCHEDULER_DURATION, SCHEDULER_RUNS
+from app.services.worker_coordination import COORDINATION_ENABLED, LeaderLease, worker_id
+from app.utils.cron import CronExpression
+
+# 調度迴圈最長休眠時間（秒）；註冊或手動觸發任務時會提前喚醒
+MAX_SLEEP_SECONDS = 60
+# 每個任務保留的最近耗時樣本數
+DURATION_SAMPLES = 50
 
 
 class TaskScheduler:
     """定時任務調度器"""
-    
-    def __init__(self):
+
+    def __init__(self, session_factory: Optional[Callable[[], Session]] = None, max_workers: int = 2,
+                 leader_lease: Optional[LeaderLease] = None):
         self.logger = logging.getLogger(__name__)
-        self.tasks = {}
+        self.tasks: Dict[str, Dict[str, Any]] = {}
         self.running = False
-        self.scheduler_thread = None
-    
+        self._session_factory = session_factory
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._lock = threading.Lock()
+        self._table_ready = False
+        # 未指定租約時（單一 worker、測試）永遠是 leader
+        self._lease = leader_lease
+        self._next_renew = 0.0
+        self._renewed_at = 0.0
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lease is None or self._lease.is_leader
+
     def start(self):
-        """啟動調度器"""
+        """啟動調度器（需於事件迴圈中呼叫，例如 FastAPI startup 事件）"""
         if self.running:
             return
-            
+
         self.running = True
-        
-        # 註冊 TCG 同步任務（每 2 小時執行一次）
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="scheduler")
+
+        # 註冊 TCG 同步任務（每 2 小時整點執行，加入最多 2 分鐘抖動）
+        # 啟動時僅在從未執行過或已逾期時才立即執行
         self.register_task(
             name="tcg_sync",
             func=self._sync_tcg_task,
-            interval_hours=2,
-            run_immediately=True  # 啟動時立即執行一次
+            cron="0 */2 * * *",
+            jitter_seconds=120,
+            timeout_seconds=1800,
+            run_immediately=True
+        )
+
+        # 每日凌晨壓縮測試案例變更紀錄（差異同步用）
+        self.register_task(
+            name="test_case_changes_compaction",
+            func=self._compact_test_case_changes_task,
+            cron="15 4 * * *",
+            jitter_seconds=300,
+            timeout_seconds=600,
         )
-        
+
         # 註冊 Lark 組織架構同步任務已移除 - 改為手動觸發
         # self.register_task(
         #     name="lark_org_sync",
         #     func=self._sync_lark_org_task,
-        #     interval_hours=24,
+        #     cron="30 3 * * *",
         #     run_immediately=False  # 不立即執行，等到凌晨時段
         # )
-        
-        # 啟動調度線程
-        self.scheduler_thread = threading.Thread(target=self._scheduler_loop, daemon=True)
-        self.scheduler_thread.start()
-        
+
+        # 啟動調度迴圈
+        self._loop_task = self._loop.create_task(self._scheduler_loop())
+
         self.logger.info("定時任務調度器已啟動")
-    
+
     def stop(self):
-        """停止調度器"""
+        """停止調度器（執行中的任務不會被中斷，但不再等待其完成）"""
         self.running = False
-        if self.scheduler_thread:
-            self.scheduler_thread.join(timeout=5)
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            self._loop_task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self._lease is not None and self._lease.is_leader:
+            # 主動釋放，其他 worker 下次續約時即可接手
+            try:
+                self._lease.release()
+            except Exception as e:
+                self.logger.warning(f"釋放調度器租約失敗: {e}")
         self.logger.info("定時任務調度器已停止")
-    
-    def register_task(self, name: str, func, interval_hours: float, run_immediately: bool = False):
+
+    def register_task(self, name: str, func, interval_hours: Optional[float] = None,
+                      run_immediately: bool = False, cron: Optional[str] = None,
+                      jitter_seconds: float = 0, timeout_seconds: Optional[float] = None):
         """
         註冊定時任務
-        
+
         Args:
             name: 任務名稱
-            func: 要執行的函數
-            interval_hours: 執行間隔（小時）
-            run_immediately: 是否立即執行一次
+            func: 要執行的函數（同步函數，於執行緒池中執行）
+            interval_hours: 執行間隔（小時），與 cron 擇一
+            run_immediately: 無執行紀錄或已逾期時是否立即執行一次
+            cron: cron 表達式（例如 "0 */2 * * *"）
+            jitter_seconds: 每次排程加上 0~jitter_seconds 秒的隨機延遲，避免多任務同時觸發
+            timeout_seconds: 執行逾時秒數（逾時後記錄錯誤；執行緒仍會跑完，期間不會重疊觸發）
         """
-        next_run = datetime.now()
-        if not run_immediately:
-            next_run += timedelta(hours=interval_hours)
-            
-        self.tasks[name] = {
+        if (cron is None) == (interval_hours is None):
+            raise ValueError("cron 與 interval_hours 需擇一指定")
+        cron_expr = CronExpression(cron) if cron else None
+        schedule = cron if cron else f"interval:{int(interval_hours * 3600)}"
+
+        task_info = {
             'func': func,
+            'cron': cron_expr,
             'interval_hours': interval_hours,
-            'next_run': next_run,
+            'schedule': schedule,
+            'jitter_seconds': jitter_seconds,
+            'timeout_seconds': timeout_seconds,
+            'next_run': None,
             'last_run': None,
+            'last_status': None,
             'run_count': 0,
             'error_count': 0,
-            'last_error': None
+            'timeout_count': 0,
+            'skipped_overlaps': 0,
+            'last_error': None,
+            'running': False,
+            'durations': deque(maxlen=DURATION_SAMPLES),
+            'last_duration': None,
+            'max_duration': None,
         }
-        
-        self.logger.info(f"已註冊定時任務: {name}, 間隔: {interval_hours}小時, 下次執行: {next_run}")
-    
-    def _scheduler_loop(self):
-        """調度主循環"""
+
+        now = datetime.now()
+        state = self._load_state(name)
+        self._apply_state(task_info, state)
+
+        if task_info['next_run'] is None:
+            if run_immediately and (state is None or state.last_run_at is None):
+                task_info['next_run'] = now
+            else:
+                task_info['next_run'] = self._compute_next_run(task_info, now)
+
+        self.tasks[name] = task_info
+        if self.is_leader:
+            # follower 不覆寫 leader 持久化的排程
+            self._save_state(name)
+        self._wake()
+
+        self.logger.info(f"已註冊定時任務: {name}, 排程: {schedule}, 下次執行: {task_info['next_run']}")
+
+    @staticmethod
+    def _apply_state(task_info: Dict[str, Any], state: Optional[ScheduledTaskState]) -> None:
+        """套用持久化狀態；排程未變更時沿用持久化的下次執行時間（已逾期則盡快補跑）"""
+        if state is None:
+            return
+        task_info['last_run'] = state.last_run_at
+        task_info['last_status'] = state.last_status
+        task_info['run_count'] = state.run_count or 0
+        task_info['error_count'] = state.error_count or 0
+        task_info['last_error'] = state.last_error
+        task_info['last_duration'] = state.last_duration_seconds
+        if state.schedule == task_info['schedule'] and state.next_run_at:
+            task_info['next_run'] = state.next_run_at
+
+    def _reload_states(self) -> None:
+        """由資料庫重新載入所有任務狀態（取得 leader 時、follower 回報狀態時）"""
+        for name, task_info in list(self.tasks.items()):
+            if not task_info['running']:
+                self._apply_state(task_info, self._load_state(name))
+
+    async def _renew_lease(self) -> None:
+        """取得或續約 leader 租約；資料庫暫時無法寫入時，於租約期限內維持原狀態"""
+        was_leader = self._lease.is_leader
+        try:
+            await asyncio.to_thread(self._lease.try_acquire)
+            self._renewed_at = time.monotonic()
+        except Exception as e:
+            self.logger.warning(f"續約調度器租約失敗: {e}")
+            if time.monotonic() - self._renewed_at >= self._lease.ttl_seconds:
+                self._lease.is_leader = False
+        self._next_renew = time.monotonic() + self._lease.renew_interval
+
+        if self._lease.is_leader and not was_leader:
+            self.logger.info(f"本 worker（{self._lease.owner}）成為定時任務 leader")
+            await asyncio.to_thread(self._reload_states)
+        elif was_leader and not self._lease.is_leader:
+            self.logger.warning(f"本 worker（{self._lease.owner}）已失去定時任務 leader 身分")
+
+    def _compute_next_run(self, task_info: Dict[str, Any], after: datetime) -> datetime:
+        if task_info['cron'] is not None:
+            next_run = task_info['cron'].next_after(after)
+        else:
+            next_run = after + timedelta(hours=task_info['interval_hours'])
+        if task_info['jitter_seconds']:
+            next_run += timedelta(seconds=random.uniform(0, task_info['jitter_seconds']))
+        return next_run
+
+    def _wake(self):
+        if self._loop is None or self._wakeup is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            # 事件迴圈已關閉
+            pass
+
+    async def _scheduler_loop(self):
+        """調度主循環：啟動到期任務後，休眠至下一個到期時間"""
         while self.running:
             try:
-                current_time = datetime.now()
-                
-                for task_name, task_info in self.tasks.items():
-                    if current_time >= task_info['next_run']:
-                        self._execute_task(task_name, task_info)
-                
-                # 每分鐘檢查一次
-                time.sleep(60)
-                
+                if self._lease is not None and time.monotonic() >= self._next_renew:
+                    await self._renew_lease()
+
+                sleep_seconds = MAX_SLEEP_SECONDS
+                if self.is_leader:
+                    current_time = datetime.now()
+
+                    for task_name, task_info in list(self.tasks.items()):
+                        if current_time >= task_info['next_run']:
+                            self._dispatch(task_name, task_info, current_time)
+
+                    if self.tasks:
+                        earliest = min(t['next_run'] for t in self.tasks.values())
+                        sleep_seconds = min(sleep_seconds, max(0.0, (earliest - datetime.now()).total_seconds()))
+                if self._lease is not None:
+                    sleep_seconds = min(sleep_seconds, max(0.0, self._next_renew - time.monotonic()))
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(sleep_seconds, 0.05))
+                except asyncio.TimeoutError:
+                    pass
+
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 self.logger.error(f"調度器循環異常: {e}")
-                time.sleep(60)
-    
-    def _execute_task(self, task_name: str, task_info: Dict[str, Any]):
+                await asyncio.sleep(MAX_SLEEP_SECONDS)
+
+    def _dispatch(self, task_name: str, task_info: Dict[str, Any], now: datetime):
+        """排定下次執行時間並啟動任務；上次執行尚未結束時略過本次（同一任務不重疊）"""
+        task_info['next_run'] = self._compute_next_run(task_info, now)
+        if task_info['running']:
+            task_info['skipped_overlaps'] += 1
+            self.logger.warning(f"定時任務 {task_name} 仍在執行中，略過本次觸發，下次執行: {task_info['next_run']}")
+            return
+        task_info['running'] = True
+        self._loop.create_task(self._execute_task(task_name, task_info, now))
+
+    async def _execute_task(self, task_name: str, task_info: Dict[str, Any], now: datetime):
         """執行單個任務"""
+        self.logger.info(f"開始執行定時任務: {task_name}")
+        start_time = time.perf_counter()
+        future = self._loop.run_in_executor(self._executor, task_info['func'])
+
+        def _release(_):
+            # 逾時後執行緒仍會跑完；完成時才解除重疊保護
+            task_info['running'] = False
+        future.add_done_callback(_release)
+
         try:
-            self.logger.info(f"開始執行定時任務: {task_name}")
-            start_time = time.time()
-            
-            # 執行任務
-            result = task_info['func']()
-            
-            # 更新任務狀態
-            task_info['last_run'] = datetime.now()
-            task_info['run_count'] += 1
-            task_info['next_run'] = datetime.now() + timedelta(hours=task_info['interval_hours'])
-            task_info['last_error'] = None
-            
-            execution_time = time.time() - start_time
+            # shield：逾時只停止等待，不取消底層 future（以保留重疊保護）
+            result = await asyncio.wait_for(asyncio.shield(future), timeout=task_info['timeout_seconds'])
+            status = 'success'
+            if isinstance(result, dict) and result.get('success') is False:
+                status = 'failed'
+                task_info['error_count'] += 1
+                task_info['last_error'] = result.get('message')
+            else:
+                task_info['last_error'] = None
+        except asyncio.TimeoutError:
+            status = 'timeout'
+            result = None
+            task_info['timeout_count'] += 1
+            task_info['error_count'] += 1
+            task_info['last_error'] = f"執行逾時（>{task_info['timeout_seconds']} 秒）"
+        except Exception as e:
+            status = 'failed'
+            result = None
+            task_info['error_count'] += 1
+            task_info['last_error'] = str(e)
+
+        execution_time = time.perf_counter() - start_time
+        task_info['last_run'] = now
+        task_info['last_status'] = status
+        task_info['run_count'] += 1
+        task_info['last_duration'] = execution_time
+        task_info['durations'].append(execution_time)
+        task_info['max_duration'] = max(task_info['max_duration'] or 0.0, execution_time)
+        SCHEDULER_RUNS.inc(task=task_name, status=status)
+        SCHEDULER_DURATION.observe(execution_time, task=task_name)
+
+        if status == 'success':
             self.logger.info(
                 f"定時任務 {task_name} 執行完成, 耗時: {execution_time:.2f}秒, "
                 f"結果: {result}, 下次執行: {task_info['next_run']}"
             )
-            
+        else:
+            self.logger.error(f"定時任務 {task_name} 執行失敗（{status}）: {task_info['last_error']}")
+
+        # 持久化排程由 leader 擁有；follower 手動觸發的執行只記在本行程，不覆寫 leader 的狀態
+        if not self.is_leader:
+            return
+        try:
+            await self._loop.run_in_executor(None, self._save_state, task_name)
         except Exception as e:
-            # 記錄錯誤
-            task_info['error_count'] += 1
-            task_info['last_error'] = str(e)
-            task_info['next_run'] = datetime.now() + timedelta(hours=task_info['interval_hours'])
-            
-            self.logger.error(f"定時任務 {task_name} 執行失敗: {e}")
-    
+            self.logger.error(f"儲存定時任務狀態失敗 {task_name}: {e}")
+
+    # ---------------- 狀態持久化 ----------------
+
+    def _new_session(self) -> Session:
+        if self._session_factory is None:
+            from sqlalchemy.orm import sessionmaker
+            from app.database import get_sync_engine
+            self._session_factory = sessionmaker(autocommit=False, autoflush=False, bind=get_sync_engine())
+        db = self._session_factory()
+        if not self._table_ready:
+            ScheduledTaskState.__table__.create(bind=db.get_bind(), checkfirst=True)
+            self._table_ready = True
+        return db
+
+    def _load_state(self, name: str) -> Optional[ScheduledTaskState]:
+        try:
+            db = self._new_session()
+            try:
+                state = db.query(ScheduledTaskState).filter(ScheduledTaskState.name == name).first()
+                if state is not None:
+                    db.expunge(state)
+                return state
+            finally:
+                db.close()
+        except Exception as e:
+            self.logger.warning(f"讀取定時任務狀態失敗 {name}: {e}")
+            return None
+
+    def _save_state(self, name: str) -> None:
+        task_info = self.tasks.get(name)
+        if task_info is None:
+            return
+        try:
+            with self._lock:
+                db = self._new_session()
+                try:
+                    state = db.query(ScheduledTaskState).filter(ScheduledTaskState.name == name).first()
+                    if state is None:
+                        state = ScheduledTaskState(name=name)
+                        db.add(state)
+                    state.schedule = task_info['schedule']
+                    state.last_run_at = task_info['last_run']
+                    state.next_run_at = task_info['next_run']
+                    state.last_status = task_info['last_status']
+                    state.last_duration_seconds = task_info['last_duration']
+                    state.last_error = task_info['last_error']
+                    state.run_count = task_info['run_count']
+                    state.error_count = task_info['error_count']
+                    db.commit()
+                finally:
+                    db.close()
+        except Exception as e:
+            self.logger.warning(f"儲存定時任務狀態失敗 {name}: {e}")
+
     def _sync_tcg_task(self) -> Dict[str, Any]:
         """TCG 同步任務"""
+        from app.services.tcg_converter import tcg_converter
+
         try:
             sync_count = tcg_converter.sync_tcg_from_lark()
             return {
@@ -146,22 +407,36 @@ class TaskScheduler:
                 'sync_count': 0,
                 'message': f'同步失敗: {str(e)}'
             }
-    
+
+    def _compact_test_case_changes_task(self) -> Dict[str, Any]:
+        """測試案例變更紀錄壓縮任務（經寫入佇列執行，避免與線上寫入搶鎖）"""
+        from app.services.test_case_change_service import compact_test_case_changes
+        from app.services.write_queue import get_write_queue
+
+        try:
+            result = get_write_queue().submit(compact_test_case_changes, group=False).result()
+            return {'success': True, **result}
+        except Exception as e:
+            self.logger.error(f"測試案例變更紀錄壓縮失敗: {e}")
+            return {'success': False, 'message': f'壓縮失敗: {str(e)}'}
+
     def _sync_lark_org_task(self) -> Dict[str, Any]:
         """Lark 組織架構同步任務"""
+        from app.services.lark_org_sync_service import get_lark_org_sync_service
+
         try:
             self.logger.info("開始執行 Lark 組織架構同步任務...")
-            
+
             # 獲取組織同步服務
             sync_service = get_lark_org_sync_service()
-            
+
             # 執行完整同步
             result = sync_service.sync_full_organization()
-            
+
             if result.get('success', False):
                 # 同步成功後清理舊數據（30天前的）
                 cleanup_result = sync_service.cleanup_old_data(days_threshold=30)
-                
+
                 return {
                     'success': True,
                     'sync_result': result,
@@ -174,7 +449,7 @@ class TaskScheduler:
                     'sync_result': result,
                     'message': f"Lark 組織架構同步失敗: {result.get('message', '未知錯誤')}"
                 }
-                
+
         except Exception as e:
             self.logger.error(f"Lark 組織架構同步任務失敗: {e}")
             return {
@@ -182,35 +457,66 @@ class TaskScheduler:
                 'sync_result': None,
                 'message': f'組織架構同步失敗: {str(e)}'
             }
-    
+
     def get_task_status(self) -> Dict[str, Any]:
-        """取得所有任務的狀態"""
+        """取得所有任務的狀態與耗時統計（follower 回報 leader 持久化的排程與結果）"""
+        if not self.is_leader:
+            self._reload_states()
         status = {
             'scheduler_running': self.running,
+            'max_workers': self._max_workers,
+            'worker_id': worker_id(),
+            'is_leader': self.is_leader,
             'tasks': {}
         }
-        
+
         for task_name, task_info in self.tasks.items():
+            durations = sorted(task_info['durations'])
+            metrics = None
+            if durations:
+                metrics = {
+                    'samples': len(durations),
+                    'last_seconds': round(task_info['last_duration'], 3),
+                    'avg_seconds': round(sum(durations) / len(durations), 3),
+                    'p50_seconds': round(durations[len(durations) // 2], 3),
+                    'p95_seconds': round(durations[min(len(durations) - 1, int(len(durations) * 0.95))], 3),
+                    'max_seconds': round(task_info['max_duration'], 3),
+                }
             status['tasks'][task_name] = {
+                'schedule': task_info['schedule'],
                 'interval_hours': task_info['interval_hours'],
+                'jitter_seconds': task_info['jitter_seconds'],
+                'timeout_seconds': task_info['timeout_seconds'],
                 'next_run': task_info['next_run'].isoformat() if task_info['next_run'] else None,
                 'last_run': task_info['last_run'].isoformat() if task_info['last_run'] else None,
+                'last_status': task_info['last_status'],
+                'running': task_info['running'],
                 'run_count': task_info['run_count'],
                 'error_count': task_info['error_count'],
-                'last_error': task_info['last_error']
+                'timeout_count': task_info['timeout_count'],
+                'skipped_overlaps': task_info['skipped_overlaps'],
+                'last_error': task_info['last_error'],
+                'duration': metrics,
             }
-        
+
         return status
-    
+
     def trigger_task(self, task_name: str) -> bool:
-        """手動觸發任務執行"""
+        """手動觸發任務執行（排入調度迴圈立即執行；follower 於本行程直接執行且不寫入持久化狀態；
+        調度器未啟動時同步執行）"""
         if task_name not in self.tasks:
             return False
-            
+
         task_info = self.tasks[task_name]
-        self._execute_task(task_name, task_info)
+        if self.running and self._loop is not None and self.is_leader:
+            task_info['next_run'] = datetime.now()
+            self._wake()
+        elif self.running and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._dispatch, task_name, task_info, datetime.now())
+        else:
+            task_info['func']()
         return True
 
 
-# 全域調度器實例
-task_scheduler = TaskScheduler()
\ No newline at end of file
+# 全域調度器實例（多 worker 時只有持有租約的 worker 執行排程）
+task_scheduler = TaskScheduler(leader_lease=LeaderLease("scheduler") if COORDINATION_ENABLED else None)
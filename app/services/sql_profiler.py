@@ -0,0 +1,141 @@
+"""
+每請求 SQL 效能剖析
+
+於 SQLAlchemy engine 的 cursor 事件中，把查詢累計到目前請求的 RequestProfile（contextvar）：
+- 查詢數、DB 總耗時
+- 以 SQL 指紋（常數與 IN 清單正規化後的語句）統計重複執行次數，
+  同一指紋達 n_plus_one_threshold 次即視為 N+1
+- 單一查詢超過 slow_query_ms 時寫入慢查詢日誌
+
+只有在剖析中的請求（由 SQLProfilerMiddleware 建立 RequestProfile）才會記錄；
+未啟用時 engine 事件只做一次 contextvar 讀取。
+"""
+
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+# 慢查詢與 N+1 專用日誌（可由設定導向獨立檔案）
+slow_query_logger = logging.getLogger("app.sql_profiler.slow")
+
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("sql_profile", default=None)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*(?:\?|:\w+|__\[POSTCOMPILE_\w+\]|%s)\s*,?)+\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """SQL 指紋：移除常數、合併 IN 清單與空白，讓同一查詢樣板得到相同字串"""
+    text = _STRING_LITERAL.sub("?", statement)
+    text = _NUMBER_LITERAL.sub("?", text)
+    text = _IN_LIST.sub("IN (...)", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class RequestProfile:
+    """單一請求的查詢統計"""
+
+    def __init__(self, label: str, n_plus_one_threshold: int = 10, slow_query_ms: float = 100):
+        self.label = label
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.slow_query_seconds = slow_query_ms / 1000.0
+        self.query_count = 0
+        self.db_seconds = 0.0
+        self.fingerprints: Counter = Counter()
+        self.fingerprint_seconds: Dict[str, float] = {}
+        self.slow_queries: List[Tuple[float, str]] = []
+
+    def record(self, statement: str, seconds: float) -> None:
+        key = fingerprint(statement)
+        self.query_count += 1
+        self.db_seconds += seconds
+        self.fingerprints[key] += 1
+        self.fingerprint_seconds[key] = self.fingerprint_seconds.get(key, 0.0) + seconds
+        if seconds >= self.slow_query_seconds:
+            self.slow_queries.append((seconds, key))
+            slow_query_logger.warning(f"慢查詢 {seconds * 1000:.1f}ms [{self.label}] {key}")
+
+    def repeated_statements(self) -> List[Tuple[str, int, float]]:
+        """重複執行達門檻的指紋：[(fingerprint, 次數, 累計秒數)]，依次數遞減"""
+        return [
+            (key, count, self.fingerprint_seconds[key])
+            for key, count in self.fingerprints.most_common()
+            if count >= self.n_plus_one_threshold
+        ]
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.db_seconds * 1000:.1f};desc="{self.query_count} queries"'
+
+    def report(self) -> None:
+        """請求結束時輸出 N+1 警告"""
+        for key, count, seconds in self.repeated_statements():
+            slow_query_logger.warning(
+                f"疑似 N+1 [{self.label}] 同一語句執行 {count} 次，共 {seconds * 1000:.1f}ms: {key}"
+            )
+
+
+def start_profile(label: str, n_plus_one_threshold: int = 10, slow_query_ms: float = 100):
+    """開始剖析（回傳 (profile, token)；結束時以 stop_profile(token) 還原）"""
+    profile = RequestProfile(label, n_plus_one_threshold, slow_query_ms)
+    return profile, _current_profile.set(profile)
+
+
+def stop_profile(token) -> None:
+    _current_profile.reset(token)
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current_profile.get()
+
+
+def install(engine) -> None:
+    """為同步 Engine（或 AsyncEngine.sync_engine）掛上剖析事件；重複呼叫無副作用"""
+    from sqlalchemy import event
+
+    if getattr(engine, "_sql_profiler_installed", False):
+        return
+
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current_profile.get() is not None:
+            conn.info.setdefault("sql_profiler_start", []).append(time.perf_counter())
+
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        profile = _current_profile.get()
+        if profile is None:
+            return
+        stack = conn.info.get("sql_profiler_start")
+        if stack:
+            profile.record(statement, time.perf_counter() - stack.pop())
+
+    def _error(exception_context):
+        conn = exception_context.connection
+        stack = conn.info.get("sql_profiler_start") if conn is not None else None
+        if not stack:
+            return
+        elapsed = time.perf_counter() - stack.pop()
+        profile = _current_profile.get()
+        if profile is not None and exception_context.statement:
+            # 失敗的查詢同樣計入
+            profile.record(exception_context.statement, elapsed)
+
+    event.listen(engine, "before_cursor_execute", _before)
+    event.listen(engine, "after_cursor_execute", _after)
+    event.listen(engine, "handle_error", _error)
+    engine._sql_profiler_installed = True
+
+
+def configure_log_file(path: str) -> None:
+    """將慢查詢/N+1 日誌另外寫入檔案"""
+    if not path:
+        return
+    for handler in slow_query_logger.handlers:
+        if isinstance(handler, logging.FileHandler) and handler.baseFilename == str(path):
+            return
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    slow_query_logger.addHandler(handler)
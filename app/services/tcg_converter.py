@@ -2,33 +2,164 @@
 TCG 單號轉換服務
 
 負責將 Lark record_id 轉換為實際的 TCG 單號顯示，參照 auto_tools 的實現方式
+
+同步採增量方式：將 Lark 取回的記錄與 tcg_records 現有內容比對，
+只對新增/變更/刪除的資料以小批次交易寫入，避免長時間持有 SQLite 寫鎖。
+
+查詢（單號 ↔ record_id、自動完成搜尋）走記憶體索引 TCGIndex，
+啟動時載入、每次同步後替換，不再逐筆查詢資料庫。
+
+多 worker 時同步以檔案鎖互斥（同一時間只有一個行程呼叫 Lark），
+映射有變動時廣播 tcg_index 失效訊息，其他 worker 收到後重新載入索引。
 """
 
+import bisect
+import heapq
+import itertools
 import logging
-from typing import Optional, List, Dict, Any
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional, List, Dict, Any, Tuple
 from pathlib import Path
 from sqlalchemy import text
-from sqlalchemy.exc import IntegrityError
 from app.database import get_sync_engine
+from app.services.worker_coordination import TOPIC_TCG_INDEX, file_lock, get_invalidation_bus
 from sqlalchemy.orm import sessionmaker
 
 
+class TCGIndex:
+    """TCG 單號的記憶體索引（執行緒安全的不可變快照）
+
+    - number → (record_id, title) 與 record_id → number 雙向 O(1) 查詢
+    - 依單號排序的陣列，以 bisect 做前綴搜尋（自動完成）
+    每次重建都產生新的快照後整批替換，讀取端不需加鎖。
+    """
+
+    def __init__(self, mapping: Optional[Dict[str, Tuple[str, Optional[str]]]] = None):
+        mapping = mapping or {}
+        self.by_number: Dict[str, Tuple[str, Optional[str]]] = dict(mapping)
+        self.by_record_id: Dict[str, str] = {
+            record_id: number for number, (record_id, _title) in mapping.items()
+        }
+        self.sorted_numbers: List[str] = sorted(mapping)
+        # 大寫單號（用於不分大小寫的前綴搜尋），與 sorted_numbers 同序
+        self._upper_numbers: List[str] = [number.upper() for number in self.sorted_numbers]
+        self._upper_sorted = self._upper_numbers == sorted(self._upper_numbers)
+        # 小寫「單號\x00標題」（用於包含比對），建立快照時計算一次，查詢時不再逐筆轉換
+        self._search_keys: List[str] = [
+            f"{number}\x00{mapping[number][1] or ''}".lower() for number in self.sorted_numbers
+        ]
+
+    def __len__(self) -> int:
+        return len(self.by_number)
+
+    def _entry(self, number: str) -> Dict[str, str]:
+        record_id, title = self.by_number[number]
+        return {
+            'record_id': record_id,
+            'tcg_number': number,
+            'title': title or '',
+            'display_text': number
+        }
+
+    def _prefix_range(self, prefix: str) -> range:
+        if not self._upper_sorted:
+            # 單號大小寫混用時退回線性比對（實務上 TCG 單號皆為大寫）
+            return range(0)
+        start = bisect.bisect_left(self._upper_numbers, prefix)
+        end = bisect.bisect_left(self._upper_numbers, prefix + "\uffff", lo=start)
+        return range(start, end)
+
+    def search(self, keyword: str = "", limit: int = 50) -> Tuple[List[Dict[str, str]], int]:
+        """搜尋單號，回傳（前 limit 筆結果, 符合總數）
+
+        單號前綴符合者優先（純數字關鍵字視為 TCG-<數字> 前綴），
+        其餘依單號或標題包含關鍵字（不分大小寫）補上；兩組各自依單號排序。
+        取得足夠結果後即停止比對，因此符合總數大於 limit 時只是下限（至少 limit + 1 筆）。
+        """
+        keyword = (keyword or "").strip()
+        if not keyword:
+            return [self._entry(n) for n in self.sorted_numbers[:limit]], len(self.sorted_numbers)
+
+        upper = keyword.upper()
+        prefixes = [upper]
+        if upper.isdigit():
+            prefixes.append(f"TCG-{upper}")
+
+        # 純數字時兩組前綴互不重疊，依單號序合併
+        ranges = [r for r in (self._prefix_range(prefix) for prefix in set(prefixes)) if r]
+        prefix_total = sum(len(r) for r in ranges)
+        ordered = [self.sorted_numbers[i] for i in itertools.islice(heapq.merge(*ranges), limit)]
+        total = prefix_total
+
+        # 其餘包含關鍵字者（單號中段或標題）；已超過 limit 筆即停止
+        if total <= limit:
+            lowered = keyword.lower()
+            for i, key in enumerate(self._search_keys):
+                if lowered not in key or any(i in r for r in ranges):
+                    continue
+                total += 1
+                if len(ordered) < limit:
+                    ordered.append(self.sorted_numbers[i])
+                elif total > limit:
+                    break
+
+        return [self._entry(n) for n in ordered], total
+
+
 class TCGConverter:
     """TCG 單號轉換器，負責將 record_id 轉換為實際的 TCG 單號"""
     
-    def __init__(self, db_path: str = "test_case_repo.db"):
+    # 增量同步每個寫入交易的最大筆數
+    SYNC_BATCH_SIZE = 500
+
+    def __init__(self, db_path: str = "test_case_repo.db", engine=None,
+                 on_index_changed: Optional[Callable[[], None]] = None):
         self.db_path = db_path
         self.logger = logging.getLogger(__name__)
-        # 使用同步引擎
-        self.engine = get_sync_engine()
-        from sqlalchemy.orm import sessionmaker
-        self.SessionLocal = sessionmaker(bind=self.engine)
-        self._init_database()
-    
+        # 引擎與資料表於首次使用時才建立（全域實例於匯入時建構，不應連線資料庫）
+        self._engine = engine
+        self._session_factory = None
+        self._db_ready = False
+        self._db_lock = threading.Lock()
+        # 跨行程鎖：多個 worker（或排程與手動觸發）不會同時向 Lark 取資料
+        self._sync_lock = file_lock("tcg_sync")
+        # 映射內容變動後呼叫（全域實例用於通知其他 worker）
+        self._on_index_changed = on_index_changed
+        # 最近一次同步的統計（供 /tcg/status 顯示）
+        self.last_sync: Optional[Dict[str, Any]] = None
+        # 記憶體索引（延遲載入；同步後以新快照替換）
+        self._index: Optional[TCGIndex] = None
+        self._index_lock = threading.Lock()
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            # 使用同步引擎
+            self._engine = get_sync_engine()
+        return self._engine
+
+    @property
+    def SessionLocal(self):
+        """Session 工廠；首次取得時確保 tcg_records 表存在"""
+        if not self._db_ready:
+            self.init_database()
+        return self._session_factory
+
+    def init_database(self) -> None:
+        """建立 tcg_records 表（只執行一次；啟動任務會於背景預先呼叫）"""
+        with self._db_lock:
+            if self._db_ready:
+                return
+            self._session_factory = sessionmaker(bind=self.engine)
+            self._init_database()
+            self._db_ready = True
+
     def _init_database(self):
         """初始化數據庫表格"""
         try:
-            db = self.SessionLocal()
+            db = self._session_factory()
             try:
                 # 使用 TCG 單號作為主鍵避免重複
                 db.execute(text('''
@@ -62,12 +193,8 @@ class TCGConverter:
         try:
             from app.services.lark_client import LarkClient
             from app.config import settings
-            import threading
-            
-            # 使用線程鎖避免同一進程內重複同步
-            if not hasattr(self, '_sync_lock'):
-                self._sync_lock = threading.Lock()
             
+            # 跨行程鎖避免重複同步（其他執行緒或 worker 正在同步時直接略過）
             if not self._sync_lock.acquire(blocking=False):
                 self.logger.warning("TCG 同步正在進行中，跳過此次同步")
                 return 0
@@ -89,14 +216,17 @@ class TCGConverter:
                 self.logger.info("開始從 Lark 同步 TCG 資料...")
                 
                 # 從 Lark 取得所有 TCG 資料
+                fetch_started = time.perf_counter()
                 records = lark_client.get_all_records(tcg_table_id)
+                fetch_seconds = time.perf_counter() - fetch_started
                 
                 if not records:
+                    # 取不到資料時不動本地映射，避免誤刪全部記錄
                     self.logger.warning("未從 Lark 取得到任何 TCG 記錄")
                     return 0
                 
-                # 在單一交易中完成清空和重建
-                return self._atomic_sync_records(records)
+                # 只寫入差異
+                return self._incremental_sync_records(records, fetch_seconds=fetch_seconds)
             finally:
                 self._sync_lock.release()
             
@@ -104,62 +234,115 @@ class TCGConverter:
             self.logger.error(f"從 Lark 同步 TCG 資料失敗: {e}")
             return 0
     
-    def _atomic_sync_records(self, records: List[Dict[str, Any]]) -> int:
-        """在單一交易中完成 TCG 記錄同步"""
-        db = self.SessionLocal()
-        try:
-            # 開始交易
-            db.begin()
+    def _parse_records(self, records: List[Dict[str, Any]]) -> Dict[str, Tuple[str, Optional[str]]]:
+        """將 Lark 記錄轉為 {tcg_number: (record_id, title)}；同一 TCG 單號以最後一筆為準"""
+        desired: Dict[str, Tuple[str, Optional[str]]] = {}
+        for index, record in enumerate(records):
+            record_id = record.get('record_id')
+            fields = record.get('fields', {})
             
-            # 清空舊資料
-            db.execute(text("DELETE FROM tcg_records"))
+            # 提取 TCG 號碼
+            raw_tcg = (
+                fields.get('TCG Tickets') or
+                fields.get('TCG Number') or 
+                fields.get('TCG') or 
+                fields.get('Ticket Number')
+            )
             
-            # 批量插入新資料
-            updated_count = 0
-            for record in records:
-                record_id = record.get('record_id')
-                fields = record.get('fields', {})
-                
-                # 提取 TCG 號碼
-                raw_tcg = (
-                    fields.get('TCG Tickets') or
-                    fields.get('TCG Number') or 
-                    fields.get('TCG') or 
-                    fields.get('Ticket Number')
-                )
-                
-                tcg_number = self._extract_text_from_field(raw_tcg)
-                
-                if updated_count == 0:
-                    self.logger.info(f"第一個記錄的所有欄位: {list(fields.keys())}")
-                    if raw_tcg:
-                        self.logger.info(f"第一個 TCG 記錄結構: {raw_tcg}")
-                        self.logger.info(f"解析後的 TCG 號碼: {tcg_number}")
-                
-                title = (
-                    fields.get('Title') or
-                    fields.get('標題') or
-                    fields.get('名稱') or
-                    self._extract_text_from_field(fields.get('Title'))
-                )
-                
-                if record_id and tcg_number:
-                    # 使用 INSERT OR REPLACE
-                    db.execute(text('''
-                        INSERT OR REPLACE INTO tcg_records 
-                        (tcg_number, record_id, title, updated_at)
-                        VALUES (:tcg_number, :record_id, :title, CURRENT_TIMESTAMP)
-                    '''), {
-                        'tcg_number': tcg_number,
-                        'record_id': record_id,
-                        'title': title
-                    })
-                    updated_count += 1
+            tcg_number = self._extract_text_from_field(raw_tcg)
             
-            # 提交交易
-            db.commit()
-            self.logger.info(f"更新了 {updated_count} 個 TCG 映射記錄")
-            return updated_count
+            if index == 0:
+                self.logger.info(f"第一個記錄的所有欄位: {list(fields.keys())}")
+                if raw_tcg:
+                    self.logger.info(f"第一個 TCG 記錄結構: {raw_tcg}")
+                    self.logger.info(f"解析後的 TCG 號碼: {tcg_number}")
+            
+            title = (
+                fields.get('Title') or
+                fields.get('標題') or
+                fields.get('名稱')
+            )
+            if title is not None and not isinstance(title, str):
+                # 富文本欄位（list/dict）轉為純文字，確保與資料庫中的值可比對
+                title = self._extract_text_from_field(title)
+            
+            if record_id and tcg_number:
+                desired[tcg_number] = (record_id, title)
+        return desired
+
+    def _incremental_sync_records(self, records: List[Dict[str, Any]], fetch_seconds: float = 0.0) -> int:
+        """比對現有映射，只以小批次交易寫入新增/更新/刪除
+
+        Returns:
+            同步後的有效 TCG 記錄數量；失敗時回傳 0
+        """
+        started = time.perf_counter()
+        desired = self._parse_records(records)
+
+        db = self.SessionLocal()
+        try:
+            # 讀取現有映射（只讀交易，不持有寫鎖）
+            current = {
+                tcg_number: (record_id, title)
+                for tcg_number, record_id, title in db.execute(
+                    text("SELECT tcg_number, record_id, title FROM tcg_records")
+                )
+            }
+            db.rollback()
+
+            inserts = [
+                {'tcg_number': number, 'record_id': record_id, 'title': title}
+                for number, (record_id, title) in desired.items() if number not in current
+            ]
+            updates = [
+                {'tcg_number': number, 'record_id': record_id, 'title': title}
+                for number, (record_id, title) in desired.items()
+                if number in current and current[number] != (record_id, title)
+            ]
+            deletes = [{'tcg_number': number} for number in current if number not in desired]
+
+            statements = [
+                (text('''
+                    INSERT INTO tcg_records (tcg_number, record_id, title, updated_at)
+                    VALUES (:tcg_number, :record_id, :title, CURRENT_TIMESTAMP)
+                '''), inserts),
+                (text('''
+                    UPDATE tcg_records
+                    SET record_id = :record_id, title = :title, updated_at = CURRENT_TIMESTAMP
+                    WHERE tcg_number = :tcg_number
+                '''), updates),
+                (text("DELETE FROM tcg_records WHERE tcg_number = :tcg_number"), deletes),
+            ]
+            # 每批獨立交易，批次之間釋放寫鎖讓其他寫入（例如測試案例編輯）可以進行
+            for statement, rows in statements:
+                for offset in range(0, len(rows), self.SYNC_BATCH_SIZE):
+                    db.execute(statement, rows[offset:offset + self.SYNC_BATCH_SIZE])
+                    db.commit()
+
+            # 同步後資料表內容即為 desired，直接替換記憶體索引
+            self._index = TCGIndex(desired)
+            if inserts or updates or deletes:
+                self._notify_index_changed()
+
+            apply_seconds = time.perf_counter() - started
+            self.last_sync = {
+                'finished_at': datetime.utcnow().isoformat(),
+                'fetched_records': len(records),
+                'total_records': len(desired),
+                'inserted': len(inserts),
+                'updated': len(updates),
+                'deleted': len(deletes),
+                'unchanged': len(desired) - len(inserts) - len(updates),
+                'changes': len(inserts) + len(updates) + len(deletes),
+                'fetch_seconds': round(fetch_seconds, 3),
+                'apply_seconds': round(apply_seconds, 3),
+                'duration_seconds': round(fetch_seconds + apply_seconds, 3),
+            }
+            self.logger.info(
+                f"TCG 映射同步完成: 新增 {len(inserts)} 筆、更新 {len(updates)} 筆、刪除 {len(deletes)} 筆，"
+                f"共 {len(desired)} 筆，耗時 {self.last_sync['duration_seconds']}s"
+            )
+            return len(desired)
             
         except Exception as e:
             db.rollback()
@@ -178,107 +361,103 @@ class TCGConverter:
         Returns:
             更新的記錄數量
         """
-        # 這個方法保留是為了向後相容，實際上呼叫新的原子同步方法
-        return self._atomic_sync_records(lark_records)
+        # 這個方法保留是為了向後相容，實際上呼叫增量同步方法
+        return self._incremental_sync_records(lark_records)
     
-    def get_tcg_number_by_record_id(self, record_id: str) -> Optional[str]:
-        """將單個 record_id 轉換為 TCG 單號"""
-        if not record_id:
-            return None
-        
+    # ---------------- 記憶體索引 ----------------
+
+    def _load_index_from_db(self) -> TCGIndex:
         db = self.SessionLocal()
         try:
-            result = db.execute(
-                text("SELECT tcg_number FROM tcg_records WHERE record_id = :record_id"),
-                {'record_id': record_id}
-            ).fetchone()
-            return result[0] if result else None
-        except Exception as e:
-            self.logger.error(f"查詢 record_id {record_id} 對應的 TCG 單號失敗: {e}")
-            return None
+            rows = db.execute(text("SELECT tcg_number, record_id, title FROM tcg_records")).fetchall()
+            return TCGIndex({number: (record_id, title) for number, record_id, title in rows})
         finally:
             db.close()
+
+    def refresh_index(self) -> int:
+        """由資料庫重新載入記憶體索引，回傳筆數（失敗時保留原索引並回傳 0）"""
+        try:
+            index = self._load_index_from_db()
+        except Exception as e:
+            self.logger.error(f"載入 TCG 記憶體索引失敗: {e}")
+            return 0
+        self._index = index
+        self.logger.info(f"TCG 記憶體索引已載入 {len(index)} 筆")
+        return len(index)
+
+    def _notify_index_changed(self) -> None:
+        if self._on_index_changed is None:
+            return
+        try:
+            self._on_index_changed()
+        except Exception as e:
+            self.logger.warning(f"通知 TCG 索引變更失敗: {e}")
+
+    def reload_index_if_loaded(self, _key: Optional[str] = None) -> None:
+        """其他 worker 同步後呼叫：已載入的索引重新讀取（尚未載入者首次使用時自然取得最新資料）"""
+        if self._index is not None:
+            self.refresh_index()
+
+    @property
+    def index(self) -> TCGIndex:
+        """目前的索引快照（首次使用時自動載入）"""
+        index = self._index
+        if index is None:
+            with self._index_lock:
+                if self._index is None:
+                    try:
+                        self._index = self._load_index_from_db()
+                    except Exception as e:
+                        self.logger.error(f"載入 TCG 記憶體索引失敗: {e}")
+                        return TCGIndex()
+                index = self._index
+        return index
+
+    def resolve_record_ids(self, tcg_numbers: List[str]) -> Dict[str, str]:
+        """批量將 TCG 單號轉為 record_id（找不到的單號不在結果中）"""
+        by_number = self.index.by_number
+        return {n: by_number[n][0] for n in tcg_numbers if n in by_number}
+
+    def resolve_tcg_numbers(self, record_ids: List[str]) -> Dict[str, str]:
+        """批量將 record_id 轉為 TCG 單號（找不到的 record_id 不在結果中）"""
+        by_record_id = self.index.by_record_id
+        return {rid: by_record_id[rid] for rid in record_ids if rid in by_record_id}
+
+    def get_tcg_number_by_record_id(self, record_id: str) -> Optional[str]:
+        """將單個 record_id 轉換為 TCG 單號"""
+        if not record_id:
+            return None
+        return self.index.by_record_id.get(record_id)
     
     def get_tcg_numbers_by_record_ids(self, record_ids: List[str]) -> Dict[str, str]:
         """批量轉換多個 record_id"""
         if not record_ids:
             return {}
-        
-        db = self.SessionLocal()
-        try:
-            # 使用參數化查詢避免 SQL 注入
-            placeholders = ", ".join([f":id{i}" for i in range(len(record_ids))])
-            params = {f"id{i}": record_id for i, record_id in enumerate(record_ids)}
-            
-            results = db.execute(
-                text(f"SELECT record_id, tcg_number FROM tcg_records WHERE record_id IN ({placeholders})"),
-                params
-            ).fetchall()
-            return {record_id: tcg_number for record_id, tcg_number in results}
-        except Exception as e:
-            self.logger.error(f"批量查詢 record_ids 對應的 TCG 單號失敗: {e}")
-            return {}
-        finally:
-            db.close()
+        return self.resolve_tcg_numbers(record_ids)
     
     def get_record_id_by_tcg_number(self, tcg_number: str) -> Optional[str]:
         """根據 TCG 單號查找 record_id（用於搜尋功能）"""
         if not tcg_number:
             return None
-        
-        db = self.SessionLocal()
-        try:
-            result = db.execute(
-                text("SELECT record_id FROM tcg_records WHERE tcg_number = :tcg_number"),
-                {'tcg_number': tcg_number}
-            ).fetchone()
-            return result[0] if result else None
-        except Exception as e:
-            self.logger.error(f"查詢 TCG 單號 {tcg_number} 對應的 record_id 失敗: {e}")
-            return None
-        finally:
-            db.close()
+        entry = self.index.by_number.get(tcg_number)
+        return entry[0] if entry else None
     
     def search_tcg_numbers(self, keyword: str = "", limit: int = 50) -> List[Dict[str, str]]:
-        """搜尋 TCG 單號"""
-        db = self.SessionLocal()
-        try:
-            if keyword:
-                results = db.execute(
-                    text('''
-                        SELECT record_id, tcg_number, title 
-                        FROM tcg_records 
-                        WHERE tcg_number LIKE :keyword OR title LIKE :keyword
-                        ORDER BY tcg_number
-                        LIMIT :limit
-                    '''),
-                    {'keyword': f'%{keyword}%', 'limit': limit}
-                ).fetchall()
-            else:
-                results = db.execute(
-                    text('''
-                        SELECT record_id, tcg_number, title 
-                        FROM tcg_records 
-                        ORDER BY tcg_number
-                        LIMIT :limit
-                    '''),
-                    {'limit': limit}
-                ).fetchall()
-            
-            return [
-                {
-                    'record_id': record_id,
-                    'tcg_number': tcg_number,
-                    'title': title or '',
-                    'display_text': tcg_number
-                }
-                for record_id, tcg_number, title in results
-            ]
-        except Exception as e:
-            self.logger.error(f"搜尋 TCG 單號失敗: {e}")
-            return []
-        finally:
-            db.close()
+        """搜尋 TCG 單號（記憶體索引，前綴符合者優先）"""
+        results, _total = self.index.search(keyword, limit)
+        return results
+
+    def search_tcg_numbers_with_total(self, keyword: str = "", limit: int = 50) -> Tuple[List[Dict[str, str]], int]:
+        """搜尋 TCG 單號並回傳符合總數（供分頁使用；超過 limit 時為下限）"""
+        return self.index.search(keyword, limit)
+
+    def count_records(self) -> int:
+        """TCG 映射總筆數"""
+        return len(self.index)
+
+    def get_sync_stats(self) -> Optional[Dict[str, Any]]:
+        """最近一次同步的統計（尚未同步過時為 None）"""
+        return dict(self.last_sync) if self.last_sync else None
     
     def get_popular_tcg_numbers(self, limit: int = 20) -> List[Dict[str, str]]:
         """取得熱門的 TCG 單號（按使用頻率）"""
@@ -305,6 +484,8 @@ class TCGConverter:
         try:
             db.execute(text("DELETE FROM tcg_records"))
             db.commit()
+            self._index = TCGIndex()
+            self._notify_index_changed()
             self.logger.info("已清除所有 TCG 映射")
             return True
         except Exception as e:
@@ -354,4 +535,5 @@ class TCGConverter:
 
 
 # 全域轉換器實例
-tcg_converter = TCGConverter()
\ No newline at end of file
+tcg_converter = TCGConverter(on_index_changed=lambda: get_invalidation_bus().broadcast(TOPIC_TCG_INDEX))
+get_invalidation_bus().subscribe(TOPIC_TCG_INDEX, tcg_converter.reload_index_if_loaded)
\ No newline at end of file
@@ -0,0 +1,144 @@
+"""
+測試案例差異同步（changes feed）
+
+test_case_changes 由 test_cases 的 SQLite trigger 寫入（見 app.models.database_models），
+ORM、批次 SQL、TestCaseSyncService 匯入等所有寫入路徑都會留下紀錄，版本號與 data_versions 的
+團隊版本一致（列表 ETag 使用同一個版本號）。
+
+用戶端保存上次同步的版本（watermark），以 since 取得之後的新增/修改與刪除：
+- since 低於團隊下限（已被壓縮掉的紀錄）或高於目前版本時回 resync_required，需整批重新載入
+- 同一編號只回最新的一筆；刪除紀錄只回編號與本地 id
+- 一次最多回 limit 筆紀錄，has_more 時以回傳的 version 作為下一次的 since
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models.database_models import (
+    DATA_VERSION_SCOPE_TEST_CASE_CHANGES_FLOOR,
+    DATA_VERSION_SCOPE_TEST_CASES,
+    TestCaseChange,
+    TestCaseLocal,
+)
+from app.services.data_version_service import ensure_data_version_triggers, get_versions
+from app.services.test_case_repo_service import _to_response
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHANGES_LIMIT = 1000
+# 刪除紀錄保留天數；超過後壓縮並提高下限，更舊的 watermark 需重新載入
+DEFAULT_TOMBSTONE_RETENTION_DAYS = 30
+
+
+def get_test_case_changes(db: Session, team_id: int, since: int,
+                          limit: int = DEFAULT_CHANGES_LIMIT) -> Dict[str, Any]:
+    """取得 since 之後的變更（回傳 dict，upserted 為 TestCaseResponse 列表）"""
+    ensure_data_version_triggers(db.get_bind())
+    versions = get_versions(db, [
+        (DATA_VERSION_SCOPE_TEST_CASES, team_id),
+        (DATA_VERSION_SCOPE_TEST_CASE_CHANGES_FLOOR, team_id),
+    ])
+    current = versions[(DATA_VERSION_SCOPE_TEST_CASES, team_id)]
+    floor = versions[(DATA_VERSION_SCOPE_TEST_CASE_CHANGES_FLOOR, team_id)]
+    result: Dict[str, Any] = {
+        "team_id": team_id,
+        "since": since,
+        "version": current,
+        "has_more": False,
+        "resync_required": False,
+        "upserted": [],
+        "deleted": [],
+    }
+    if since < floor or since > current:
+        result["resync_required"] = True
+        return result
+    if since == current:
+        return result
+
+    rows = (
+        db.query(TestCaseChange)
+        .filter(TestCaseChange.team_id == team_id, TestCaseChange.version > since)
+        .order_by(TestCaseChange.version, TestCaseChange.id)
+        .limit(limit + 1)
+        .all()
+    )
+    has_more = len(rows) > limit
+    if has_more:
+        rows = rows[:limit]
+        # 同一版本可能有兩筆紀錄（改編號），分頁不可切在版本中間
+        last = rows[-1]
+        rows += (
+            db.query(TestCaseChange)
+            .filter(TestCaseChange.team_id == team_id,
+                    TestCaseChange.version == last.version,
+                    TestCaseChange.id > last.id)
+            .order_by(TestCaseChange.id)
+            .all()
+        )
+        result["version"] = last.version
+        result["has_more"] = True
+    elif rows:
+        result["version"] = max(current, rows[-1].version)
+
+    latest: Dict[str, TestCaseChange] = {}
+    for row in rows:
+        latest[row.test_case_number] = row
+
+    upsert_ids = [row.test_case_id for row in latest.values() if row.op == "upsert"]
+    cases = {}
+    if upsert_ids:
+        cases = {
+            case.id: case
+            for case in db.query(TestCaseLocal).filter(TestCaseLocal.id.in_(upsert_ids)).all()
+        }
+
+    upserted: List[Any] = []
+    deleted: List[Dict[str, Any]] = []
+    for number, row in latest.items():
+        case = cases.get(row.test_case_id) if row.op == "upsert" else None
+        # 紀錄之後案例可能已被刪除/改號/移出（其紀錄在更後面的頁），此處以目前狀態為準
+        if case is not None and case.team_id == team_id and case.test_case_number == number:
+            upserted.append(_to_response(case, include_attachments=True))
+        else:
+            deleted.append({"test_case_number": number, "test_case_id": row.test_case_id})
+    result["upserted"] = upserted
+    result["deleted"] = deleted
+    return result
+
+
+def compact_test_case_changes(db: Session,
+                              retention_days: int = DEFAULT_TOMBSTONE_RETENTION_DAYS) -> Dict[str, int]:
+    """壓縮變更紀錄（呼叫端負責 commit）
+
+    1. 同團隊同編號只保留最新一筆（用戶端只需要最終狀態）
+    2. 超過保留天數的刪除紀錄移除，並把團隊下限提高到被移除的最大版本
+    """
+    ensure_data_version_triggers(db.get_bind())
+    superseded = db.execute(text(
+        "DELETE FROM test_case_changes WHERE id NOT IN ("
+        "SELECT MAX(id) FROM test_case_changes GROUP BY team_id, test_case_number)"
+    )).rowcount or 0
+
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    floors = db.execute(text(
+        "SELECT team_id, MAX(version) FROM test_case_changes "
+        "WHERE op = 'delete' AND changed_at < :cutoff GROUP BY team_id"
+    ), {"cutoff": cutoff}).all()
+    for team_id, version in floors:
+        db.execute(text(
+            "INSERT INTO data_versions (scope, scope_id, version, updated_at) "
+            "VALUES (:scope, :team_id, :version, CURRENT_TIMESTAMP) "
+            "ON CONFLICT (scope, scope_id) DO UPDATE SET "
+            "version = MAX(version, excluded.version), updated_at = CURRENT_TIMESTAMP"
+        ), {"scope": DATA_VERSION_SCOPE_TEST_CASE_CHANGES_FLOOR, "team_id": team_id, "version": version})
+    tombstones = db.execute(text(
+        "DELETE FROM test_case_changes WHERE op = 'delete' AND changed_at < :cutoff"
+    ), {"cutoff": cutoff}).rowcount or 0
+
+    if superseded or tombstones:
+        logger.info(f"壓縮測試案例變更紀錄：移除被取代 {superseded} 筆、過期刪除紀錄 {tombstones} 筆")
+    return {"superseded": superseded, "tombstones": tombstones, "teams_floor_raised": len(floors)}
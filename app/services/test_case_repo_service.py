@@ -15,6 +15,7 @@ from sqlalchemy import or_, and_
 from app.models.database_models import TestCaseLocal
 from app.models.test_case import TestCaseResponse
 from app.models.lark_types import Priority, TestResultStatus
+from app.services.thumbnail_service import thumbnail_url
 
 
 def _safe_json_len(text: Optional[str]) -> int:
@@ -47,6 +48,7 @@ def _to_response(row: TestCaseLocal, include_attachments: bool = False) -> TestC
                     "type": mime,
                     "url": url,
                     "tmp_url": url,
+                    "thumbnail_url": thumbnail_url(rel, name, mime),
                 })
         except Exception:
             attachments = []
@@ -97,6 +99,80 @@ def _to_response(row: TestCaseLocal, include_attachments: bool = False) -> TestC
     )
 
 
+# ---- 列表快速路徑：只取列表需要的欄位，直接組出與 TestCaseResponse 相同的 JSON 結構 ----
+
+_LIST_COLUMNS = (
+    TestCaseLocal.id,
+    TestCaseLocal.lark_record_id,
+    TestCaseLocal.test_case_number,
+    TestCaseLocal.title,
+    TestCaseLocal.priority,
+    TestCaseLocal.precondition,
+    TestCaseLocal.steps,
+    TestCaseLocal.expected_result,
+    TestCaseLocal.test_result,
+    TestCaseLocal.tcg_json,
+    TestCaseLocal.team_id,
+    TestCaseLocal.created_at,
+    TestCaseLocal.updated_at,
+    TestCaseLocal.last_sync_at,
+)
+
+
+def _is_str_list(value: Any) -> bool:
+    return isinstance(value, list) and all(isinstance(v, str) for v in value)
+
+
+def _tcg_dicts(text: Optional[str]) -> List[Dict[str, Any]]:
+    """與 _to_response 的 LarkRecord 解析相同：不符合 LarkRecord 欄位型別的項目略過"""
+    if not text:
+        return []
+    try:
+        data = json.loads(text)
+    except Exception:
+        return []
+    items: List[Dict[str, Any]] = []
+    for it in data if isinstance(data, list) else []:
+        if not isinstance(it, dict):
+            continue
+        rec = {
+            "record_ids": it.get('record_ids') or [],
+            "table_id": it.get('table_id') or '',
+            "text": it.get('text') or '',
+            "text_arr": it.get('text_arr') or [],
+            "type": it.get('type') or 'text',
+        }
+        if (_is_str_list(rec["record_ids"]) and _is_str_list(rec["text_arr"])
+                and isinstance(rec["table_id"], str) and isinstance(rec["text"], str) and isinstance(rec["type"], str)):
+            items.append(rec)
+    return items
+
+
+def _row_to_list_dict(row) -> Dict[str, Any]:
+    """_LIST_COLUMNS 資料列 → TestCaseResponse（不含附件）的 JSON 結構，欄位順序與模型一致"""
+    return {
+        "record_id": row.lark_record_id or str(row.id),
+        "test_case_number": str(row.test_case_number).strip() if row.test_case_number is not None else '',
+        "title": str(row.title).strip() if row.title is not None else '',
+        "priority": row.priority.value if row.priority is not None else Priority.MEDIUM.value,
+        "precondition": row.precondition,
+        "steps": row.steps,
+        "expected_result": row.expected_result,
+        "assignee": None,
+        "test_result": row.test_result.value if row.test_result is not None else None,
+        "attachments": [],
+        "test_results_files": [],
+        "user_story_map": [],
+        "tcg": _tcg_dicts(row.tcg_json),
+        "parent_record": [],
+        "team_id": row.team_id,
+        "created_at": row.created_at,
+        "updated_at": row.updated_at,
+        "last_sync_at": row.last_sync_at,
+        "raw_fields": {},
+    }
+
+
 class TestCaseRepoService:
     def __init__(self, db: Session):
         self.db = db
@@ -114,6 +190,30 @@ class TestCaseRepoService:
         skip: int = 0,
         limit: int = 1000,
     ) -> List[TestCaseResponse]:
+        q = self._list_query(team_id, search, tcg_filter, priority_filter, test_result_filter,
+                             assignee_filter, sort_by, sort_order, skip, limit)
+        return [_to_response(r, include_attachments=False) for r in q.all()]
+
+    def list_dicts(
+        self,
+        team_id: int,
+        search: Optional[str] = None,
+        tcg_filter: Optional[str] = None,
+        priority_filter: Optional[str] = None,
+        test_result_filter: Optional[str] = None,
+        assignee_filter: Optional[str] = None,
+        sort_by: str = 'created_at',
+        sort_order: str = 'desc',
+        skip: int = 0,
+        limit: int = 1000,
+    ) -> List[Dict[str, Any]]:
+        """與 list() 相同的查詢與輸出結構，但只取需要的欄位並直接回傳 dict（不建立 Pydantic 模型）"""
+        q = self._list_query(team_id, search, tcg_filter, priority_filter, test_result_filter,
+                             assignee_filter, sort_by, sort_order, skip, limit)
+        return [_row_to_list_dict(r) for r in q.with_entities(*_LIST_COLUMNS).all()]
+
+    def _list_query(self, team_id, search, tcg_filter, priority_filter, test_result_filter,
+                    assignee_filter, sort_by, sort_order, skip, limit):
         q = self.db.query(TestCaseLocal).filter(TestCaseLocal.team_id == team_id)
 
         # 搜尋
@@ -164,9 +264,7 @@ class TestCaseRepoService:
         q = q.order_by(col.desc() if order_desc else col.asc())
 
         # 分頁
-        q = q.offset(skip).limit(limit)
-
-        return [_to_response(r, include_attachments=False) for r in q.all()]
+        return q.offset(skip).limit(limit)
 
     def count(
         self,
@@ -0,0 +1,242 @@
+"""
+附件圖片縮圖服務
+
+測試執行結果與測試案例附件中的截圖原本以原始大小（常為數 MB 的 PNG）顯示於清單。
+此模組在背景 worker pool 中產生縮小後的 WebP（不支援時改用 JPEG）預覽圖：
+
+- 上傳時以 schedule() 預先產生；舊附件則於第一次請求縮圖時產生（get_or_create）
+- 縮圖存放於原附件同目錄下的 .thumbs/ 子目錄，檔名為 {stored_name}.{size}.webp
+- 同一縮圖的並發請求共用一次產生工作
+- Pillow 為選用相依套件；未安裝時 thumbnail_url() 回傳 None，前端沿用原始 url
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Any
+import urllib.parse
+
+logger = logging.getLogger(__name__)
+
+THUMB_DIR_NAME = ".thumbs"
+DEFAULT_SIZE = 320
+ALLOWED_SIZES = (160, 320, 640)
+THUMB_QUALITY = 80
+# 過大的原圖不產生縮圖（避免解碼炸彈佔用記憶體）
+MAX_SOURCE_BYTES = 50 * 1024 * 1024
+
+THUMBNAIL_API_PREFIX = "/api/attachments/thumbnails"
+
+_IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp", ".tif", ".tiff"}
+
+
+def _pillow():
+    """延遲載入 Pillow；未安裝時回傳 None"""
+    try:
+        from PIL import Image, ImageOps, features
+        return Image, ImageOps, features
+    except ImportError:
+        return None
+
+
+_output_format: Optional[Tuple[str, str]] = None
+
+
+def _get_output_format() -> Optional[Tuple[str, str]]:
+    """回傳 (PIL 格式, 副檔名)；優先 WebP，不支援時改用 JPEG"""
+    global _output_format
+    if _output_format is None:
+        pil = _pillow()
+        if pil is None:
+            return None
+        _, _, features = pil
+        try:
+            webp = features.check("webp")
+        except Exception:
+            webp = False
+        _output_format = ("WEBP", "webp") if webp else ("JPEG", "jpg")
+    return _output_format
+
+
+def is_available() -> bool:
+    return _get_output_format() is not None
+
+
+def is_image(name: Optional[str], mime_type: Optional[str] = None) -> bool:
+    """判斷附件是否為可產生縮圖的點陣圖（SVG 等向量圖不處理）"""
+    if mime_type and mime_type.startswith("image/"):
+        return mime_type != "image/svg+xml"
+    return Path(name or "").suffix.lower() in _IMAGE_EXTENSIONS
+
+
+def normalize_size(size: Optional[int]) -> int:
+    """將要求的尺寸對齊到允許的尺寸（避免任意尺寸造成快取爆量）"""
+    if not size:
+        return DEFAULT_SIZE
+    for allowed in ALLOWED_SIZES:
+        if size <= allowed:
+            return allowed
+    return ALLOWED_SIZES[-1]
+
+
+def thumbnail_path(source: Path, size: int = DEFAULT_SIZE) -> Optional[Path]:
+    fmt = _get_output_format()
+    if fmt is None:
+        return None
+    return source.parent / THUMB_DIR_NAME / f"{source.name}.{size}.{fmt[1]}"
+
+
+def thumbnail_url(relative_path: Optional[str], name: Optional[str] = None,
+                  mime_type: Optional[str] = None, size: int = DEFAULT_SIZE) -> Optional[str]:
+    """產生附件縮圖 URL；非圖片或 Pillow 不可用時回傳 None"""
+    if not relative_path or not is_available():
+        return None
+    if not is_image(name or relative_path, mime_type):
+        return None
+    quoted = urllib.parse.quote(relative_path.lstrip("/"))
+    if size == DEFAULT_SIZE:
+        return f"{THUMBNAIL_API_PREFIX}/{quoted}"
+    return f"{THUMBNAIL_API_PREFIX}/{quoted}?size={size}"
+
+
+def _is_fresh(source: Path, thumb: Path) -> bool:
+    try:
+        return thumb.stat().st_mtime >= source.stat().st_mtime
+    except OSError:
+        return False
+
+
+def generate_thumbnail(source: Path, size: int = DEFAULT_SIZE) -> Optional[Path]:
+    """同步產生縮圖（已存在且比原檔新則直接回傳）；無法產生時回傳 None"""
+    pil = _pillow()
+    fmt = _get_output_format()
+    if pil is None or fmt is None:
+        return None
+    Image, ImageOps, _ = pil
+    source = Path(source)
+    thumb = thumbnail_path(source, size)
+    if _is_fresh(source, thumb):
+        return thumb
+    try:
+        if source.stat().st_size > MAX_SOURCE_BYTES:
+            return None
+    except OSError:
+        return None
+
+    thumb.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = thumb.parent / f".{thumb.name}.{uuid.uuid4().hex}.part"
+    try:
+        with Image.open(source) as img:
+            # JPEG 可於解碼時直接縮小，大幅降低記憶體與 CPU
+            img.draft("RGB", (size * 2, size * 2))
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((size, size))
+            if fmt[0] == "JPEG":
+                if img.mode not in ("RGB", "L"):
+                    img = img.convert("RGB")
+            elif img.mode not in ("RGB", "RGBA", "L", "LA"):
+                img = img.convert("RGBA")
+            img.save(tmp_path, fmt[0], quality=THUMB_QUALITY)
+        os.replace(tmp_path, thumb)
+        return thumb
+    except Exception as e:
+        logger.warning(f"產生縮圖失敗 {source}: {e}")
+        return None
+    finally:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+
+
+def remove_thumbnails(source: Path) -> None:
+    """刪除某附件的所有尺寸縮圖"""
+    thumb_dir = Path(source).parent / THUMB_DIR_NAME
+    if not thumb_dir.is_dir():
+        return
+    for p in thumb_dir.glob(f"{Path(source).name}.*"):
+        try:
+            p.unlink()
+        except OSError:
+            pass
+
+
+class ThumbnailService:
+    """以執行緒池產生縮圖，並合併相同縮圖的並發請求"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self._max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._inflight: Dict[Tuple[str, int], Future] = {}
+        self._stats = {'scheduled': 0, 'generated': 0, 'coalesced': 0, 'failed': 0}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # 呼叫端需持有 self._lock
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_workers, thread_name_prefix="thumbnail"
+            )
+        return self._executor
+
+    def _run(self, key: Tuple[str, int]) -> Optional[Path]:
+        try:
+            result = generate_thumbnail(Path(key[0]), key[1])
+            with self._lock:
+                self._stats['generated' if result else 'failed'] += 1
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def submit(self, source: Path, size: int = DEFAULT_SIZE) -> Optional[Future]:
+        """提交縮圖產生工作；相同縮圖已在處理中時回傳既有的 Future"""
+        if not is_available():
+            return None
+        key = (str(source), normalize_size(size))
+        with self._lock:
+            pending = self._inflight.get(key)
+            if pending is not None:
+                self._stats['coalesced'] += 1
+                return pending
+            # 持有鎖時登錄，_run 結束時的 pop 必定在登錄之後
+            future = self._get_executor().submit(self._run, key)
+            self._inflight[key] = future
+            return future
+
+    def schedule(self, source: Path, name: Optional[str] = None,
+                 mime_type: Optional[str] = None) -> None:
+        """上傳後呼叫：若為圖片，於背景預先產生預設尺寸縮圖"""
+        if not is_image(name or Path(source).name, mime_type):
+            return
+        if self.submit(source, DEFAULT_SIZE) is not None:
+            with self._lock:
+                self._stats['scheduled'] += 1
+
+    async def get_or_create(self, source: Path, size: int = DEFAULT_SIZE) -> Optional[Path]:
+        """取得縮圖路徑；尚未產生時於 worker pool 產生並等待完成"""
+        size = normalize_size(size)
+        thumb = thumbnail_path(Path(source), size)
+        if thumb is None:
+            return None
+        if _is_fresh(Path(source), thumb):
+            return thumb
+        future = self.submit(source, size)
+        if future is None:
+            return None
+        return await asyncio.wrap_future(future)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['inflight'] = len(self._inflight)
+        stats['available'] = is_available()
+        stats['max_workers'] = self._max_workers
+        return stats
+
+
+thumbnail_service = ThumbnailService()
@@ -0,0 +1,354 @@
+"""
+多 worker 協調（uvicorn --workers N）
+
+各 worker 是獨立行程，行程內的快取、鎖與排程互不相通。本模組只依賴共用的 SQLite 檔與檔案鎖，
+不需外部服務：
+
+- FileLock：跨行程互斥（fcntl.flock；行程結束時由作業系統釋放），例如 TCG 同步、組織同步
+- LeaderLease：worker_leases 表上的租約；定時任務調度器只在持有租約的 worker 上排程，
+  持有者定期續約，逾期未續約（行程結束或卡住）時由其他 worker 接手
+- InvalidationBus：cache_invalidations 表傳遞快取失效訊息；發布端自行清除本行程快取後廣播，
+  其他 worker 輪詢到訊息後呼叫各自訂閱的處理函式（權限快取、TCG 索引、聯絡人索引）
+
+WORKER_COORDINATION=false 可關閉廣播與租約（單一 worker 部署時）；檔案鎖不受影響。
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+
+from app.services.metrics import CACHE_INVALIDATIONS
+
+try:
+    import fcntl
+except ImportError:  # Windows：退回行程內鎖
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+COORDINATION_ENABLED = os.getenv("WORKER_COORDINATION", "true").lower() == "true"
+INVALIDATION_POLL_SECONDS = float(os.getenv("COORDINATION_POLL_MS", "500")) / 1000.0
+INVALIDATION_RETENTION_SECONDS = float(os.getenv("COORDINATION_RETENTION_SECONDS", "600"))
+LEASE_SECONDS = float(os.getenv("SCHEDULER_LEASE_SECONDS", "60"))
+# 檔案鎖目錄；預設為資料庫檔旁的 .locks（同一主機上的 worker 共用）
+LOCK_DIR = os.getenv("COORDINATION_LOCK_DIR", "")
+
+# 快取失效主題
+TOPIC_PERMISSIONS = "permissions"
+TOPIC_TCG_INDEX = "tcg_index"
+TOPIC_CONTACTS = "contacts"
+
+
+def worker_id() -> str:
+    """目前行程的識別（主機名:PID；於呼叫時取得，fork 後的子行程也正確）"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _lock_dir() -> Path:
+    if LOCK_DIR:
+        return Path(LOCK_DIR)
+    from app.database import DB_FILE
+    return Path(DB_FILE).resolve().parent / ".locks"
+
+
+# ---------------- 檔案鎖 ----------------
+
+class FileLock:
+    """跨行程的獨占鎖；同一行程內的執行緒另以 threading.Lock 互斥（flock 以開檔為單位）"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._thread_lock = threading.Lock()
+        self._fd: Optional[int] = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        if not self._thread_lock.acquire(blocking):
+            return False
+        if fcntl is None:
+            return True
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError as e:
+            # 無法建立鎖檔時仍保有行程內互斥
+            logger.warning(f"無法建立檔案鎖 {self.path}: {e}")
+            return True
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except OSError:
+            os.close(fd)
+            self._thread_lock.release()
+            return False
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is not None:
+            fd, self._fd = self._fd, None
+            try:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+        self._thread_lock.release()
+
+    def locked(self) -> bool:
+        return self._thread_lock.locked()
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+_file_locks: Dict[str, FileLock] = {}
+_file_locks_guard = threading.Lock()
+
+
+def file_lock(name: str) -> FileLock:
+    """取得具名的跨行程鎖（同一行程內同名共用同一物件）"""
+    with _file_locks_guard:
+        lock = _file_locks.get(name)
+        if lock is None:
+            lock = _file_locks[name] = FileLock(_lock_dir() / f"{name}.lock")
+        return lock
+
+
+# ---------------- Leader 租約 ----------------
+
+_ACQUIRE_SQL = text(
+    "INSERT INTO worker_leases (name, owner, acquired_at, expires_at) "
+    "VALUES (:name, :owner, :now, :expires) "
+    "ON CONFLICT(name) DO UPDATE SET "
+    "  acquired_at = CASE WHEN worker_leases.owner = excluded.owner "
+    "                     THEN worker_leases.acquired_at ELSE excluded.acquired_at END, "
+    "  owner = excluded.owner, expires_at = excluded.expires_at "
+    "WHERE worker_leases.owner = excluded.owner OR worker_leases.expires_at < :now"
+)
+
+
+class LeaderLease:
+    """具名租約：try_acquire() 取得或續約，成功時 is_leader 為 True"""
+
+    def __init__(self, name: str, engine=None, ttl_seconds: float = LEASE_SECONDS, owner: Optional[str] = None):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.is_leader = False
+        self._owner = owner
+        self._engine = engine
+        self._table_ready = False
+
+    @property
+    def owner(self) -> str:
+        return self._owner or worker_id()
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from app.database import get_sync_engine
+            self._engine = get_sync_engine()
+        return self._engine
+
+    @property
+    def renew_interval(self) -> float:
+        """續約間隔：租約期限的 1/3，容許連續兩次續約失敗"""
+        return max(0.05, self.ttl_seconds / 3)
+
+    def _ensure_table(self) -> None:
+        if not self._table_ready:
+            from app.models.database_models import WorkerLease
+            WorkerLease.__table__.create(bind=self.engine, checkfirst=True)
+            self._table_ready = True
+
+    def try_acquire(self) -> bool:
+        self._ensure_table()
+        now = time.time()
+        with self.engine.begin() as conn:
+            conn.execute(_ACQUIRE_SQL, {"name": self.name, "owner": self.owner,
+                                        "now": now, "expires": now + self.ttl_seconds})
+            holder = conn.execute(text("SELECT owner FROM worker_leases WHERE name = :name"),
+                                  {"name": self.name}).scalar()
+        self.is_leader = holder == self.owner
+        return self.is_leader
+
+    def release(self) -> None:
+        """釋放租約（僅限持有者），讓其他 worker 不必等到逾期即可接手"""
+        self.is_leader = False
+        self._ensure_table()
+        with self.engine.begin() as conn:
+            conn.execute(text("DELETE FROM worker_leases WHERE name = :name AND owner = :owner"),
+                         {"name": self.name, "owner": self.owner})
+
+    def current_owner(self) -> Optional[str]:
+        self._ensure_table()
+        with self.engine.connect() as conn:
+            return conn.execute(
+                text("SELECT owner FROM worker_leases WHERE name = :name AND expires_at >= :now"),
+                {"name": self.name, "now": time.time()},
+            ).scalar()
+
+
+# ---------------- 快取失效廣播 ----------------
+
+Handler = Callable[[Optional[str]], Any]
+
+
+class InvalidationBus:
+    """跨 worker 快取失效：broadcast() 寫入訊息，各 worker 的輪詢任務分派給訂閱者（略過自己發出的）"""
+
+    def __init__(self, engine=None, write_queue=None, poll_seconds: float = INVALIDATION_POLL_SECONDS,
+                 retention_seconds: float = INVALIDATION_RETENTION_SECONDS,
+                 origin: Optional[str] = None, enabled: bool = COORDINATION_ENABLED):
+        self._engine = engine
+        self._write_queue = write_queue
+        self.poll_seconds = poll_seconds
+        self.retention_seconds = retention_seconds
+        self._origin = origin
+        self.enabled = enabled
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._last_id = 0
+        self._last_prune = 0.0
+        self._table_ready = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from app.database import get_sync_engine
+            self._engine = get_sync_engine()
+        return self._engine
+
+    @property
+    def write_queue(self):
+        if self._write_queue is None:
+            from app.services.write_queue import get_write_queue
+            self._write_queue = get_write_queue()
+        return self._write_queue
+
+    @property
+    def origin(self) -> str:
+        # 全域實例可能於 fork 前建立，預設於使用時才取得本行程的識別
+        return self._origin or worker_id()
+
+    def subscribe(self, topic: str, handler: Handler) -> None:
+        """註冊處理函式 handler(key)；同步函式於執行緒中執行，async 函式直接等待"""
+        self._handlers.setdefault(topic, []).append(handler)
+
+    def _ensure_table(self, bind=None) -> None:
+        if not self._table_ready:
+            from app.models.database_models import CacheInvalidation
+            CacheInvalidation.__table__.create(bind=bind if bind is not None else self.engine, checkfirst=True)
+            self._table_ready = True
+
+    def broadcast(self, topic: str, key: Optional[str] = None):
+        """通知其他 worker 清除快取（經寫入佇列合併 commit，不等待）；呼叫端需自行處理本行程的快取"""
+        if not self.enabled:
+            return None
+        origin = self.origin
+
+        def insert(session):
+            # 於寫入佇列的連線上建表，避免另開連線與批次內已取得的寫鎖互等
+            self._ensure_table(session.connection())
+            session.execute(
+                text("INSERT INTO cache_invalidations (topic, key, origin, created_at) "
+                     "VALUES (:topic, :key, :origin, CURRENT_TIMESTAMP)"),
+                {"topic": topic, "key": key, "origin": origin},
+            )
+
+        try:
+            future = self.write_queue.submit(insert)
+        except Exception as e:
+            logger.warning(f"廣播快取失效失敗 {topic}: {e}")
+            return None
+        CACHE_INVALIDATIONS.inc(topic=topic, direction="sent")
+        return future
+
+    def _max_id(self) -> int:
+        self._ensure_table()
+        with self.engine.connect() as conn:
+            return int(conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM cache_invalidations")).scalar() or 0)
+
+    def _fetch(self):
+        with self.engine.connect() as conn:
+            return conn.execute(
+                text("SELECT id, topic, key, origin FROM cache_invalidations "
+                     "WHERE id > :last ORDER BY id LIMIT 1000"),
+                {"last": self._last_id},
+            ).all()
+
+    def _prune(self, session) -> None:
+        session.execute(
+            text("DELETE FROM cache_invalidations WHERE created_at < datetime('now', :age)"),
+            {"age": f"-{int(self.retention_seconds)} seconds"},
+        )
+
+    async def _dispatch(self, topic: str, key: Optional[str]) -> None:
+        for handler in self._handlers.get(topic, ()):
+            try:
+                if asyncio.iscoroutinefunction(handler):
+                    await handler(key)
+                else:
+                    await asyncio.to_thread(handler, key)
+            except Exception as e:
+                logger.error(f"處理快取失效 {topic}({key}) 失敗: {e}")
+        CACHE_INVALIDATIONS.inc(topic=topic, direction="received")
+
+    async def poll_once(self) -> int:
+        """讀取並分派新訊息，回傳分派筆數（連續重複的訊息只分派一次）"""
+        rows = await asyncio.to_thread(self._fetch)
+        pending = []
+        for row_id, topic, key, origin in rows:
+            self._last_id = row_id
+            if origin != self.origin and (topic, key) not in pending:
+                pending.append((topic, key))
+        for topic, key in pending:
+            await self._dispatch(topic, key)
+        now = time.monotonic()
+        if now - self._last_prune > self.retention_seconds:
+            self._last_prune = now
+            self.write_queue.submit(self._prune)
+        return len(pending)
+
+    async def start(self) -> None:
+        if not self.enabled or self._task is not None:
+            return
+        # 只處理啟動後的訊息（啟動時各快取本來就是空的）
+        self._last_id = await asyncio.to_thread(self._max_id)
+        self._task = asyncio.get_running_loop().create_task(self._poll_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _poll_loop(self) -> None:
+        while True:
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"讀取快取失效訊息失敗: {e}")
+            await asyncio.sleep(self.poll_seconds)
+
+
+_bus: Optional[InvalidationBus] = None
+_bus_lock = threading.Lock()
+
+
+def get_invalidation_bus() -> InvalidationBus:
+    """取得全域快取失效廣播（各模組於匯入時訂閱，應用程式啟動時開始輪詢）"""
+    global _bus
+    if _bus is None:
+        with _bus_lock:
+            if _bus is None:
+                _bus = InvalidationBus()
+    return _bus
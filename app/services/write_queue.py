@@ -0,0 +1,197 @@
+"""
+序列化寫入佇列（group commit）
+
+SQLite 同一時間只允許一個寫入者。各路由各自提交時，執行日的大量結果更新會在
+busy_timeout 內互相等待，造成長尾延遲甚至 "database is locked"。
+
+WriteQueue 以單一寫入執行緒依序處理寫入工作：
+- 工作為 fn(session) -> result，於寫入執行緒的同步 Session 中執行
+- 可合併（group=True）的小交易會與佇列中已在等待的其他工作合併為一次 commit
+- 合併批次中任一工作失敗時整批回滾，再逐一單獨重跑，確保失敗不影響其他請求
+- 提供佇列深度、批次大小與 commit 延遲指標
+
+讀取不經過佇列；WAL 模式下讀取不受寫入阻塞。
+
+適用範圍：目前經由佇列寫入的是執行日的熱點路徑——Test Run 項目的結果更新
+（單筆/批次）、批次建立與刪除，以及即時事件與跨 worker 的快取失效廣播。其餘寫入（測試案例、
+Test Run 配置、附件、使用者與認證、audit 等）仍於各自的連線直接 commit，與佇列
+共用 busy_timeout 等待 SQLite 寫鎖；佇列只保證上述路徑之間不互相競爭。
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.services.metrics import WRITE_BATCH_SIZE, WRITE_COMMIT_LATENCY, WRITE_JOBS
+
+logger = logging.getLogger(__name__)
+
+WriteFn = Callable[[Session], Any]
+
+
+@dataclass
+class WriteJob:
+    fn: WriteFn
+    group: bool = True
+    future: Future = field(default_factory=Future)
+
+
+class WriteQueue:
+    """單一寫入執行緒；submit() 回傳 concurrent Future，run() 供 async 路由等待結果"""
+
+    def __init__(self, session_factory: Optional[Callable[[], Session]] = None,
+                 max_batch: int = 64, linger_ms: float = 0.0, name: str = "main"):
+        self._session_factory = session_factory
+        self.max_batch = max(1, max_batch)
+        self.linger_seconds = max(0.0, linger_ms) / 1000.0
+        self.name = name
+        self._queue: "queue.Queue[Optional[WriteJob]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stopping = False
+
+    # ---- 提交 ----
+
+    def submit(self, fn: WriteFn, group: bool = True) -> Future:
+        job = WriteJob(fn=fn, group=group)
+        with self._lock:
+            if self._stopping:
+                raise RuntimeError("寫入佇列已停止")
+            self._ensure_started()
+            self._queue.put(job)
+        return job.future
+
+    async def run(self, fn: WriteFn, group: bool = True) -> Any:
+        """提交寫入並等待結果（不阻塞事件迴圈）"""
+        return await asyncio.wrap_future(self.submit(fn, group))
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    # ---- 生命週期 ----
+
+    def _ensure_started(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._worker, name=f"write-queue-{self.name}", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """停止接收新工作，處理完佇列中剩餘的工作後結束寫入執行緒"""
+        with self._lock:
+            self._stopping = True
+            thread = self._thread
+            if thread is None:
+                return
+            self._queue.put(None)
+        thread.join(timeout)
+        with self._lock:
+            self._thread = None
+            self._stopping = False
+
+    # ---- 寫入執行緒 ----
+
+    def _new_session(self) -> Session:
+        if self._session_factory is None:
+            from sqlalchemy.orm import sessionmaker
+            from app.database import get_sync_engine
+            self._session_factory = sessionmaker(autocommit=False, autoflush=False, bind=get_sync_engine())
+        return self._session_factory()
+
+    def _next_batch(self, first: WriteJob) -> tuple:
+        """以 first 起始收集可合併的工作；回傳 (batch, 下一個不可合併的工作或 None, 是否收到停止訊號)"""
+        batch = [first]
+        if not first.group:
+            return batch, None, False
+        deadline = time.perf_counter() + self.linger_seconds
+        while len(batch) < self.max_batch:
+            try:
+                remaining = deadline - time.perf_counter()
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                return batch, None, True
+            if not job.group:
+                return batch, job, False
+            batch.append(job)
+        return batch, None, False
+
+    def _worker(self) -> None:
+        carry: Optional[WriteJob] = None
+        while True:
+            job = carry if carry is not None else self._queue.get()
+            carry = None
+            if job is None:
+                break
+            batch, carry, stop = self._next_batch(job)
+            self._commit(batch)
+            if stop:
+                break
+        # 停止前處理完剩餘工作
+        if carry is not None:
+            self._commit([carry])
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                self._commit([job])
+
+    def _commit(self, batch: List[WriteJob]) -> None:
+        started = time.perf_counter()
+        if len(batch) > 1:
+            results = self._execute(batch)
+            if results is None:
+                # 合併批次失敗：逐一重跑，讓失敗只影響自己的請求
+                logger.info(f"寫入佇列批次 ({len(batch)} 筆) 失敗，改為逐一提交")
+                for job in batch:
+                    self._commit([job])
+                return
+        else:
+            results = self._execute(batch, raise_errors=True)
+
+        WRITE_COMMIT_LATENCY.observe(time.perf_counter() - started, queue=self.name)
+        WRITE_BATCH_SIZE.observe(len(batch), queue=self.name)
+        for job, (ok, value) in zip(batch, results):
+            WRITE_JOBS.inc(queue=self.name, status="ok" if ok else "error")
+            if ok:
+                job.future.set_result(value)
+            else:
+                job.future.set_exception(value)
+
+    def _execute(self, batch: List[WriteJob], raise_errors: bool = False):
+        """於單一交易中執行批次；成功回傳 [(True, result)]，失敗時單筆回傳 [(False, exc)]、批次回傳 None"""
+        session = self._new_session()
+        try:
+            results = [(True, job.fn(session)) for job in batch]
+            session.commit()
+            return results
+        except Exception as e:
+            session.rollback()
+            if not raise_errors:
+                return None
+            return [(False, e)]
+        finally:
+            session.close()
+
+
+_write_queue: Optional[WriteQueue] = None
+_write_queue_lock = threading.Lock()
+
+
+def get_write_queue() -> WriteQueue:
+    """取得全域寫入佇列（首次使用時建立）"""
+    global _write_queue
+    if _write_queue is None:
+        with _write_queue_lock:
+            if _write_queue is None:
+                _write_queue = WriteQueue()
+    return _write_queue
@@ -0,0 +1,89 @@
+/**
+ * 測試執行即時事件
+ * 以 AuthClient.fetch 讀取 SSE 串流（EventSource 無法帶 Authorization 標頭），
+ * 接收其他測試人員的結果、執行者、Bug tickets 變更與統計，取代輪詢。
+ */
+
+class LiveRunEvents {
+    constructor(teamId, configId, handlers = {}) {
+        this.url = `/api/teams/${teamId}/test-run-configs/${configId}/items/events`;
+        this.handlers = handlers;
+        this.retryMs = 3000;
+        this.abortCtrl = null;
+        this.stopped = false;
+    }
+
+    start() {
+        this.stopped = false;
+        this._connect();
+        return this;
+    }
+
+    stop() {
+        this.stopped = true;
+        if (this.abortCtrl) this.abortCtrl.abort();
+    }
+
+    async _connect() {
+        while (!this.stopped) {
+            this.abortCtrl = new AbortController();
+            try {
+                const response = await window.AuthClient.fetch(this.url, {
+                    headers: { 'Accept': 'text/event-stream' },
+                    signal: this.abortCtrl.signal
+                });
+                if (!response.ok || !response.body) throw new Error(`HTTP ${response.status}`);
+                await this._read(response.body.getReader());
+            } catch (error) {
+                if (this.stopped) return;
+                console.warn('[LiveRunEvents] 連線中斷，稍後重新連線:', error);
+            }
+            if (this.stopped) return;
+            // 重新連線期間可能漏掉事件，先讓頁面重新載入
+            this._emit('reconnect', {});
+            await new Promise(resolve => setTimeout(resolve, this.retryMs));
+        }
+    }
+
+    async _read(reader) {
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) return;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const block = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                this._handleBlock(block);
+            }
+        }
+    }
+
+    _handleBlock(block) {
+        let event = 'message';
+        const dataLines = [];
+        block.split('\n').forEach(line => {
+            if (line.startsWith(':')) return; // 心跳
+            if (line.startsWith('event:')) event = line.slice(6).trim();
+            else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+            else if (line.startsWith('retry:')) this.retryMs = parseInt(line.slice(6), 10) || this.retryMs;
+        });
+        if (!dataLines.length) return;
+        try {
+            this._emit(event, JSON.parse(dataLines.join('\n')));
+        } catch (error) {
+            console.warn('[LiveRunEvents] 無法解析事件:', event, error);
+        }
+    }
+
+    _emit(event, data) {
+        const handler = this.handlers[event];
+        if (typeof handler === 'function') {
+            try { handler(data); } catch (error) { console.error('[LiveRunEvents] 事件處理失敗:', event, error); }
+        }
+    }
+}
+
+window.LiveRunEvents = LiveRunEvents;
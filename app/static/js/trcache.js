@@ -371,6 +371,95 @@
       }
     },
 
+    // 差異同步：依伺服器變更紀錄更新已快取的測試案例，取代整批重新載入
+    _changesWatermarkKey(teamId) {
+      return `trcache:changes:${this._getValidTeamId(teamId)}`;
+    },
+
+    async _removeTeamExec(teamId) {
+      const validTeamId = this._getValidTeamId(teamId);
+      const db = await this._openDB();
+      await new Promise((resolve, reject) => {
+        const tx = db.transaction([STORE_EXEC], 'readwrite');
+        const index = tx.objectStore(STORE_EXEC).index('teamId');
+        index.openCursor(IDBKeyRange.only(validTeamId)).onsuccess = (event) => {
+          const cursor = event.target.result;
+          if (cursor) {
+            cursor.delete();
+            cursor.continue();
+          }
+        };
+        tx.oncomplete = () => resolve(true);
+        tx.onerror = () => reject(tx.error);
+      });
+    },
+
+    // 全量載入後記錄 watermark（列表 API 的 X-Data-Version），之後以 syncTeamChanges 取差異
+    setTeamChangesVersion(teamId, version) {
+      const parsed = parseInt(version, 10);
+      if (!Number.isFinite(parsed) || parsed < 0) return false;
+      localStorage.setItem(this._changesWatermarkKey(teamId), String(parsed));
+      return true;
+    },
+
+    clearTeamChangesVersion(teamId) {
+      localStorage.removeItem(this._changesWatermarkKey(teamId));
+    },
+
+    // handlers.onUpsert(testCase) / handlers.onDelete({ test_case_number, test_case_id }) 讓呼叫端同步更新列表快取
+    // 回傳 resynced=true（watermark 缺少或過期）或 failed=true 時，呼叫端需改為全量重新載入
+    async syncTeamChanges(teamId, handlers = {}) {
+      const watermarkKey = this._changesWatermarkKey(teamId);
+      const summary = { upserted: 0, deleted: 0, resynced: false, failed: false };
+      const stored = localStorage.getItem(watermarkKey);
+      if (stored === null) {
+        summary.resynced = true;
+        return summary;
+      }
+      try {
+        let since = parseInt(stored, 10) || 0;
+        let hasMore = true;
+        while (hasMore) {
+          const resp = await window.AuthClient.fetch(`/api/teams/${teamId}/testcases/changes?since=${since}`);
+          if (!resp.ok) {
+            summary.failed = true;
+            return summary;
+          }
+          const body = await resp.json();
+          if (body.resync_required) {
+            // watermark 過期：清除此團隊的快取，由呼叫端全量重新載入後重設 watermark
+            await this._removeTeamExec(teamId);
+            this.clearTeamChangesVersion(teamId);
+            summary.resynced = true;
+            return summary;
+          }
+          for (const item of body.upserted || []) {
+            if (handlers.onUpsert) handlers.onUpsert(item);
+            // 只更新已快取的項目，不主動擴大快取
+            const cached = await this._get(STORE_EXEC, this._execKey(teamId, item.test_case_number));
+            if (cached) {
+              await this.setExecDetail(teamId, item.test_case_number, item);
+            }
+            summary.upserted += 1;
+          }
+          for (const ref of body.deleted || []) {
+            if (handlers.onDelete) handlers.onDelete(ref);
+            await this.removeExecDetail(teamId, ref.test_case_number);
+            summary.deleted += 1;
+          }
+          since = body.version;
+          localStorage.setItem(watermarkKey, String(since));
+          hasMore = !!body.has_more;
+        }
+      } catch (error) {
+        summary.failed = true;
+        if (this.enableErrorLogging) {
+          console.error('[TRCache] syncTeamChanges 失敗:', error, { teamId });
+        }
+      }
+      return summary;
+    },
+
     async getTCG(ttlMs) {
       const rec = await this._get(STORE_TCG, 'tcg');
       if (!rec) return null;
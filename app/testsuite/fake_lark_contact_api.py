@@ -0,0 +1,138 @@
+"""
+本地假 Lark 通訊錄 API（測試用）
+
+以 ThreadingHTTPServer 模擬下列端點：
+- POST /open-apis/auth/v3/tenant_access_token/internal
+- GET  /open-apis/contact/v3/departments/{id}/children（支援 page_size/page_token 翻頁）
+- GET  /open-apis/contact/v3/users/find_by_department（同上）
+
+並記錄請求數與最大同時進行中的請求數，用來驗證限流。
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+
+def build_department_tree(total: int, fanout: int = 8, root_id: str = "od-root") -> Dict[str, List[str]]:
+    """產生共 total 個部門（含根部門）的樹，回傳 parent_id -> [child_id]"""
+    children: Dict[str, List[str]] = {root_id: []}
+    queue = [root_id]
+    created = 1
+    while queue and created < total:
+        parent = queue.pop(0)
+        for _ in range(fanout):
+            if created >= total:
+                break
+            child_id = f"od-{created}"
+            children[parent].append(child_id)
+            children[child_id] = []
+            queue.append(child_id)
+            created += 1
+    return children
+
+
+class FakeLarkContactAPI:
+    """於背景執行緒啟動的假 Lark API 伺服器"""
+
+    def __init__(self, tree: Dict[str, List[str]], latency_seconds: float = 0.0,
+                 users: Optional[Dict[str, List[Dict]]] = None):
+        self.tree = tree
+        self.users = users or {}
+        self.latency_seconds = latency_seconds
+        self.request_count = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/open-apis"
+
+    def __enter__(self) -> "FakeLarkContactAPI":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, payload: Dict) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self.rfile.read(length)
+                self._send({"code": 0, "tenant_access_token": "t-fake", "expire": 7200})
+
+            def do_GET(self):
+                with api._lock:
+                    api.request_count += 1
+                    api.in_flight += 1
+                    api.max_in_flight = max(api.max_in_flight, api.in_flight)
+                try:
+                    if api.latency_seconds:
+                        time.sleep(api.latency_seconds)
+                    self._send(api.handle_get(self.path))
+                finally:
+                    with api._lock:
+                        api.in_flight -= 1
+
+        return Handler
+
+    def handle_get(self, raw_path: str) -> Dict:
+        parsed = urlparse(raw_path)
+        query = parse_qs(parsed.query)
+        parts = parsed.path.strip("/").split("/")
+        # open-apis/contact/v3/departments/{id}/children
+        if len(parts) == 6 and parts[3] == "departments" and parts[5] == "children":
+            department_id = parts[4]
+            if department_id not in self.tree:
+                return {"code": 40004, "msg": "department not found"}
+            items = [
+                {"open_department_id": child_id, "name": child_id, "leaders": [{"leaderID": f"ou-{child_id}"}]}
+                for child_id in self.tree[department_id]
+            ]
+            return self._page(items, query)
+        # open-apis/contact/v3/users/find_by_department
+        if parts[-2:] == ["users", "find_by_department"]:
+            department_id = query.get("department_id", [""])[0]
+            return self._page(self.users.get(department_id, []), query)
+        return {"code": 404, "msg": f"unknown path {parsed.path}"}
+
+    @staticmethod
+    def _page(items: List[Dict], query: Dict[str, List[str]]) -> Dict:
+        page_size = int(query.get("page_size", ["50"])[0])
+        offset = int(query.get("page_token", ["0"])[0])
+        page = items[offset:offset + page_size]
+        has_more = offset + page_size < len(items)
+        return {
+            "code": 0,
+            "data": {
+                "items": page,
+                "has_more": has_more,
+                "page_token": str(offset + page_size) if has_more else "",
+            },
+        }
@@ -0,0 +1,52 @@
+from pathlib import Path
+import sys
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.models.database_models import AttachmentIndex
+from app.services import attachment_index_service
+
+
+def _session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'index.db'}")
+    AttachmentIndex.__table__.create(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def test_index_lookup_move_and_rebuild(tmp_path):
+    db = _session(tmp_path)
+    root = tmp_path / "attachments"
+    staging = root / "staging" / "abc"
+    staging.mkdir(parents=True)
+
+    stored = staging / "20250101-000000-000000-shot.png"
+    stored.write_bytes(b"png-bytes")
+    attachment_index_service.index_content(db, root, stored, b"png-bytes", "image/png")
+    db.commit()
+
+    entry = attachment_index_service.find_by_token(db, stored.name)
+    assert entry.relative_path == "staging/abc/" + stored.name
+    assert entry.size == 9
+    assert entry.sha256 == attachment_index_service.sha256_bytes(b"png-bytes")
+
+    final = root / "test-cases" / "1" / "TCG-1.010.010" / stored.name
+    final.parent.mkdir(parents=True)
+    stored.rename(final)
+    attachment_index_service.move_entry(db, root, stored, final)
+    db.commit()
+    assert attachment_index_service.find_by_token(db, stored.name).relative_path.startswith("test-cases/1/")
+
+    # 未登錄的檔案由重建補上，已刪除的檔案由重建清除
+    extra = root / "test-runs" / "1" / "2" / "3" / "log.txt"
+    extra.parent.mkdir(parents=True)
+    extra.write_text("hello")
+    final.unlink()
+    stats = attachment_index_service.rebuild_index(db, root)
+    assert stats["indexed"] == 1 and stats["pruned"] == 1
+    assert attachment_index_service.find_by_token(db, "log.txt").mime_type == "text/plain"
+    assert attachment_index_service.find_by_token(db, stored.name) is None
@@ -0,0 +1,30 @@
+import json
+from pathlib import Path
+import subprocess
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def test_benchmark_load_smoke(tmp_path):
+    output = tmp_path / "bench.json"
+    completed = subprocess.run(
+        [sys.executable, str(PROJECT_ROOT / "scripts" / "benchmark_load.py"),
+         "--scale", "tiny", "--test-cases", "200", "--items", "300", "--audit-logs", "100",
+         "--iterations", "3", "--warmup", "1", "--concurrency", "2", "--output", str(output)],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=300,
+    )
+    assert completed.returncode == 0, completed.stderr[-2000:]
+
+    report = json.loads(output.read_text(encoding="utf-8"))
+    assert report["meta"]["dataset"]["test_cases"] == 200
+    assert set(report["scenarios"]) == {
+        "testcase_list", "testcase_search", "item_list", "item_batch_update", "item_statistics", "report_generate",
+    }
+    for name, result in report["scenarios"].items():
+        assert result["errors"] == 0, (name, result["statuses"])
+        assert result["requests"] == 3
+        latency = result["latency_ms"]
+        assert 0 < latency["p50"] <= latency["p95"] <= latency["max"]
@@ -0,0 +1,111 @@
+from pathlib import Path
+import random
+import sys
+import time
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.services.contact_search_index import ContactSearchIndex, _lark_user_payload
+
+
+def _ids(results):
+    return [r["id"] for r in results]
+
+
+def test_ranking_and_cjk_matches():
+    index = ContactSearchIndex()
+    index.rebuild([
+        {"id": "u1", "name": "王小明", "en_name": "Ming Wang", "email": "ming.wang@example.com"},
+        {"id": "u2", "name": "陳明華", "en_name": "Hua Chen", "email": "hua.chen@example.com"},
+        {"id": "u3", "name": "Ann", "en_name": "", "email": "ann@example.com"},
+        {"id": "u4", "name": "Annabel Lee", "en_name": "", "email": "annabel@example.com"},
+        {"id": "u5", "name": "Joanna", "en_name": "", "email": "jo@example.com"},
+    ])
+
+    # 完全相符 > 欄位前綴 > 中段包含
+    assert _ids(index.search("ann")) == ["u3", "u4", "u5"]
+    # 詞首前綴與 email 前綴
+    assert _ids(index.search("lee")) == ["u4"]
+    assert _ids(index.search("hua.c")) == ["u2"]
+    # CJK 單字 / 雙字中段比對，且不分大小寫與全半形
+    assert _ids(index.search("明")) == ["u1", "u2"]
+    assert _ids(index.search("明華")) == ["u2"]
+    assert _ids(index.search("ＭＩＮＧ")) == ["u1"]
+    # 拉丁 2 字只做前綴，不做中段比對
+    assert _ids(index.search("nn")) == []
+    assert _ids(index.search("ann", limit=1)) == ["u3"]
+
+
+def test_incremental_update_replaces_and_removes():
+    index = ContactSearchIndex()
+    users = [{"id": f"u{i}", "name": f"User {i}", "en_name": "", "email": f"user{i}@example.com"} for i in range(10)]
+    index.rebuild(users)
+
+    users[3] = {"id": "u3", "name": "Renamed", "en_name": "", "email": "renamed@example.com"}
+    result = index.update(users[:9] + [{"id": "u42", "name": "Newcomer", "en_name": "", "email": "new@example.com"}])
+    assert (result["added"], result["updated"], result["removed"], result["rebuilt"]) == (1, 1, 1, 0)
+
+    assert _ids(index.search("renamed")) == ["u3"]
+    assert index.search("user3@") == []
+    assert index.search("user 9") == []
+    assert _ids(index.search("newc")) == ["u42"]
+    assert index.get("u9") is None
+    assert len(index) == 10
+
+    # 失效文件過多時整體重建
+    result = index.update(users[:2])
+    assert result["rebuilt"] == 1
+    assert index.get_stats()["dead_documents"] == 0
+    assert _ids(index.search("user")) == ["u0", "u1"]
+
+
+def test_update_reindexes_fields_missing_from_payload():
+    def lark_user(en_name):
+        return {"id": "u1", "name": "王小明", "en_name": en_name, "email": "u1@example.com", "avatar": None,
+                "department_id": None, "job_title": None, "employee_type": None}
+
+    index = ContactSearchIndex()
+    index.rebuild([lark_user("Ming")], payload=_lark_user_payload)
+
+    # payload 不含 en_name，僅 en_name 變更時仍需重新索引
+    result = index.update([lark_user("Bob")], payload=_lark_user_payload)
+    assert result["updated"] == 1
+    assert _ids(index.search("bob")) == ["u1"]
+    assert index.search("ming") == []
+    assert index.update([lark_user("Bob")], payload=_lark_user_payload)["updated"] == 0
+
+
+def test_search_at_50k_users():
+    rng = random.Random(7)
+    surnames = "王李張劉陳楊黃趙吳周徐孫馬朱胡郭何高林羅"
+    given = "明華強軍平偉芳娜敏靜麗秀英傑濤超勇豔"
+    latin = ["alex", "brian", "chris", "diana", "emma", "frank", "grace", "henry", "iris", "jack"]
+    users = []
+    for i in range(50000):
+        first = rng.choice(latin)
+        users.append({
+            "id": f"u{i}",
+            "name": rng.choice(surnames) + rng.choice(given) + rng.choice(given),
+            "en_name": f"{first.title()} {rng.choice(latin).title()}{i}",
+            "email": f"{first}.{i}@example.com",
+        })
+    index = ContactSearchIndex()
+    index.rebuild(users)
+
+    # 完整 email 完全相符排第一
+    target = users[31337]
+    assert index.search(target["email"], limit=10)[0]["id"] == target["id"]
+    # 前綴結果集正確且受 limit 限制
+    emma = index.search("emma.12", limit=10)
+    assert len(emma) == 10 and all(r["email"].startswith("emma.12") for r in emma)
+    assert all("王" in r["name"] for r in index.search("王", limit=10))
+    assert index.search("xyz", limit=10) == []
+
+    # 寬鬆上限：只防止退化為逐筆全掃描等級的延遲，不作為效能基準
+    queries = ["王", "明華", "alex", "gr", "emma.12", "henry3", "ample", "xyz", "chris 49", "u"]
+    start = time.perf_counter()
+    for q in queries:
+        index.search(q, limit=10)
+    assert time.perf_counter() - start < 2.0
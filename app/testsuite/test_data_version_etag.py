@@ -0,0 +1,87 @@
+from datetime import datetime
+from pathlib import Path
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text, update
+from sqlalchemy.orm import sessionmaker
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.database import get_sync_db
+from app.main import app
+from app.models.database_models import (
+    DATA_VERSION_SCOPE_ITEMS, DATA_VERSION_SCOPE_TEST_CASES,
+    Base, Team, TestCaseLocal, TestRunConfig, TestRunItem,
+)
+from app.services import data_version_service
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'dv.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        db.add(Team(id=1, name="T", wiki_token="w", test_case_table_id="tbl"))
+        db.add(TestRunConfig(id=10, team_id=1, name="R1"))
+        db.add(TestCaseLocal(id=1, team_id=1, lark_record_id="rec1", test_case_number="TC-1", title="登入"))
+        db.add(TestRunItem(id=100, team_id=1, config_id=10, test_case_number="TC-1"))
+        db.commit()
+    yield Session
+    engine.dispose()
+
+
+def test_triggers_bump_versions_on_every_write_path(session_factory):
+    with session_factory() as db:
+        def versions():
+            return (data_version_service.get_version(db, DATA_VERSION_SCOPE_TEST_CASES, 1),
+                    data_version_service.get_version(db, DATA_VERSION_SCOPE_ITEMS, 10))
+
+        start_cases, start_items = versions()
+        assert start_cases >= 1 and start_items >= 1
+
+        # Core 批次更新（不經 ORM 事件）
+        db.execute(update(TestRunItem).where(TestRunItem.config_id == 10).values(updated_at=datetime.utcnow()))
+        db.commit()
+        assert versions() == (start_cases, start_items + 1)
+
+        # 原始 SQL 刪除
+        db.execute(text("DELETE FROM test_cases WHERE id = 1"))
+        db.commit()
+        assert versions()[0] == start_cases + 1
+
+
+def test_item_listing_answers_304_until_data_changes(session_factory):
+    def override_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_sync_db] = override_db
+    try:
+        client = TestClient(app)
+        url = "/api/teams/1/test-run-configs/10/items/?limit=50"
+        first = client.get(url)
+        assert first.status_code == 200
+        etag = first.headers["etag"]
+        assert etag.startswith('"items-') and not etag.startswith("W/")
+
+        assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+        # 不同查詢參數 → 不同 ETag
+        assert client.get(url + "&skip=1", headers={"If-None-Match": etag}).status_code == 200
+
+        with session_factory() as db:
+            db.execute(update(TestRunItem).where(TestRunItem.id == 100).values(test_result="Passed"))
+            db.commit()
+        changed = client.get(url, headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["etag"] != etag
+        assert changed.json()[0]["test_result"] == "Passed"
+    finally:
+        app.dependency_overrides.pop(get_sync_db, None)
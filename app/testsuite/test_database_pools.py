@@ -0,0 +1,53 @@
+import asyncio
+from pathlib import Path
+import sys
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.database import create_sqlite_engine
+
+
+def test_pooled_engines_apply_pragmas_once_per_connection(tmp_path):
+    db_file = tmp_path / "pool.db"
+
+    async def scenario():
+        writer = create_sqlite_engine(db_file, "test_write")
+        reader = create_sqlite_engine(db_file, "test_read", read_only=True, pool_size=2, cache_mb=8)
+        connects = []
+        event.listen(reader.sync_engine, "connect", lambda *args: connects.append(1))
+
+        async with writer.begin() as conn:
+            await conn.execute(text("CREATE TABLE t (id INTEGER PRIMARY KEY)"))
+            await conn.execute(text("INSERT INTO t (id) VALUES (1), (2)"))
+
+        Session = async_sessionmaker(bind=reader)
+
+        async def read():
+            async with Session() as session:
+                return (await session.execute(text("SELECT COUNT(*) FROM t"))).scalar()
+
+        counts = await asyncio.gather(*(read() for _ in range(20)))
+        async with reader.connect() as conn:
+            pragmas = {
+                name: (await conn.execute(text(f"PRAGMA {name}"))).scalar()
+                for name in ("journal_mode", "query_only", "cache_size", "foreign_keys")
+            }
+            with pytest.raises(OperationalError):
+                await conn.execute(text("INSERT INTO t (id) VALUES (3)"))
+
+        await writer.dispose()
+        await reader.dispose()
+        return counts, len(connects), pragmas
+
+    counts, connects, pragmas = asyncio.run(scenario())
+    assert counts == [2] * 20
+    # 20 個會話最多只建立 pool_size 條實體連線
+    assert connects <= 2
+    assert pragmas == {"journal_mode": "wal", "query_only": 1, "cache_size": -8 * 1024, "foreign_keys": 1}
@@ -0,0 +1,114 @@
+import asyncio
+import json
+from datetime import datetime
+from pathlib import Path
+import sys
+from typing import List
+
+import pytest
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.api import test_run_items
+from app.models.database_models import Base, Team, TestCaseLocal, TestRunConfig, TestRunItem
+from app.models.lark_types import Priority, TestResultStatus
+from app.models.test_case import TestCaseResponse
+from app.services.test_case_repo_service import TestCaseRepoService
+from app.utils import fast_json
+
+
+class _FakeRequest:
+    headers = {}
+    query_params = {}
+
+
+@pytest.fixture
+def db_session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fast.db'}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    now = datetime(2024, 5, 1, 8, 30, 15, 123456)
+    with Session() as db:
+        db.add(Team(id=1, name="T", wiki_token="w", test_case_table_id="tbl"))
+        db.add(TestRunConfig(id=10, team_id=1, name="R1"))
+        db.add(TestCaseLocal(
+            id=1, team_id=1, lark_record_id="rec1", test_case_number="TC-1", title="登入",
+            priority=Priority.HIGH, test_result=TestResultStatus.PASSED, created_at=now, updated_at=now,
+            tcg_json=json.dumps([
+                {"record_ids": ["r1"], "table_id": "tbl", "text": "TCG-1", "text_arr": ["TCG-1"], "type": "text"},
+                {"record_ids": "bad"},
+                {"text": "TCG-2"},
+            ]),
+        ))
+        db.add(TestCaseLocal(id=2, team_id=1, test_case_number=" TC-2 ", title="  登出 ",
+                             tcg_json="not json", created_at=now))
+        db.add(TestRunItem(
+            id=100, team_id=1, config_id=10, test_case_number="TC-1", test_result=TestResultStatus.FAILED,
+            executed_at=now, assignee_name="Amy", created_at=now, updated_at=now,
+            attachments_json=json.dumps([{"name": "a"}, {"name": "b"}]),
+            execution_results_json=json.dumps([{"name": "r.png", "stored_name": "s.png",
+                                                "relative_path": "runs/s.png", "type": "image/png", "size": 5}]),
+        ))
+        db.add(TestRunItem(id=101, team_id=1, config_id=10, test_case_number="TC-404", created_at=datetime(2024, 5, 2),
+                           attachments_json="{}"))
+        db.commit()
+    yield Session
+    engine.dispose()
+
+
+def test_dumps_matches_pydantic_json_types():
+    payload = {"at": datetime(2024, 1, 2, 3, 4, 5), "p": Priority.LOW, 1: {"tags"}}
+    assert json.loads(fast_json.dumps(payload)) == {"at": "2024-01-02T03:04:05", "p": "Low", "1": ["tags"]}
+
+
+def test_test_case_list_dicts_match_response_model(db_session):
+    with db_session() as db:
+        service = TestCaseRepoService(db)
+        models = service.list(team_id=1, sort_by="test_case_number", sort_order="asc")
+        fast = service.list_dicts(team_id=1, sort_by="test_case_number", sort_order="asc")
+
+    expected = TypeAdapter(List[TestCaseResponse]).dump_python(models, mode="json")
+    assert json.loads(fast_json.dumps(fast)) == expected
+    assert list(fast[0]) == list(expected[0])
+    by_number = {item["test_case_number"]: item for item in fast}
+    assert by_number["TC-2"]["title"] == "登出" and by_number["TC-2"]["tcg"] == []
+    assert by_number["TC-1"]["tcg"] == [
+        {"record_ids": ["r1"], "table_id": "tbl", "text": "TCG-1", "text_arr": ["TCG-1"], "type": "text"},
+        {"record_ids": [], "table_id": "", "text": "TCG-2", "text_arr": [], "type": "text"},
+    ]
+
+
+@pytest.mark.parametrize("enabled", [True, False])
+def test_item_list_output_is_identical_with_fast_path(db_session, monkeypatch, enabled):
+    monkeypatch.setattr(fast_json, "FAST_JSON_ENABLED", enabled)
+    monkeypatch.setattr(test_run_items, "_verify_team_and_config", lambda *args: None)
+    monkeypatch.setattr(test_run_items.data_version_service, "items_etag", lambda *args: '"v1"')
+
+    async def call():
+        response = test_run_items.Response()
+        with db_session() as db:
+            result = await test_run_items.list_items(
+                1, 10, _FakeRequest(), response, db=db, search=None, priority_filter=None,
+                test_result_filter=None, executed_only=None, sort_by="created_at", sort_order="asc",
+                skip=0, limit=100,
+            )
+        return result
+
+    result = asyncio.run(call())
+    if enabled:
+        assert result.headers["etag"] == '"v1"'
+        body = json.loads(result.body)
+    else:
+        body = TypeAdapter(List[test_run_items.TestRunItemResponse]).dump_python(result, mode="json")
+
+    first = body[0]
+    assert first["title"] == "登入" and first["priority"] == "High" and first["test_result"] == "Failed"
+    assert first["executed_at"] == "2024-05-01T08:30:15.123456"
+    assert first["attachment_count"] == 2 and first["execution_result_count"] == 1
+    assert first["execution_results"][0]["url"] == "/attachments/runs/s.png"
+    assert body[1]["title"] is None and body[1]["attachment_count"] == 0
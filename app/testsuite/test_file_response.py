@@ -0,0 +1,45 @@
+from pathlib import Path
+import sys
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.utils.file_response import build_file_response
+
+
+def _client(path: Path, sha256=None) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/file")
+    async def serve(request: Request):
+        return build_file_response(request, path, media_type="text/plain", sha256=sha256)
+
+    return TestClient(app)
+
+
+def test_range_etag_and_not_modified(tmp_path):
+    path = tmp_path / "run.log"
+    path.write_bytes(b"0123456789" * 10)
+    client = _client(path, sha256="abc123")
+
+    full = client.get("/file")
+    assert full.status_code == 200
+    assert full.headers["content-length"] == "100"
+    assert full.headers["etag"] == '"abc123"'
+    assert full.headers["accept-ranges"] == "bytes"
+
+    part = client.get("/file", headers={"Range": "bytes=10-19"})
+    assert part.status_code == 206
+    assert part.content == b"0123456789"
+    assert part.headers["content-range"] == "bytes 10-19/100"
+
+    cached = client.get("/file", headers={"If-None-Match": 'W/"abc123"'})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+    since = client.get("/file", headers={"If-Modified-Since": full.headers["last-modified"]})
+    assert since.status_code == 304
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+import sys
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.models.database_models import Base, TestRunConfig, TestRunItem, TestCaseLocal
+from app.models.lark_types import TestResultStatus
+from app.services.html_report_service import HTMLReportService, HTMLReportWorker
+
+
+def _setup(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'report.db'}")
+    tables = [TestRunConfig.__table__, TestRunItem.__table__, TestCaseLocal.__table__]
+    Base.metadata.create_all(bind=engine, tables=tables)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add(TestRunConfig(id=1, team_id=1, name="Sprint 1"))
+    db.add(TestCaseLocal(team_id=1, test_case_number="TC-1", title="Login"))
+    db.add(TestRunItem(team_id=1, config_id=1, test_case_number="TC-1",
+                       test_result=TestResultStatus.PASSED))
+    db.add(TestRunItem(team_id=1, config_id=1, test_case_number="TC-2"))
+    db.commit()
+    return factory, db
+
+
+def test_unchanged_run_reuses_artifact_and_changes_regenerate(tmp_path):
+    factory, db = _setup(tmp_path)
+    service = HTMLReportService(db, base_dir=str(tmp_path))
+
+    first = service.generate_test_run_report(1, 1)
+    assert first["overwritten"] is True
+    html = (tmp_path / "generated_report" / "team-1-config-1.html").read_text(encoding="utf-8")
+    assert "Login" in html
+
+    second = service.generate_test_run_report(1, 1)
+    assert second["overwritten"] is False
+    assert second["data_version"] == first["data_version"]
+
+    # 更新任一項目即改變資料版本，交由背景 worker 重新生成
+    item = db.query(TestRunItem).filter(TestRunItem.test_case_number == "TC-2").one()
+    item.test_result = TestResultStatus.FAILED
+    item.updated_at = datetime.utcnow() + timedelta(seconds=1)
+    db.commit()
+
+    worker = HTMLReportWorker(session_factory=factory, base_dir=str(tmp_path))
+    assert worker.get_status(1, 1, db)["status"] == "stale"
+    queued = worker.request(1, 1, db)
+    assert queued["status"] == "generating"
+    worker.get_future(1, 1).result(timeout=30)
+
+    status = worker.get_status(1, 1, db)
+    assert status["status"] == "ready"
+    assert status["up_to_date"] is True
+    assert status["job"]["state"] == "done"
+    assert worker.request(1, 1, db)["status"] == "ready"
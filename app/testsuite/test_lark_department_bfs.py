@@ -0,0 +1,69 @@
+from pathlib import Path
+import sys
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.models.database_models import LarkDepartment
+from app.services.lark_client import LarkAuthManager, LarkRateLimiter
+from app.services.lark_department_service import LarkDepartmentService
+from app.testsuite.fake_lark_contact_api import FakeLarkContactAPI, build_department_tree
+
+
+def _service(api, factory, max_concurrency=6):
+    auth = LarkAuthManager("app", "secret")
+    auth.auth_url = f"{api.base_url}/auth/v3/tenant_access_token/internal"
+    auth.rate_limiter = LarkRateLimiter(qps=0, max_concurrency=max_concurrency)
+    service = LarkDepartmentService(auth, session_factory=factory)
+    service.base_url = api.base_url
+    return service
+
+
+def test_bfs_sync_of_5k_department_tree(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'org.db'}")
+    LarkDepartment.__table__.create(bind=engine)
+    factory = sessionmaker(bind=engine)
+    # fanout 60 使部分部門的子部門需要翻頁（page_size=50）
+    tree = build_department_tree(5000, fanout=60)
+
+    progress = []
+    with FakeLarkContactAPI(tree) as api:
+        result = _service(api, factory).sync_all_departments(["od-root"], progress.append)
+
+        assert result["success"] is True
+        stats = result["stats"]
+        assert stats["departments_discovered"] == 5000
+        assert stats["departments_created"] == 5000
+        assert stats["errors"] == 0
+        assert api.max_in_flight <= 6
+        assert [p["levels_completed"] for p in progress] == list(range(1, stats["levels_completed"] + 1))
+
+        db = factory()
+        assert db.query(LarkDepartment).count() == 5000
+        leaf = db.get(LarkDepartment, "od-4999")
+        parent = db.get(LarkDepartment, leaf.parent_department_id)
+        assert leaf.level == parent.level + 1
+        assert leaf.path == f"{parent.path}/od-4999"
+        assert "ou-od-4999" in leaf.leaders_json
+        db.close()
+
+
+def test_resync_updates_and_reports_failed_root(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'org.db'}")
+    LarkDepartment.__table__.create(bind=engine)
+    factory = sessionmaker(bind=engine)
+
+    with FakeLarkContactAPI(build_department_tree(10)) as api:
+        first = _service(api, factory).sync_all_departments(["od-root"])
+        assert first["stats"]["departments_created"] == 10
+
+        result = _service(api, factory).sync_all_departments(["od-root", "od-missing"])
+
+    assert result["success"] is False
+    assert result["stats"]["departments_discovered"] == 11
+    assert result["stats"]["departments_updated"] == 10
+    assert result["stats"]["departments_created"] == 0
@@ -0,0 +1,113 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import asyncio
+import sys
+import threading
+import time
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.services.lark_media_cache import (
+    LarkMediaCache,
+    LarkMediaFetchError,
+    extract_media_token,
+    make_lark_media_fetcher,
+)
+
+
+MEDIA = {
+    "boxcnAAAA": b"A" * 4000,
+    "boxcnBBBB": b"B" * 4000,
+    "boxcnCCCC": b"C" * 4000,
+}
+
+
+@pytest.fixture
+def fake_lark():
+    """模擬 Lark drive/v1/medias/{token}/download 端點，記錄各 token 的下載次數"""
+    hits = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            token = extract_media_token(self.path)
+            hits[token] = hits.get(token, 0) + 1
+            body = MEDIA.get(token)
+            if self.headers.get("Authorization") != "Bearer t-test":
+                self.send_response(401)
+                self.end_headers()
+                return
+            if body is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            time.sleep(0.2)  # 讓並發請求有機會重疊
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_address[1]}/open-apis/drive/v1/medias/{{}}/download"
+    yield base, hits
+    server.shutdown()
+
+
+def _fetcher(base, token):
+    return make_lark_media_fetcher(base.format(token), "t-test")
+
+
+def test_concurrent_requests_collapse_and_hits_served_locally(tmp_path, fake_lark):
+    base, hits = fake_lark
+    cache = LarkMediaCache(tmp_path / "cache", max_bytes=1024 * 1024)
+
+    async def run():
+        results = await asyncio.gather(
+            *[cache.get_or_fetch("boxcnAAAA", _fetcher(base, "boxcnAAAA")) for _ in range(5)]
+        )
+        again = await cache.get_or_fetch("boxcnAAAA", _fetcher(base, "boxcnAAAA"))
+        return results, again
+
+    results, again = asyncio.run(run())
+    assert hits["boxcnAAAA"] == 1
+    assert all(r.path.read_bytes() == MEDIA["boxcnAAAA"] for r in results)
+    assert again.content_type == "image/png"
+
+    stats = cache.get_stats()
+    assert stats["misses"] == 1
+    assert stats["coalesced"] == 4
+    assert stats["hits"] == 1
+    assert stats["bytes_downloaded"] == 4000
+
+
+def test_lru_eviction_and_errors(tmp_path, fake_lark):
+    base, hits = fake_lark
+    cache = LarkMediaCache(tmp_path / "cache", max_bytes=9000)
+
+    async def run():
+        await cache.get_or_fetch("boxcnAAAA", _fetcher(base, "boxcnAAAA"))
+        await cache.get_or_fetch("boxcnBBBB", _fetcher(base, "boxcnBBBB"))
+        cache.get("boxcnAAAA")  # A 變為最近使用
+        await cache.get_or_fetch("boxcnCCCC", _fetcher(base, "boxcnCCCC"))
+        with pytest.raises(LarkMediaFetchError) as exc:
+            await cache.get_or_fetch("boxcnMISSING", _fetcher(base, "boxcnMISSING"))
+        return exc.value
+
+    err = asyncio.run(run())
+    assert err.status_code == 404
+    assert cache.get("boxcnBBBB") is None
+    assert cache.get("boxcnAAAA") is not None
+    assert cache.get_stats()["evictions"] == 1
+
+    # 重新載入時由磁碟重建索引
+    reloaded = LarkMediaCache(tmp_path / "cache", max_bytes=9000)
+    assert reloaded.get_stats()["entries"] == 2
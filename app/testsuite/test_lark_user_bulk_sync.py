@@ -0,0 +1,109 @@
+import json
+from pathlib import Path
+import sys
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.models.database_models import LarkDepartment, LarkUser
+from app.services.lark_client import LarkAuthManager, LarkRateLimiter
+from app.services.lark_user_service import LarkUserService
+from app.testsuite.fake_lark_contact_api import FakeLarkContactAPI
+
+
+def _user(n, **overrides):
+    user = {
+        "user_id": f"u{n}",
+        "open_id": f"ou_{n}",
+        "name": f"User {n}",
+        "enterprise_email": f"user{n}@example.com",
+        "status": {"is_activated": True, "is_exited": False},
+        "avatar": {"avatar_240": f"https://avatar/{n}"},
+    }
+    user.update(overrides)
+    return user
+
+
+def _setup(tmp_path, department_count):
+    engine = create_engine(f"sqlite:///{tmp_path / 'org.db'}")
+    LarkDepartment.__table__.create(bind=engine)
+    LarkUser.__table__.create(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    for i in range(department_count):
+        db.add(LarkDepartment(department_id=f"od-{i:03d}", level=1, status="active"))
+    db.commit()
+    db.close()
+    return factory
+
+
+def _service(api, factory):
+    auth = LarkAuthManager("app", "secret")
+    auth.auth_url = f"{api.base_url}/auth/v3/tenant_access_token/internal"
+    auth.rate_limiter = LarkRateLimiter(qps=0, max_concurrency=6)
+    service = LarkUserService(auth, session_factory=factory)
+    service.base_url = api.base_url
+    return service
+
+
+def test_bulk_sync_dedups_and_counts(tmp_path):
+    factory = _setup(tmp_path, 100)
+    # 100 個部門各 120 人（需翻頁）；每個部門另有 10 人同時屬於下一個部門
+    users = {}
+    for d in range(100):
+        members = [_user(d * 120 + i) for i in range(120)]
+        if d > 0:
+            members += [_user((d - 1) * 120 + i) for i in range(10)]
+        users[f"od-{d:03d}"] = members
+
+    with FakeLarkContactAPI({}, users=users) as api:
+        result = _service(api, factory).sync_all_users()
+
+    assert result["success"] is True
+    stats = result["stats"]
+    assert stats["users_discovered"] == 12000 + 99 * 10
+    assert stats["users_duplicated"] == 990
+    assert stats["users_created"] == 12000
+    assert stats["errors"] == 0
+
+    db = factory()
+    assert db.query(LarkUser).count() == 12000
+    shared = db.get(LarkUser, "u0")
+    assert shared.primary_department_id == "od-000"
+    assert json.loads(shared.department_ids_json) == ["od-000", "od-001"]
+    assert db.get(LarkDepartment, "od-000").direct_user_count == 120
+    db.close()
+
+
+def test_resync_merges_departments_and_isolates_conflicts(tmp_path):
+    factory = _setup(tmp_path, 2)
+    db = factory()
+    db.add(LarkUser(user_id="u1", name="Old", department_ids_json='["od-legacy"]'))
+    db.commit()
+    db.close()
+
+    users = {
+        "od-000": [_user(1, name="New"), _user(2)],
+        # 與 u2 相同 email：只有這一筆寫入失敗
+        "od-001": [_user(3, enterprise_email="user2@example.com", status={"is_activated": True, "is_exited": True})],
+    }
+    with FakeLarkContactAPI({}, users=users) as api:
+        result = _service(api, factory).sync_all_users()
+
+    stats = result["stats"]
+    assert stats["users_updated"] == 1
+    assert stats["users_created"] == 1
+    assert stats["errors"] == 1
+
+    db = factory()
+    user = db.get(LarkUser, "u1")
+    assert user.name == "New"
+    assert json.loads(user.department_ids_json) == ["od-000", "od-legacy"]
+    assert db.get(LarkUser, "u3") is None
+    assert db.get(LarkDepartment, "od-000").direct_user_count == 2
+    assert db.get(LarkDepartment, "od-001").direct_user_count == 0
+    db.close()
@@ -0,0 +1,163 @@
+import asyncio
+import json
+from pathlib import Path
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.api import test_run_items
+from app.models.database_models import Base, Team, TestCaseLocal, TestRunConfig, TestRunItem
+from app.services import live_events, write_queue
+from app.services.live_events import LiveEventBroker, SQLiteEventBackend, run_channel
+from app.services.write_queue import WriteQueue
+
+
+@pytest.fixture
+def db_env(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'live.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        db.add(Team(id=1, name="T", wiki_token="w", test_case_table_id="tbl"))
+        db.add(TestRunConfig(id=10, team_id=1, name="R1"))
+        db.add(TestCaseLocal(id=1, team_id=1, test_case_number="TC-1", title="登入"))
+        db.add(TestRunItem(id=100, team_id=1, config_id=10, test_case_number="TC-1"))
+        db.commit()
+    queue = WriteQueue(Session, name="test")
+    monkeypatch.setattr(write_queue, "_write_queue", queue)
+    yield engine, Session, queue
+    queue.stop()
+    engine.dispose()
+
+
+def test_memory_broker_fans_out_and_flags_slow_subscribers():
+    async def scenario():
+        broker = LiveEventBroker(queue_size=2)
+        fast = await broker.subscribe("c")
+        slow = await broker.subscribe("c")
+        other = await broker.subscribe("other")
+        for i in range(3):
+            await broker.publish("c", "items", {"n": i})
+            assert (await fast.get(1))["data"] == {"n": i}
+        received = await other.get(0.05)
+        fast.close()
+        return slow.overflowed, received, broker.subscriber_count("c")
+
+    overflowed, other_received, remaining = asyncio.run(scenario())
+    assert overflowed and other_received is None and remaining == 1
+
+
+def test_coalesced_publish_runs_builder_once():
+    calls = []
+
+    async def scenario():
+        broker = LiveEventBroker()
+        sub = await broker.subscribe("c")
+        for _ in range(5):
+            broker.publish_coalesced("c", "statistics", lambda: calls.append(1) or {"total": len(calls)}, delay=0.05)
+        first = await sub.get(1)
+        second = await sub.get(0.2)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first["data"] == {"total": 1} and second is None and len(calls) == 1
+
+
+def test_coalesced_publish_keeps_newer_pending_task():
+    import threading
+    calls = []
+    release = threading.Event()
+
+    def slow_build():
+        calls.append(1)
+        release.wait(1)
+        return {"total": len(calls)}
+
+    async def scenario():
+        broker = LiveEventBroker()
+        sub = await broker.subscribe("c")
+        broker.publish_coalesced("c", "statistics", slow_build, delay=0.01)
+        await asyncio.sleep(0.05)  # 第一個工作已進入 build()
+        broker.publish_coalesced("c", "statistics", slow_build, delay=0.2)
+        newer = broker._pending[("c", "statistics")]
+        release.set()
+        first = await sub.get(1)
+        # 第一個工作結束時不可移除新排定的工作
+        assert broker._pending.get(("c", "statistics")) is newer
+        broker.publish_coalesced("c", "statistics", slow_build, delay=0.01)
+        second = await sub.get(1)
+        return first, second, await sub.get(0.1)
+
+    first, second, third = asyncio.run(scenario())
+    assert (first["data"], second["data"], third) == ({"total": 1}, {"total": 2}, None)
+    assert len(calls) == 2
+
+
+def test_sqlite_backend_delivers_across_brokers(db_env):
+    engine, _, queue = db_env
+
+    async def scenario():
+        # 兩個 broker 模擬兩個 worker，只共用 SQLite 檔
+        publisher = LiveEventBroker(SQLiteEventBackend(engine, poll_seconds=0.02, write_queue=queue))
+        subscriber = LiveEventBroker(SQLiteEventBackend(engine, poll_seconds=0.02, write_queue=queue))
+        sub = await subscriber.subscribe(run_channel(10))
+        await asyncio.sleep(0.05)
+        assert publisher.has_subscribers(run_channel(10))
+        await publisher.publish(run_channel(10), "items", {"items": [{"id": 100}]})
+        message = await sub.get(2)
+        await publisher.stop()
+        await subscriber.stop()
+        return message
+
+    assert asyncio.run(scenario()) == {"channel": "test_run:10", "event": "items", "data": {"items": [{"id": 100}]}}
+
+
+class _FakeRequest:
+    def __init__(self):
+        self.disconnected = False
+
+    async def is_disconnected(self):
+        return self.disconnected
+
+
+def test_item_update_is_streamed_with_statistics(db_env, monkeypatch):
+    _, Session, _ = db_env
+    monkeypatch.setattr(live_events, "_broker", LiveEventBroker())
+    monkeypatch.setattr(live_events, "COALESCE_SECONDS", 0.01)
+
+    async def scenario():
+        request = _FakeRequest()
+        with Session() as stream_db, Session() as db:
+            response = await test_run_items.stream_item_events(1, 10, request, db=stream_db)
+            chunks = response.body_iterator
+            assert (await chunks.__anext__()).startswith("retry:")
+            initial = await chunks.__anext__()
+
+            payload = test_run_items.TestRunItemUpdate(test_result="Passed", assignee_name="Amy")
+            await test_run_items.update_item(1, 10, 100, payload, db=db)
+            item_event = await chunks.__anext__()
+            stats_event = await asyncio.wait_for(chunks.__anext__(), 2)
+            request.disconnected = True
+            await chunks.aclose()
+        return initial, item_event, stats_event
+
+    initial, item_event, stats_event = asyncio.run(scenario())
+
+    def parse(chunk):
+        lines = dict(line.split(": ", 1) for line in chunk.strip().split("\n"))
+        return lines["event"], json.loads(lines["data"])
+
+    event, data = parse(initial)
+    assert event == "statistics" and data["executed_runs"] == 0
+    event, data = parse(item_event)
+    assert event == "items"
+    assert data["items"][0]["id"] == 100
+    assert data["items"][0]["test_result"] == "Passed" and data["items"][0]["assignee_name"] == "Amy"
+    event, data = parse(stats_event)
+    assert event == "statistics" and data["executed_runs"] == 1 and data["passed_runs"] == 1
@@ -0,0 +1,84 @@
+import os
+from pathlib import Path
+import subprocess
+import sys
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.middlewares import MetricsMiddleware
+from app.services import metrics
+from app.services.metrics import MetricsRegistry, normalize_endpoint
+
+
+def test_render_exposition_format():
+    registry = MetricsRegistry()
+    counter = registry.counter("jobs_total", "Jobs", ("kind",))
+    counter.inc(kind='a"b')
+    counter.inc(2, kind='a"b')
+    histogram = registry.histogram("job_seconds", "Job time", buckets=(0.1, 1.0))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(3)
+
+    text = registry.render()
+    assert "# TYPE jobs_total counter" in text
+    assert 'jobs_total{kind="a\\"b"} 3' in text
+    assert 'job_seconds_bucket{le="0.1"} 1' in text
+    assert 'job_seconds_bucket{le="1"} 2' in text
+    assert 'job_seconds_bucket{le="+Inf"} 3' in text
+    assert "job_seconds_count 3" in text
+    assert "job_seconds_sum 3.55" in text
+
+
+def test_multiprocess_merge_keeps_dead_counters_but_not_gauges(tmp_path):
+    def build():
+        registry = MetricsRegistry(multiproc_dir=str(tmp_path))
+        return registry, registry.counter("hits_total", "Hits"), registry.gauge("busy", "Busy")
+
+    # 以已結束的子行程 PID 模擬結束的 worker
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    worker, hits, busy = build()
+    hits.inc(5)
+    busy.set(7)
+    worker.flush()
+    (tmp_path / f"metrics_{os.getpid()}.json").rename(tmp_path / f"metrics_{dead.pid}.json")
+
+    current, hits, busy = build()
+    hits.inc(2)
+    busy.set(1)
+    text = current.render()
+    assert "hits_total 7" in text
+    assert "busy 1" in text
+
+
+def test_middleware_labels_by_route_template():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    def read_item(item_id: int):
+        return {"id": item_id}
+
+    before = dict(metrics.HTTP_REQUESTS._values)
+    with TestClient(app) as client:
+        for item_id in (1, 2, 3):
+            assert client.get(f"/items/{item_id}").status_code == 200
+        assert client.get("/missing").status_code == 404
+
+    key = ("GET", "/items/{item_id}", "200")
+    assert metrics.HTTP_REQUESTS._values[key] - before.get(key, 0) == 3
+    assert ("GET", "__unmatched__", "404") in metrics.HTTP_REQUESTS._values
+    assert metrics.HTTP_IN_PROGRESS._values[()] == 0
+
+
+def test_normalize_endpoint():
+    assert normalize_endpoint(
+        "https://open.larksuite.com/open-apis/bitable/v1/apps/bascn8xYz/tables/tbl9Qw/records?page_size=500"
+    ) == "/open-apis/bitable/v1/apps/{id}/tables/{id}/records"
+    assert normalize_endpoint("https://jira.example.com/rest/api/2/issue/TP-1234") == "/rest/api/2/issue/{id}"
@@ -0,0 +1,85 @@
+from pathlib import Path
+import asyncio
+import sys
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.models.database_models import Base, TestRunConfig, TestRunItem, TestCaseLocal
+from app.models.lark_types import TestResultStatus
+from app.services import pdf_report_service
+from app.services.pdf_report_jobs import PDFReportJobManager
+from reportlab.platypus import Table
+
+
+def _setup_db(tmp_path) -> str:
+    url = f"sqlite:///{tmp_path / 'pdf.db'}"
+    engine = create_engine(url)
+    tables = [TestRunConfig.__table__, TestRunItem.__table__, TestCaseLocal.__table__]
+    Base.metadata.create_all(bind=engine, tables=tables)
+    db = sessionmaker(bind=engine)()
+    db.add(TestRunConfig(id=1, team_id=1, name="Sprint 1"))
+    for n in range(130):
+        db.add(TestRunItem(team_id=1, config_id=1, test_case_number=f"TC-{n}",
+                           test_result=TestResultStatus.PASSED if n % 3 else TestResultStatus.FAILED))
+    db.commit()
+    db.close()
+    return url
+
+
+def test_pdf_rendered_in_process_pool_via_job_handle(tmp_path):
+    url = _setup_db(tmp_path)
+    manager = PDFReportJobManager(output_dir=tmp_path / "pdf", database_url=url, max_workers=1)
+    try:
+        job = manager.submit(1, 1)
+        assert job["status"] == "running"
+        # 同一 Test Run 的進行中工作會被沿用
+        assert manager.submit(1, 1)["job_id"] == job["job_id"]
+
+        done = asyncio.run(manager.wait(job["job_id"]))
+        assert done["status"] == "done"
+        assert Path(done["path"]).read_bytes().startswith(b"%PDF")
+
+        missing = asyncio.run(manager.wait(manager.submit(1, 999)["job_id"]))
+        assert missing["status"] == "failed"
+        assert missing["error_status_code"] == 404
+
+        # 其他 worker 由 sidecar 取得工作狀態
+        other = PDFReportJobManager(output_dir=tmp_path / "pdf", database_url=url)
+        assert other.get(job["job_id"])["path"] == done["path"]
+        assert other.get(missing["job_id"])["error_status_code"] == 404
+        assert other.get("../" + job["job_id"]) is None
+    finally:
+        manager.shutdown()
+
+
+def test_chart_drawings_cached_by_counts():
+    font = pdf_report_service.register_chinese_font()
+    items = (("Passed", 3), ("Failed", 1))
+    colors = ("#28a745", "#dc3545")
+    first = pdf_report_service._pie_chart_drawing(items, "測試狀態分佈", colors, font)
+    assert first is pdf_report_service._pie_chart_drawing(items, "測試狀態分佈", colors, font)
+    assert pdf_report_service._bar_chart_drawing((("高", 0),), "優先級分佈", ("#dc3545",), font) is None
+
+
+def test_full_results_streamed_in_table_chunks(tmp_path):
+    url = _setup_db(tmp_path)
+    db = sessionmaker(bind=create_engine(url))()
+    service = pdf_report_service.PDFReportService(db)
+
+    def table_rows(full):
+        data = service._collect_report_data(1, 1, full_results=full)
+        tables = [f for f in service._build_results_table(data) if isinstance(f, Table)]
+        return [len(t._cellvalues) - 1 for t in tables]
+
+    assert table_rows(full=False) == [40, 10]
+    assert table_rows(full=True) == [40, 40, 40, 10]
+
+    out = tmp_path / "full.pdf"
+    service.write_test_run_report(1, 1, str(out), full_results=True)
+    assert out.read_bytes().startswith(b"%PDF")
+    db.close()
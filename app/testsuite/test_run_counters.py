@@ -0,0 +1,133 @@
+import json
+from pathlib import Path
+import sys
+
+import pytest
+from sqlalchemy import create_engine, text, update
+from sqlalchemy.orm import sessionmaker
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.api.test_run_items import _compute_item_statistics
+from app.models.database_models import Base, Team, TestRunConfig, TestRunItem
+from app.models.lark_types import TestResultStatus
+from app.services import run_counter_service
+
+
+def _tickets(*numbers):
+    return json.dumps([{"ticket_number": n, "created_at": "2024-01-01T00:00:00"} for n in numbers])
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'counters.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        db.add(Team(id=1, name="T", wiki_token="w", test_case_table_id="tbl"))
+        db.add_all([TestRunConfig(id=10, team_id=1, name="R1"), TestRunConfig(id=20, team_id=1, name="R2")])
+        db.commit()
+    yield Session
+    engine.dispose()
+
+
+def _counts(db, config_id):
+    row = db.execute(text(
+        "SELECT total_test_cases, executed_cases, passed_cases, failed_cases, retest_cases, "
+        "not_available_cases, unique_bug_tickets FROM test_run_configs WHERE id = :id"
+    ), {"id": config_id}).one()
+    return tuple(row)
+
+
+def test_counters_follow_orm_bulk_and_raw_writes(session_factory):
+    with session_factory() as db:
+        db.add_all([
+            TestRunItem(id=1, team_id=1, config_id=10, test_case_number="TC-1",
+                        test_result=TestResultStatus.PASSED, bug_tickets_json=_tickets("BUG-1", "bug-2")),
+            TestRunItem(id=2, team_id=1, config_id=10, test_case_number="TC-2",
+                        test_result=TestResultStatus.FAILED, bug_tickets_json=_tickets("BUG-1")),
+            TestRunItem(id=3, team_id=1, config_id=10, test_case_number="TC-3"),
+        ])
+        db.commit()
+        assert _counts(db, 10) == (3, 2, 1, 1, 0, 0, 2)
+
+        # ORM 單筆更新
+        item = db.get(TestRunItem, 3)
+        item.test_result = TestResultStatus.RETEST
+        db.commit()
+        assert _counts(db, 10) == (3, 3, 1, 1, 1, 0, 2)
+
+        # Core 批次更新與原生 SQL
+        db.execute(update(TestRunItem).where(TestRunItem.id.in_([1, 2])).values(test_result=None))
+        db.execute(text("UPDATE test_run_items SET test_result = 'NOT_AVAILABLE' WHERE id = 3"))
+        db.commit()
+        assert _counts(db, 10) == (3, 1, 0, 0, 0, 1, 2)
+
+        # 移到另一個配置、刪除
+        db.execute(text("UPDATE test_run_items SET config_id = 20 WHERE id = 1"))
+        db.delete(db.get(TestRunItem, 3))
+        db.commit()
+        assert _counts(db, 10) == (1, 0, 0, 0, 0, 0, 1)
+        assert _counts(db, 20) == (1, 0, 0, 0, 0, 0, 2)
+        assert _compute_item_statistics(db, 1, 20)["unique_bug_tickets_count"] == 2
+
+
+def test_bug_ticket_refs_count_unique_tickets(session_factory):
+    with session_factory() as db:
+        db.add_all([
+            TestRunItem(id=1, team_id=1, config_id=10, test_case_number="TC-1", bug_tickets_json=_tickets("BUG-1")),
+            TestRunItem(id=2, team_id=1, config_id=10, test_case_number="TC-2",
+                        bug_tickets_json=_tickets("bug-1", "BUG-1")),
+            TestRunItem(id=3, team_id=1, config_id=10, test_case_number="TC-3", bug_tickets_json="not json"),
+        ])
+        db.commit()
+        assert _counts(db, 10)[-1] == 1
+
+        db.execute(text("UPDATE test_run_items SET bug_tickets_json = :t WHERE id = 1"), {"t": _tickets("BUG-1", "BUG-9")})
+        db.commit()
+        assert _counts(db, 10)[-1] == 2
+
+        db.execute(text("UPDATE test_run_items SET bug_tickets_json = NULL WHERE id IN (1, 2)"))
+        db.commit()
+        assert _counts(db, 10)[-1] == 0
+        assert db.execute(text("SELECT COUNT(*) FROM test_run_bug_tickets")).scalar() == 0
+
+
+def test_verify_reports_and_repairs_drift(session_factory):
+    with session_factory() as db:
+        db.add_all([
+            TestRunItem(id=1, team_id=1, config_id=10, test_case_number="TC-1",
+                        test_result=TestResultStatus.PASSED, bug_tickets_json=_tickets("BUG-1")),
+            TestRunItem(id=2, team_id=1, config_id=10, test_case_number="TC-2"),
+        ])
+        db.commit()
+        assert run_counter_service.verify_counters(db)["mismatches"] == []
+
+        db.execute(text("UPDATE test_run_configs SET passed_cases = 5, unique_bug_tickets = 0 WHERE id = 10"))
+        db.execute(text("DELETE FROM test_run_bug_tickets"))
+        db.commit()
+        result = run_counter_service.verify_counters(db, repair=True)
+        db.commit()
+
+        assert result["checked"] == 2 and result["repaired"] == 1
+        assert set(result["mismatches"][0]["fields"]) == {"passed_cases", "unique_bug_tickets", "bug_ticket_refs"}
+        assert _counts(db, 10) == (2, 1, 1, 0, 0, 0, 1)
+        assert run_counter_service.verify_counters(db)["mismatches"] == []
+
+
+def test_ensure_installs_triggers_and_backfills_existing_database(session_factory):
+    with session_factory() as db:
+        engine = db.get_bind()
+        with engine.begin() as conn:
+            for (name,) in conn.exec_driver_sql(
+                    "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE '%counts%'").fetchall():
+                conn.exec_driver_sql(f"DROP TRIGGER {name}")
+        db.add(TestRunItem(id=1, team_id=1, config_id=10, test_case_number="TC-1",
+                           test_result=TestResultStatus.FAILED))
+        db.commit()
+        assert _counts(db, 10)[:2] == (0, 0)
+
+        assert run_counter_service.ensure_run_counters(engine)
+        assert _counts(db, 10)[:4] == (1, 1, 0, 1)
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.models.database_models import ScheduledTaskState
+from app.services.scheduler import TaskScheduler
+from app.utils.cron import CronExpression
+
+
+def test_cron_next_after():
+    base = datetime(2024, 1, 31, 23, 59, 30)
+    assert CronExpression("0 */2 * * *").next_after(base) == datetime(2024, 2, 1, 0, 0)
+    assert CronExpression("30 3 * * *").next_after(datetime(2024, 1, 1, 3, 30)) == datetime(2024, 1, 2, 3, 30)
+    # 2024-01-06 為星期六；週欄位 7 代表星期日
+    assert CronExpression("0 9 * * 7").next_after(datetime(2024, 1, 6, 10, 0)) == datetime(2024, 1, 7, 9, 0)
+    assert CronExpression("@monthly").next_after(base) == datetime(2024, 2, 1, 0, 0)
+    with pytest.raises(ValueError):
+        CronExpression("61 * * * *")
+
+
+def _factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'scheduler.db'}")
+    return sessionmaker(bind=engine)
+
+
+def test_schedule_persists_across_instances(tmp_path):
+    factory = _factory(tmp_path)
+    first = TaskScheduler(session_factory=factory)
+    first.register_task("job", lambda: None, cron="0 3 * * *", run_immediately=True)
+    # 從未執行過：立即排入
+    assert first.tasks["job"]["next_run"] <= datetime.now()
+
+    db = factory()
+    state = db.query(ScheduledTaskState).filter_by(name="job").one()
+    planned = datetime.now() + timedelta(hours=5)
+    state.last_run_at = datetime.now() - timedelta(hours=1)
+    state.next_run_at = planned
+    state.run_count = 3
+    db.commit()
+    db.close()
+
+    second = TaskScheduler(session_factory=factory)
+    second.register_task("job", lambda: None, cron="0 3 * * *", run_immediately=True)
+    assert second.tasks["job"]["next_run"] == planned
+    assert second.get_task_status()["tasks"]["job"]["run_count"] == 3
+
+    # 排程變更時重新計算
+    third = TaskScheduler(session_factory=factory)
+    third.register_task("job", lambda: None, interval_hours=1)
+    assert third.tasks["job"]["next_run"] != planned
+
+
+def test_overlap_skip_and_timeout(tmp_path):
+    release = threading.Event()
+
+    async def scenario():
+        scheduler = TaskScheduler(session_factory=_factory(tmp_path))
+        scheduler.running = True
+        scheduler._loop = asyncio.get_running_loop()
+        from concurrent.futures import ThreadPoolExecutor
+        scheduler._executor = ThreadPoolExecutor(max_workers=2)
+        scheduler.register_task("slow", lambda: release.wait(5), interval_hours=1, timeout_seconds=0.1)
+        info = scheduler.tasks["slow"]
+
+        scheduler._dispatch("slow", info, datetime.now())
+        await asyncio.sleep(0.3)
+        # 逾時後執行緒仍在跑：再次到期時略過
+        scheduler._dispatch("slow", info, datetime.now())
+        release.set()
+        await asyncio.sleep(0.1)
+
+        status = scheduler.get_task_status()["tasks"]["slow"]
+        scheduler.stop()
+        return status
+
+    status = asyncio.run(scenario())
+    assert status["timeout_count"] == 1
+    assert status["skipped_overlaps"] == 1
+    assert status["last_status"] == "timeout"
+    assert status["running"] is False
+    assert status["duration"]["samples"] == 1
@@ -0,0 +1,61 @@
+import logging
+from pathlib import Path
+import sys
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.middlewares import SQLProfilerMiddleware
+from app.services import sql_profiler
+
+
+def test_fingerprint_normalizes_literals_and_in_lists():
+    a = sql_profiler.fingerprint("SELECT * FROM t WHERE id = 5 AND name = 'x'  AND k IN (?, ?, ?)")
+    b = sql_profiler.fingerprint("SELECT *\n FROM t WHERE id = 42 AND name = 'it''s' AND k IN (?)")
+    assert a == b == "SELECT * FROM t WHERE id = ? AND name = ? AND k IN (...)"
+
+
+def test_middleware_reports_queries_and_n_plus_one(tmp_path, caplog):
+    sync_engine = create_engine(f"sqlite:///{tmp_path / 'p.db'}")
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'p.db'}")
+    sql_profiler.install(sync_engine)
+    sql_profiler.install(async_engine.sync_engine)
+
+    app = FastAPI()
+    app.add_middleware(SQLProfilerMiddleware, n_plus_one_threshold=5, slow_query_ms=10_000)
+
+    @app.get("/sync")
+    def sync_items():
+        with sync_engine.connect() as conn:
+            for i in range(6):
+                conn.execute(text("SELECT :i"), {"i": i})
+        return {}
+
+    @app.get("/async")
+    async def async_items():
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            await conn.execute(text("SELECT 2"))
+        return {}
+
+    with caplog.at_level(logging.WARNING, logger="app.sql_profiler.slow"), TestClient(app) as client:
+        response = client.get("/sync")
+        assert response.headers["server-timing"].startswith("db;dur=")
+        assert response.headers["server-timing"].endswith('desc="6 queries"')
+        assert any("N+1" in r.getMessage() and "GET /sync" in r.getMessage() for r in caplog.records)
+
+        caplog.clear()
+        response = client.get("/async")
+        assert response.headers["server-timing"].endswith('desc="2 queries"')
+        assert not any("N+1" in r.getMessage() for r in caplog.records)
+
+    # 請求外的查詢不記錄
+    with sync_engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert sql_profiler.current_profile() is None
@@ -0,0 +1,65 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+from sqlalchemy import create_engine, inspect
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.services.tcg_converter import TCGConverter
+from scripts.profile_startup import parse_importtime, summarize
+
+SAMPLE = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     yaml.reader
+import time:       300 |        420 |   yaml
+import time:      5000 |       5000 |     casbin.core
+import time:       100 |       5100 |   casbin
+import time:      2000 |       7500 | app.main
+"""
+
+
+def test_importtime_summary_flags_heavy_modules():
+    entries = parse_importtime(SAMPLE)
+    assert [e["depth"] for e in entries] == [2, 1, 2, 1, 0]
+    report = summarize(entries, top=2)
+    assert report["total_ms"] == 7.5
+    assert report["top_self"][0] == {"module": "casbin.core", "self_ms": 5.0}
+    assert report["packages"][0] == {"package": "casbin", "self_ms": 5.1}
+    assert report["eager_heavy_modules"] == ["casbin"]
+
+
+def test_importing_app_defers_heavy_modules_and_db_setup():
+    code = (
+        "import json, sys\n"
+        "import app.main\n"
+        "from app.auth.permission_service import permission_service\n"
+        "from app.services.tcg_converter import tcg_converter\n"
+        "print(json.dumps({\n"
+        "    'modules': sorted(m for m in ('casbin', 'aiohttp', 'reportlab') if m in sys.modules),\n"
+        "    'scheduler_imported': 'app.services.scheduler' in sys.modules,\n"
+        "    'policy_loaded': permission_service._loaded,\n"
+        "    'tcg_db_ready': tcg_converter._db_ready,\n"
+        "    'api_routes': sum(1 for r in app.main.app.routes if getattr(r, 'path', '').startswith('/api/')),\n"
+        "}))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=str(PROJECT_ROOT),
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr[-2000:]
+    state = json.loads(result.stdout.strip().splitlines()[-1])
+    assert state["modules"] == []
+    assert not state["scheduler_imported"]
+    assert not state["policy_loaded"] and not state["tcg_db_ready"]
+    assert state["api_routes"] > 100
+
+
+def test_tcg_converter_creates_table_on_first_use(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tcg.db'}")
+    converter = TCGConverter(engine=engine)
+    assert "tcg_records" not in inspect(engine).get_table_names()
+
+    assert converter.count_records() == 0
+    assert "tcg_records" in inspect(engine).get_table_names()
+    engine.dispose()
@@ -0,0 +1,47 @@
+from pathlib import Path
+import sys
+
+from sqlalchemy import create_engine, event, text
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.services.tcg_converter import TCGConverter
+
+
+def _record(record_id, number, title):
+    return {"record_id": record_id, "fields": {"TCG Tickets": [{"text": number, "type": "text"}], "Title": title}}
+
+
+def test_incremental_sync_applies_only_changes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tcg.db'}")
+    converter = TCGConverter(engine=engine)
+    converter.SYNC_BATCH_SIZE = 2
+
+    initial = [_record(f"rec{i}", f"TCG-{i}", f"Ticket {i}") for i in range(5)]
+    assert converter._incremental_sync_records(initial) == 5
+    assert converter.get_sync_stats()["inserted"] == 5
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    changed = initial[:3] + [_record("rec3", "TCG-3", "Renamed"), _record("rec9", "TCG-9", "New")]
+    assert converter._incremental_sync_records(changed) == 5
+
+    stats = converter.get_sync_stats()
+    assert (stats["inserted"], stats["updated"], stats["deleted"], stats["unchanged"]) == (1, 1, 1, 3)
+    assert stats["changes"] == 3
+    assert stats["duration_seconds"] >= 0
+    # 不再整表清空重建
+    assert not any(s.strip().upper() == "DELETE FROM TCG_RECORDS" for s in statements)
+
+    with engine.connect() as conn:
+        rows = dict(conn.execute(text("SELECT tcg_number, title FROM tcg_records")).all())
+    assert rows == {"TCG-0": "Ticket 0", "TCG-1": "Ticket 1", "TCG-2": "Ticket 2",
+                    "TCG-3": "Renamed", "TCG-9": "New"}
+    assert converter.count_records() == 5
+
+    # 無變更時不寫入
+    converter._incremental_sync_records(changed)
+    assert converter.get_sync_stats()["changes"] == 0
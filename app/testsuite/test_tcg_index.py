@@ -0,0 +1,49 @@
+from pathlib import Path
+import sys
+
+from sqlalchemy import create_engine, event
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.services.tcg_converter import TCGConverter
+
+
+def _record(record_id, number, title):
+    return {"record_id": record_id, "fields": {"TCG Tickets": [{"text": number, "type": "text"}], "Title": title}}
+
+
+def test_in_memory_index_lookups_and_search(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tcg.db'}")
+    converter = TCGConverter(engine=engine)
+    records = [_record(f"rec{i}", f"TCG-{i}", f"Ticket {i}") for i in (1, 12, 123, 2, 45)]
+    records.append(_record("rec-login", "TCG-777", "Login flow"))
+    converter._incremental_sync_records(records)
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    assert converter.get_record_id_by_tcg_number("TCG-12") == "rec12"
+    assert converter.get_tcg_number_by_record_id("rec45") == "TCG-45"
+    assert converter.resolve_record_ids(["TCG-1", "TCG-999", "TCG-2"]) == {"TCG-1": "rec1", "TCG-2": "rec2"}
+    assert converter.resolve_tcg_numbers(["rec123", "missing"]) == {"rec123": "TCG-123"}
+
+    # 純數字視為 TCG-<數字> 前綴；前綴符合者優先，其後為包含關鍵字者
+    results, total = converter.search_tcg_numbers_with_total("12", 10)
+    assert [r["tcg_number"] for r in results] == ["TCG-12", "TCG-123"]
+    assert total == 2
+    assert [r["tcg_number"] for r in converter.search_tcg_numbers("tcg-1", 10)] == ["TCG-1", "TCG-12", "TCG-123"]
+    assert [r["tcg_number"] for r in converter.search_tcg_numbers("login", 10)] == ["TCG-777"]
+    assert len(converter.search_tcg_numbers("", 3)) == 3
+    # 結果已滿 limit 時停止比對，總數僅為下限
+    results, total = converter.search_tcg_numbers_with_total("ticket", 2)
+    assert [r["tcg_number"] for r in results] == ["TCG-1", "TCG-12"]
+    assert total == 3
+    assert converter.search_tcg_numbers_with_total("tcg", 2)[1] == 6
+    assert statements == []
+
+    # 重新啟動（新實例）時由資料庫載入
+    fresh = TCGConverter(engine=engine)
+    assert fresh.refresh_index() == 6
+    assert fresh.get_record_id_by_tcg_number("TCG-777") == "rec-login"
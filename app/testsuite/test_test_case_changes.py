@@ -0,0 +1,161 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text, update
+from sqlalchemy.orm import sessionmaker
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.auth.dependencies import get_current_user
+from app.auth.models import UserRole
+from app.database import get_sync_db
+from app.main import app
+from app.models.database_models import (
+    DATA_VERSION_SCOPE_TEST_CASE_CHANGES_FLOOR, DATA_VERSION_SCOPE_TEST_CASES,
+    Base, DataVersion, Team, TestCaseChange, TestCaseLocal,
+)
+from app.services import data_version_service
+from app.services.test_case_change_service import compact_test_case_changes, get_test_case_changes
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'changes.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        db.add(Team(id=1, name="A", wiki_token="w", test_case_table_id="t1"))
+        db.add(Team(id=2, name="B", wiki_token="w", test_case_table_id="t2"))
+        db.commit()
+    yield Session
+    engine.dispose()
+
+
+def _add_case(db, case_id, number, team_id=1):
+    db.add(TestCaseLocal(id=case_id, team_id=team_id, test_case_number=number, title=f"case {number}"))
+    db.commit()
+
+
+def test_feed_reports_every_write_path(session_factory):
+    with session_factory() as db:
+        _add_case(db, 1, "TC-1")
+        _add_case(db, 2, "TC-2")
+        _add_case(db, 3, "TC-3")
+        watermark = get_test_case_changes(db, 1, 0)["version"]
+
+        db.execute(update(TestCaseLocal).where(TestCaseLocal.id == 1).values(title="改標題"))
+        db.execute(text("UPDATE test_cases SET test_case_number = 'TC-2B' WHERE id = 2"))
+        db.execute(text("DELETE FROM test_cases WHERE id = 3"))
+        db.commit()
+
+        feed = get_test_case_changes(db, 1, watermark)
+        assert not feed["resync_required"] and not feed["has_more"]
+        assert {c.test_case_number: c.title for c in feed["upserted"]} == {"TC-1": "改標題", "TC-2B": "case TC-2"}
+        assert {d["test_case_number"] for d in feed["deleted"]} == {"TC-2", "TC-3"}
+        assert feed["version"] == data_version_service.get_version(db, DATA_VERSION_SCOPE_TEST_CASES, 1)
+
+        # 移到其他團隊：原團隊視為刪除、新團隊視為新增
+        watermark_b = get_test_case_changes(db, 2, 0)["version"]
+        db.execute(text("UPDATE test_cases SET team_id = 2 WHERE id = 1"))
+        db.commit()
+        assert [d["test_case_number"] for d in get_test_case_changes(db, 1, feed["version"])["deleted"]] == ["TC-1"]
+        assert [c.test_case_number for c in get_test_case_changes(db, 2, watermark_b)["upserted"]] == ["TC-1"]
+
+
+def test_feed_pages_and_keeps_latest_change_per_case(session_factory):
+    with session_factory() as db:
+        for i in range(1, 6):
+            _add_case(db, i, f"TC-{i}")
+        for _ in range(3):
+            db.execute(text("UPDATE test_cases SET title = title || '!' WHERE id = 1"))
+            db.commit()
+
+        seen, since, pages = {}, 0, 0
+        while True:
+            feed = get_test_case_changes(db, 1, since, limit=3)
+            pages += 1
+            seen.update({c.test_case_number: c for c in feed["upserted"]})
+            since = feed["version"]
+            if not feed["has_more"]:
+                break
+        assert pages == 3
+        assert sorted(seen) == [f"TC-{i}" for i in range(1, 6)]
+        assert get_test_case_changes(db, 1, since) == {
+            "team_id": 1, "since": since, "version": since, "has_more": False,
+            "resync_required": False, "upserted": [], "deleted": [],
+        }
+        assert get_test_case_changes(db, 1, since + 5)["resync_required"]
+
+
+def test_compaction_raises_floor_and_requires_resync(session_factory):
+    with session_factory() as db:
+        _add_case(db, 1, "TC-1")
+        _add_case(db, 2, "TC-2")
+        old_watermark = get_test_case_changes(db, 1, 0)["version"]
+        db.execute(text("UPDATE test_cases SET title = 'x' WHERE id = 1"))
+        db.execute(text("DELETE FROM test_cases WHERE id = 2"))
+        db.commit()
+        db.execute(update(TestCaseChange).where(TestCaseChange.op == "delete")
+                   .values(changed_at=datetime.utcnow() - timedelta(days=60)))
+        db.commit()
+
+        result = compact_test_case_changes(db, retention_days=30)
+        db.commit()
+        assert result == {"superseded": 2, "tombstones": 1, "teams_floor_raised": 1}
+        assert db.query(TestCaseChange).count() == 1
+
+        assert get_test_case_changes(db, 1, old_watermark)["resync_required"]
+        floor = data_version_service.get_version(db, DATA_VERSION_SCOPE_TEST_CASE_CHANGES_FLOOR, 1)
+        assert get_test_case_changes(db, 1, floor)["resync_required"] is False
+
+
+def test_existing_database_gets_floor_when_change_log_is_added(session_factory):
+    with session_factory() as db:
+        _add_case(db, 1, "TC-1")
+        db.execute(text("DROP TABLE test_case_changes"))
+        db.execute(text("DELETE FROM data_versions"))
+        db.commit()
+        TestCaseChange.__table__.create(bind=db.get_bind())
+        assert get_test_case_changes(db, 1, 0)["resync_required"]
+        version = data_version_service.get_version(db, DATA_VERSION_SCOPE_TEST_CASES, 1)
+        assert db.get(DataVersion, (DATA_VERSION_SCOPE_TEST_CASE_CHANGES_FLOOR, 1)).version == version
+
+
+def test_changes_endpoint(session_factory):
+    class Admin:
+        id = 1
+        role = UserRole.SUPER_ADMIN
+
+    def override_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    with session_factory() as db:
+        _add_case(db, 1, "TC-1")
+    app.dependency_overrides[get_sync_db] = override_db
+    app.dependency_overrides[get_current_user] = lambda: Admin()
+    try:
+        client = TestClient(app)
+        body = client.get("/api/teams/1/testcases/changes", params={"since": 0}).json()
+        assert [c["test_case_number"] for c in body["upserted"]] == ["TC-1"]
+        assert client.get("/api/teams/1/testcases/changes", params={"since": body["version"]}).json()["upserted"] == []
+
+        # 全量載入帶出 watermark，之後的差異只包含其後的變更
+        listing = client.get("/api/teams/1/testcases/", params={"load_all": "true"})
+        watermark = int(listing.headers["X-Data-Version"])
+        assert watermark == body["version"]
+        with session_factory() as db:
+            _add_case(db, 2, "TC-2")
+        delta = client.get("/api/teams/1/testcases/changes", params={"since": watermark}).json()
+        assert [c["test_case_number"] for c in delta["upserted"]] == ["TC-2"]
+    finally:
+        app.dependency_overrides.pop(get_sync_db, None)
+        app.dependency_overrides.pop(get_current_user, None)
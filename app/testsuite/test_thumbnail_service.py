@@ -0,0 +1,45 @@
+from pathlib import Path
+import asyncio
+import sys
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.services import thumbnail_service as ts
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def test_thumbnail_generated_once_and_cached(tmp_path):
+    src = tmp_path / "20250101-screenshot.png"
+    Image.new("RGBA", (2000, 1000), (255, 0, 0, 128)).save(src)
+    service = ts.ThumbnailService(max_workers=2)
+
+    async def run():
+        return await asyncio.gather(*[service.get_or_create(src, 300) for _ in range(4)])
+
+    results = asyncio.run(run())
+    thumb = results[0]
+    assert all(r == thumb for r in results)
+    assert thumb.parent.name == ts.THUMB_DIR_NAME
+    assert thumb.name.startswith(f"{src.name}.320.")
+    with Image.open(thumb) as img:
+        assert max(img.size) == 320
+    assert service.get_stats()["generated"] == 1
+
+    # 已產生的縮圖直接回傳，不再排入 worker
+    assert asyncio.run(service.get_or_create(src, 320)) == thumb
+    assert service.get_stats()["generated"] == 1
+
+    ts.remove_thumbnails(src)
+    assert not thumb.exists()
+
+
+def test_thumbnail_url_only_for_images():
+    assert ts.thumbnail_url("test-runs/1/2/3/a b.png", "a b.png", "image/png") == \
+        "/api/attachments/thumbnails/test-runs/1/2/3/a%20b.png"
+    assert ts.thumbnail_url("test-runs/1/2/3/log.txt", "log.txt", "text/plain") is None
+    assert ts.thumbnail_url("", "a.png", "image/png") is None
@@ -0,0 +1,209 @@
+import asyncio
+import threading
+import time
+from pathlib import Path
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.models.database_models import Base, CacheInvalidation, ScheduledTaskState, WorkerLease
+from app.services.scheduler import TaskScheduler
+from app.services.worker_coordination import FileLock, InvalidationBus, LeaderLease
+from app.services.write_queue import WriteQueue
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'coord.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine, tables=[
+        WorkerLease.__table__, CacheInvalidation.__table__, ScheduledTaskState.__table__,
+    ])
+    yield engine
+    engine.dispose()
+
+
+def test_lease_is_exclusive_and_taken_over_after_expiry(engine):
+    first = LeaderLease("scheduler", engine, ttl_seconds=0.2, owner="w1")
+    second = LeaderLease("scheduler", engine, ttl_seconds=0.2, owner="w2")
+
+    assert first.try_acquire() and not second.try_acquire()
+    assert first.try_acquire()  # 續約
+    assert second.current_owner() == "w1"
+
+    time.sleep(0.3)
+    assert second.try_acquire() and not first.try_acquire()
+
+    second.release()
+    assert second.current_owner() is None
+    assert first.try_acquire()
+
+
+def test_file_lock_excludes_other_holders(tmp_path):
+    path = tmp_path / "locks" / "sync.lock"
+    holder, other = FileLock(path), FileLock(path)
+
+    assert holder.acquire(blocking=False)
+    assert not other.acquire(blocking=False)
+    holder.release()
+    assert other.acquire(blocking=False)
+    other.release()
+
+
+def test_invalidation_reaches_other_workers_only(engine):
+    queue = WriteQueue(sessionmaker(bind=engine), name="test")
+    sender = InvalidationBus(engine, queue, poll_seconds=0.05, origin="w1", enabled=True)
+    receiver = InvalidationBus(engine, queue, poll_seconds=0.05, origin="w2", enabled=True)
+    received = {"w1": [], "w2": []}
+    sender.subscribe("permissions", received["w1"].append)
+
+    async def on_permissions(key):
+        received["w2"].append(key)
+
+    receiver.subscribe("permissions", on_permissions)
+    receiver.subscribe("contacts", received["w2"].append)
+
+    async def scenario():
+        await sender.start()
+        await receiver.start()
+        sender.broadcast("permissions", "7:")
+        await asyncio.wrap_future(sender.broadcast("contacts"))
+        await asyncio.sleep(0.3)
+        await sender.stop()
+        await receiver.stop()
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        queue.stop()
+    # 發送端不處理自己的訊息
+    assert received == {"w1": [], "w2": ["7:", None]}
+
+
+def test_scheduler_runs_tasks_only_while_holding_lease(engine):
+    ran = threading.Event()
+    other = LeaderLease("scheduler", engine, ttl_seconds=30, owner="w1")
+    assert other.try_acquire()
+
+    async def scenario():
+        from concurrent.futures import ThreadPoolExecutor
+        scheduler = TaskScheduler(session_factory=sessionmaker(bind=engine),
+                                  leader_lease=LeaderLease("scheduler", engine, ttl_seconds=0.3, owner="w2"))
+        scheduler.running = True
+        scheduler._loop = asyncio.get_running_loop()
+        scheduler._wakeup = asyncio.Event()
+        scheduler._executor = ThreadPoolExecutor(max_workers=1)
+        scheduler.register_task("job", ran.set, interval_hours=1, run_immediately=True)
+        scheduler._loop_task = scheduler._loop.create_task(scheduler._scheduler_loop())
+
+        await asyncio.sleep(0.3)
+        follower_ran = ran.is_set()
+        follower_status = scheduler.get_task_status()
+
+        other.release()
+        await asyncio.sleep(0.4)
+        leader = scheduler.is_leader
+        scheduler.stop()
+        return follower_ran, follower_status, leader
+
+    follower_ran, follower_status, leader = asyncio.run(scenario())
+    assert not follower_ran and not follower_status["is_leader"]
+    assert leader and ran.is_set()
+    # 停止時釋放租約
+    assert other.current_owner() is None
+
+
+def test_follower_manual_trigger_keeps_leader_state(engine):
+    from datetime import datetime, timedelta
+    ran = threading.Event()
+    Session = sessionmaker(bind=engine)
+    planned = datetime.now() + timedelta(hours=5)
+    with Session() as db:
+        db.add(ScheduledTaskState(name="job", schedule="interval:1h", next_run_at=planned, run_count=3))
+        db.commit()
+    leader = LeaderLease("scheduler", engine, ttl_seconds=30, owner="w1")
+    assert leader.try_acquire()
+
+    async def scenario():
+        from concurrent.futures import ThreadPoolExecutor
+        scheduler = TaskScheduler(session_factory=Session,
+                                  leader_lease=LeaderLease("scheduler", engine, ttl_seconds=30, owner="w2"))
+        scheduler.running = True
+        scheduler._loop = asyncio.get_running_loop()
+        scheduler._wakeup = asyncio.Event()
+        scheduler._executor = ThreadPoolExecutor(max_workers=1)
+        scheduler.register_task("job", ran.set, interval_hours=1)
+        assert scheduler.trigger_task("job")
+        await asyncio.sleep(0.3)
+        scheduler._executor.shutdown(wait=True)
+
+    asyncio.run(scenario())
+    assert ran.is_set()
+    with Session() as db:
+        state = db.query(ScheduledTaskState).filter_by(name="job").one()
+        assert (state.run_count, state.next_run_at) == (3, planned)
+
+
+def test_partial_org_sync_skips_while_another_worker_holds_lock(tmp_path):
+    from unittest.mock import MagicMock
+    from app.services.lark_org_sync_service import LarkOrgSyncService
+
+    path = tmp_path / "lark_org_sync.lock"
+    service = LarkOrgSyncService.__new__(LarkOrgSyncService)
+    service.logger = MagicMock()
+    service.user_service = MagicMock()
+    service.department_service = MagicMock()
+    service.root_departments = []
+    service._sync_lock = FileLock(path)
+    service.user_service.sync_all_users.return_value = {"success": True}
+
+    other = FileLock(path)
+    assert other.acquire(blocking=False)
+    assert not service.sync_users_only()["success"]
+    assert not service.sync_departments_only()["success"]
+    service.user_service.sync_all_users.assert_not_called()
+    service.department_service.sync_all_departments.assert_not_called()
+
+    other.release()
+    assert service.sync_users_only() == {"success": True}
+    # 同步結束後釋放鎖
+    assert other.acquire(blocking=False)
+    other.release()
+
+
+def test_login_challenge_verifies_on_another_worker(tmp_path, monkeypatch):
+    from contextlib import asynccontextmanager
+    from datetime import datetime, timedelta
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from app.auth import session_service as session_module
+
+    async def scenario():
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'auth.db'}")
+        factory = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
+        @asynccontextmanager
+        async def fake_session():
+            async with factory() as session:
+                yield session
+
+        monkeypatch.setattr(session_module, "get_async_session", fake_session)
+        issuer, verifier = session_module.SessionService(), session_module.SessionService()
+        expires_at = datetime.utcnow() + timedelta(minutes=5)
+        try:
+            assert await issuer.store_challenge("alice", "old", expires_at)
+            assert await issuer.store_challenge("alice", "c1", expires_at)  # 重新索取時覆寫
+            assert not await verifier.verify_challenge("alice", "old")
+            assert await verifier.verify_challenge("alice", "c1")
+            assert not await issuer.verify_challenge("alice", "c1")  # 一次性使用
+
+            await issuer.store_challenge("bob", "c2", datetime.utcnow() - timedelta(seconds=1))
+            assert not await verifier.verify_challenge("bob", "c2")
+        finally:
+            await async_engine.dispose()
+
+    asyncio.run(scenario())
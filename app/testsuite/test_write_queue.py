@@ -0,0 +1,133 @@
+import asyncio
+from pathlib import Path
+import sys
+import threading
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.services.write_queue import WriteQueue
+
+
+@pytest.fixture
+def queue_and_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'wq.db'}", connect_args={"check_same_thread": False})
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT NOT NULL)"))
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+    queue = WriteQueue(sessionmaker(bind=engine), name="test")
+    yield queue, engine, commits
+    queue.stop()
+    engine.dispose()
+
+
+def _insert(value):
+    def fn(session):
+        session.execute(text("INSERT INTO t (v) VALUES (:v)"), {"v": value})
+        return value
+    return fn
+
+
+def test_waiting_jobs_are_group_committed(queue_and_engine):
+    queue, engine, commits = queue_and_engine
+    started, gate = threading.Event(), threading.Event()
+
+    def blocker(session):
+        started.set()
+        gate.wait(5)
+        return _insert("first")(session)
+
+    first = queue.submit(blocker)
+    started.wait(5)
+    futures = [queue.submit(_insert(f"v{i}")) for i in range(10)]
+    gate.set()
+
+    assert first.result(5) == "first"
+    assert [f.result(5) for f in futures] == [f"v{i}" for i in range(10)]
+    # 阻塞期間排隊的 10 筆合併為一次 commit
+    assert len(commits) == 2
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM t")).scalar() == 11
+
+
+def test_failing_job_does_not_affect_its_batch(queue_and_engine):
+    queue, engine, _ = queue_and_engine
+    started, gate = threading.Event(), threading.Event()
+    queue.submit(lambda session: started.set() or gate.wait(5))
+    started.wait(5)
+
+    def broken(session):
+        session.execute(text("INSERT INTO t (v) VALUES (NULL)"))
+
+    ok_before = queue.submit(_insert("a"))
+    failed = queue.submit(broken)
+    ok_after = queue.submit(_insert("b"))
+    gate.set()
+
+    assert ok_before.result(5) == "a" and ok_after.result(5) == "b"
+    with pytest.raises(Exception):
+        failed.result(5)
+    with engine.connect() as conn:
+        assert [r[0] for r in conn.execute(text("SELECT v FROM t ORDER BY id"))] == ["a", "b"]
+
+
+def test_async_run_and_stop_drains(queue_and_engine):
+    queue, engine, _ = queue_and_engine
+
+    async def scenario():
+        return await asyncio.gather(*(queue.run(_insert(str(i))) for i in range(20)))
+
+    assert asyncio.run(scenario()) == [str(i) for i in range(20)]
+    pending = [queue.submit(_insert("late")) for _ in range(5)]
+    queue.stop()
+    assert all(f.done() for f in pending)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM t")).scalar() == 25
+
+
+def test_item_create_and_delete_go_through_write_queue(tmp_path, monkeypatch):
+    from app.api import test_run_items
+    from app.models.database_models import Base, Team, TestCaseLocal, TestRunConfig, TestRunItem
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'items.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        db.add(Team(id=1, name="T", wiki_token="w", test_case_table_id="tbl"))
+        db.add(TestRunConfig(id=10, team_id=1, name="R1"))
+        db.add_all([TestCaseLocal(team_id=1, test_case_number=f"TC-{n}", title=f"Case {n}") for n in (1, 2)])
+        db.commit()
+
+    queue = WriteQueue(Session, name="test")
+    jobs = []
+    submit = queue.submit
+    monkeypatch.setattr(queue, "submit", lambda fn, group=True: jobs.append(group) or submit(fn, group))
+    monkeypatch.setattr(test_run_items, "get_write_queue", lambda: queue)
+
+    async def scenario():
+        def payload(*numbers):
+            return test_run_items.BatchCreateRequest(items=[{"test_case_number": n} for n in numbers])
+
+        with Session() as db:
+            created = await test_run_items.batch_create_items(1, 10, payload("TC-1", "TC-404"), db)
+            assert (created.created_count, created.skipped_duplicates, len(created.errors)) == (1, 0, 1)
+            created = await test_run_items.batch_create_items(1, 10, payload("TC-1", "TC-2"), db)
+            assert (created.created_count, created.skipped_duplicates, len(created.errors)) == (1, 1, 0)
+            item_id = db.query(TestRunItem.id).filter_by(test_case_number="TC-1").scalar()
+            await test_run_items.delete_item(1, 10, item_id, db)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        queue.stop()
+    # 批次建立單獨提交，刪除可與其他工作合併
+    assert jobs == [False, False, True]
+    with Session() as db:
+        assert [i.test_case_number for i in db.query(TestRunItem).all()] == ["TC-2"]
+    engine.dispose()
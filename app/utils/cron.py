@@ -0,0 +1,100 @@
+"""
+Cron 表達式工具
+
+支援標準 5 欄位格式（分 時 日 月 週）：
+- `*`、數值、範圍 `1-5`、清單 `1,15`、間隔 `*/15` 或 `8-18/2`
+- 週欄位 0 與 7 皆代表星期日
+- 日與週同時限定時，任一符合即觸發（與 Vixie cron 相同）
+- 別名：@hourly、@daily、@weekly、@monthly
+"""
+
+from datetime import datetime, timedelta
+from typing import List, Set, Tuple
+
+_ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+}
+
+_FIELD_RANGES: List[Tuple[int, int]] = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+# 搜尋上限：約 5 年（避免如 2/30 這類永遠不會符合的表達式造成無窮迴圈）
+_MAX_SEARCH_DAYS = 366 * 5
+
+
+class CronExpression:
+    """已解析的 cron 表達式"""
+
+    def __init__(self, expression: str):
+        self.expression = expression.strip()
+        expr = _ALIASES.get(self.expression.lower(), self.expression)
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron 表達式需為 5 個欄位: {expression!r}")
+
+        parsed = [self._parse_field(f, lo, hi) for f, (lo, hi) in zip(fields, _FIELD_RANGES)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        # 0 與 7 皆為星期日
+        self.weekdays = {d % 7 for d in weekdays}
+        self._days_restricted = fields[2] != "*"
+        self._weekdays_restricted = fields[4] != "*"
+
+    @staticmethod
+    def _parse_field(field: str, lo: int, hi: int) -> Set[int]:
+        values: Set[int] = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step_str = part.split("/", 1)
+                step = int(step_str)
+                if step <= 0:
+                    raise ValueError(f"cron 間隔需為正數: {field!r}")
+            if part == "*":
+                start, end = lo, hi
+            elif "-" in part:
+                start_str, end_str = part.split("-", 1)
+                start, end = int(start_str), int(end_str)
+            else:
+                start = int(part)
+                end = hi if step > 1 else start
+            if start < lo or end > hi or start > end:
+                raise ValueError(f"cron 欄位超出範圍 {lo}-{hi}: {field!r}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, dt: datetime) -> bool:
+        # Python weekday(): 週一=0；cron: 週日=0
+        cron_weekday = (dt.weekday() + 1) % 7
+        day_ok = dt.day in self.days
+        weekday_ok = cron_weekday in self.weekdays
+        if self._days_restricted and self._weekdays_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, after: datetime) -> datetime:
+        """回傳嚴格晚於 after 的下一個觸發時間（保留 after 的時區資訊）"""
+        dt = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = after + timedelta(days=_MAX_SEARCH_DAYS)
+        while dt <= limit:
+            if dt.month not in self.months:
+                # 跳到下個月 1 日 00:00
+                year, month = (dt.year + 1, 1) if dt.month == 12 else (dt.year, dt.month + 1)
+                dt = dt.replace(year=year, month=month, day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+                continue
+            if dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+                continue
+            return dt
+        raise ValueError(f"cron 表達式找不到下一個觸發時間: {self.expression!r}")
+
+    def __repr__(self) -> str:
+        return f"CronExpression({self.expression!r})"
@@ -0,0 +1,58 @@
+"""
+大型列表回應的快速 JSON 輸出
+
+列表 API 預設會先建立 Pydantic 模型、再由 FastAPI 依 response_model 驗證與序列化一次；
+數千筆時大部分時間花在這兩次轉換。快速路徑直接由資料列組出與 response_model
+輸出相同的 dict，回傳 FastJSONResponse 一次編碼（有 orjson 時使用 orjson）。
+
+- datetime 以 isoformat 輸出（與 FastAPI 對 naive datetime 的輸出相同）
+- Enum 輸出其值
+- FAST_JSON_RESPONSES=false 可關閉快速路徑，改回 Pydantic 驗證（排查輸出差異用）
+"""
+
+import json
+import os
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Optional
+
+from starlette.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # 未安裝時退回標準庫 json
+    orjson = None
+
+FAST_JSON_ENABLED = os.getenv("FAST_JSON_RESPONSES", "true").lower() == "true"
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    return str(value)
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def fast_json_response(content: Any, response: Optional[Response] = None, status_code: int = 200) -> FastJSONResponse:
+    """建立快速 JSON 回應；帶入路由注入的 response 時沿用其標頭（直接回傳 Response 時 FastAPI 不會合併）"""
+    result = FastJSONResponse(content, status_code=status_code)
+    if response is not None:
+        result.raw_headers.extend(
+            (key, value) for key, value in response.raw_headers
+            if key not in (b"content-length", b"content-type")
+        )
+    return result
@@ -0,0 +1,89 @@
+"""
+本地檔案回應工具
+
+為附件下載提供支援 HTTP 快取與斷點續傳的檔案回應：
+- Range / If-Range：交由 Starlette FileResponse 處理（206 / 416）
+- ETag：有儲存雜湊（sha256）時使用強 ETag，否則沿用 mtime+size 產生的 ETag
+- If-None-Match / If-Modified-Since：命中時直接回 304，不讀檔
+- 伺服器支援 http.response.pathsend 擴充時，FileResponse 會改用零拷貝傳送
+"""
+
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Optional, Dict
+
+from fastapi import Request
+from starlette.responses import FileResponse, Response
+
+# 附件內容以 stored_name 區分，檔案寫入後不會變動；仍保留 revalidate 以處理覆寫情況
+DEFAULT_CACHE_CONTROL = "private, max-age=3600, must-revalidate"
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """依 RFC 7232 弱比對規則判斷 If-None-Match 是否命中"""
+    if if_none_match.strip() == "*":
+        return True
+    target = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == target:
+            return True
+    return False
+
+
+def _not_modified_since(if_modified_since: str, mtime: float) -> bool:
+    try:
+        ims = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if ims is None:
+        return False
+    return int(mtime) <= int(ims.timestamp())
+
+
+def build_file_response(
+    request: Request,
+    path: Path,
+    media_type: Optional[str] = None,
+    sha256: Optional[str] = None,
+    cache_control: str = DEFAULT_CACHE_CONTROL,
+    extra_headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """建立支援 Range / ETag / 304 的本地檔案回應"""
+    stat_result = os.stat(path)
+    headers: Dict[str, str] = {
+        "Cache-Control": cache_control,
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        # 標示為 identity，避免 GZipMiddleware 重新壓縮導致 Content-Length / Range 失真
+        "Content-Encoding": "identity",
+    }
+    if sha256:
+        headers["ETag"] = f'"{sha256}"'
+    if extra_headers:
+        headers.update(extra_headers)
+
+    response = FileResponse(
+        path,
+        headers=headers,
+        media_type=media_type or "application/octet-stream",
+        stat_result=stat_result,
+    )
+
+    etag = response.headers.get("etag", "")
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        not_modified = bool(etag) and etag_matches(if_none_match, etag)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        not_modified = bool(if_modified_since) and _not_modified_since(if_modified_since, stat_result.st_mtime)
+
+    if not_modified:
+        keep = ("etag", "last-modified", "cache-control")
+        return Response(
+            status_code=304,
+            headers={k: v for k, v in response.headers.items() if k in keep},
+        )
+    return response
@@ -42,10 +42,14 @@ from app.models.database_models import (
     User, UserTeamPermission, ActiveSession, PasswordResetToken,  # 認證系統相關表
     Team, TestRunConfig, TestRunItem, TestRunItemResultHistory,
     TCGRecord, LarkDepartment, LarkUser, SyncHistory,
+    AttachmentIndex,
+    ScheduledTaskState,
 )
 from sqlalchemy import create_engine
 
 from app.audit import audit_db_manager, AuditLogTable
+from app.services.data_version_service import ensure_data_version_triggers
+from app.services.run_counter_service import ensure_run_counters
 
 # -----------------------------
 # 輔助輸出（繁體中文）
@@ -79,6 +83,7 @@ IMPORTANT_TABLES: List[str] = [
     "user_team_permissions", 
     "active_sessions",
     "password_reset_tokens",
+    "login_challenges",
     # 測試系統相關表
     "teams",
     "test_run_configs",
@@ -88,6 +93,14 @@ IMPORTANT_TABLES: List[str] = [
     "lark_departments",
     "lark_users",
     "sync_history",
+    "attachment_index",
+    "scheduled_task_state",
+    "data_versions",
+    "test_case_changes",
+    "live_events",
+    "worker_leases",
+    "cache_invalidations",
+    "test_run_bug_tickets",
 ]
 
 AUDIT_TABLES: List[str] = [
@@ -200,6 +213,10 @@ COLUMN_CHECKS: Dict[str, List[ColumnSpec]] = {
         ColumnSpec("notify_chat_ids_json", "TEXT", nullable=True, default=None),
         ColumnSpec("notify_chat_names_snapshot", "TEXT", nullable=True, default=None),
         ColumnSpec("notify_chats_search", "TEXT", nullable=True, default=None),
+        # 由 trigger 維護的統計欄位（補上後由 ensure_run_counters 安裝 trigger 並重算）
+        ColumnSpec("retest_cases", "INTEGER", nullable=False, default=0),
+        ColumnSpec("not_available_cases", "INTEGER", nullable=False, default=0),
+        ColumnSpec("unique_bug_tickets", "INTEGER", nullable=False, default=0),
     ],
     # TestCaseLocal 需要新增的附件標記欄位
     "test_cases": [
@@ -399,6 +416,9 @@ def create_all_tables(engine: Engine, logger: Logger):
         
         # 執行 FK 修正
         ensure_test_run_item_history_fk(engine, logger)
+
+        # 資料版本 trigger（既有資料表不會觸發 after_create，需補建）
+        ensure_data_version_triggers(engine)
         
         logger.info("資料表確認完成")
     except SQLAlchemyError as e:
@@ -840,6 +860,12 @@ def main(argv: Optional[List[str]] = None) -> int:
         elif constraint_changes:
             logger.info("如需自動修復約束變更，可使用 --auto-fix 參數。")
 
+        # Test Run 統計計數 trigger（需上方補齊計數欄位；首次安裝時重算既有配置）
+        if ensure_run_counters(engine):
+            logger.info("Test Run 統計計數 trigger 已就緒")
+        else:
+            logger.warn("Test Run 統計計數 trigger 未安裝（缺少計數欄位），請使用 --auto-fix 參數。")
+
         # 索引確保
         ensure_indexes(engine, logger)
 
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+資料庫連線開銷基準測試
+
+比較兩種異步連線方式在並發下「開會話 → 單筆查詢 → 關閉」的吞吐量與延遲：
+- nullpool：每個會話新建 aiosqlite 連線（含背景執行緒）並重設 PRAGMA（舊行為）
+- pooled：app.database 的唯讀連線池（連線重複使用，PRAGMA 只設定一次）
+
+未指定 --db 時於暫存目錄建立測試資料表。
+
+使用方式：
+  python scripts/benchmark_db_connections.py
+  python scripts/benchmark_db_connections.py --concurrency 32 --sessions 200 --output conn.json
+  python scripts/benchmark_db_connections.py --db /tmp/bench.db --table test_run_items
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 確保可從專案根目錄匯入 app 套件
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+SCRIPTS_DIR = Path(__file__).resolve().parent
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.database import READ_POOL_SIZE, configure_sqlite_connection, create_sqlite_engine
+from benchmark_load import summarize
+
+
+def create_fixture(path: Path, rows: int) -> str:
+    conn = sqlite3.connect(str(path))
+    try:
+        conn.execute("CREATE TABLE bench_rows (id INTEGER PRIMARY KEY, title TEXT NOT NULL)")
+        conn.executemany("INSERT INTO bench_rows (id, title) VALUES (?, ?)",
+                         ((i, f"row {i}") for i in range(1, rows + 1)))
+        conn.commit()
+    finally:
+        conn.close()
+    return "bench_rows"
+
+
+def nullpool_engine(db_path: Path):
+    """重現改版前的設定：NullPool，每次連線都重新執行 PRAGMA"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}", poolclass=NullPool,
+                                 connect_args={"check_same_thread": False})
+    event.listen(engine.sync_engine, "connect", lambda dbapi_conn, record: configure_sqlite_connection(dbapi_conn))
+    return engine
+
+
+async def drive(engine, table: str, max_id: int, concurrency: int, sessions: int) -> dict:
+    factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    statement = text(f"SELECT * FROM {table} WHERE id = :id")
+    latencies = []
+    errors = 0
+
+    async def worker(offset: int):
+        nonlocal errors
+        for n in range(sessions):
+            started = time.perf_counter()
+            try:
+                async with factory() as session:
+                    (await session.execute(statement, {"id": 1 + (offset * sessions + n) % max_id})).first()
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    # 暖身：讓連線池先建立連線，量測穩定狀態
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    latencies.clear()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    result = summarize(latencies, errors, time.perf_counter() - started)
+    await engine.dispose()
+    return result
+
+
+async def run(db_path: Path, table: str, concurrency: int, sessions: int, pool_size: int) -> dict:
+    conn = sqlite3.connect(str(db_path))
+    try:
+        max_id = conn.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0] or 1
+    finally:
+        conn.close()
+    return {
+        "nullpool": await drive(nullpool_engine(db_path), table, max_id, concurrency, sessions),
+        "pooled": await drive(
+            create_sqlite_engine(db_path, "bench_read", read_only=True, pool_size=pool_size),
+            table, max_id, concurrency, sessions,
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較 NullPool 與連線池的連線開銷")
+    parser.add_argument('--db', type=str, default=None, help='既有 SQLite 資料庫（未指定則建立暫存資料表）')
+    parser.add_argument('--table', type=str, default=None, help='以主鍵查詢的資料表（搭配 --db）')
+    parser.add_argument('--rows', type=int, default=10_000, help='暫存資料表筆數')
+    parser.add_argument('--concurrency', type=int, default=16, help='同時進行的工作數')
+    parser.add_argument('--sessions', type=int, default=100, help='每個工作開啟的會話數')
+    parser.add_argument('--pool-size', type=int, default=READ_POOL_SIZE, help='連線池大小')
+    parser.add_argument('--output', type=str, default=None, help='結果 JSON 輸出檔（預設輸出至 stdout）')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="tcrs-conn-bench-") as tmp:
+        if args.db:
+            db_path, table = Path(args.db).resolve(), args.table or "test_run_items"
+        else:
+            db_path = Path(tmp) / "conn.db"
+            table = create_fixture(db_path, args.rows)
+        results = asyncio.run(run(db_path, table, args.concurrency, args.sessions, args.pool_size))
+
+    report = {
+        "meta": {"concurrency": args.concurrency, "sessions_per_worker": args.sessions, "pool_size": args.pool_size},
+        "results": results,
+        "speedup": round(results["pooled"]["rps"] / results["nullpool"]["rps"], 2) if results["nullpool"]["rps"] else None,
+    }
+    text_out = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text_out + "\n", encoding="utf-8")
+    else:
+        print(text_out)
+
+
+if __name__ == '__main__':
+    main()
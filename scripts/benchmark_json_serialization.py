@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+列表 JSON 序列化效能基準測試
+
+於暫存 SQLite 資料庫建立指定筆數的測試案例與 Test Run 項目，比較兩種列表輸出路徑：
+- pydantic：建立回應模型 → 依 response_model 驗證並 dump(mode="json") → json.dumps（FastAPI 預設流程）
+- fast：只取列表欄位組成 dict → fast_json.dumps（有 orjson 時使用 orjson）
+量測查詢＋序列化總耗時（取多次中位數）與輸出大小，並確認兩者輸出的 JSON 內容一致，輸出 JSON。
+
+使用方式：
+  python scripts/benchmark_json_serialization.py
+  python scripts/benchmark_json_serialization.py --sizes 5000 20000 --repeat 5
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+# 確保可從專案根目錄匯入 app 套件
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session, aliased
+
+from app.api import test_run_items
+from app.models.database_models import Base, TestRunConfig, TestRunItem, TestCaseLocal
+from app.models.lark_types import Priority, TestResultStatus
+from app.models.test_case import TestCaseResponse
+from app.services.test_case_repo_service import TestCaseRepoService
+from app.utils import fast_json
+
+RESULTS = [TestResultStatus.PASSED, TestResultStatus.FAILED, TestResultStatus.RETEST,
+           TestResultStatus.NOT_AVAILABLE, None]
+PRIORITIES = [Priority.HIGH, Priority.MEDIUM, Priority.LOW]
+
+_case_adapter = TypeAdapter(List[TestCaseResponse])
+_item_adapter = TypeAdapter(List[test_run_items.TestRunItemResponse])
+
+
+def _seed(engine, count: int) -> None:
+    tables = [TestRunConfig.__table__, TestRunItem.__table__, TestCaseLocal.__table__]
+    Base.metadata.create_all(bind=engine, tables=tables)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(TestRunConfig.__table__), [{"id": 1, "team_id": 1, "name": f"Benchmark {count}"}])
+        for start in range(0, count, 5000):
+            stop = min(start + 5000, count)
+            conn.execute(insert(TestCaseLocal.__table__), [
+                {
+                    "team_id": 1,
+                    "test_case_number": f"TCG-{n:06d}",
+                    "title": f"測試案例 {n}：登入流程與權限驗證",
+                    "priority": PRIORITIES[n % 3],
+                    "precondition": "已建立測試帳號",
+                    "steps": "1. 開啟登入頁\n2. 輸入帳號密碼\n3. 送出",
+                    "expected_result": "成功進入首頁",
+                    "tcg_json": json.dumps([{"record_ids": [f"rec{n}"], "table_id": "tbl",
+                                             "text": f"TCG-{n % 500}", "text_arr": [f"TCG-{n % 500}"],
+                                             "type": "text"}]),
+                    "created_at": now - timedelta(seconds=n),
+                    "updated_at": now,
+                }
+                for n in range(start, stop)
+            ])
+            conn.execute(insert(TestRunItem.__table__), [
+                {
+                    "team_id": 1,
+                    "config_id": 1,
+                    "test_case_number": f"TCG-{n:06d}",
+                    "test_result": RESULTS[n % len(RESULTS)],
+                    "assignee_name": f"tester{n % 20}",
+                    "executed_at": now - timedelta(minutes=n) if RESULTS[n % len(RESULTS)] else None,
+                    "execution_results_json": json.dumps([{"name": "result.png", "stored_name": f"r{n}.png",
+                                                           "relative_path": f"test-runs/1/r{n}.png",
+                                                           "type": "image/png", "size": 1024}]) if n % 4 == 0 else None,
+                    "result_files_uploaded": False,
+                    "result_files_count": 0,
+                    "created_at": now - timedelta(seconds=n),
+                    "updated_at": now,
+                }
+                for n in range(start, stop)
+            ])
+
+
+def _items_query(db: Session):
+    Tc = aliased(TestCaseLocal)
+    q = db.query(TestRunItem).outerjoin(
+        Tc, (TestRunItem.team_id == Tc.team_id) & (TestRunItem.test_case_number == Tc.test_case_number)
+    ).filter(TestRunItem.config_id == 1).order_by(TestRunItem.created_at.desc())
+    return q, Tc
+
+
+def _cases_pydantic(db: Session, count: int) -> bytes:
+    items = TestCaseRepoService(db).list(team_id=1, limit=count)
+    return json.dumps(_case_adapter.dump_python(_case_adapter.validate_python(items), mode="json"),
+                      ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _cases_fast(db: Session, count: int) -> bytes:
+    return fast_json.dumps(TestCaseRepoService(db).list_dicts(team_id=1, limit=count))
+
+
+def _items_pydantic(db: Session, count: int) -> bytes:
+    q, Tc = _items_query(db)
+    rows = q.limit(count).all()
+    items = [test_run_items._db_to_response(i, i.test_case) for i in rows]
+    return json.dumps(_item_adapter.dump_python(_item_adapter.validate_python(items), mode="json"),
+                      ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _items_fast(db: Session, count: int) -> bytes:
+    q, Tc = _items_query(db)
+    rows = q.limit(count).with_entities(*test_run_items._list_item_columns(Tc)).all()
+    return fast_json.dumps([test_run_items._row_to_item_dict(r) for r in rows])
+
+
+def _measure(engine, func, count: int, repeat: int):
+    timings = []
+    body = b""
+    for _ in range(repeat):
+        with Session(engine) as db:
+            started = time.perf_counter()
+            body = func(db, count)
+            timings.append(time.perf_counter() - started)
+    return statistics.median(timings), body
+
+
+def run_benchmark(count: int, repeat: int = 3) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        _seed(engine, count)
+        result = {"rows": count, "orjson": fast_json.orjson is not None}
+        for name, slow, fast in (("test_cases", _cases_pydantic, _cases_fast),
+                                 ("test_run_items", _items_pydantic, _items_fast)):
+            slow_seconds, slow_body = _measure(engine, slow, count, repeat)
+            fast_seconds, fast_body = _measure(engine, fast, count, repeat)
+            result[name] = {
+                "pydantic_ms": round(slow_seconds * 1000, 1),
+                "fast_ms": round(fast_seconds * 1000, 1),
+                "speedup": round(slow_seconds / fast_seconds, 2) if fast_seconds else None,
+                "body_kb": round(len(fast_body) / 1024, 1),
+                "identical": json.loads(slow_body) == json.loads(fast_body),
+            }
+        engine.dispose()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="列表 JSON 序列化效能基準測試")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000], help='測試的資料筆數')
+    parser.add_argument('--repeat', type=int, default=3, help='每組量測次數（取中位數）')
+    args = parser.parse_args()
+
+    results = [run_benchmark(n, args.repeat) for n in args.sizes]
+    print(json.dumps({"benchmark": "json_list_serialization", "results": results}, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+端對端負載基準測試
+
+於同一行程內（httpx ASGITransport，不經網路、不啟動排程器）對熱門端點施加負載，
+輸出各情境的吞吐量與延遲百分位數（JSON），供不同版本間比較是否退化：
+- 測試案例列表 / 標題搜尋
+- Test Run 項目列表
+- 批次更新執行結果
+- 項目統計
+- HTML 報告生成
+
+資料庫：未指定 --db 時，會以 generate_synthetic_data 於暫存目錄產生指定規模的資料集；
+應用程式透過 DATABASE_FILE / AUDIT_DATABASE_URL 環境變數指向該資料集，不會動到正式資料庫。
+
+使用方式：
+  python scripts/benchmark_load.py --scale small --output bench.json
+  python scripts/benchmark_load.py --db /tmp/bench.db --iterations 500 --concurrency 16
+  python scripts/benchmark_load.py --scale tiny --scenarios testcase_list,item_statistics
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+# 確保可從專案根目錄匯入 app 套件
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+SCRIPTS_DIR = Path(__file__).resolve().parent
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+from generate_synthetic_data import BENCHMARK_USERNAME, add_scale_arguments, generate_dataset, scale_from_args
+
+SCENARIOS = (
+    "testcase_list",
+    "testcase_search",
+    "item_list",
+    "item_batch_update",
+    "item_statistics",
+    "report_generate",
+)
+PAGE_SIZE = 100
+BATCH_UPDATE_SIZE = 50
+SEARCH_TERMS = ["登入", "付款", "訂單", "權限", "報表", "逾時", "邊界值", "錯誤訊息"]
+
+
+def percentile(sorted_values, pct: float) -> float:
+    """最近秩（nearest-rank）百分位數"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies, errors: int, wall_seconds: float) -> dict:
+    values = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 2)  # noqa: E731
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "seconds": round(wall_seconds, 3),
+        "rps": round(len(values) / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+        "latency_ms": {
+            "mean": ms(sum(values) / len(values)) if values else 0.0,
+            "p50": ms(percentile(values, 50)),
+            "p90": ms(percentile(values, 90)),
+            "p95": ms(percentile(values, 95)),
+            "p99": ms(percentile(values, 99)),
+            "max": ms(values[-1]) if values else 0.0,
+        },
+    }
+
+
+def load_fixture(db_path: Path) -> dict:
+    """讀取資料集中的團隊、配置與項目 ID，供組出請求"""
+    conn = sqlite3.connect(str(db_path))
+    try:
+        user_id = conn.execute("SELECT id FROM users WHERE username = ?", (BENCHMARK_USERNAME,)).fetchone()
+        if not user_id:
+            raise SystemExit(f"資料庫缺少 {BENCHMARK_USERNAME} 帳號，請以 generate_synthetic_data.py 產生資料集")
+        teams = {}
+        for team_id, case_count in conn.execute(
+            "SELECT team_id, COUNT(*) FROM test_cases GROUP BY team_id"
+        ):
+            teams[team_id] = {"cases": case_count, "configs": {}}
+        for config_id, team_id in conn.execute("SELECT id, team_id FROM test_run_configs"):
+            ids = [row[0] for row in conn.execute(
+                "SELECT id FROM test_run_items WHERE config_id = ? ORDER BY id", (config_id,)
+            )]
+            if ids and team_id in teams:
+                teams[team_id]["configs"][config_id] = ids
+        return {"user_id": user_id[0], "teams": {k: v for k, v in teams.items() if v["configs"]}}
+    finally:
+        conn.close()
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return ""
+
+
+class LoadDriver:
+    """以固定亂數種子產生請求序列，確保每次執行的負載一致"""
+
+    def __init__(self, client, fixture: dict, seed: int = 42):
+        self.client = client
+        self.fixture = fixture
+        self.rng = random.Random(seed)
+        self.team_ids = sorted(fixture["teams"])
+
+    def _team_config(self):
+        team_id = self.rng.choice(self.team_ids)
+        configs = self.fixture["teams"][team_id]["configs"]
+        config_id = self.rng.choice(sorted(configs))
+        return team_id, config_id, configs[config_id]
+
+    def build(self, scenario: str):
+        """回傳 (method, url, json) 的請求描述"""
+        if scenario in ("testcase_list", "testcase_search"):
+            team_id = self.rng.choice(self.team_ids)
+            pages = max(1, self.fixture["teams"][team_id]["cases"] // PAGE_SIZE)
+            params = f"limit={PAGE_SIZE}"
+            if scenario == "testcase_search":
+                params += f"&search={self.rng.choice(SEARCH_TERMS)}"
+            else:
+                params += f"&skip={self.rng.randrange(pages) * PAGE_SIZE}"
+            return "GET", f"/api/teams/{team_id}/testcases/?{params}", None
+
+        team_id, config_id, item_ids = self._team_config()
+        base = f"/api/teams/{team_id}/test-run-configs/{config_id}/items"
+        if scenario == "item_list":
+            pages = max(1, len(item_ids) // PAGE_SIZE)
+            return "GET", f"{base}/?limit={PAGE_SIZE}&skip={self.rng.randrange(pages) * PAGE_SIZE}", None
+        if scenario == "item_batch_update":
+            chosen = self.rng.sample(item_ids, min(BATCH_UPDATE_SIZE, len(item_ids)))
+            results = ["Passed", "Failed", "Retest", "Not Available"]
+            return "POST", f"{base}/batch-update-results", {
+                "updates": [{"id": item_id, "test_result": self.rng.choice(results)} for item_id in chosen],
+                "change_source": "batch",
+            }
+        if scenario == "item_statistics":
+            return "GET", f"{base}/statistics", None
+        if scenario == "report_generate":
+            return "POST", f"/api/teams/{team_id}/test-runs/{config_id}/generate-html?wait=true", None
+        raise ValueError(f"未知情境: {scenario}")
+
+    async def run(self, scenario: str, iterations: int, concurrency: int, warmup: int) -> dict:
+        requests = [self.build(scenario) for _ in range(warmup + iterations)]
+        for method, url, body in requests[:warmup]:
+            await self.client.request(method, url, json=body)
+
+        queue = list(reversed(requests[warmup:]))
+        latencies, statuses = [], {}
+
+        async def worker():
+            while queue:
+                method, url, body = queue.pop()
+                started = time.perf_counter()
+                try:
+                    response = await self.client.request(method, url, json=body)
+                    code = str(response.status_code)
+                except Exception as e:  # 例外同樣視為錯誤，避免單一請求中斷整個情境
+                    code = type(e).__name__
+                latencies.append(time.perf_counter() - started)
+                statuses[code] = statuses.get(code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+        wall = time.perf_counter() - started
+        errors = sum(count for code, count in statuses.items() if not code.startswith("2"))
+        return {**summarize(latencies, errors, wall), "statuses": statuses}
+
+
+async def run_benchmark(db_path: Path, audit_db_path: Path, scenarios, iterations: int,
+                        concurrency: int, warmup: int, seed: int, work_dir: Path) -> dict:
+    # 必須在匯入 app 之前設定，讓資料庫與設定指向暫存資料集
+    os.environ["DATABASE_FILE"] = str(db_path)
+    os.environ["AUDIT_DATABASE_URL"] = f"sqlite:///{audit_db_path}"
+    os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+
+    import httpx
+
+    from app.audit.database import audit_db_manager, cleanup_audit_database, init_audit_database
+    from app.auth.auth_service import auth_service
+    from app.auth.models import UserRole
+    from app.main import app
+    from app.services.html_report_service import html_report_worker
+
+    # 設定可能已於匯入 generate_synthetic_data 時載入，審計資料庫位置需另外覆寫
+    audit_db_manager.config.database_url = os.environ["AUDIT_DATABASE_URL"]
+    html_report_worker._base_dir = str(work_dir / "reports")
+    os.makedirs(html_report_worker._base_dir, exist_ok=True)
+
+    fixture = load_fixture(db_path)
+    await init_audit_database()
+    token, _, _ = await auth_service.create_access_token(fixture["user_id"], BENCHMARK_USERNAME, UserRole.SUPER_ADMIN)
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://benchmark", timeout=None,
+        headers={"Authorization": f"Bearer {token}"},
+    ) as client:
+        driver = LoadDriver(client, fixture, seed=seed)
+        for scenario in scenarios:
+            results[scenario] = await driver.run(scenario, iterations, concurrency, warmup)
+            print(
+                f"{scenario:<18} {results[scenario]['rps']:>9.1f} req/s  "
+                f"p50 {results[scenario]['latency_ms']['p50']:>8.1f}ms  "
+                f"p99 {results[scenario]['latency_ms']['p99']:>8.1f}ms  "
+                f"errors {results[scenario]['errors']}",
+                file=sys.stderr,
+            )
+
+    from app.audit import audit_service
+    await audit_service.force_flush()
+    await cleanup_audit_database()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="熱門 API 端點的行程內負載基準測試")
+    parser.add_argument('--db', type=str, default=None, help='既有的合成資料庫（未指定則於暫存目錄產生）')
+    parser.add_argument('--audit-db', type=str, default=None, help='審計資料庫路徑（預設為 <db>.audit.db）')
+    parser.add_argument('--scenarios', type=str, default=','.join(SCENARIOS),
+                        help=f"以逗號分隔的情境（可用: {', '.join(SCENARIOS)}）")
+    parser.add_argument('--iterations', type=int, default=200, help='每個情境的請求數')
+    parser.add_argument('--concurrency', type=int, default=8, help='同時進行的請求數')
+    parser.add_argument('--warmup', type=int, default=5, help='每個情境先行丟棄的暖身請求數')
+    parser.add_argument('--output', type=str, default=None, help='結果 JSON 輸出檔（預設輸出至 stdout）')
+    add_scale_arguments(parser)
+    parser.set_defaults(scale='small')
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知情境: {', '.join(unknown)}")
+
+    with tempfile.TemporaryDirectory(prefix="tcrs-bench-") as tmp:
+        work_dir = Path(tmp)
+        dataset = None
+        if args.db:
+            db_path = Path(args.db).resolve()
+            audit_db_path = Path(args.audit_db).resolve() if args.audit_db else db_path.with_suffix(".audit.db")
+        else:
+            db_path = work_dir / "bench.db"
+            audit_db_path = work_dir / "bench.audit.db"
+            dataset = generate_dataset(db_path, audit_db_path=audit_db_path, seed=args.seed, **scale_from_args(args))
+            print(f"已產生資料集（{dataset['seconds']}s）: {dataset['counts']}", file=sys.stderr)
+
+        results = asyncio.run(run_benchmark(
+            db_path, audit_db_path, scenarios, args.iterations, args.concurrency, args.warmup, args.seed, work_dir,
+        ))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "db_path": str(args.db) if args.db else None,
+            "scale": None if args.db else args.scale,
+            "dataset": dataset["counts"] if dataset else None,
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "seed": args.seed,
+        },
+        "scenarios": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
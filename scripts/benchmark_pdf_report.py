@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+PDF 報告效能基準測試
+
+於暫存 SQLite 資料庫建立指定項目數的 Test Run，以完整模式（full_results）產生 PDF，
+量測耗時與 Python 記憶體峰值（tracemalloc），輸出 JSON。
+預設比較 2,000 與 20,000 筆：結果列與表格 flowable 為固定大小的批次，
+峰值記憶體僅隨 ReportLab 保留至存檔的已壓縮頁面資料（約與輸出檔大小成正比）緩慢增加。
+
+使用方式：
+  python scripts/benchmark_pdf_report.py
+  python scripts/benchmark_pdf_report.py --sizes 20000 --output /tmp/report.pdf
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 確保可從專案根目錄匯入 app 套件
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from app.models.database_models import Base, TestRunConfig, TestRunItem, TestCaseLocal
+from app.models.lark_types import Priority, TestResultStatus
+from app.services.pdf_report_service import PDFReportService, register_chinese_font
+
+RESULTS = [TestResultStatus.PASSED, TestResultStatus.FAILED, TestResultStatus.RETEST,
+           TestResultStatus.NOT_AVAILABLE, None]
+PRIORITIES = [Priority.HIGH, Priority.MEDIUM, Priority.LOW]
+
+
+def _seed(engine, count: int) -> None:
+    tables = [TestRunConfig.__table__, TestRunItem.__table__, TestCaseLocal.__table__]
+    Base.metadata.create_all(bind=engine, tables=tables)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(TestRunConfig.__table__), [{"id": 1, "team_id": 1, "name": f"Benchmark {count}"}])
+        for start in range(0, count, 5000):
+            stop = min(start + 5000, count)
+            conn.execute(insert(TestCaseLocal.__table__), [
+                {
+                    "team_id": 1,
+                    "test_case_number": f"TCG-{n:06d}",
+                    "title": f"測試案例 {n}：登入流程與權限驗證",
+                    "priority": PRIORITIES[n % 3],
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for n in range(start, stop)
+            ])
+            conn.execute(insert(TestRunItem.__table__), [
+                {
+                    "team_id": 1,
+                    "config_id": 1,
+                    "test_case_number": f"TCG-{n:06d}",
+                    "test_result": RESULTS[n % len(RESULTS)],
+                    "assignee_name": f"tester{n % 20}",
+                    "executed_at": now - timedelta(minutes=n) if RESULTS[n % len(RESULTS)] else None,
+                    "bug_tickets_json": json.dumps([{"ticket_number": f"BUG-{n % 97}"}]) if n % 10 == 0 else None,
+                    "result_files_uploaded": False,
+                    "result_files_count": 0,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for n in range(start, stop)
+            ])
+
+
+def run_benchmark(count: int, output: str | None = None, measure_memory: bool = True) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        _seed(engine, count)
+        pdf_path = output or str(Path(tmp) / "report.pdf")
+
+        # 計時與記憶體量測分開執行（tracemalloc 會明顯拖慢排版）
+        with Session(engine) as db:
+            started = time.perf_counter()
+            PDFReportService(db).write_test_run_report(1, 1, pdf_path, full_results=True)
+            elapsed = time.perf_counter() - started
+
+        peak = None
+        if measure_memory:
+            with Session(engine) as db:
+                service = PDFReportService(db)
+                tracemalloc.start()
+                service.write_test_run_report(1, 1, pdf_path, full_results=True)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+        size = os.path.getsize(pdf_path)
+        engine.dispose()
+    return {
+        "items": count,
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round(count / elapsed) if elapsed else None,
+        "peak_python_mb": round(peak / (1024 * 1024), 1) if peak is not None else None,
+        "pdf_mb": round(size / (1024 * 1024), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF 報告效能基準測試")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[2000, 20000], help='測試的項目數')
+    parser.add_argument('--output', type=str, default=None, help='保留最後一次產生的 PDF 路徑')
+    parser.add_argument('--no-memory', action='store_true', help='略過 tracemalloc 記憶體量測')
+    args = parser.parse_args()
+
+    register_chinese_font()
+    # 先以小資料暖機，避免字型與樣式初始化計入第一組量測
+    run_benchmark(200, measure_memory=False)
+    results = [run_benchmark(n, args.output, not args.no_memory) for n in args.sizes]
+    print(json.dumps({"benchmark": "pdf_report_full_results", "results": results}, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
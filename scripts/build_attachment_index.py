@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+附件索引建立腳本（一次性 / 可重複執行）
+
+掃描 attachments 根目錄，將既有檔案登錄到 attachment_index 表格，
+供下載代理以 file_token 直接查詢，不再於請求時掃描目錄。
+
+使用方式：
+  python scripts/build_attachment_index.py
+  python scripts/build_attachment_index.py --root /data/attachments --no-prune
+
+選項：
+  --root      指定附件根目錄（預設依 config.yaml 的 attachments.root_dir）
+  --no-prune  保留磁碟上已不存在檔案的索引條目
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# 確保可從專案根目錄匯入 app 套件
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from sqlalchemy.orm import sessionmaker
+from app.database import get_sync_engine
+from app.models.database_models import AttachmentIndex
+from app.services.attachment_index_service import get_attachments_root, rebuild_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="附件索引建立工具")
+    parser.add_argument('--root', type=str, default=None, help='附件根目錄（預設讀取設定）')
+    parser.add_argument('--no-prune', action='store_true', help='不移除已不存在檔案的索引條目')
+    parser.add_argument('--batch-size', type=int, default=500, help='每批提交的筆數')
+    args = parser.parse_args()
+
+    sync_engine = get_sync_engine()
+    # 確保索引表存在（不影響其他表）
+    AttachmentIndex.__table__.create(bind=sync_engine, checkfirst=True)
+
+    root_dir = Path(args.root) if args.root else get_attachments_root()
+    print(f"[INFO] 掃描附件目錄: {root_dir}")
+
+    SessionLocal = sessionmaker(bind=sync_engine, autocommit=False, autoflush=False)
+    db = SessionLocal()
+    try:
+        stats = rebuild_index(db, root_dir, prune=not args.no_prune, batch_size=args.batch_size)
+    finally:
+        db.close()
+
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
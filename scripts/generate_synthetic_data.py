@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+合成資料產生器
+
+於暫存 SQLite 資料庫產生接近正式環境規模的資料，供效能基準測試使用：
+團隊、測試案例（含 TCG JSON）、Test Run 配置、Test Run 項目與結果歷程，以及審計記錄（獨立的審計資料庫）。
+另建立一個 super_admin 帳號（benchmark）供負載測試取得 Token。
+
+資料以固定亂數種子產生，同樣參數可重現相同資料集。
+
+使用方式：
+  python scripts/generate_synthetic_data.py --db /tmp/bench.db
+  python scripts/generate_synthetic_data.py --db /tmp/bench.db --scale small
+  python scripts/generate_synthetic_data.py --db /tmp/bench.db --test-cases 200000 --items 5000000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 確保可從專案根目錄匯入 app 套件
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from sqlalchemy import create_engine, event, insert
+
+from app.audit.database import AuditBase, AuditLogTable
+from app.audit.models import ActionType, AuditSeverity, ResourceType
+from app.auth.models import UserRole
+from app.models.database_models import (
+    Base, Team, TestCaseLocal, TestRunConfig, TestRunItem, TestRunItemResultHistory, User,
+)
+from app.models.lark_types import Priority, TestResultStatus
+from app.models.test_run_config import TestRunStatus
+
+# 規模預設：teams / test_cases / configs / items / history_ratio（歷程筆數 = 項目數 × 比例）/ audit_logs
+SCALES = {
+    "tiny": dict(teams=1, test_cases=500, configs=3, items=1_200, history_ratio=0.5, audit_logs=1_000),
+    "small": dict(teams=2, test_cases=10_000, configs=30, items=100_000, history_ratio=1.0, audit_logs=20_000),
+    "full": dict(teams=4, test_cases=100_000, configs=300, items=2_000_000, history_ratio=1.5, audit_logs=500_000),
+}
+
+BATCH_SIZE = 5000
+BENCHMARK_USERNAME = "benchmark"
+
+RESULTS = [TestResultStatus.PASSED] * 6 + [TestResultStatus.FAILED, TestResultStatus.RETEST,
+                                           TestResultStatus.NOT_AVAILABLE] + [None] * 3
+PRIORITIES = [Priority.HIGH, Priority.MEDIUM, Priority.MEDIUM, Priority.LOW]
+FEATURES = ["登入", "付款", "訂單", "權限", "報表", "通知", "搜尋", "匯出", "設定", "會員"]
+ACTIONS = ["驗證", "建立", "更新", "刪除", "查詢", "逾時處理", "邊界值", "錯誤訊息"]
+TESTERS = [f"tester{i:02d}" for i in range(40)]
+
+
+def _batched(rows, size: int = BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _fast_engine(path: Path):
+    """大量寫入用引擎：關閉同步與日誌以加快產生速度（僅用於暫存資料庫）"""
+    engine = create_engine(f"sqlite:///{path}")
+
+    @event.listens_for(engine, "connect")
+    def _pragma(dbapi_conn, _record):
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA journal_mode=OFF")
+        cursor.execute("PRAGMA synchronous=OFF")
+        cursor.execute("PRAGMA cache_size=-200000")
+        cursor.close()
+
+    return engine
+
+
+def _team_cases(team_index: int, teams: int, test_cases: int) -> range:
+    """第 team_index 個團隊（0 起算）分配到的測試案例序號範圍"""
+    per_team = test_cases // teams
+    start = team_index * per_team
+    stop = test_cases if team_index == teams - 1 else start + per_team
+    return range(start, stop)
+
+
+def _case_number(n: int) -> str:
+    return f"TCG-{100000 + n}.{n % 50:03d}.{n % 7:03d}"
+
+
+def generate_dataset(db_path, teams: int, test_cases: int, configs: int, items: int,
+                     history_ratio: float, audit_logs: int, audit_db_path=None, seed: int = 42) -> dict:
+    """產生資料集並回傳各表筆數與耗時"""
+    db_path = Path(db_path)
+    audit_db_path = Path(audit_db_path) if audit_db_path else db_path.with_suffix(".audit.db")
+    for path in (db_path, audit_db_path):
+        if path.exists():
+            path.unlink()
+
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    started = time.perf_counter()
+    counts = {}
+
+    engine = _fast_engine(db_path)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), [{
+            "username": BENCHMARK_USERNAME, "email": "benchmark@example.com",
+            "hashed_password": "!", "full_name": "Benchmark", "role": UserRole.SUPER_ADMIN,
+            "is_active": True, "is_verified": True, "created_at": now, "updated_at": now,
+        }])
+        conn.execute(insert(Team.__table__), [{
+            "id": t + 1, "name": f"Team {t + 1}", "wiki_token": f"wiki{t + 1}",
+            "test_case_table_id": f"tbl{t + 1}", "created_at": now, "updated_at": now,
+        } for t in range(teams)])
+        counts["teams"] = teams
+
+        # 測試案例
+        def case_rows():
+            for t in range(teams):
+                for n in _team_cases(t, teams, test_cases):
+                    feature, action = FEATURES[n % len(FEATURES)], ACTIONS[(n // 10) % len(ACTIONS)]
+                    tcg = f"TCG-{1000 + n % 5000}"
+                    created = now - timedelta(days=365) + timedelta(minutes=n)
+                    yield {
+                        "team_id": t + 1,
+                        "test_case_number": _case_number(n),
+                        "title": f"{feature}模組 - {action} 情境 {n}",
+                        "priority": PRIORITIES[n % len(PRIORITIES)],
+                        "precondition": f"已登入且具備{feature}權限",
+                        "steps": "\n".join(f"{i}. 操作{feature}步驟 {i}" for i in range(1, 6)),
+                        "expected_result": f"{feature}{action}結果符合預期",
+                        "tcg_json": json.dumps([{
+                            "record_ids": [f"rec{n % 5000:06d}"], "table_id": "tblTCG",
+                            "text": tcg, "text_arr": [tcg], "type": "text",
+                        }], ensure_ascii=False),
+                        "checksum": f"{n:064x}",
+                        "created_at": created,
+                        "updated_at": created,
+                    }
+
+        for batch in _batched(case_rows()):
+            conn.execute(insert(TestCaseLocal.__table__), batch)
+        counts["test_cases"] = test_cases
+
+        # Test Run 配置與項目
+        conn.execute(insert(TestRunConfig.__table__), [{
+            "id": c + 1, "team_id": c % teams + 1, "name": f"Regression {c + 1}",
+            "test_version": f"v{1 + c // 50}.{c % 50}", "test_environment": ["staging", "uat", "prod"][c % 3],
+            "status": TestRunStatus.ACTIVE if c % 4 else TestRunStatus.COMPLETED,
+            "created_at": now - timedelta(days=configs - c), "updated_at": now,
+        } for c in range(configs)])
+        counts["test_run_configs"] = configs
+
+        items_per_config = max(1, items // configs) if configs else 0
+        executed_items = []
+
+        def item_rows():
+            item_id = 0
+            for c in range(configs):
+                cases = _team_cases(c % teams, teams, test_cases)
+                size = min(items_per_config, len(cases))
+                offset = (c * 7919) % len(cases)
+                for k in range(size):
+                    n = cases[(offset + k) % len(cases)]
+                    item_id += 1
+                    result = RESULTS[(n + c) % len(RESULTS)]
+                    executed_at = now - timedelta(minutes=(item_id % 20000)) if result else None
+                    if result:
+                        executed_items.append((item_id, c + 1, c % teams + 1))
+                    tester = TESTERS[(n + c) % len(TESTERS)]
+                    yield {
+                        "id": item_id,
+                        "team_id": c % teams + 1,
+                        "config_id": c + 1,
+                        "test_case_number": _case_number(n),
+                        "assignee_name": tester,
+                        "assignee_email": f"{tester}@example.com",
+                        "test_result": result,
+                        "executed_at": executed_at,
+                        "bug_tickets_json": json.dumps([{"ticket_number": f"BUG-{n % 997}"}]) if result == TestResultStatus.FAILED else None,
+                        "result_files_uploaded": False,
+                        "result_files_count": 0,
+                        "created_at": now - timedelta(days=1),
+                        "updated_at": executed_at or now - timedelta(days=1),
+                    }
+
+        for batch in _batched(item_rows()):
+            conn.execute(insert(TestRunItem.__table__), batch)
+        counts["test_run_items"] = sum(
+            min(items_per_config, len(_team_cases(c % teams, teams, test_cases))) for c in range(configs)
+        )
+
+        # 結果歷程：隨機挑選已執行項目
+        history_count = int(counts["test_run_items"] * history_ratio) if executed_items else 0
+
+        def history_rows():
+            for i in range(history_count):
+                item_id, config_id, team_id = executed_items[rng.randrange(len(executed_items))]
+                yield {
+                    "team_id": team_id,
+                    "config_id": config_id,
+                    "item_id": item_id,
+                    "prev_result": RESULTS[i % len(RESULTS)],
+                    "new_result": RESULTS[(i + 1) % len(RESULTS)],
+                    "new_executed_at": now - timedelta(minutes=i % 50000),
+                    "changed_by_name": TESTERS[i % len(TESTERS)],
+                    "change_source": "batch" if i % 3 else "single",
+                    "changed_at": now - timedelta(minutes=i % 50000),
+                }
+
+        for batch in _batched(history_rows()):
+            conn.execute(insert(TestRunItemResultHistory.__table__), batch)
+        counts["test_run_item_result_history"] = history_count
+    engine.dispose()
+
+    # 審計記錄（獨立資料庫，與正式環境相同）
+    audit_engine = _fast_engine(audit_db_path)
+    AuditBase.metadata.create_all(bind=audit_engine)
+    resource_types = list(ResourceType)
+    action_types = [ActionType.CREATE, ActionType.UPDATE, ActionType.UPDATE, ActionType.DELETE, ActionType.READ]
+
+    def audit_rows():
+        for i in range(audit_logs):
+            yield {
+                "timestamp": now - timedelta(seconds=i * 30),
+                "user_id": 1 + i % 40,
+                "username": TESTERS[i % len(TESTERS)],
+                "role": "user",
+                "action_type": action_types[i % len(action_types)],
+                "resource_type": resource_types[i % len(resource_types)],
+                "resource_id": str(1 + i % 5000),
+                "team_id": 1 + i % teams,
+                "details": json.dumps({"path": f"/api/teams/{1 + i % teams}/testcases/{i % 5000}"}),
+                "action_brief": f"{TESTERS[i % len(TESTERS)]} 更新了資源 {i % 5000}",
+                "severity": AuditSeverity.CRITICAL if i % 97 == 0 else AuditSeverity.INFO,
+                "ip_address": f"10.0.{i % 256}.{(i // 256) % 256}",
+            }
+
+    with audit_engine.begin() as conn:
+        for batch in _batched(audit_rows()):
+            conn.execute(insert(AuditLogTable.__table__), batch)
+    audit_engine.dispose()
+    counts["audit_logs"] = audit_logs
+
+    return {
+        "db_path": str(db_path),
+        "audit_db_path": str(audit_db_path),
+        "seed": seed,
+        "counts": counts,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def add_scale_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--scale', choices=sorted(SCALES), default='full', help='規模預設（可再以個別參數覆寫）')
+    for name in ('teams', 'test_cases', 'configs', 'items', 'audit_logs'):
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=None)
+    parser.add_argument('--history-ratio', type=float, default=None, help='結果歷程筆數相對於項目數的比例')
+    parser.add_argument('--seed', type=int, default=42)
+
+
+def scale_from_args(args) -> dict:
+    scale = dict(SCALES[args.scale])
+    for name in scale:
+        value = getattr(args, name, None)
+        if value is not None:
+            scale[name] = value
+    return scale
+
+
+def main():
+    parser = argparse.ArgumentParser(description="產生效能測試用的合成資料")
+    parser.add_argument('--db', type=str, required=True, help='輸出的 SQLite 資料庫路徑（既有檔案會被覆寫）')
+    parser.add_argument('--audit-db', type=str, default=None, help='審計資料庫路徑（預設為 <db>.audit.db）')
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+
+    result = generate_dataset(args.db, audit_db_path=args.audit_db, seed=args.seed, **scale_from_args(args))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
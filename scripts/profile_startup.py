@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+應用程式啟動匯入時間剖析
+
+以 `python -X importtime -c "import app.main"` 於子行程匯入應用程式（多次取中位數），
+彙整 importtime 輸出：總耗時、累計/自身耗時最高的模組、各頂層套件耗時，
+並檢查啟動預算與不應於啟動時載入的重量級模組（應延遲到首次使用才匯入）。
+
+- 預算：--budget-ms 或環境變數 STARTUP_IMPORT_BUDGET_MS（預設 3000 ms）
+- 超出預算或載入了禁止模組時以結束碼 1 結束，可用於 CI
+
+使用方式：
+  python scripts/profile_startup.py
+  python scripts/profile_startup.py --runs 5 --top 30 --budget-ms 2000
+  python scripts/profile_startup.py --raw /tmp/importtime.txt   # 只彙整既有的 importtime 輸出
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "3000"))
+# 僅於特定功能使用、不應拖慢 worker 啟動的模組
+LAZY_MODULES = ("reportlab", "matplotlib", "casbin", "aiohttp", "openpyxl", "PIL")
+
+_LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def parse_importtime(text: str) -> List[Dict[str, object]]:
+    """解析 -X importtime 輸出（單位轉為 ms；depth 為巢狀層級，0 為頂層匯入）"""
+    entries = []
+    for line in text.splitlines():
+        match = _LINE_RE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        entries.append({
+            "module": module,
+            "self_ms": int(self_us) / 1000.0,
+            "cumulative_ms": int(cumulative_us) / 1000.0,
+            "depth": max(0, (len(indent) - 1) // 2),
+        })
+    return entries
+
+
+def summarize(entries: List[Dict[str, object]], top: int = 20, target: str = "app.main") -> Dict[str, object]:
+    total = next((e["cumulative_ms"] for e in entries if e["module"] == target), None)
+    if total is None:
+        total = sum(e["cumulative_ms"] for e in entries if e["depth"] == 0)
+
+    packages: Dict[str, float] = defaultdict(float)
+    for e in entries:
+        packages[str(e["module"]).split(".")[0]] += e["self_ms"]
+
+    def rows(key: str, items) -> List[Dict[str, object]]:
+        return [{"module": e["module"], key: round(e[key], 1)}
+                for e in sorted(items, key=lambda e: e[key], reverse=True)[:top]]
+
+    loaded = {str(e["module"]) for e in entries}
+    return {
+        "total_ms": round(total, 1),
+        "modules": len(entries),
+        "top_cumulative": rows("cumulative_ms", entries),
+        "top_self": rows("self_ms", entries),
+        "top_app_self": rows("self_ms", [e for e in entries if str(e["module"]).startswith("app.")]),
+        "packages": [{"package": name, "self_ms": round(ms, 1)}
+                     for name, ms in sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:top]],
+        "eager_heavy_modules": sorted(m for m in LAZY_MODULES if m in loaded),
+    }
+
+
+def run_importtime(target: str = "app.main") -> str:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=str(ROOT), capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"匯入 {target} 失敗:\n{result.stderr[-2000:]}")
+    return result.stderr
+
+
+def profile(runs: int = 3, top: int = 20, target: str = "app.main", raw: Optional[str] = None) -> Dict[str, object]:
+    if raw:
+        return summarize(parse_importtime(Path(raw).read_text(encoding="utf-8")), top, target)
+    # 取總耗時為中位數的那一次作為明細（第一次可能含 .pyc 編譯）
+    summaries = [summarize(parse_importtime(run_importtime(target)), top, target) for _ in range(max(1, runs))]
+    median = statistics.median(s["total_ms"] for s in summaries)
+    chosen = min(summaries, key=lambda s: abs(s["total_ms"] - median))
+    chosen["runs_ms"] = [s["total_ms"] for s in summaries]
+    return chosen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="應用程式啟動匯入時間剖析")
+    parser.add_argument("--runs", type=int, default=3, help="匯入次數（取中位數）")
+    parser.add_argument("--top", type=int, default=20, help="各排行列出的模組數")
+    parser.add_argument("--target", default="app.main", help="要匯入的模組")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="啟動匯入時間預算（ms）")
+    parser.add_argument("--raw", default=None, help="彙整既有的 importtime 輸出檔，不重新執行")
+    args = parser.parse_args()
+
+    report = profile(args.runs, args.top, args.target, args.raw)
+    report["budget_ms"] = args.budget_ms
+    report["within_budget"] = report["total_ms"] <= args.budget_ms
+    print(json.dumps({"profile": "startup_importtime", **report}, ensure_ascii=False, indent=2))
+
+    if not report["within_budget"] or report["eager_heavy_modules"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Test Run 統計計數檢查 / 修復腳本
+
+test_run_configs 的統計欄位由 trigger 於項目寫入時增量維護。本腳本以 GROUP BY 重新統計
+test_run_items，與配置上的計數及 test_run_bug_tickets 參照表比對，列出不一致的配置。
+
+- 未指定 --repair 時發現不一致以結束碼 1 結束，可用於排程監控
+- --repair 重算不一致的配置；尚未安裝 trigger 的資料庫會先安裝並全量重算
+
+使用方式：
+  python scripts/verify_run_counters.py
+  python scripts/verify_run_counters.py --config-id 12
+  python scripts/verify_run_counters.py --repair
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# 確保可從專案根目錄匯入 app 套件
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from sqlalchemy.orm import sessionmaker
+from app.database import get_sync_engine
+from app.services.run_counter_service import ensure_run_counters, verify_counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test Run 統計計數檢查 / 修復工具")
+    parser.add_argument('--config-id', type=int, default=None, help='只檢查指定的配置')
+    parser.add_argument('--repair', action='store_true', help='重算不一致的配置')
+    args = parser.parse_args()
+
+    sync_engine = get_sync_engine()
+    if args.repair and not ensure_run_counters(sync_engine):
+        print("[ERROR] test_run_configs 缺少計數欄位，請先執行 database_init.py --auto-fix", file=sys.stderr)
+        sys.exit(2)
+
+    SessionLocal = sessionmaker(bind=sync_engine, autocommit=False, autoflush=False)
+    db = SessionLocal()
+    try:
+        result = verify_counters(db, config_id=args.config_id, repair=args.repair)
+        if args.repair:
+            db.commit()
+    finally:
+        db.close()
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if result["mismatches"] and not args.repair:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()